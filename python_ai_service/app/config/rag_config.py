@@ -9,8 +9,8 @@ import os
 import yaml
 import logging
 from pathlib import Path
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import Dict, Optional
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +24,10 @@ class RAGConfig:
     extraction_provider: Optional[str] = None
     aggregation_provider: Optional[str] = None
     profile_name: str = "default"
+    # Stage map di _multi_step_synthesis (batch in parallelo)
+    map_max_in_flight: int = 4
+    map_min_success_ratio: float = 0.5
+    provider_rate_limits: Dict[str, int] = field(default_factory=dict)  # provider -> richieste/minuto
 
 
 def load_rag_config() -> RAGConfig:
@@ -59,12 +63,16 @@ def load_rag_config() -> RAGConfig:
             timeout_seconds=profile.get("timeout_seconds", 240),
             extraction_provider=profile.get("extraction_provider"),
             aggregation_provider=profile.get("aggregation_provider"),
-            profile_name=active_profile
+            profile_name=active_profile,
+            map_max_in_flight=profile.get("map_max_in_flight", 4),
+            map_min_success_ratio=profile.get("map_min_success_ratio", 0.5),
+            provider_rate_limits=profile.get("provider_rate_limits") or {}
         )
         
         logger.info(f"📋 RAG Config caricata: profilo='{active_profile}', "
                    f"max_evidences={config.max_evidences}, "
-                   f"batch_size={config.batch_size}")
+                   f"batch_size={config.batch_size}, "
+                   f"map_max_in_flight={config.map_max_in_flight}")
         
         return config
         
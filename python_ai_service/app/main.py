@@ -28,6 +28,7 @@ logging.getLogger('app.services.mongodb_service').setLevel(logging.INFO)
 env_path = Path(__file__).parent.parent / '.env'
 load_dotenv(dotenv_path=env_path)
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.routers import (
@@ -44,14 +45,46 @@ from app.routers import (
     memories,
     infographics,
 )
+from app.services.embedding_store import EmbeddingStore
+from app.services.mongodb_async import AsyncMongoDBService
+from app.services.mongodb_health import MongoHealthMonitor
+from app.services.mongodb_service import MongoDBService
+from app.services.pdf_extraction import PDFExtractionService
+from app.services.providers.http_client import HTTPClientRegistry
+from app.services.compliance_scanner.http_fetcher import ScannerClientPool, ScannerHTTPFetcher
 
 logger = logging.getLogger(__name__)
 logger.info("🚀 NATAN AI Gateway starting...")
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Startup/shutdown del servizio"""
+    # Mappa in memoria gli store embedding dei tenant (scoring zero-copy)
+    try:
+        loaded = EmbeddingStore.load_all()
+        logger.info(f"🗂️ EmbeddingStore: {loaded} tenant mappati")
+    except Exception as e:
+        logger.warning(f"⚠️ EmbeddingStore non caricato all'avvio: {e}")
+    # Heartbeat MongoDB: is_connected() legge lo stato cachato invece di fare ping
+    MongoHealthMonitor.start_heartbeat(MongoDBService.ping)
+    yield
+    await MongoHealthMonitor.stop_heartbeat()
+    # Chiude le connessioni keep-alive verso i provider AI e gli albi (scanner)
+    await HTTPClientRegistry.aclose()
+    await ScannerClientPool.aclose()
+    ScannerHTTPFetcher.shutdown()
+    # Processi di estrazione PDF (upload e bulk import)
+    PDFExtractionService.shutdown()
+    # Chiude il pool dei thread MongoDB async
+    AsyncMongoDBService.shutdown(wait=False)
+
+
 app = FastAPI(
     title="NATAN AI Gateway",
     description="AI Gateway microservice for NATAN_LOC",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
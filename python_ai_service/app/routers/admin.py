@@ -9,6 +9,7 @@ from app.services.compliance_scanner import AlboPretorioComplianceScanner
 from app.services.compliance_scanner.report_generator import ReportGenerator
 from app.services.compliance_scanner.email_sender import EmailSender
 from app.services.compliance_scanner.comuni_tracker import ComuniScrapingTracker
+from app.services.compliance_scanner.http_fetcher import ScannerHTTPFetcher
 
 router = APIRouter()
 
@@ -36,7 +37,8 @@ class ComplianceScanResponse(BaseModel):
 async def scan_compliance(
     comune_slug: str, 
     mongodb_import: bool = False, 
-    tenant_id: Optional[int] = None
+    tenant_id: Optional[int] = None,
+    incremental: bool = False
 ):
     """
     Lancia scan conformità per un comune specifico
@@ -44,13 +46,20 @@ async def scan_compliance(
     Query params:
     - mongodb_import: Se True, importa atti in MongoDB con embeddings (default: False)
     - tenant_id: ID tenant per multi-tenancy (opzionale)
+    - incremental: Se True, solo atti successivi all'ultimo scan (high-water mark nel tracker)
     
     Endpoint protetto - solo admin
     """
     try:
         # Per esecuzione normale, usa output_dir standard
         scanner = AlboPretorioComplianceScanner(output_dir="storage/testing/compliance_scanner")
-        report = await scanner.scan_comune(comune_slug, tenant_id=tenant_id, dry_run=False, mongodb_import=mongodb_import)
+        report = await scanner.scan_comune(
+            comune_slug,
+            tenant_id=tenant_id,
+            dry_run=False,
+            mongodb_import=mongodb_import,
+            incremental=incremental
+        )
         
         # Genera PDF
         report_generator = ReportGenerator()
@@ -202,17 +211,31 @@ async def get_scraping_stats(tenant_id: Optional[int] = None):
 async def scrape_all_comuni(
     skip_scraped: bool = True,
     tenant_id: Optional[int] = None,
-    dry_run: bool = False
+    dry_run: bool = False,
+    concurrency: Optional[int] = None,
+    job_id: Optional[str] = None,
+    incremental: bool = False
 ):
     """
     Scrapa tutti i comuni standard, saltando quelli già scrapati se richiesto.
     
+    I comuni sono scrapati in parallelo (DistributedScraperQueue), un solo
+    scraping alla volta per host. Lo stato del job è salvato nel tracker:
+    rilanciando con lo stesso job_id i comuni completati vengono saltati e
+    quelli falliti o interrotti ritentati.
+    
     Body params:
     - skip_scraped: Se True, salta comuni già scrapati (default: True)
     - tenant_id: ID tenant (opzionale)
     - dry_run: Se True, solo dry-run senza estrarre atti (default: False)
+    - concurrency: Comuni scrapati contemporaneamente (default: SCRAPER_QUEUE_CONCURRENCY)
+    - job_id: ID job da riprendere (default: nuovo job)
+    - incremental: Refresh solo atti nuovi di ogni comune (high-water mark); i comuni
+      già scrapati non vengono saltati
     """
     try:
+        from app.scrapers.distributed_queue import DistributedScraperQueue, ScrapeTask, default_job_id
+        
         # Lista standard comuni toscani supportati
         comuni_standard = [
             "firenze", "sesto_fiorentino", "empoli", "pisa", "prato",
@@ -221,7 +244,7 @@ async def scrape_all_comuni(
         
         # Filtra comuni già scrapati se richiesto
         comuni_to_scrape = comuni_standard
-        if skip_scraped:
+        if skip_scraped and not incremental:
             comuni_to_scrape = ComuniScrapingTracker.get_unscraped_comuni(
                 comuni_standard, 
                 tenant_id=tenant_id
@@ -236,14 +259,30 @@ async def scrape_all_comuni(
             }
         
         scanner = AlboPretorioComplianceScanner(output_dir="storage/testing/compliance_scanner")
+        job_id = job_id or default_job_id("scrape-all")
+        
+        async def scan(task, rate_limiter):
+            # Scanner per comune: le richieste HTTP passano dal limiter dell'host
+            task_scanner = AlboPretorioComplianceScanner(
+                output_dir="storage/testing/compliance_scanner",
+                fetcher=ScannerHTTPFetcher(rate_limiter=rate_limiter)
+            )
+            return await task_scanner.scan_comune(task.key, tenant_id=tenant_id, dry_run=dry_run, incremental=incremental)
+        
+        queue_options = {"concurrency": concurrency} if concurrency else {}
+        queue = DistributedScraperQueue(scan, job_id=job_id, tenant_id=tenant_id, **queue_options)
+        outcomes = await queue.run(
+            # L'host del primo URL albo noto: comuni sullo stesso host non vanno in parallelo
+            ScrapeTask(comune_slug, scanner._get_albo_urls(comune_slug)[0])
+            for comune_slug in comuni_to_scrape
+        )
         
         results = []
         skipped = []
         
-        for comune_slug in comuni_to_scrape:
-            try:
-                report = await scanner.scan_comune(comune_slug, tenant_id=tenant_id, dry_run=dry_run)
-                
+        for comune_slug, outcome in outcomes.items():
+            if outcome.state == "completed":
+                report = outcome.result
                 results.append({
                     "comune_slug": comune_slug,
                     "status": "success",
@@ -251,18 +290,22 @@ async def scrape_all_comuni(
                     "compliance_score": report.compliance_score,
                     "violations_count": len(report.violations)
                 })
-                
-            except Exception as e:
+            elif outcome.state == "failed":
                 skipped.append({
                     "comune_slug": comune_slug,
                     "status": "failed",
-                    "error": str(e)
+                    "error": outcome.error,
+                    "attempts": outcome.attempts
                 })
         
+        progress = queue.get_progress()
         return {
+            "job_id": job_id,
             "total": len(comuni_to_scrape),
             "scraped": len(results),
             "failed": len(skipped),
+            "already_completed": progress["skipped"],
+            "duration_seconds": round(progress["elapsed_seconds"], 1),
             "results": results,
             "skipped_comuni": skipped
         }
@@ -270,6 +313,42 @@ async def scrape_all_comuni(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to scrape all comuni: {str(e)}")
 
+@router.get("/admin/compliance-scanner/scrape-jobs/{job_id}", dependencies=[Depends(verify_admin)])
+async def get_scrape_job_progress(job_id: str, tenant_id: Optional[int] = None):
+    """
+    Avanzamento di un job di scraping (stato per comune salvato dalla DistributedScraperQueue).
+    
+    Query params:
+    - tenant_id: Filtra per tenant (opzionale)
+    """
+    try:
+        states = ComuniScrapingTracker.get_queue_states(job_id, tenant_id=tenant_id)
+        if not states:
+            raise HTTPException(status_code=404, detail=f"Job {job_id} non trovato")
+        
+        counts: Dict[str, int] = {}
+        for state in states.values():
+            counts[state.get("state", "unknown")] = counts.get(state.get("state", "unknown"), 0) + 1
+        
+        return {
+            "job_id": job_id,
+            "total": len(states),
+            "counts": counts,
+            "comuni": {
+                comune_slug: {
+                    "state": state.get("state"),
+                    "attempts": state.get("attempts", 0),
+                    "last_error": state.get("last_error"),
+                    "updated_at": state.get("updated_at")
+                }
+                for comune_slug, state in states.items()
+            }
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get job progress: {str(e)}")
+
 @router.post("/admin/compliance-scanner/import-atti/{comune_slug}", dependencies=[Depends(verify_admin)])
 async def import_atti_to_mongodb(comune_slug: str, tenant_id: Optional[int] = None):
     """
@@ -285,7 +364,7 @@ async def import_atti_to_mongodb(comune_slug: str, tenant_id: Optional[int] = No
     try:
         from pathlib import Path
         import json
-        from app.services.pa_act_mongodb_importer import PAActMongoDBImporter
+        from app.services.bulk_importer import BulkActImporter, atto_from_scanner_dict
         
         # Trova file JSON più recente per questo comune
         json_dir = Path("storage/testing/compliance_scanner/json")
@@ -304,74 +383,18 @@ async def import_atti_to_mongodb(comune_slug: str, tenant_id: Optional[int] = No
         if not atti_list:
             raise HTTPException(status_code=404, detail=f"File JSON vuoto per comune {comune_slug}")
         
-        # Inizializza importer
-        importer = PAActMongoDBImporter(tenant_id=tenant_id or 1, dry_run=False)
-        
-        # CRITICAL: Check which atti are already imported BEFORE processing
-        from app.services.mongodb_service import MongoDBService
-        already_imported = set()
-        if MongoDBService.is_connected():
-            db = MongoDBService.get_database()
-            if db is not None:
-                coll = db['documents']
-                # Get all existing protocol_numbers for this tenant
-                existing_protocols = set(
-                    doc.get('protocol_number', '')
-                    for doc in coll.find(
-                        {'tenant_id': tenant_id or 1, 'document_type': 'pa_act'},
-                        {'protocol_number': 1}
-                    )
-                )
-                already_imported = existing_protocols
-        
-        imported_count = 0
-        skipped_count = 0
-        errors_count = 0
-        errors_detail = []
-        
-        for atto_dict in atti_list:
-            # Skip if already imported
-            protocol_num = atto_dict.get('numero', atto_dict.get('numero_atto', ''))
-            if protocol_num in already_imported:
-                skipped_count += 1
-                continue
-            try:
-                # Converti formato atto
-                atto_data = {
-                    'numero_atto': atto_dict.get('numero', atto_dict.get('numero_atto', '')),
-                    'tipo_atto': atto_dict.get('tipo', atto_dict.get('tipo_atto', '')),
-                    'oggetto': atto_dict.get('oggetto', atto_dict.get('descrizione', '')),
-                    'data_atto': atto_dict.get('data', atto_dict.get('data_pubblicazione', atto_dict.get('data_adozione', ''))),
-                    'anno': atto_dict.get('anno', ''),
-                    'scraper_type': 'compliance_scanner',
-                    'comune_slug': comune_slug
-                }
-                
-                # URL PDF se disponibile
-                pdf_url = atto_dict.get('url_pdf') or atto_dict.get('pdf_url') or atto_dict.get('link')
-                
-                # Import atto
-                success = await importer.import_atto(
-                    atto_data=atto_data,
-                    pdf_url=pdf_url,
-                    ente=comune_slug.title()
-                )
-                
-                if success:
-                    imported_count += 1
-                else:
-                    errors_count += 1
-                    errors_detail.append({
-                        'numero': atto_data['numero_atto'],
-                        'error': 'Import failed'
-                    })
-                    
-            except Exception as e:
-                errors_count += 1
-                errors_detail.append({
-                    'numero': atto_dict.get('numero', 'N/A'),
-                    'error': str(e)
-                })
+        # Pipeline bulk: gli atti già presenti per il tenant vengono saltati,
+        # quindi rilanciare l'endpoint dopo un'interruzione riprende da dove era arrivato
+        importer = BulkActImporter(tenant_id=tenant_id or 1, ente=comune_slug.title())
+        import_report = await importer.run(atto_from_scanner_dict(atto_dict, comune_slug) for atto_dict in atti_list)
+        import_stats = import_report["stats"]
+        imported_count = import_stats["processed"]
+        skipped_count = import_stats["skipped"]
+        errors_count = import_stats["errors"]
+        errors_detail = [
+            {'numero': error["atto"], 'error': error["error"]}
+            for error in import_report["errors"]
+        ]
         
         return {
             "success": True,
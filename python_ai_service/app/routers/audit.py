@@ -3,7 +3,7 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
-from app.services.mongodb_service import MongoDBService
+from app.services.mongodb_async import AsyncMongoDBService
 from datetime import datetime
 import uuid
 
@@ -59,19 +59,19 @@ async def save_sources(request: SourceSaveRequest):
                 "entity_id": source_doc["entity_id"]
             }
             
-            MongoDBService.update_document(
+            await AsyncMongoDBService.update_document(
                 "sources",
                 filter_query,
                 source_doc
             )
             
             # Get saved document ID
-            saved = MongoDBService.find_documents("sources", filter_query, limit=1)
+            saved = await AsyncMongoDBService.find_documents("sources", filter_query, limit=1)
             if saved:
                 saved_ids.append(str(saved[0].get("_id", "")))
             else:
                 # Insert if not exists
-                doc_id = MongoDBService.insert_document("sources", source_doc)
+                doc_id = await AsyncMongoDBService.insert_document("sources", source_doc)
                 saved_ids.append(doc_id)
         
         return {
@@ -107,7 +107,7 @@ async def save_claims(request: ClaimSaveRequest):
             claim_doc["claim_id"] = claim_id
             
             # Insert claim
-            doc_id = MongoDBService.insert_document("claims", claim_doc)
+            doc_id = await AsyncMongoDBService.insert_document("claims", claim_doc)
             saved_ids.append(doc_id)
         
         return {
@@ -141,7 +141,7 @@ async def save_query_audit(request: QueryAuditSaveRequest):
             "created_at": datetime.utcnow()
         }
         
-        doc_id = MongoDBService.insert_document("query_audit", audit_doc)
+        doc_id = await AsyncMongoDBService.insert_document("query_audit", audit_doc)
         
         return {
             "status": "success",
@@ -160,7 +160,7 @@ async def get_audit_history(tenant_id: int, user_id: int, limit: int = 50):
             "user_id": user_id
         }
         
-        results = MongoDBService.find_documents(
+        results = await AsyncMongoDBService.find_documents(
             "query_audit",
             filter_query,
             limit=limit,
@@ -189,7 +189,7 @@ async def get_claims_for_answer(answer_id: str, tenant_id: int):
             "answer_id": answer_id
         }
         
-        results = MongoDBService.find_documents("claims", filter_query)
+        results = await AsyncMongoDBService.find_documents("claims", filter_query)
         
         # Convert ObjectId to string
         for doc in results:
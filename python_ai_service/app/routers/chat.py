@@ -1,18 +1,26 @@
 """Chat router - LLM inference con RAG-Fortress Zero-Hallucination"""
 
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional, Any
 from app.services.ai_router import AIRouter
 from app.services.rag_fortress.pipeline import rag_fortress
+from app.services.rag_fortress.stream_events import emit, generate_streaming, stream_events
 from app.services.question_classifier import QuestionClassifier
 from app.services.execution_router import ExecutionRouter, RouterAction
 from app.config.rag_config import get_rag_config
+from app.services.tracing import normalize_usage
+import os
+import json
 import time
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Intervallo heartbeat SSE durante step lunghi (proxy con idle timeout)
+CHAT_STREAM_HEARTBEAT_SECONDS = float(os.getenv("CHAT_STREAM_HEARTBEAT_SECONDS", "15"))
+
 router = APIRouter()
 ai_router = AIRouter()
 question_classifier = QuestionClassifier()
@@ -46,6 +54,7 @@ class ChatResponse(BaseModel):
     gaps_detected: List[str] = []
     processing_notice: Optional[str] = None  # Messaggio di progresso per operazioni lunghe
     infographic: Optional[dict] = None  # Infografica generata (chart HTML, tipo, titolo)
+    debug: Optional[dict] = None  # Tracing per stage (latenze, provider, MongoDB) se PIPELINE_TRACE_IN_RESPONSE
 
 class ProcessingEstimate(BaseModel):
     """Stima della complessità del processamento per mostrare notice anticipato"""
@@ -55,6 +64,20 @@ class ProcessingEstimate(BaseModel):
     query_type: str
     num_documents_estimated: int
 
+def _pipeline_usage(result: dict, elapsed_ms: int) -> dict:
+    """Usage della pipeline RAG-Fortress (token reali dalla trace, somma di tutte le chiamate LLM)"""
+    tokens = result.get("usage") or {}
+    return {
+        "prompt_tokens": tokens.get("prompt", 0),
+        "completion_tokens": tokens.get("completion", 0),
+        "total_tokens": tokens.get("total", 0),
+        "elapsed_ms": elapsed_ms,
+        "answer_cache_hit": bool(result.get("answer_cache"))
+    }
+
+def _pipeline_debug(result: dict) -> Optional[dict]:
+    return {"trace": result["trace"]} if result.get("trace") else None
+
 @router.post("/chat/estimate", response_model=ProcessingEstimate)
 async def estimate_processing(request: ChatRequest):
     """
@@ -96,6 +119,7 @@ async def estimate_processing(request: ChatRequest):
         # Stima documenti recuperati (query veloce al database)
         from app.services.rag_fortress.pipeline import RAGFortressPipeline
         from app.services.mongodb_service import MongoDBService
+        from app.services.stats_rollup import StatsRollup
         
         pipeline = RAGFortressPipeline()
         
@@ -106,12 +130,14 @@ async def estimate_processing(request: ChatRequest):
         
         # Stima documenti: conta reale dal database per il tenant
         if is_generative or action == RouterAction.RAG_GENERATIVE.value:
-            # Query veloce per contare documenti disponibili per questo tenant
+            # Documenti disponibili per questo tenant: contatore del rollup statistico
             try:
-                total_available = MongoDBService.count_documents(
-                    "documents", 
-                    {"tenant_id": request.tenant_id, "embedding": {"$exists": True}}
-                )
+                total_available = StatsRollup.embedded_count(request.tenant_id)
+                if total_available is None:
+                    total_available = MongoDBService.count_documents(
+                        "documents", 
+                        {"tenant_id": request.tenant_id, "embedding": {"$exists": True}}
+                    )
             except Exception:
                 total_available = 100  # Fallback se conteggio fallisce
             
@@ -227,6 +253,7 @@ async def chat_inference(request: ChatRequest):
         
         action = routing["action"]
         logger.info(f"🔍 ROUTING - Intent: {intent} → Action: {action}")
+        emit("stage", {"stage": "routing", "intent": intent, "action": action})
         
         # STEP 3: Esegui azione appropriata
         start_time = time.time()
@@ -250,12 +277,7 @@ async def chat_inference(request: ChatRequest):
             return ChatResponse(
                 message=result.get("answer", ""),
                 model="rag-fortress-pipeline",
-                usage={
-                    "prompt_tokens": 0,  # TODO: calcola da pipeline
-                    "completion_tokens": 0,
-                    "total_tokens": 0,
-                    "elapsed_ms": elapsed_ms
-                },
+                usage=_pipeline_usage(result, elapsed_ms),
                 citations=result.get("claims_used", []),
                 urs_score=result.get("urs_score", 0.0),
                 urs_explanation=result.get("urs_explanation", ""),
@@ -263,7 +285,8 @@ async def chat_inference(request: ChatRequest):
                 sources=sources_data,  # Passa direttamente gli oggetti dict
                 hallucinations_found=result.get("hallucinations_found", []),
                 gaps_detected=result.get("gaps_detected", []),
-                infographic=result.get("infographic")  # Infografica se generata
+                infographic=result.get("infographic"),  # Infografica se generata
+                debug=_pipeline_debug(result)
             )
         
         elif action == RouterAction.RAG_GENERATIVE.value:
@@ -287,12 +310,7 @@ async def chat_inference(request: ChatRequest):
             return ChatResponse(
                 message=result.get("answer", ""),
                 model="rag-generative-pipeline",
-                usage={
-                    "prompt_tokens": 0,  # TODO: calcola da pipeline
-                    "completion_tokens": 0,
-                    "total_tokens": 0,
-                    "elapsed_ms": elapsed_ms
-                },
+                usage=_pipeline_usage(result, elapsed_ms),
                 citations=[],  # Sources del tenant usate
                 urs_score=None,  # No URS rigoroso per query generative
                 urs_explanation=result.get("urs_explanation", "Query generativa - usa contesto tenant senza verifica URS rigorosa"),
@@ -301,7 +319,8 @@ async def chat_inference(request: ChatRequest):
                 hallucinations_found=[],
                 gaps_detected=[],
                 processing_notice=result.get("processing_notice"),  # Messaggio di progresso se presente
-                infographic=result.get("infographic")  # Infografica se generata
+                infographic=result.get("infographic"),  # Infografica se generata
+                debug=_pipeline_debug(result)
             )
         
         elif action == RouterAction.DIRECT_QUERY.value:
@@ -355,16 +374,18 @@ async def chat_inference(request: ChatRequest):
             
             adapter = ai_router.get_chat_adapter(context)
             
-            result = await adapter.generate(messages, temperature=0.7, max_tokens=150)
+            result = await generate_streaming(adapter, messages, temperature=0.7, max_tokens=150)
             elapsed_ms = int((time.time() - start_time) * 1000)
+            # Usage con chiavi diverse per provider (prompt_tokens / input_tokens)
+            prompt_tokens, completion_tokens = normalize_usage(result["usage"])
             
             return ChatResponse(
                 message=result["content"],
                 model=f"{result['model']}-conversational",
                 usage={
-                    "prompt_tokens": result["usage"].get("prompt_tokens", 0),
-                    "completion_tokens": result["usage"].get("completion_tokens", 0),
-                    "total_tokens": result["usage"].get("total_tokens", 0),
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
                     "elapsed_ms": elapsed_ms
                 },
                 citations=[],
@@ -388,3 +409,42 @@ async def chat_inference(request: ChatRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Chat inference failed: {str(e)}")
 
+def _sse(event: str, data: Any) -> str:
+    """Formatta un evento Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+@router.post("/chat/stream")
+async def chat_inference_stream(request: ChatRequest):
+    """
+    Variante streaming (SSE) di /chat
+    
+    Stessa classificazione, routing e pipeline di /chat, ma gli eventi sono
+    inviati man mano che gli step completano:
+    - stage: routing, retrieval, step della pipeline strict, batch_extraction, synthesis
+    - sources: fonti recuperate (prima della sintesi)
+    - batch_summary: sintesi di ogni batch della multi-step synthesis
+    - token: testo della sintesi finale mentre viene generato (senza link, aggiunti nel result)
+    - result: ChatResponse completa (stesso payload di /chat)
+    - error: {"status_code", "detail"}
+    Le righe di commento ": heartbeat" mantengono aperta la connessione.
+    """
+    async def event_source():
+        try:
+            async for item in stream_events(chat_inference(request), heartbeat_seconds=CHAT_STREAM_HEARTBEAT_SECONDS):
+                if item["event"] == "heartbeat":
+                    yield ": heartbeat\n\n"
+                elif item["event"] == "result":
+                    yield _sse("result", item["data"].model_dump())
+                else:
+                    yield _sse(item["event"], item["data"])
+        except HTTPException as e:
+            yield _sse("error", {"status_code": e.status_code, "detail": e.detail})
+        except Exception as e:
+            logger.error(f"Errore durante chat streaming: {e}", exc_info=True)
+            yield _sse("error", {"status_code": 500, "detail": f"Chat inference failed: {str(e)}"})
+    
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -4,6 +4,7 @@ Commands Router - endpoints per comandi chat diretti su MongoDB
 
 from __future__ import annotations
 
+import asyncio
 import copy
 import json
 import time
@@ -25,6 +26,16 @@ from app.config.natural_query import (
 )
 from app.services.ai_router import AIRouter
 from app.services.mongodb_service import MongoDBService
+from app.services.mongodb_async import AsyncMongoDBService
+from app.services.stats_rollup import StatsRollup, month_range
+from app.services.search_projection import (
+    compile_filter,
+    department_condition,
+    protocol_condition,
+    responsible_condition,
+    text_condition,
+    type_condition,
+)
 from zoneinfo import ZoneInfo
 
 LOCAL_TIMEZONE = ZoneInfo(os.getenv("NATURAL_QUERY_TIMEZONE", "Europe/Rome"))
@@ -58,8 +69,8 @@ _ALLOWED_OPERATORS = {
 _DAY_MS = 86_400_000
 
 
-def _ensure_connection() -> None:
-    if not MongoDBService.is_connected():
+async def _ensure_connection() -> None:
+    if not await AsyncMongoDBService.is_connected():
         raise HTTPException(
             status_code=503,
             detail="MongoDB connection is not available"
@@ -84,12 +95,7 @@ def _build_protocol_match(protocol_numbers: List[str]) -> Dict[str, Any]:
     cleaned = [numero for numero in protocol_numbers if numero]
     if not cleaned:
         return {}
-    return {
-        "$or": [
-            {"protocol_number": {"$in": cleaned}},
-            {"metadata.numero_atto": {"$in": cleaned}},
-        ]
-    }
+    return protocol_condition(cleaned)
 
 
 def _document_to_payload(document: Dict[str, Any]) -> Dict[str, Any]:
@@ -589,10 +595,7 @@ class AttoCommandRequest(CommandBaseRequest):
             base_filter["document_id"] = self.document_id
 
         if self.protocol_number:
-            base_filter["$or"] = [
-                {"protocol_number": self.protocol_number},
-                {"metadata.numero_atto": self.protocol_number},
-            ]
+            base_filter.update(protocol_condition([self.protocol_number]))
 
         return base_filter
 
@@ -681,7 +684,7 @@ class NaturalQueryModel(BaseModel):
 
 @router.post("/natural-query")
 async def command_natural_query(request: NaturalQueryRequest):
-    _ensure_connection()
+    await _ensure_connection()
     logger.info(
         "[commands][natural-query] received request tenant=%s user=%s limit=%s text=%s"
         % (request.tenant_id, request.user_id, request.limit, request.text)
@@ -723,6 +726,8 @@ async def command_natural_query(request: NaturalQueryRequest):
     try:
         filter_query = _normalize_filter(parsed_query.filter, request.tenant_id)
         _validate_filter(filter_query)
+        # Condizioni su titolo/dipartimento/protocollo tradotte sui campi di ricerca indicizzati
+        filter_query = compile_filter(filter_query)
     except ValueError as exc:
         return {
             "success": False,
@@ -737,7 +742,7 @@ async def command_natural_query(request: NaturalQueryRequest):
 
     fallback_details: Optional[Dict[str, Any]] = None
 
-    documents = MongoDBService.find_documents(
+    documents = await AsyncMongoDBService.find_documents(
         parsed_query.collection,
         filter_query,
         limit=limit,
@@ -751,7 +756,7 @@ async def command_natural_query(request: NaturalQueryRequest):
     if not documents:
         fallback_filter, fallback_details = _apply_date_range_fallback(filter_query)
         if fallback_details is not None:
-            documents = MongoDBService.find_documents(
+            documents = await AsyncMongoDBService.find_documents(
                 parsed_query.collection,
                 fallback_filter,
                 limit=limit,
@@ -903,10 +908,10 @@ async def _generate_structured_query(
 
 @router.post("/atto")
 async def command_atto(request: AttoCommandRequest):
-    _ensure_connection()
+    await _ensure_connection()
 
     filters = request.filters()
-    documents = MongoDBService.find_documents(
+    documents = await AsyncMongoDBService.find_documents(
         "documents",
         filters,
         limit=1,
@@ -951,7 +956,7 @@ def _build_date_condition(date_from: Optional[str], date_to: Optional[str]) -> D
 
 @router.post("/atti")
 async def command_atti(request: AttiCommandRequest):
-    _ensure_connection()
+    await _ensure_connection()
 
     filters: List[Dict[str, Any]] = [{"tenant_id": request.tenant_id}]
 
@@ -961,48 +966,18 @@ async def command_atti(request: AttiCommandRequest):
     if request.protocol_numbers:
         filters.append(_build_protocol_match(request.protocol_numbers))
 
+    # Filtri sui campi di ricerca normalizzati (search_projection), indicizzati con tenant_id
     if request.types:
-        filters.append(
-            {
-                "$or": [
-                    {"document_type": {"$in": request.types}},
-                    {"metadata.tipo_atto": {"$in": request.types}},
-                ]
-            }
-        )
+        filters.append(type_condition(request.types))
 
     if request.departments:
-        filters.append(
-            {
-                "$or": [
-                    {"department": {"$in": request.departments}},
-                    {"metadata.dipartimento": {"$in": request.departments}},
-                    {"metadata.department": {"$in": request.departments}},
-                    {"metadata.direzione": {"$in": request.departments}},
-                ]
-            }
-        )
+        filters.append(department_condition(request.departments))
 
     if request.responsibles:
-        filters.append(
-            {
-                "$or": [
-                    {"responsible": {"$in": request.responsibles}},
-                    {"metadata.responsabile": {"$in": request.responsibles}},
-                ]
-            }
-        )
+        filters.append(responsible_condition(request.responsibles))
 
     if request.text:
-        filters.append(
-            {
-                "$or": [
-                    {"title": {"$regex": request.text, "$options": "i"}},
-                    {"description": {"$regex": request.text, "$options": "i"}},
-                    {"metadata.title": {"$regex": request.text, "$options": "i"}},
-                ]
-            }
-        )
+        filters.append(text_condition(request.text))
 
     date_condition = _build_date_condition(request.date_from, request.date_to)
     if date_condition:
@@ -1021,7 +996,7 @@ async def command_atti(request: AttiCommandRequest):
     else:
         query = {"$and": filters}
 
-    documents = MongoDBService.find_documents(
+    documents = await AsyncMongoDBService.find_documents(
         "documents",
         query,
         limit=request.limit,
@@ -1039,7 +1014,22 @@ async def command_atti(request: AttiCommandRequest):
 
 @router.post("/stats")
 async def command_stats(request: StatsCommandRequest):
-    _ensure_connection()
+    await _ensure_connection()
+
+    # Rollup materializzato (una find_one) se il periodo è assente o allineato ai mesi
+    months = month_range(request.date_from, request.date_to)
+    if months is not None:
+        rollup = await AsyncMongoDBService.run(StatsRollup.get, request.tenant_id)
+        if rollup is not None:
+            rows, total_documents = StatsRollup.type_counts(
+                rollup, months=months, scraper_type=request.scraper_type, limit=request.limit or 10
+            )
+            return {
+                "success": True,
+                "rows": rows,
+                "count": len(rows),
+                "total_acts": total_documents,
+            }
 
     match_filters: List[Dict[str, Any]] = [{"tenant_id": request.tenant_id}]
     date_condition = _build_date_condition(request.date_from, request.date_to)
@@ -1085,8 +1075,11 @@ async def command_stats(request: StatsCommandRequest):
     if collection is None:
         raise HTTPException(status_code=500, detail="MongoDB collection not available")
 
-    aggregated = list(collection.aggregate(pipeline))
-    total_documents = collection.count_documents(match_stage)
+    # Aggregazione e conteggio in parallelo sul pool async
+    aggregated, total_documents = await asyncio.gather(
+        AsyncMongoDBService.run(lambda: list(collection.aggregate(pipeline))),
+        AsyncMongoDBService.run(collection.count_documents, match_stage),
+    )
 
     rows = [
         {
@@ -1104,3 +1097,15 @@ async def command_stats(request: StatsCommandRequest):
     }
 
 
+@router.post("/stats/rebuild")
+async def command_stats_rebuild(request: CommandBaseRequest):
+    """Ricostruisce il rollup statistico del tenant dai documenti"""
+    await _ensure_connection()
+
+    rollup = await AsyncMongoDBService.run(StatsRollup.rebuild, request.tenant_id)
+    if rollup is None:
+        raise HTTPException(status_code=503, detail="Stats rollup not available")
+
+    return {"success": True, **StatsRollup.summary(rollup)}
+
+
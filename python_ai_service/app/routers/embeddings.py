@@ -1,7 +1,7 @@
 """Embeddings router - Generate text embeddings"""
 
 from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from app.services.ai_router import AIRouter
 import time
 
@@ -20,6 +20,18 @@ class EmbedResponse(BaseModel):
     dimensions: int
     tokens: int
 
+class EmbedBatchRequest(BaseModel):
+    texts: list[str] = Field(..., min_length=1, max_length=2048)
+    tenant_id: int
+    model: str = None  # Optional, will use policy engine if None
+    task_class: str = "embed"  # For policy selection
+
+class EmbedBatchResponse(BaseModel):
+    embeddings: list[list[float]]
+    model: str
+    dimensions: int
+    tokens: int
+
 @router.post("/embed", response_model=EmbedResponse)
 async def generate_embedding(request: EmbedRequest):
     """
@@ -54,3 +66,32 @@ async def generate_embedding(request: EmbedRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Embedding generation failed: {str(e)}")
 
+
+@router.post("/embed/batch", response_model=EmbedBatchResponse)
+async def generate_embeddings_batch(request: EmbedBatchRequest):
+    """
+    Generate embeddings for many texts in one call
+    
+    The adapter sends list input upstream (one provider request per batch)
+    instead of one HTTP round trip per text.
+    """
+    try:
+        context = {
+            "tenant_id": request.tenant_id,
+            "task_class": request.task_class
+        }
+        
+        adapter = ai_router.get_embedding_adapter(context)
+        results = await adapter.embed_batch(request.texts)
+        
+        return EmbedBatchResponse(
+            embeddings=[result["embedding"] for result in results],
+            model=results[0]["model"],
+            dimensions=results[0]["dimensions"],
+            tokens=sum(result.get("tokens", 0) for result in results)
+        )
+    
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Embedding generation failed: {str(e)}")
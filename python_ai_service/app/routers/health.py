@@ -1,7 +1,10 @@
 """Health check router"""
 
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
 from app.services.mongodb_service import MongoDBService
+from app.services.mongodb_health import MongoHealthMonitor
+from app.services.tracing import PipelineMetrics
 import logging
 
 logger = logging.getLogger(__name__)
@@ -23,12 +26,11 @@ async def health_check():
         "checks": {}
     }
     
-    # Check MongoDB
-    try:
-        MongoDBService.get_client().admin.command('ping')
+    # Check MongoDB (stato cachato dall'heartbeat, nessun ping per richiesta)
+    if MongoDBService.is_connected():
         health_status["checks"]["mongodb"] = "ok"
-    except Exception as e:
-        logger.error(f"MongoDB health check failed: {e}")
+    else:
+        logger.error(f"MongoDB health check failed: {MongoHealthMonitor.get_status().get('last_error')}")
         health_status["checks"]["mongodb"] = "error"
         health_status["status"] = "degraded"
     
@@ -38,3 +40,15 @@ async def health_check():
     
     return health_status
 
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Metriche in formato Prometheus (text exposition 0.0.4)
+    
+    Latenza per stage della pipeline, chiamate e token per provider AI,
+    durata dei comandi MongoDB.
+    """
+    return PlainTextResponse(
+        PipelineMetrics.render_prometheus(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
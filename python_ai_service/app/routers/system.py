@@ -7,7 +7,14 @@ import sys
 from pathlib import Path
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+from app.services.mongodb_health import MongoHealthMonitor
+from app.services.mongodb_async import AsyncMongoDBService
+from app.services.providers.http_client import HTTPClientRegistry
+from app.services.providers.embedding_coalescer import EmbeddingCoalescer
+from app.services.providers.embedding_cache import EmbeddingCache
+from app.services.answer_cache import SemanticAnswerCache
+from app.services.tracing import PipelineMetrics
 
 router = APIRouter()
 
@@ -23,6 +30,10 @@ class SystemStatusResponse(BaseModel):
     status: str
     services: list[ServiceStatus]
     message: str
+    mongodb: Optional[Dict[str, Any]] = None
+    ai_providers_http: Optional[Dict[str, Any]] = None
+    answer_cache: Optional[Dict[str, Any]] = None
+    pipeline_metrics: Optional[Dict[str, Any]] = None
 
 
 def _check_port(host: str, port: int, timeout: float = 2.0) -> bool:
@@ -84,10 +95,24 @@ async def get_system_status():
         ))
         # Frontend is optional, so we don't mark all_running = False
     
+    # MongoDB: stato cachato (heartbeat), circuit breaker e statistiche dei pool
+    mongodb_status = MongoHealthMonitor.get_status()
+    mongodb_status["async_pool"] = AsyncMongoDBService.get_stats()
+    
     return SystemStatusResponse(
         status="ok" if all_running else "degraded",
         services=services,
-        message="All services running" if all_running else "Some services are not running"
+        message="All services running" if all_running else "Some services are not running",
+        mongodb=mongodb_status,
+        # Riuso connessioni keep-alive, micro-batching e cache embedding verso i provider AI
+        ai_providers_http={
+            **HTTPClientRegistry.get_stats(),
+            "embedding_coalescer": EmbeddingCoalescer.get_stats(),
+            "embedding_cache": EmbeddingCache.get_stats()
+        },
+        answer_cache=SemanticAnswerCache.get_stats(),
+        # Latenza media per stage / provider / comando MongoDB (dettaglio in /metrics)
+        pipeline_metrics=PipelineMetrics.get_stats()
     )
 
 
@@ -7,6 +7,7 @@ various platforms used by Italian municipalities for their public notices.
 
 from .base_scraper import BaseAlboScraper, AttoPA, ScrapeResult
 from .factory import ScraperFactory
+from .distributed_queue import DistributedScraperQueue, ScrapeTask
 from .trasparenza_vm_scraper import TrasparenzaVMScraper
 from .drupal_scraper import DrupalAlboScraper
 
@@ -19,6 +20,8 @@ __all__ = [
     'AttoPA',
     'ScrapeResult',
     'ScraperFactory',
+    'DistributedScraperQueue',
+    'ScrapeTask',
     'TrasparenzaVMScraper',
     'DrupalAlboScraper',
 ]
@@ -16,6 +16,8 @@ import json
 import logging
 from pathlib import Path
 
+from .utils.high_water_mark import HighWaterMark
+
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -182,7 +184,7 @@ class BaseAlboScraper(ABC):
     - Circuit breaker
     - Structured logging
     - Common scraping workflow
-    - MongoDB integration (via existing PAActMongoDBImporter)
+    - MongoDB integration (via BulkActImporter)
     
     Platform-specific scrapers must implement:
     - detect_platform(): Check if this scraper can handle a URL
@@ -204,6 +206,8 @@ class BaseAlboScraper(ABC):
             tenant_id: Multi-tenant identifier (e.g., 'tenant_toscana')
             config: Optional configuration dict with:
                 - rate_limit_preset: 'pa_gentle', 'pa_moderate', 'pa_aggressive'
+                - rate_limiter: shared per-host limiter (wait/adjust_for_response),
+                  set by DistributedScraperQueue
                 - max_retries: int
                 - timeout: int
                 - etc.
@@ -267,7 +271,8 @@ class BaseAlboScraper(ABC):
     async def scrape_all(
         self,
         start_url: str,
-        max_pages: Optional[int] = None
+        max_pages: Optional[int] = None,
+        high_water_mark: Optional[HighWaterMark] = None
     ) -> ScrapeResult:
         """
         Scrape all pages (common method for all scrapers).
@@ -278,9 +283,14 @@ class BaseAlboScraper(ABC):
         3. Scrape each page with rate limiting and error handling
         4. Collect statistics
         
+        Incremental mode: with a high_water_mark, acts already seen by a
+        previous run are dropped and paging stops after the first page that
+        contains one (albi list the newest acts first).
+        
         Args:
             start_url: Starting URL for scraping
             max_pages: Optional limit on number of pages to scrape
+            high_water_mark: Newest act of the previous run (incremental mode)
             
         Returns:
             ScrapeResult with status, acts, errors, and statistics
@@ -289,6 +299,8 @@ class BaseAlboScraper(ABC):
         errors: List[str] = []
         start_time = datetime.now()
         pages_scraped = 0
+        known_skipped = 0
+        reached_known = False
         
         try:
             # Step 1: Check platform compatibility
@@ -319,6 +331,7 @@ class BaseAlboScraper(ABC):
             )
             
             # Step 3: Scrape each page
+            rate_limiter = self.config.get('rate_limiter')
             for page_num in range(1, total_pages + 1):
                 # Check circuit breaker
                 if not self.circuit_breaker.can_execute():
@@ -330,14 +343,32 @@ class BaseAlboScraper(ABC):
                 try:
                     logger.info(f"Scraping page {page_num}/{total_pages}...")
                     
-                    # Rate limiting (basic sleep for now, can be enhanced)
-                    if page_num > 1:
+                    # Rate limiting: per-host limiter when provided (DistributedScraperQueue),
+                    # otherwise a fixed delay between pages
+                    if rate_limiter is not None:
+                        await rate_limiter.wait()
+                    elif page_num > 1:
                         await asyncio.sleep(self.config.get('page_delay', 2.0))
                     
                     # Scrape page
                     page_start = datetime.now()
-                    atti = await self.scrape_page(start_url, page_num)
+                    try:
+                        atti = await self.scrape_page(start_url, page_num)
+                    except Exception:
+                        if rate_limiter is not None:
+                            rate_limiter.adjust_for_response((datetime.now() - page_start).total_seconds(), 500)
+                        raise
                     page_duration = (datetime.now() - page_start).total_seconds()
+                    if rate_limiter is not None:
+                        rate_limiter.adjust_for_response(page_duration, 200)
+                    
+                    # Incremental mode: drop acts already seen by the previous run
+                    page_known = 0
+                    if high_water_mark is not None:
+                        new_atti = [atto for atto in atti if not high_water_mark.is_known(atto.data_pubblicazione, atto.numero)]
+                        page_known = len(atti) - len(new_atti)
+                        known_skipped += page_known
+                        atti = new_atti
                     
                     all_atti.extend(atti)
                     pages_scraped = page_num
@@ -353,6 +384,11 @@ class BaseAlboScraper(ABC):
                         atti_count=len(atti),
                         duration=page_duration
                     )
+                    
+                    if page_known:
+                        reached_known = True
+                        logger.info(f"📌 Page {page_num}: reached acts already scraped, stopping (incremental)")
+                        break
                 
                 except Exception as e:
                     error_msg = f"Error scraping page {page_num}: {str(e)}"
@@ -409,7 +445,10 @@ class BaseAlboScraper(ABC):
                     'pages_requested': total_pages,
                     'duration_seconds': duration,
                     'errors_count': len(errors),
-                    'circuit_breaker_state': self.circuit_breaker.state
+                    'circuit_breaker_state': self.circuit_breaker.state,
+                    'incremental': high_water_mark is not None,
+                    'known_atti_skipped': known_skipped,
+                    'reached_known_atti': reached_known
                 }
             )
         
@@ -437,7 +476,10 @@ class BaseAlboScraper(ABC):
     
     async def save_to_mongodb(self, atti: List[AttoPA]) -> Dict[str, Any]:
         """
-        Save acts to MongoDB using existing PAActMongoDBImporter.
+        Save acts to MongoDB using the bulk import pipeline (BulkActImporter).
+        
+        Acts already imported for the tenant are skipped, so a repeated call
+        after an interruption only imports the missing ones.
         
         Args:
             atti: List of AttoPA objects to save
@@ -449,34 +491,28 @@ class BaseAlboScraper(ABC):
         
         try:
             # Import here to avoid circular dependency
-            from python_ai_service.app.services.pa_act_mongodb_importer import PAActMongoDBImporter
-            
-            importer = PAActMongoDBImporter(tenant_id=self.tenant_id)
+            from app.services.bulk_importer import BulkActImporter
             
-            saved_count = 0
-            errors = []
+            items = [
+                {
+                    'atto_data': {
+                        'numero_atto': atto.numero,
+                        'tipo_atto': atto.tipo_atto,
+                        'oggetto': atto.oggetto,
+                        'data_atto': atto.data_pubblicazione.isoformat(),
+                        'anno': atto.data_pubblicazione.year,
+                        'scraper_type': self.__class__.__name__,
+                        'comune_slug': atto.comune_code
+                    },
+                    'pdf_url': atto.url_pdf
+                }
+                for atto in atti
+            ]
             
-            for atto in atti:
-                try:
-                    # Call existing importer (adjust parameters based on actual method signature)
-                    await importer.import_atto(
-                        numero=atto.numero,
-                        data_pubblicazione=atto.data_pubblicazione,
-                        oggetto=atto.oggetto,
-                        tipo_atto=atto.tipo_atto,
-                        url_dettaglio=atto.url_dettaglio,
-                        url_pdf=atto.url_pdf,
-                        metadata={
-                            **atto.metadata,
-                            'comune_code': atto.comune_code,
-                            'data_scadenza': atto.data_scadenza.isoformat() if atto.data_scadenza else None
-                        }
-                    )
-                    saved_count += 1
-                except Exception as e:
-                    error_msg = f"Error saving atto {atto.numero}: {str(e)}"
-                    logger.error(error_msg)
-                    errors.append(error_msg)
+            importer = BulkActImporter(tenant_id=self.tenant_id, ente=self.comune_code.title())
+            report = await importer.run(items)
+            saved_count = report['stats']['processed']
+            errors = [f"Error saving atto {error['atto']}: {error['error']}" for error in report['errors']]
             
             logger.info(f"✅ Saved {saved_count}/{len(atti)} atti to MongoDB")
             
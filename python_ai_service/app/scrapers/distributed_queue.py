@@ -0,0 +1,294 @@
+"""
+Distributed scraper queue: concurrent multi-comune scraping with per-host politeness.
+
+Each comune becomes a task; tasks run concurrently under a global limit,
+while every host gets its own AdaptiveRateLimiter (shared by all tasks on
+that host) and a per-host concurrency limit, so each albo is still scraped
+politely. A full crawl then takes about as long as the slowest comune
+instead of the sum of all of them.
+
+Job state is persisted in the ComuniScrapingTracker collection (`queue`
+sub-document): re-running the same job_id skips comuni already completed
+and retries failed or interrupted ones.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+from .utils.rate_limiter import AdaptiveRateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Configuration (environment overrides)
+SCRAPER_QUEUE_CONCURRENCY = int(os.getenv("SCRAPER_QUEUE_CONCURRENCY", "6"))
+SCRAPER_QUEUE_PER_HOST_CONCURRENCY = int(os.getenv("SCRAPER_QUEUE_PER_HOST_CONCURRENCY", "1"))
+SCRAPER_QUEUE_MAX_ATTEMPTS = int(os.getenv("SCRAPER_QUEUE_MAX_ATTEMPTS", "2"))
+SCRAPER_QUEUE_RETRY_DELAY_SECONDS = float(os.getenv("SCRAPER_QUEUE_RETRY_DELAY_SECONDS", "30"))
+SCRAPER_QUEUE_RATE_PRESET = os.getenv("SCRAPER_QUEUE_RATE_PRESET", "pa_moderate")
+
+
+@dataclass
+class ScrapeTask:
+    """A unit of work: one comune."""
+    key: str                                # comune code / slug
+    url: Optional[str] = None               # albo URL (defines the host)
+    payload: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def host(self) -> str:
+        """Politeness key: URL hostname, or the task key when no URL is known."""
+        hostname = urlparse(self.url).hostname if self.url else None
+        return (hostname or self.key).lower()
+
+
+class HostRateLimiter:
+    """
+    AdaptiveRateLimiter shared by all tasks on one host.
+
+    AdaptiveRateLimiter.wait() is not safe for concurrent callers (two
+    coroutines would compute the same sleep): calls are serialized here.
+    """
+
+    def __init__(self, host: str, preset: str = SCRAPER_QUEUE_RATE_PRESET):
+        self.host = host
+        self.limiter = AdaptiveRateLimiter(preset)
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self._lock:
+            await self.limiter.wait()
+
+    def adjust_for_response(self, response_time: float, status_code: int):
+        self.limiter.adjust_for_response(response_time, status_code)
+
+    def get_stats(self) -> dict:
+        return {'host': self.host, **self.limiter.get_stats()}
+
+
+@dataclass
+class TaskOutcome:
+    """Result of a task after all attempts."""
+    key: str
+    state: str                  # completed, failed, skipped
+    result: Any = None
+    error: Optional[str] = None
+    attempts: int = 0
+    duration_seconds: float = 0.0
+
+
+TaskRunner = Callable[[ScrapeTask, HostRateLimiter], Awaitable[Any]]
+
+
+class DistributedScraperQueue:
+    """
+    Async worker pool for scraping many comuni.
+
+    Usage:
+        queue = DistributedScraperQueue(runner, job_id='toscana-2025-01', tenant_id=1)
+        outcomes = await queue.run([ScrapeTask('empoli', url), ...])
+
+    The runner receives the task and the HostRateLimiter of its host and
+    returns the task result; an exception (or a result for which
+    `is_failure` is True) is retried up to max_attempts.
+    """
+
+    def __init__(
+        self,
+        runner: TaskRunner,
+        concurrency: int = SCRAPER_QUEUE_CONCURRENCY,
+        per_host_concurrency: int = SCRAPER_QUEUE_PER_HOST_CONCURRENCY,
+        max_attempts: int = SCRAPER_QUEUE_MAX_ATTEMPTS,
+        retry_delay: Optional[float] = None,
+        rate_limit_preset: str = SCRAPER_QUEUE_RATE_PRESET,
+        job_id: Optional[str] = None,
+        tenant_id: Optional[Any] = None,
+        is_failure: Optional[Callable[[Any], bool]] = None,
+        progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None
+    ):
+        """
+        Initialize the queue.
+
+        Args:
+            runner: Coroutine function (task, host_rate_limiter) -> result
+            concurrency: Max tasks running at the same time (all hosts)
+            per_host_concurrency: Max tasks running at the same time on one host
+            max_attempts: Attempts per task (1 = no retry)
+            retry_delay: Base delay before a retry, doubled at each attempt
+                (default: SCRAPER_QUEUE_RETRY_DELAY_SECONDS)
+            rate_limit_preset: AdaptiveRateLimiter preset for each host
+            job_id: Persist state in ComuniScrapingTracker under this job (resume/retry)
+            tenant_id: Tenant for persisted state
+            is_failure: Treat a returned result as a failed attempt
+            progress_callback: Called with get_progress() after every state change
+        """
+        self.runner = runner
+        self.concurrency = max(1, concurrency)
+        self.per_host_concurrency = max(1, per_host_concurrency)
+        self.max_attempts = max(1, max_attempts)
+        self.retry_delay = SCRAPER_QUEUE_RETRY_DELAY_SECONDS if retry_delay is None else retry_delay
+        self.rate_limit_preset = rate_limit_preset
+        self.job_id = job_id
+        self.tenant_id = tenant_id
+        self.is_failure = is_failure or (lambda result: False)
+        self.progress_callback = progress_callback
+
+        self._limiters: Dict[str, HostRateLimiter] = {}
+        self._host_slots: Dict[str, asyncio.Semaphore] = {}
+        self._states: Dict[str, str] = {}
+        self._started_at: Optional[float] = None
+
+    # === Public API ===
+
+    async def run(self, tasks: Iterable[ScrapeTask]) -> Dict[str, TaskOutcome]:
+        """
+        Run all tasks and wait for completion.
+
+        Returns:
+            Dict task key -> TaskOutcome (skipped for tasks completed in a previous run of the job)
+        """
+        tasks = list(tasks)
+        self._started_at = time.time()
+        global_slots = asyncio.Semaphore(self.concurrency)
+
+        previous = await self._load_states()
+        outcomes: Dict[str, TaskOutcome] = {}
+        pending: List[ScrapeTask] = []
+        for task in tasks:
+            if previous.get(task.key.lower(), {}).get('state') == 'completed':
+                outcomes[task.key] = TaskOutcome(task.key, 'skipped')
+                self._states[task.key] = 'skipped'
+            else:
+                pending.append(task)
+                self._states[task.key] = 'queued'
+
+        logger.info(
+            f"🚦 Scraper queue{f' {self.job_id}' if self.job_id else ''}: {len(pending)} comuni "
+            f"({len(tasks) - len(pending)} already completed), concurrency {self.concurrency}, "
+            f"{len({task.host for task in pending})} hosts"
+        )
+        for task in pending:
+            await self._persist(task, 'queued')
+        self._report_progress()
+
+        results = await asyncio.gather(*(self._run_task(task, global_slots) for task in pending))
+        for outcome in results:
+            outcomes[outcome.key] = outcome
+
+        progress = self.get_progress()
+        logger.info(
+            f"🏁 Scraper queue done: {progress['completed']} completed, {progress['failed']} failed, "
+            f"{progress['skipped']} skipped in {progress['elapsed_seconds']:.1f}s"
+        )
+        return outcomes
+
+    def get_progress(self) -> Dict[str, Any]:
+        """Snapshot of task counts per state."""
+        counts = {state: 0 for state in ('queued', 'running', 'completed', 'failed', 'skipped')}
+        for state in self._states.values():
+            counts[state] = counts.get(state, 0) + 1
+        return {
+            'job_id': self.job_id,
+            'total': len(self._states),
+            **counts,
+            'elapsed_seconds': time.time() - self._started_at if self._started_at else 0.0,
+        }
+
+    def get_rate_limiter(self, host: str) -> HostRateLimiter:
+        """Rate limiter of a host (created on first use)."""
+        limiter = self._limiters.get(host)
+        if limiter is None:
+            limiter = self._limiters[host] = HostRateLimiter(host, self.rate_limit_preset)
+        return limiter
+
+    def get_host_stats(self) -> List[dict]:
+        return [limiter.get_stats() for limiter in self._limiters.values()]
+
+    # === Internals ===
+
+    async def _run_task(self, task: ScrapeTask, global_slots: asyncio.Semaphore) -> TaskOutcome:
+        host_slots = self._host_slots.setdefault(task.host, asyncio.Semaphore(self.per_host_concurrency))
+        limiter = self.get_rate_limiter(task.host)
+        started = time.time()
+        outcome = TaskOutcome(task.key, 'failed')
+
+        for attempt in range(1, self.max_attempts + 1):
+            outcome.attempts = attempt
+            # Host slot first: a task waiting for its host does not hold a global slot
+            async with host_slots, global_slots:
+                self._set_state(task, 'running')
+                await self._persist(task, 'running', attempts=attempt)
+                try:
+                    outcome.result = await self.runner(task, limiter)
+                    outcome.error = None
+                    if not self.is_failure(outcome.result):
+                        outcome.state = 'completed'
+                        break
+                    outcome.error = f"{task.key}: scraping returned a failed result"
+                except Exception as e:
+                    outcome.result = None
+                    outcome.error = str(e) or e.__class__.__name__
+                    logger.warning(f"⚠️ Scraping {task.key} failed (attempt {attempt}/{self.max_attempts}): {outcome.error}")
+
+            if attempt < self.max_attempts:
+                self._set_state(task, 'queued')
+                await self._persist(task, 'queued', attempts=attempt, error=outcome.error)
+                await asyncio.sleep(self.retry_delay * (2 ** (attempt - 1)))
+
+        outcome.duration_seconds = time.time() - started
+        self._set_state(task, outcome.state)
+        await self._persist(task, outcome.state, attempts=outcome.attempts, error=outcome.error)
+        return outcome
+
+    def _set_state(self, task: ScrapeTask, state: str):
+        self._states[task.key] = state
+        self._report_progress()
+
+    def _report_progress(self):
+        if self.progress_callback:
+            try:
+                self.progress_callback(self.get_progress())
+            except Exception as e:
+                logger.debug(f"Progress callback error: {e}")
+
+    async def _load_states(self) -> Dict[str, Dict]:
+        if not self.job_id:
+            return {}
+        # Import here to avoid circular dependency
+        from app.services.compliance_scanner.comuni_tracker import ComuniScrapingTracker
+        from app.services.mongodb_async import AsyncMongoDBService
+
+        try:
+            return await AsyncMongoDBService.run(ComuniScrapingTracker.get_queue_states, self.job_id, self.tenant_id)
+        except Exception as e:
+            logger.warning(f"⚠️ Job state for {self.job_id} not loaded: {e}")
+            return {}
+
+    async def _persist(self, task: ScrapeTask, state: str, attempts: Optional[int] = None, error: Optional[str] = None):
+        if not self.job_id:
+            return
+        from app.services.compliance_scanner.comuni_tracker import ComuniScrapingTracker
+        from app.services.mongodb_async import AsyncMongoDBService
+
+        try:
+            await AsyncMongoDBService.run(
+                ComuniScrapingTracker.update_queue_state,
+                task.key,
+                self.job_id,
+                state,
+                tenant_id=self.tenant_id,
+                attempts=attempts,
+                error=error
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ Job state for {task.key} not saved: {e}")
+
+
+def default_job_id(prefix: str) -> str:
+    """Job id for a new crawl (returned to the caller for resume/polling)."""
+    return f"{prefix}-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
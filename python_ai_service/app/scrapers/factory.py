@@ -9,6 +9,8 @@ from typing import Optional, List, Type
 import logging
 
 from .base_scraper import BaseAlboScraper, ScrapeResult
+from .distributed_queue import DistributedScraperQueue, HostRateLimiter, ScrapeTask
+from .utils.high_water_mark import HighWaterMark, load_high_water_mark, save_high_water_mark
 
 logger = logging.getLogger(__name__)
 
@@ -103,13 +105,21 @@ class ScraperFactory:
         tenant_id: str,
         max_pages: Optional[int] = None,
         config: Optional[dict] = None,
-        save_to_mongodb: bool = False
+        save_to_mongodb: bool = False,
+        incremental: bool = False,
+        high_water_mark: Optional[HighWaterMark] = None
     ) -> ScrapeResult:
         """
         High-level interface: scrape a municipality with auto-detection.
         
         This is the main entry point for scraping operations.
         
+        Incremental mode loads the comune's high-water mark from
+        ComuniScrapingTracker, stops paging at the first act already seen and,
+        after a fully successful run, advances the mark to the newest act.
+        Callers that track the mark themselves pass it as `high_water_mark`
+        (it is then used but not saved).
+        
         Args:
             comune_code: Municipality code (e.g., 'empoli')
             url: Albo Pretorio URL
@@ -117,6 +127,8 @@ class ScraperFactory:
             max_pages: Optional limit on pages to scrape
             config: Optional configuration dict
             save_to_mongodb: If True, automatically save to MongoDB after scraping
+            incremental: Only scrape acts newer than the saved high-water mark
+            high_water_mark: Explicit mark (not persisted by this call)
             
         Returns:
             ScrapeResult with status, acts, errors, and statistics
@@ -136,8 +148,24 @@ class ScraperFactory:
                 stats={'comune_code': comune_code}
             )
         
+        # Incremental mode: newest act of the previous run
+        track_high_water_mark = incremental and high_water_mark is None
+        if track_high_water_mark:
+            high_water_mark = await load_high_water_mark(comune_code, tenant_id)
+            if high_water_mark:
+                logger.info(f"Incremental: acts after {high_water_mark.data_pubblicazione:%Y-%m-%d} ({high_water_mark.numero})")
+        
         # Scrape
-        result = await scraper.scrape_all(url, max_pages=max_pages)
+        result = await scraper.scrape_all(url, max_pages=max_pages, high_water_mark=high_water_mark)
+        
+        # Advance the mark only after a complete run: a partial run may have skipped pages
+        if track_high_water_mark and result.status == 'success' and result.atti:
+            new_mark = HighWaterMark.from_acts(
+                ((atto.data_pubblicazione, atto.numero) for atto in result.atti),
+                previous=high_water_mark
+            )
+            if new_mark:
+                await save_high_water_mark(comune_code, new_mark, tenant_id)
         
         # Optionally save to MongoDB
         if save_to_mongodb and result.atti:
@@ -159,12 +187,17 @@ class ScraperFactory:
         tenant_id: str,
         max_pages: Optional[int] = None,
         config: Optional[dict] = None,
-        save_to_mongodb: bool = False
+        save_to_mongodb: bool = False,
+        concurrency: Optional[int] = None,
+        job_id: Optional[str] = None,
+        incremental: bool = False
     ) -> dict:
         """
-        Scrape multiple municipalities sequentially.
+        Scrape multiple municipalities concurrently (DistributedScraperQueue).
         
-        For parallel processing, use DistributedScraperQueue (to be implemented).
+        Comuni run in parallel up to `concurrency`; each host gets its own
+        AdaptiveRateLimiter (passed to the scraper as config['rate_limiter']),
+        so every albo is still scraped politely.
         
         Args:
             comuni: List of dicts with 'code' and 'url' keys
@@ -172,35 +205,48 @@ class ScraperFactory:
             max_pages: Optional limit on pages per comune
             config: Optional configuration dict
             save_to_mongodb: If True, save all results to MongoDB
+            concurrency: Max comuni scraped at the same time (default: SCRAPER_QUEUE_CONCURRENCY)
+            job_id: Persist job state for resume/retry (comuni completed in a previous run are skipped)
+            incremental: Only scrape acts newer than each comune's high-water mark
             
         Returns:
             Dictionary mapping comune_code -> ScrapeResult
         """
-        logger.info(f"Scraping {len(comuni)} comuni sequentially")
+        logger.info(f"Scraping {len(comuni)} comuni concurrently")
         
-        results = {}
+        async def scrape(task: ScrapeTask, rate_limiter: HostRateLimiter) -> ScrapeResult:
+            return await cls.scrape_comune(
+                comune_code=task.key,
+                url=task.url,
+                tenant_id=tenant_id,
+                max_pages=max_pages,
+                config={**(config or {}), 'rate_limiter': rate_limiter},
+                save_to_mongodb=save_to_mongodb,
+                incremental=incremental
+            )
         
-        for comune in comuni:
-            comune_code = comune['code']
-            url = comune['url']
-            
-            try:
-                result = await cls.scrape_comune(
-                    comune_code=comune_code,
-                    url=url,
-                    tenant_id=tenant_id,
-                    max_pages=max_pages,
-                    config=config,
-                    save_to_mongodb=save_to_mongodb
-                )
-                results[comune_code] = result
-            
-            except Exception as e:
-                logger.exception(f"Fatal error scraping {comune_code}")
+        queue_options = {'concurrency': concurrency} if concurrency else {}
+        queue = DistributedScraperQueue(
+            scrape,
+            job_id=job_id,
+            tenant_id=tenant_id,
+            is_failure=lambda result: result.status == 'error',
+            **queue_options
+        )
+        outcomes = await queue.run(ScrapeTask(comune['code'], comune['url']) for comune in comuni)
+        
+        results = {}
+        for comune_code, outcome in outcomes.items():
+            if outcome.state == 'skipped':
+                continue
+            if outcome.result is not None:
+                results[comune_code] = outcome.result
+            else:
+                logger.error(f"Fatal error scraping {comune_code}: {outcome.error}")
                 results[comune_code] = ScrapeResult(
                     status='error',
                     atti=[],
-                    errors=[f"Fatal error: {str(e)}"],
+                    errors=[f"Fatal error: {outcome.error}"],
                     stats={'comune_code': comune_code}
                 )
         
@@ -215,6 +261,7 @@ class ScraperFactory:
             f"SCRAPING SUMMARY\n"
             f"{'='*70}\n"
             f"Total comuni: {len(comuni)}\n"
+            f"Skipped (already completed in job): {len(comuni) - len(results)}\n"
             f"Success: {success_count}\n"
             f"Partial: {partial_count}\n"
             f"Error: {error_count}\n"
@@ -232,7 +279,8 @@ async def scrape_comune_cli(
     tenant_id: str = 'tenant_toscana',
     max_pages: Optional[int] = None,
     save_json: Optional[str] = None,
-    save_to_mongodb: bool = False
+    save_to_mongodb: bool = False,
+    incremental: bool = False
 ) -> ScrapeResult:
     """
     CLI-friendly scraping function.
@@ -244,6 +292,7 @@ async def scrape_comune_cli(
         max_pages: Optional page limit
         save_json: Optional path to save JSON result
         save_to_mongodb: If True, save to MongoDB
+        incremental: Only scrape acts newer than the saved high-water mark
         
     Returns:
         ScrapeResult
@@ -253,7 +302,8 @@ async def scrape_comune_cli(
         url=url,
         tenant_id=tenant_id,
         max_pages=max_pages,
-        save_to_mongodb=save_to_mongodb
+        save_to_mongodb=save_to_mongodb,
+        incremental=incremental
     )
     
     # Save to JSON if requested
@@ -2,9 +2,12 @@
 
 from .rate_limiter import AdaptiveRateLimiter
 from .smart_headers import SmartHeaders, SessionManager
+from .high_water_mark import HighWaterMark, parse_act_date
 
 __all__ = [
     'AdaptiveRateLimiter',
     'SmartHeaders',
     'SessionManager',
+    'HighWaterMark',
+    'parse_act_date',
 ]
@@ -0,0 +1,151 @@
+"""
+High-water mark for incremental (delta) scraping.
+
+The newest act seen for a comune/tenant: its publication date plus the act
+numbers published on that date (several acts share a day). It is stored in
+the ComuniScrapingTracker document of the comune; the next incremental run
+stops paging at the first known act and asks the API strategies only for
+years >= the mark's year.
+"""
+
+import logging
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_DATE_FORMATS = ("%d/%m/%Y", "%d-%m-%Y", "%Y-%m-%d", "%d.%m.%Y")
+_DATE_PREFIX = re.compile(r"^\s*(\d{4}-\d{2}-\d{2}|\d{1,2}[/.-]\d{1,2}[/.-]\d{4})")
+
+
+def parse_act_date(value: Any) -> Optional[datetime]:
+    """
+    Publication date of an act as datetime (time dropped).
+
+    Accepts datetime, ISO strings and the dd/mm/yyyy variants used by the
+    albi; returns None when the value is missing or not a date.
+    """
+    if isinstance(value, datetime):
+        return datetime(value.year, value.month, value.day)
+    if not isinstance(value, str):
+        return None
+    match = _DATE_PREFIX.match(value)
+    if not match:
+        return None
+    text = match.group(1)
+    for date_format in _DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format)
+        except ValueError:
+            continue
+    return None
+
+
+def _normalize_numero(numero: Any) -> str:
+    return str(numero or "").strip().lower()
+
+
+@dataclass
+class HighWaterMark:
+    """Newest (data_pubblicazione, numero) seen for a comune."""
+    data_pubblicazione: datetime
+    numero: Optional[str] = None
+    numeri: List[str] = field(default_factory=list)   # all act numbers published on that date
+    updated_at: Optional[datetime] = None
+
+    @property
+    def year(self) -> int:
+        return self.data_pubblicazione.year
+
+    def is_known(self, data_pubblicazione: Any, numero: Any = None) -> bool:
+        """
+        True if the act was already seen by a previous run.
+
+        Acts without a readable date are never considered known.
+        """
+        date = parse_act_date(data_pubblicazione)
+        if date is None:
+            return False
+        if date != self.data_pubblicazione:
+            return date < self.data_pubblicazione
+        return _normalize_numero(numero) in {_normalize_numero(n) for n in self.numeri}
+
+    @classmethod
+    def from_acts(cls, acts: Iterable[Tuple[Any, Any]], previous: Optional["HighWaterMark"] = None) -> Optional["HighWaterMark"]:
+        """
+        Mark of the newest acts in `acts`, merged with `previous`.
+
+        Returns None if no act has a readable date and there is no previous mark.
+        """
+        newest: Optional[datetime] = previous.data_pubblicazione if previous else None
+        numeri: List[str] = list(previous.numeri) if previous else []
+        numero: Optional[str] = previous.numero if previous else None
+
+        for data_pubblicazione, act_numero in acts:
+            date = parse_act_date(data_pubblicazione)
+            if date is None:
+                continue
+            act_numero = str(act_numero).strip() if act_numero not in (None, "") else None
+            if newest is None or date > newest:
+                newest = date
+                numeri = [act_numero] if act_numero else []
+                numero = act_numero
+            elif date == newest and act_numero and act_numero not in numeri:
+                numeri.append(act_numero)
+                numero = numero or act_numero
+
+        if newest is None:
+            return None
+        return cls(data_pubblicazione=newest, numero=numero, numeri=numeri, updated_at=datetime.now())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "data_pubblicazione": self.data_pubblicazione,
+            "numero": self.numero,
+            "numeri": list(self.numeri),
+            "updated_at": self.updated_at or datetime.now(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> Optional["HighWaterMark"]:
+        if not data:
+            return None
+        date = parse_act_date(data.get("data_pubblicazione"))
+        if date is None:
+            return None
+        return cls(
+            data_pubblicazione=date,
+            numero=data.get("numero"),
+            numeri=list(data.get("numeri") or []),
+            updated_at=data.get("updated_at"),
+        )
+
+
+async def load_high_water_mark(comune_slug: str, tenant_id: Optional[Any] = None) -> Optional[HighWaterMark]:
+    """Mark saved in ComuniScrapingTracker (None if missing or MongoDB unavailable)."""
+    # Import here to avoid circular dependency
+    from app.services.compliance_scanner.comuni_tracker import ComuniScrapingTracker
+    from app.services.mongodb_async import AsyncMongoDBService
+
+    try:
+        data = await AsyncMongoDBService.run(ComuniScrapingTracker.get_high_water_mark, comune_slug, tenant_id)
+    except Exception as e:
+        logger.warning(f"⚠️ High-water mark for {comune_slug} not loaded: {e}")
+        return None
+    return HighWaterMark.from_dict(data)
+
+
+async def save_high_water_mark(comune_slug: str, high_water_mark: HighWaterMark, tenant_id: Optional[Any] = None) -> bool:
+    """Persist the mark in ComuniScrapingTracker."""
+    from app.services.compliance_scanner.comuni_tracker import ComuniScrapingTracker
+    from app.services.mongodb_async import AsyncMongoDBService
+
+    try:
+        return await AsyncMongoDBService.run(
+            ComuniScrapingTracker.set_high_water_mark, comune_slug, high_water_mark.to_dict(), tenant_id
+        )
+    except Exception as e:
+        logger.warning(f"⚠️ High-water mark for {comune_slug} not saved: {e}")
+        return False
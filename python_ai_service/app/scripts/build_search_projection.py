@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Script di migrazione: scrive i campi di ricerca normalizzati (search_terms,
+search_department, search_responsible, search_protocols, search_types) sui
+documenti importati prima della proiezione e crea gli indici composti
+
+Dopo la migrazione i filtri di /commands/atti, /atto e /natural-query non
+ricadono più sulle condizioni $regex / $or originali.
+"""
+
+import sys
+import argparse
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Add the parent directory of python_ai_service to sys.path
+NATAN_LOC_ROOT = Path(__file__).resolve().parents[3]
+sys.path.insert(0, str(NATAN_LOC_ROOT / "python_ai_service"))
+
+from app.services.mongodb_service import MongoDBService
+from app.services.search_projection import backfill_collection, ensure_search_indexes
+from app.services.tenant_ids import normalize_tenant_id
+
+# Load environment variables from .env file
+env_path = NATAN_LOC_ROOT / "python_ai_service" / ".env"
+if env_path.exists():
+    load_dotenv(env_path, override=True)
+
+
+def build_search_projection(tenant_id=None, dry_run: bool = False) -> bool:
+    """
+    Completa la proiezione di ricerca sulla collection documents
+
+    Args:
+        tenant_id: Limita a un tenant (None = tutti)
+        dry_run: Se True, conta soltanto i documenti da aggiornare
+    """
+    if not MongoDBService.is_connected():
+        print("❌ MongoDB non connesso")
+        return False
+
+    collection = MongoDBService.get_collection("documents")
+    if collection is None:
+        print("❌ Collection 'documents' non disponibile")
+        return False
+
+    if not dry_run:
+        for name in ensure_search_indexes(collection):
+            print(f"  🗂️ Indice {name}")
+
+    count = backfill_collection(collection, tenant_id=tenant_id, dry_run=dry_run)
+    action = "da aggiornare" if dry_run else "aggiornati"
+    print(f"✅ Totale: {count} documenti {action}")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrive i campi di ricerca normalizzati sui documenti MongoDB")
+    parser.add_argument("--tenant-id", default=None, help="Limita la migrazione a un tenant")
+    parser.add_argument("--dry-run", action="store_true", help="Conta i documenti senza modificarli")
+
+    args = parser.parse_args()
+
+    try:
+        success = build_search_projection(
+            tenant_id=normalize_tenant_id(args.tenant_id) if args.tenant_id else None,
+            dry_run=args.dry_run
+        )
+        sys.exit(0 if success else 1)
+    except Exception as e:
+        print(f"❌ Errore: {e}")
+        sys.exit(1)
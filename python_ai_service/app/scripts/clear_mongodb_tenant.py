@@ -54,9 +54,10 @@ def clear_tenant_documents(tenant_id: int, confirm: bool = False):
             return False
     
     # Elimina documenti
-    result = collection.delete_many({"tenant_id": tenant_id})
+    # Tramite MongoDBService: versione del corpus (cache risposte) e rollup del tenant aggiornati
+    deleted_count = MongoDBService.delete_documents("documents", {"tenant_id": tenant_id})
     
-    print(f"✅ Eliminati {result.deleted_count} documenti per tenant_id: {tenant_id}")
+    print(f"✅ Eliminati {deleted_count} documenti per tenant_id: {tenant_id}")
     return True
 
 
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Script di migrazione: normalizza tenant_id (stringa numerica -> intero)
+su documents, user_memories e sources
+
+Dopo la migrazione i retriever eseguono una sola ricerca per query
+invece di ripeterla per tenant_id stringa e intero.
+"""
+
+import sys
+import argparse
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Add the parent directory of python_ai_service to sys.path
+NATAN_LOC_ROOT = Path(__file__).resolve().parents[3]
+sys.path.insert(0, str(NATAN_LOC_ROOT / "python_ai_service"))
+
+from app.services.mongodb_service import MongoDBService
+from app.services.tenant_ids import TENANT_COLLECTIONS, normalize_collections
+
+# Load environment variables from .env file
+env_path = NATAN_LOC_ROOT / "python_ai_service" / ".env"
+if env_path.exists():
+    load_dotenv(env_path, override=True)
+
+
+def normalize_tenant_ids(dry_run: bool = False) -> bool:
+    """
+    Normalizza tenant_id su tutte le collection multi-tenant
+    
+    Args:
+        dry_run: Se True, conta soltanto i documenti da convertire
+    """
+    if not MongoDBService.is_connected():
+        print("❌ MongoDB non connesso")
+        return False
+    
+    database = MongoDBService.get_database()
+    if database is None:
+        print("❌ Database non disponibile")
+        return False
+    
+    results = normalize_collections(database, TENANT_COLLECTIONS, dry_run=dry_run)
+    
+    action = "da convertire" if dry_run else "convertiti"
+    for collection_name, count in results.items():
+        print(f"  {collection_name}: {count} documenti {action}")
+    print(f"✅ Totale: {sum(results.values())} documenti {action}")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Normalizza tenant_id (stringa -> intero) nelle collection MongoDB")
+    parser.add_argument("--dry-run", action="store_true", help="Conta i documenti senza modificarli")
+    
+    args = parser.parse_args()
+    
+    try:
+        success = normalize_tenant_ids(dry_run=args.dry_run)
+        sys.exit(0 if success else 1)
+    except Exception as e:
+        print(f"❌ Errore: {e}")
+        sys.exit(1)
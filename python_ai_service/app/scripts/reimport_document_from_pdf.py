@@ -24,7 +24,7 @@ if env_path.exists():
     load_dotenv(env_path, override=True)
 
 
-async def reimport_document(document_id: str, tenant_id: int, force: bool = False):
+async def reimport_document(document_id: str, tenant_id: int, force: bool = False, use_pdf_cache: bool = True):
     """
     Re-importa un documento estraendo il testo completo dal PDF
     
@@ -32,6 +32,7 @@ async def reimport_document(document_id: str, tenant_id: int, force: bool = Fals
         document_id: Document ID in MongoDB
         tenant_id: Tenant ID
         force: Se True, aggiorna anche se il documento ha già testo completo
+        use_pdf_cache: Se True, un PDF già estratto (stesso contenuto) non viene ri-parsato
     """
     if not MongoDBService.is_connected():
         print("❌ MongoDB non connesso")
@@ -71,7 +72,7 @@ async def reimport_document(document_id: str, tenant_id: int, force: bool = Fals
         return False
     
     # Crea importer
-    importer = PAActMongoDBImporter(tenant_id=tenant_id, dry_run=False)
+    importer = PAActMongoDBImporter(tenant_id=tenant_id, dry_run=False, use_pdf_cache=use_pdf_cache)
     
     # Prepara atto_data dal documento esistente
     atto_data = {
@@ -120,11 +121,12 @@ if __name__ == "__main__":
     parser.add_argument("--document-id", type=str, required=True, help="Document ID in MongoDB")
     parser.add_argument("--tenant-id", type=int, required=True, help="Tenant ID")
     parser.add_argument("--force", action="store_true", help="Forza re-importazione anche se documento ha già testo completo")
+    parser.add_argument("--no-pdf-cache", action="store_true", help="Ri-estrae il testo anche se il PDF è già in cache (es. dopo aggiornamento del parser)")
     
     args = parser.parse_args()
     
     try:
-        success = asyncio.run(reimport_document(args.document_id, args.tenant_id, args.force))
+        success = asyncio.run(reimport_document(args.document_id, args.tenant_id, args.force, use_pdf_cache=not args.no_pdf_cache))
         sys.exit(0 if success else 1)
     except Exception as e:
         print(f"❌ Errore: {e}")
@@ -11,6 +11,8 @@ from app.services.providers import (
     BaseChatAdapter,
     BaseEmbeddingAdapter
 )
+from app.services.providers.embedding_coalescer import CoalescingEmbeddingAdapter, EMBEDDING_COALESCE_WINDOW_MS
+from app.services.providers.embedding_cache import CachingEmbeddingAdapter, EMBEDDING_CACHE_ENABLED
 
 class AIRouter:
     """Routes AI requests to appropriate provider adapters"""
@@ -36,7 +38,14 @@ class AIRouter:
         
         # Cache adapters
         if model not in self._embedding_adapters:
-            self._embedding_adapters[model] = self._create_embedding_adapter(model)
+            adapter = self._create_embedding_adapter(model)
+            # Micro-batching: embed() concorrenti raggruppate in una sola richiesta
+            if EMBEDDING_COALESCE_WINDOW_MS > 0:
+                adapter = CoalescingEmbeddingAdapter(adapter)
+            # Cache content-addressed: testi già embeddati non arrivano al provider
+            if EMBEDDING_CACHE_ENABLED:
+                adapter = CachingEmbeddingAdapter(adapter)
+            self._embedding_adapters[model] = adapter
         
         return self._embedding_adapters[model]
     
@@ -0,0 +1,189 @@
+"""
+Semantic Answer Cache - risposte RAG-Fortress riusate per domande equivalenti
+
+La pipeline completa (retrieval, verifica, claim, gap, sintesi, fact-check)
+costa diverse chiamate LLM. Se per lo stesso tenant è già stata risposta una
+domanda con embedding quasi identico (similarità >= ANSWER_CACHE_SIMILARITY)
+e il corpus non è cambiato da allora (CorpusVersion), si restituisce la
+risposta salvata con fonti e URS.
+
+Risposte che hanno usato memorie personali dell'utente restano visibili solo
+a quell'utente; le altre sono condivise dal tenant.
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.services import vector_scoring
+from app.services.tenant_ids import normalize_tenant_id
+
+logger = logging.getLogger(__name__)
+
+# Configurazione (override da environment)
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.97"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+ANSWER_CACHE_MAX_PER_TENANT = int(os.getenv("ANSWER_CACHE_MAX_PER_TENANT", "256"))
+
+
+def uses_user_memories(result: Dict[str, Any]) -> bool:
+    """True se la risposta cita memorie personali dell'utente"""
+    for source in result.get("sources") or []:
+        if isinstance(source, dict) and str(source.get("document_id", "")).startswith("user_memory_"):
+            return True
+    return False
+
+
+def is_cacheable(result: Dict[str, Any]) -> bool:
+    """Solo risposte riuscite e basate su fonti (niente errori o "nessun documento trovato")"""
+    return bool(result.get("answer")) and bool(result.get("sources")) and not result.get("error_type")
+
+
+class SemanticAnswerCache:
+    """Cache semantica per tenant (classmethod singleton)"""
+
+    _lock = threading.Lock()
+    # tenant_id -> lista di entry {embedding, mode, user_id, corpus_version, result, stored_at, hits}
+    _entries: Dict[Any, List[Dict[str, Any]]] = {}
+
+    _metrics: Dict[str, int] = {
+        "lookups": 0,
+        "hits": 0,
+        "misses": 0,
+        "stale": 0,
+        "stores": 0,
+        "evictions": 0,
+    }
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls._entries.clear()
+            for key in cls._metrics:
+                cls._metrics[key] = 0
+
+    @classmethod
+    def invalidate(cls, tenant_id: Any):
+        with cls._lock:
+            cls._entries.pop(normalize_tenant_id(tenant_id), None)
+
+    @classmethod
+    def lookup(
+        cls,
+        tenant_id: Any,
+        mode: str,
+        user_id: Optional[Any],
+        question_embedding: List[float],
+        corpus_version: str,
+        threshold: float = ANSWER_CACHE_SIMILARITY
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Risposta in cache per una domanda semanticamente equivalente
+
+        Returns:
+            Copia del risultato salvato con "answer_cache" (similarity, age_s), None se miss
+        """
+        tenant_id = normalize_tenant_id(tenant_id)
+        now = time.monotonic()
+
+        with cls._lock:
+            cls._metrics["lookups"] += 1
+            entries = cls._entries.get(tenant_id, [])
+
+            # Rimuovi entry scadute o di una versione precedente del corpus
+            valid = [
+                e for e in entries
+                if e["corpus_version"] == corpus_version and now - e["stored_at"] < ANSWER_CACHE_TTL_SECONDS
+            ]
+            cls._metrics["stale"] += len(entries) - len(valid)
+            cls._entries[tenant_id] = valid
+
+            candidates = [
+                e for e in valid
+                if e["mode"] == mode
+                and (e["user_id"] is None or e["user_id"] == user_id)
+                and len(e["embedding"]) == len(question_embedding)
+            ]
+            if not candidates:
+                cls._metrics["misses"] += 1
+                return None
+
+            matrix = np.stack([e["embedding"] for e in candidates])
+            hits = vector_scoring.search(question_embedding, matrix, k=1, min_score=threshold)
+            if not hits:
+                cls._metrics["misses"] += 1
+                return None
+
+            row, similarity = hits[0]
+            entry = candidates[row]
+            entry["hits"] += 1
+            cls._metrics["hits"] += 1
+
+        logger.info(f"⚡ Answer cache hit per tenant {tenant_id} (similarity={similarity:.3f}, hits={entry['hits']})")
+        return {
+            **entry["result"],
+            "answer_cache": {
+                "hit": True,
+                "similarity": round(float(similarity), 4),
+                "age_s": round(now - entry["stored_at"], 1),
+            },
+        }
+
+    @classmethod
+    def store(
+        cls,
+        tenant_id: Any,
+        mode: str,
+        user_id: Optional[Any],
+        question_embedding: List[float],
+        corpus_version: str,
+        result: Dict[str, Any]
+    ) -> bool:
+        """Salva una risposta (se cacheable); ritorna True se salvata"""
+        if not is_cacheable(result):
+            return False
+
+        tenant_id = normalize_tenant_id(tenant_id)
+        embedding = vector_scoring.normalize_rows(question_embedding)[0]
+        entry = {
+            "embedding": embedding,
+            "mode": mode,
+            # Risposte con memorie personali restano dell'utente
+            "user_id": user_id if uses_user_memories(result) else None,
+            "corpus_version": corpus_version,
+            "result": {k: v for k, v in result.items() if k != "answer_cache"},
+            "stored_at": time.monotonic(),
+            "hits": 0,
+        }
+
+        with cls._lock:
+            entries = cls._entries.setdefault(tenant_id, [])
+            entries.append(entry)
+            cls._metrics["stores"] += 1
+            if len(entries) > ANSWER_CACHE_MAX_PER_TENANT:
+                # Rimuovi la entry meno usata (a parità, la più vecchia)
+                victim = min(range(len(entries)), key=lambda i: (entries[i]["hits"], entries[i]["stored_at"]))
+                entries.pop(victim)
+                cls._metrics["evictions"] += 1
+        return True
+
+    @classmethod
+    def get_stats(cls) -> Dict[str, Any]:
+        """Hit rate e occupazione (per /system/status)"""
+        with cls._lock:
+            metrics = dict(cls._metrics)
+            size = sum(len(entries) for entries in cls._entries.values())
+            tenants = len(cls._entries)
+        lookups = metrics["lookups"]
+        return {
+            **metrics,
+            "hit_rate": round(metrics["hits"] / lookups, 3) if lookups else 0.0,
+            "size": size,
+            "tenants": tenants,
+            "enabled": ANSWER_CACHE_ENABLED,
+        }
@@ -0,0 +1,618 @@
+"""
+Bulk Act Importer - import massivo di atti PA come pipeline a stadi
+
+PAActMongoDBImporter.import_atto tratta un atto alla volta (download →
+estrazione → chunk → embedding → scrittura). Per un albo intero gli stadi
+girano qui in parallelo, collegati da code limitate (backpressure: un
+download veloce non riempie la memoria di PDF in attesa):
+
+    produzione → download (I/O, N task async)
+               → estrazione testo + struttura + chunk (processi)
+               → embedding (batch tra più atti, poche richieste grandi)
+               → scrittura (bulk_write con upsert)
+
+Ripresa dopo interruzione: ogni scrittura è un upsert idempotente per
+(tenant_id, document_id) e gli atti già presenti in MongoDB vengono saltati.
+Con job_id l'avanzamento è salvato anche in import_jobs: riavviando lo
+stesso job (anche con refresh=True) gli atti completati non vengono rifatti.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import Executor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import httpx
+from pymongo.errors import BulkWriteError, ConnectionFailure
+
+from app.services.document_structure_parser import DocumentStructureParser
+from app.services.embedding_store import EmbeddingStore
+from app.services.lexical_index import LexicalIndexRegistry
+from app.services.mongodb_async import AsyncMongoDBService
+from app.services.mongodb_service import MongoDBService
+from app.services.pa_act_mongodb_importer import PAActMongoDBImporter
+from app.services.pdf_extraction import PDF_TEXT_CACHE_ENABLED, PDFExtractionService, PDFTextCache, extract_document, split_text_into_chunks
+from app.services.tenant_ids import normalize_tenant_id
+from app.services.vector_index import VectorIndexRegistry
+
+logger = logging.getLogger(__name__)
+
+# Configurazione (override da environment)
+BULK_IMPORT_DOWNLOAD_WORKERS = int(os.getenv("BULK_IMPORT_DOWNLOAD_WORKERS", "8"))
+BULK_IMPORT_EXTRACT_WORKERS = int(os.getenv("BULK_IMPORT_EXTRACT_WORKERS", str(os.cpu_count() or 2)))
+BULK_IMPORT_EMBED_BATCH_SIZE = int(os.getenv("BULK_IMPORT_EMBED_BATCH_SIZE", "256"))
+BULK_IMPORT_EMBED_CONCURRENCY = int(os.getenv("BULK_IMPORT_EMBED_CONCURRENCY", "2"))
+BULK_IMPORT_WRITE_BATCH_SIZE = int(os.getenv("BULK_IMPORT_WRITE_BATCH_SIZE", "100"))
+BULK_IMPORT_QUEUE_SIZE = int(os.getenv("BULK_IMPORT_QUEUE_SIZE", "32"))
+BULK_IMPORT_DOWNLOAD_TIMEOUT_SECONDS = float(os.getenv("BULK_IMPORT_DOWNLOAD_TIMEOUT_SECONDS", "30"))
+
+IMPORT_JOBS_COLLECTION = "import_jobs"
+
+# Testo minimo estratto dal PDF, altrimenti si usa l'oggetto (come import_atto)
+MIN_TEXT_CHARS = 50
+STRUCTURE_MIN_CHARS = 500
+
+_DONE = object()
+
+
+# === Stadio CPU (eseguito nei processi del pool) ===
+
+_worker_parser: Optional[DocumentStructureParser] = None
+
+
+def prepare_document(
+    pdf_path: Optional[str],
+    oggetto: str,
+    use_pdf_cache: bool = PDF_TEXT_CACHE_ENABLED,
+    cache_dir: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Estrazione testo PDF, struttura e chunk di un atto
+
+    Funzione di modulo (picklable) per il process pool: PyPDF2/pdfplumber e le
+    regex della struttura non bloccano l'event loop né il GIL del processo API.
+    Pagine e chunk escono in un solo passaggio (extract_document), con la cache
+    del testo per hash del PDF.
+
+    Returns:
+        {"text", "using_fallback_oggetto", "structure", "chunks"}; text vuoto se
+        non c'è né testo PDF né oggetto
+    """
+    global _worker_parser
+    if _worker_parser is None:
+        _worker_parser = DocumentStructureParser()
+
+    text, chunks = None, []
+    if pdf_path and os.path.exists(pdf_path):
+        try:
+            extraction = extract_document(
+                pdf_path,
+                PAActMongoDBImporter.CHUNK_SIZE,
+                PAActMongoDBImporter.CHUNK_OVERLAP,
+                use_cache=use_pdf_cache,
+                cache_dir=cache_dir
+            )
+            text, chunks = extraction["text"], extraction["chunks"]
+        except Exception as e:
+            # Come import_atto: PDF illeggibile → oggetto
+            logger.error(f"Errore estrazione PDF {pdf_path}: {e}")
+
+    using_fallback = False
+    if not text or len(text.strip()) < MIN_TEXT_CHARS:
+        text = oggetto or ""
+        using_fallback = bool(text)
+        chunks = split_text_into_chunks(text, PAActMongoDBImporter.CHUNK_SIZE, PAActMongoDBImporter.CHUNK_OVERLAP)
+
+    structure = None
+    if len(text) > STRUCTURE_MIN_CHARS:
+        try:
+            # L'analisi LLM del parser è disabilitata: solo pattern matching
+            structure = _worker_parser.parse_structure(text, use_llm=False)
+        except Exception:
+            structure = None
+
+    return {
+        "text": text,
+        "using_fallback_oggetto": using_fallback,
+        "structure": structure,
+        "chunks": chunks,
+    }
+
+
+class ImportJob:
+    """Un atto in transito nella pipeline"""
+
+    __slots__ = ("atto_data", "pdf_url", "pdf_path", "document_id", "downloaded_path", "prepared", "document", "embedding_count")
+
+    def __init__(self, atto_data: Dict[str, Any], pdf_url: Optional[str] = None, pdf_path: Optional[str] = None):
+        self.atto_data = atto_data
+        self.pdf_url = pdf_url
+        self.pdf_path = pdf_path
+        self.document_id: Optional[str] = None
+        self.downloaded_path: Optional[str] = None
+        self.prepared: Optional[Dict[str, Any]] = None
+        self.document: Optional[Dict[str, Any]] = None
+        self.embedding_count = 0
+
+    @property
+    def label(self) -> str:
+        return str(self.atto_data.get("numero_atto") or self.document_id or "N/A")
+
+
+def atto_from_scanner_dict(atto_dict: Dict[str, Any], comune_slug: str) -> Dict[str, Any]:
+    """Item di import da un atto del Compliance Scanner (JSON di scraping)"""
+    return {
+        "atto_data": {
+            "numero_atto": atto_dict.get("numero", atto_dict.get("numero_atto", "")),
+            "tipo_atto": atto_dict.get("tipo", atto_dict.get("tipo_atto", "")),
+            "oggetto": atto_dict.get("oggetto", atto_dict.get("descrizione", "")),
+            "data_atto": atto_dict.get("data", atto_dict.get("data_pubblicazione", atto_dict.get("data_adozione", ""))),
+            "anno": atto_dict.get("anno", ""),
+            "scraper_type": "compliance_scanner",
+            "comune_slug": comune_slug,
+        },
+        "pdf_url": atto_dict.get("url_pdf") or atto_dict.get("pdf_url") or atto_dict.get("link"),
+    }
+
+
+class BulkActImporter:
+    """
+    Pipeline di import massivo per un tenant
+
+    Usage:
+        importer = BulkActImporter(tenant_id=1, ente="Firenze", job_id="firenze-2024")
+        report = await importer.run(items)   # items: {"atto_data", "pdf_url"?, "pdf_path"?}
+    """
+
+    def __init__(
+        self,
+        tenant_id: int = 1,
+        ente: str = "Firenze",
+        dry_run: bool = False,
+        refresh: bool = False,
+        job_id: Optional[str] = None,
+        download_workers: int = BULK_IMPORT_DOWNLOAD_WORKERS,
+        extract_workers: int = BULK_IMPORT_EXTRACT_WORKERS,
+        embed_batch_size: int = BULK_IMPORT_EMBED_BATCH_SIZE,
+        embed_concurrency: int = BULK_IMPORT_EMBED_CONCURRENCY,
+        write_batch_size: int = BULK_IMPORT_WRITE_BATCH_SIZE,
+        queue_size: int = BULK_IMPORT_QUEUE_SIZE,
+        extract_executor: Optional[Executor] = None,
+        progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None
+    ):
+        """
+        Args:
+            tenant_id: Tenant di destinazione
+            ente: Nome ente (document_id e metadata)
+            dry_run: Solo estrazione e stima token (nessun embedding, nessuna scrittura)
+            refresh: Reimporta anche gli atti già presenti in MongoDB
+            job_id: Salva l'avanzamento in import_jobs per la ripresa
+            extract_executor: Executor per lo stadio CPU (default: process pool condiviso di
+                PDFExtractionService, anche tra import concorrenti)
+            progress_callback: Chiamata con le statistiche dopo ogni scrittura
+        """
+        self.tenant_id = normalize_tenant_id(tenant_id)
+        self.ente = ente
+        self.dry_run = dry_run
+        self.refresh = refresh
+        self.job_id = job_id
+        self.download_workers = max(1, download_workers)
+        self.extract_workers = max(1, extract_workers)
+        self.embed_batch_size = max(1, embed_batch_size)
+        self.embed_concurrency = max(1, embed_concurrency)
+        self.write_batch_size = max(1, write_batch_size)
+        self.queue_size = max(1, queue_size)
+        self.progress_callback = progress_callback
+        self._extract_executor = extract_executor
+
+        # Embedding, costi, document_id e formato documento come l'import singolo
+        self.importer = PAActMongoDBImporter(tenant_id=self.tenant_id, dry_run=dry_run)
+        self.stats: Dict[str, Any] = {
+            "total": 0,
+            "processed": 0,
+            "skipped": 0,
+            "errors": 0,
+            "downloaded": 0,
+            "download_failed": 0,
+            "fallback_oggetto": 0,
+            "total_chunks": 0,
+            "total_documents": 0,
+            "embedding_requests": 0,
+            "write_batches": 0,
+        }
+        self.error_details: List[Dict[str, Any]] = []
+        self._http: Optional[httpx.AsyncClient] = None
+        self._temp_dir: Optional[Path] = None
+
+    # === Orchestrazione ===
+
+    async def run(self, items: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Importa gli atti
+
+        Args:
+            items: Dict con "atto_data" (formato import_atto) e opzionali "pdf_url" / "pdf_path"
+
+        Returns:
+            Report (get_report) con statistiche, costi e durata
+        """
+        started = time.perf_counter()
+        executor = self._extract_executor or PDFExtractionService.get_executor()
+        queues = [asyncio.Queue(maxsize=self.queue_size) for _ in range(4)]
+        download_q, extract_q, embed_q, write_q = queues
+
+        await self._start_job()
+        try:
+            with tempfile.TemporaryDirectory(prefix="natan_bulk_import_") as temp_dir:
+                self._temp_dir = Path(temp_dir)
+                async with httpx.AsyncClient(
+                    timeout=BULK_IMPORT_DOWNLOAD_TIMEOUT_SECONDS,
+                    follow_redirects=True,
+                    limits=httpx.Limits(max_connections=self.download_workers)
+                ) as http:
+                    self._http = http
+                    await asyncio.gather(
+                        self._produce(items, download_q),
+                        self._stage(self._download, self.download_workers, download_q, extract_q, self.extract_workers),
+                        self._stage(lambda job: self._extract(job, executor), self.extract_workers, extract_q, embed_q, self.embed_concurrency),
+                        self._batch_stage(self._embed, self.embed_concurrency, embed_q, write_q, 1, self._embed_batch_full),
+                        self._batch_stage(self._write, 1, write_q, None, 0, lambda batch: len(batch) >= self.write_batch_size),
+                    )
+        except BaseException:
+            await self._finish_job("interrupted")
+            raise
+        finally:
+            self._http = None
+
+        self.stats["duration_s"] = round(time.perf_counter() - started, 2)
+        await self._finish_job("completed")
+        logger.info(
+            f"📦 Bulk import {self.ente} (tenant {self.tenant_id}): {self.stats['processed']} importati, "
+            f"{self.stats['skipped']} saltati, {self.stats['errors']} errori in {self.stats['duration_s']}s"
+        )
+        return self.get_report()
+
+    async def _stage(self, handler, workers: int, inbox: asyncio.Queue, outbox: asyncio.Queue, downstream_workers: int):
+        """Stadio a N worker, un atto alla volta; a fine input propaga la chiusura a valle"""
+        async def worker():
+            while True:
+                job = await inbox.get()
+                if job is _DONE:
+                    return
+                try:
+                    job = await handler(job)
+                except Exception as e:
+                    self._record_error(job, e)
+                    job = None
+                if job is not None:
+                    await outbox.put(job)
+
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        for _ in range(downstream_workers):
+            await outbox.put(_DONE)
+
+    async def _batch_stage(
+        self,
+        handler,
+        workers: int,
+        inbox: asyncio.Queue,
+        outbox: Optional[asyncio.Queue],
+        downstream_workers: int,
+        is_full: Callable[[List[ImportJob]], bool]
+    ):
+        """
+        Stadio a batch: ogni worker raccoglie gli atti già in coda (senza
+        attendere oltre il primo) finché il batch non è pieno
+        """
+        async def worker():
+            finished = False
+            while not finished:
+                job = await inbox.get()
+                if job is _DONE:
+                    return
+                batch = [job]
+                while not is_full(batch):
+                    try:
+                        job = inbox.get_nowait()
+                    except asyncio.QueueEmpty:
+                        break
+                    if job is _DONE:
+                        finished = True
+                        break
+                    batch.append(job)
+                try:
+                    done = await handler(batch)
+                except Exception as e:
+                    for job in batch:
+                        self._record_error(job, e)
+                    continue
+                if outbox is not None:
+                    for job in done:
+                        await outbox.put(job)
+
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        if outbox is not None:
+            for _ in range(downstream_workers):
+                await outbox.put(_DONE)
+
+    def _embed_batch_full(self, batch: List[ImportJob]) -> bool:
+        return sum(len(job.prepared["chunks"]) + 1 for job in batch) >= self.embed_batch_size
+
+    # === Stadi ===
+
+    async def _produce(self, items: Iterable[Dict[str, Any]], download_q: asyncio.Queue):
+        """Calcola i document_id, salta gli atti già importati e alimenta la pipeline"""
+        try:
+            existing_ids, id_by_protocol = await self._load_existing()
+            completed = await self._load_completed()
+            seen = set()
+            for item in items:
+                job = ImportJob(item["atto_data"], item.get("pdf_url"), item.get("pdf_path"))
+                self.stats["total"] += 1
+
+                job.document_id = self.importer.generate_document_id(job.atto_data, self.ente)
+                # Stesso remap di import_atto: un atto già importato con un altro formato di id
+                protocol_number = job.atto_data.get("numero_atto")
+                if protocol_number and protocol_number in id_by_protocol:
+                    job.document_id = id_by_protocol[protocol_number]
+
+                if job.document_id in seen or job.document_id in completed or (not self.refresh and job.document_id in existing_ids):
+                    self.stats["skipped"] += 1
+                    continue
+                seen.add(job.document_id)
+                await download_q.put(job)
+        finally:
+            for _ in range(self.download_workers):
+                await download_q.put(_DONE)
+
+    async def _download(self, job: ImportJob) -> ImportJob:
+        if (job.pdf_path and os.path.exists(job.pdf_path)) or not job.pdf_url:
+            return job
+
+        filename = hashlib.sha1(job.pdf_url.encode("utf-8")).hexdigest() + ".pdf"
+        path = self._temp_dir / filename
+        try:
+            async with self._http.stream("GET", job.pdf_url) as response:
+                response.raise_for_status()
+                with open(path, "wb") as f:
+                    async for block in response.aiter_bytes(64 * 1024):
+                        f.write(block)
+            job.downloaded_path = str(path)
+            self.stats["downloaded"] += 1
+        except Exception as e:
+            # Come import_atto: senza PDF si importa l'oggetto
+            logger.warning(f"  ⚠️  Download PDF fallito per atto {job.label}: {e}")
+            self.stats["download_failed"] += 1
+        return job
+
+    async def _extract(self, job: ImportJob, executor: Executor) -> Optional[ImportJob]:
+        pdf_path = job.downloaded_path or job.pdf_path
+        try:
+            loop = asyncio.get_running_loop()
+            job.prepared = await loop.run_in_executor(
+                executor,
+                prepare_document,
+                pdf_path,
+                job.atto_data.get("oggetto", ""),
+                self.importer.use_pdf_cache,
+                str(PDFTextCache.base_dir)
+            )
+        finally:
+            if job.downloaded_path:
+                try:
+                    os.remove(job.downloaded_path)
+                except OSError:
+                    pass
+                job.downloaded_path = None
+
+        if not job.prepared["chunks"]:
+            logger.warning(f"  ⚠️  Nessun contenuto testo valido per atto {job.label}")
+            self.stats["skipped"] += 1
+            return None
+        if job.prepared["using_fallback_oggetto"]:
+            self.stats["fallback_oggetto"] += 1
+        self.stats["total_chunks"] += len(job.prepared["chunks"])
+        return job
+
+    async def _embed(self, batch: List[ImportJob]) -> List[ImportJob]:
+        """Embedding di chunk e documento per tutti gli atti del batch con una sola chiamata batch"""
+        if self.dry_run:
+            for job in batch:
+                estimated_tokens = sum(len(chunk["chunk_text"]) // 4 for chunk in job.prepared["chunks"])
+                self.importer.cost_tracker.add_usage(estimated_tokens, "openai.text-embedding-3-small")
+            return batch
+
+        texts = []
+        for job in batch:
+            chunks = job.prepared["chunks"]
+            texts.extend(chunk["chunk_text"] for chunk in chunks)
+            # Embedding document-level: oggetto + inizio del primo chunk (come import_atto)
+            texts.append(f"{job.atto_data.get('oggetto', '')}\n\n{chunks[0]['chunk_text'][:500]}")
+
+        results = await self.importer.generate_embeddings(texts)
+        self.stats["embedding_requests"] += 1
+
+        ready = []
+        position = 0
+        for job in batch:
+            chunks = job.prepared["chunks"]
+            chunk_results = results[position:position + len(chunks)]
+            doc_embedding = results[position + len(chunks)][0]
+            position += len(chunks) + 1
+
+            chunks_with_embeddings = []
+            for chunk, (embedding, tokens, model) in zip(chunks, chunk_results):
+                if embedding:
+                    chunks_with_embeddings.append({**chunk, "embedding": embedding, "tokens_used": tokens, "model_used": model})
+            if not chunks_with_embeddings:
+                self._record_error(job, "Nessun embedding generato")
+                continue
+
+            prepared = job.prepared
+            job.document = self.importer.build_document(
+                job.atto_data,
+                document_id=job.document_id,
+                ente=self.ente,
+                text_content=prepared["text"],
+                chunks=chunks_with_embeddings,
+                doc_embedding=doc_embedding,
+                document_structure=prepared["structure"],
+                pdf_path=job.pdf_path,
+                pdf_url=job.pdf_url
+            )
+            job.prepared = None  # il testo ora è nel documento
+            ready.append(job)
+        return ready
+
+    async def _write(self, batch: List[ImportJob]) -> List[ImportJob]:
+        """bulk_write degli atti del batch, poi indici in-process e checkpoint del job"""
+        if self.dry_run:
+            self.stats["processed"] += len(batch)
+            await self._checkpoint(batch)
+            return batch
+
+        try:
+            counts = await AsyncMongoDBService.bulk_upsert("documents", [job.document for job in batch])
+        except BulkWriteError as e:
+            # ordered=False: MongoDB ha scritto tutti gli atti tranne quelli in writeErrors
+            details = e.details or {}
+            failed = {error["index"]: error.get("errmsg", "") for error in details.get("writeErrors", [])}
+            for index, message in sorted(failed.items()):
+                batch[index].document = None
+                self._record_error(batch[index], f"Scrittura MongoDB fallita: {message}")
+            batch = [job for index, job in enumerate(batch) if index not in failed]
+            counts = {
+                "matched": details.get("nMatched", 0),
+                "modified": details.get("nModified", 0),
+                "upserted": details.get("nUpserted", 0),
+            }
+        else:
+            # Ogni upsert trova o crea il suo documento: conteggi a zero = nessuna scrittura
+            # (MongoDB non connesso o circuit breaker aperto), il batch non va segnato completato
+            if not counts["matched"] and not counts["upserted"]:
+                raise ConnectionFailure(f"MongoDB non disponibile: {len(batch)} atti non scritti")
+        self.stats["write_batches"] += 1
+        self.stats["processed"] += len(batch)
+        self.stats["total_documents"] += counts["upserted"]
+
+        # _id dei documenti (nuovi e aggiornati) per l'EmbeddingStore
+        collection = MongoDBService.get_collection("documents")
+        document_ids = [job.document_id for job in batch]
+        rows = await AsyncMongoDBService.run(lambda: list(collection.find(
+            {"tenant_id": self.tenant_id, "document_id": {"$in": document_ids}},
+            {"_id": 1, "document_id": 1}
+        )))
+        object_ids = {row["document_id"]: row["_id"] for row in rows}
+        await asyncio.to_thread(self._update_embedding_store, batch, object_ids)
+        VectorIndexRegistry.invalidate(self.tenant_id)
+
+        await self._checkpoint(batch)
+        logger.info(f"  💾 Bulk write: {len(batch)} atti ({counts['upserted']} nuovi, {counts['modified']} aggiornati)")
+        return batch
+
+    def _update_embedding_store(self, batch: List[ImportJob], object_ids: Dict[str, Any]):
+        records = []
+        for job in batch:
+            object_id = object_ids.get(job.document_id)
+            if object_id is not None and job.document["embedding"]:
+                records.append((object_id, job.document["embedding"], job.document["updated_at"]))
+            if object_id is not None:
+                LexicalIndexRegistry.upsert(self.tenant_id, object_id, job.document)
+            # Il documento è in MongoDB: nessun riferimento trattenuto
+            job.document = None
+        # Un solo append e una sola scrittura della tabella per batch
+        EmbeddingStore.upsert_many(self.tenant_id, records)
+
+    # === Stato e ripresa ===
+
+    async def _load_existing(self):
+        """document_id già importati per il tenant e remap protocol_number → document_id"""
+        collection = MongoDBService.get_collection("documents") if MongoDBService.is_connected() else None
+        if collection is None:
+            return set(), {}
+        rows = await AsyncMongoDBService.run(lambda: list(collection.find(
+            {"tenant_id": self.tenant_id, "document_type": "pa_act"},
+            {"_id": 0, "document_id": 1, "protocol_number": 1}
+        )))
+        existing_ids = {row.get("document_id") for row in rows if row.get("document_id")}
+        id_by_protocol = {row["protocol_number"]: row["document_id"] for row in rows if row.get("protocol_number") and row.get("document_id")}
+        return existing_ids, id_by_protocol
+
+    def _jobs_collection(self):
+        if not self.job_id or self.dry_run or not MongoDBService.is_connected():
+            return None
+        return MongoDBService.get_collection(IMPORT_JOBS_COLLECTION)
+
+    async def _load_completed(self) -> set:
+        collection = self._jobs_collection()
+        if collection is None:
+            return set()
+        job = await AsyncMongoDBService.run(collection.find_one, {"_id": self.job_id}, {"completed_ids": 1})
+        completed = set((job or {}).get("completed_ids", []))
+        if completed:
+            logger.info(f"🔁 Ripresa job {self.job_id}: {len(completed)} atti già completati")
+        return completed
+
+    async def _start_job(self):
+        collection = self._jobs_collection()
+        if collection is None:
+            return
+        now = datetime.now()
+        await AsyncMongoDBService.run(
+            collection.update_one,
+            {"_id": self.job_id},
+            {
+                "$set": {"tenant_id": self.tenant_id, "ente": self.ente, "status": "running", "updated_at": now},
+                "$setOnInsert": {"completed_ids": [], "started_at": now},
+            },
+            upsert=True
+        )
+
+    async def _checkpoint(self, batch: List[ImportJob]):
+        if self.progress_callback:
+            self.progress_callback(dict(self.stats))
+        collection = self._jobs_collection()
+        if collection is None:
+            return
+        await AsyncMongoDBService.run(
+            collection.update_one,
+            {"_id": self.job_id},
+            {
+                "$addToSet": {"completed_ids": {"$each": [job.document_id for job in batch]}},
+                "$set": {"stats": dict(self.stats), "updated_at": datetime.now()},
+            }
+        )
+
+    async def _finish_job(self, status: str):
+        collection = self._jobs_collection()
+        if collection is None:
+            return
+        try:
+            await AsyncMongoDBService.run(
+                collection.update_one,
+                {"_id": self.job_id},
+                {"$set": {"status": status, "stats": dict(self.stats), "updated_at": datetime.now()}}
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ Stato job {self.job_id} non aggiornato: {e}")
+
+    def _record_error(self, job: ImportJob, error: Any):
+        logger.error(f"  ❌ Errore import atto {job.label}: {error}")
+        self.stats["errors"] += 1
+        self.error_details.append({"atto": job.label, "error": str(error)})
+
+    def get_report(self) -> Dict[str, Any]:
+        """Report nel formato di PAActMongoDBImporter.get_report (più statistiche di pipeline)"""
+        return {
+            "dry_run": self.dry_run,
+            "job_id": self.job_id,
+            "stats": dict(self.stats),
+            "costs": self.importer.cost_tracker.calculate_cost(),
+            "errors": self.error_details,
+        }
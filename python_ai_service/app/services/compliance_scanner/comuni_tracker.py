@@ -16,7 +16,20 @@ Salva in MongoDB collection `scraped_comuni` con struttura:
     "landing_page_url": "https://...",
     "email_sent": true,
     "tenant_id": 1,
-    "status": "completed"  # completed, failed, partial
+    "status": "completed",  # completed, failed, partial
+    "queue": {                # stato del job DistributedScraperQueue (opzionale)
+        "job_id": "scrape-all-20250128",
+        "state": "completed", # queued, running, completed, failed
+        "attempts": 1,
+        "last_error": null,
+        "updated_at": "2025-01-28T10:31:00Z"
+    },
+    "high_water_mark": {      # atto più recente visto (scraping incrementale, opzionale)
+        "data_pubblicazione": "2025-01-27T00:00:00Z",
+        "numero": "1234/2025",
+        "numeri": ["1234/2025", "1235/2025"],  # atti pubblicati in quella data
+        "updated_at": "2025-01-28T10:31:00Z"
+    }
 }
 """
 
@@ -200,7 +213,8 @@ class ComuniScrapingTracker:
             if not MongoDBService.is_connected():
                 return []
             
-            filter_query = {}
+            # Documenti con solo lo stato di coda (mai scrapati) non contano
+            filter_query = {"status": {"$exists": True}}
             if tenant_id is not None:
                 filter_query["tenant_id"] = tenant_id
             if status:
@@ -246,6 +260,149 @@ class ComuniScrapingTracker:
             logger.error(f"Errore filtraggio comuni non scrapati: {e}")
             return comuni_list  # In caso di errore, restituisci tutti
     
+    @classmethod
+    def update_queue_state(
+        cls,
+        comune_slug: str,
+        job_id: str,
+        state: str,
+        tenant_id: Optional[int] = None,
+        attempts: Optional[int] = None,
+        error: Optional[str] = None
+    ) -> bool:
+        """
+        Salva lo stato di un comune in un job di scraping (DistributedScraperQueue).
+        
+        Lo stato sta nel sotto-documento `queue`: i campi dello scraping
+        (status, atti_estratti, ...) restano quelli di mark_comune_scraped.
+        
+        Args:
+            comune_slug: Slug del comune
+            job_id: ID del job di scraping
+            state: queued, running, completed, failed
+            tenant_id: ID tenant (opzionale)
+            attempts: Tentativi eseguiti (opzionale)
+            error: Ultimo errore (opzionale)
+            
+        Returns:
+            True se salvato, False altrimenti
+        """
+        try:
+            if not MongoDBService.is_connected():
+                return False
+            collection = MongoDBService.get_collection(cls.COLLECTION_NAME)
+            if collection is None:
+                return False
+            
+            queue_state = {
+                "queue.job_id": job_id,
+                "queue.state": state,
+                "queue.last_error": error,
+                "queue.updated_at": datetime.now()
+            }
+            if attempts is not None:
+                queue_state["queue.attempts"] = attempts
+            
+            collection.update_one(
+                {"comune_slug": comune_slug.lower().strip(), "tenant_id": tenant_id},
+                {"$set": queue_state},
+                upsert=True
+            )
+            return True
+            
+        except Exception as e:
+            logger.error(f"Errore salvataggio stato coda {comune_slug}: {e}")
+            return False
+    
+    @classmethod
+    def get_queue_states(cls, job_id: str, tenant_id: Optional[int] = None) -> Dict[str, Dict]:
+        """
+        Stato dei comuni di un job di scraping.
+        
+        Returns:
+            Dict comune_slug -> sotto-documento queue
+        """
+        try:
+            if not MongoDBService.is_connected():
+                return {}
+            
+            filter_query = {"queue.job_id": job_id}
+            if tenant_id is not None:
+                filter_query["tenant_id"] = tenant_id
+            
+            result = MongoDBService.find_documents(cls.COLLECTION_NAME, filter_query)
+            return {doc["comune_slug"]: doc.get("queue", {}) for doc in result}
+            
+        except Exception as e:
+            logger.error(f"Errore recupero stato job {job_id}: {e}")
+            return {}
+    
+    @classmethod
+    def get_high_water_mark(cls, comune_slug: str, tenant_id: Optional[int] = None) -> Optional[Dict]:
+        """
+        Atto più recente visto per un comune (scraping incrementale).
+        
+        Returns:
+            Sotto-documento high_water_mark (vedi HighWaterMark.to_dict) o None
+        """
+        try:
+            if not MongoDBService.is_connected():
+                return None
+            
+            result = MongoDBService.find_documents(
+                cls.COLLECTION_NAME,
+                {"comune_slug": comune_slug.lower().strip(), "tenant_id": tenant_id},
+                limit=1
+            )
+            return result[0].get("high_water_mark") if result else None
+            
+        except Exception as e:
+            logger.error(f"Errore recupero high-water mark {comune_slug}: {e}")
+            return None
+    
+    @classmethod
+    def set_high_water_mark(cls, comune_slug: str, high_water_mark: Dict, tenant_id: Optional[int] = None) -> bool:
+        """
+        Salva l'atto più recente visto per un comune.
+        
+        Il mark non torna indietro: se quello salvato ha una data più recente
+        (es. run concorrenti) non viene sovrascritto.
+        
+        Args:
+            comune_slug: Slug del comune
+            high_water_mark: Dict con data_pubblicazione, numero, numeri, updated_at
+            tenant_id: ID tenant (opzionale)
+            
+        Returns:
+            True se salvato, False altrimenti
+        """
+        try:
+            if not MongoDBService.is_connected():
+                return False
+            collection = MongoDBService.get_collection(cls.COLLECTION_NAME)
+            if collection is None:
+                return False
+            
+            comune_filter = {"comune_slug": comune_slug.lower().strip(), "tenant_id": tenant_id}
+            existing = collection.find_one(comune_filter)
+            current = (existing or {}).get("high_water_mark") or {}
+            current_date = current.get("data_pubblicazione")
+            if current_date is not None and current_date > high_water_mark["data_pubblicazione"]:
+                logger.debug(f"High-water mark di {comune_slug} già più recente ({current_date})")
+                return False
+            
+            collection.update_one(
+                comune_filter,
+                {"$set": {"high_water_mark": high_water_mark}},
+                upsert=True
+            )
+            logger.info(f"📌 High-water mark {comune_slug}: {high_water_mark['data_pubblicazione']:%Y-%m-%d} ({high_water_mark.get('numero')})")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Errore salvataggio high-water mark {comune_slug}: {e}")
+            return False
+    
     @classmethod
     def get_comune_info(cls, comune_slug: str, tenant_id: Optional[int] = None) -> Optional[Dict]:
         """
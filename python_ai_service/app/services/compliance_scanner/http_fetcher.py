@@ -0,0 +1,345 @@
+"""
+ScannerHTTPFetcher - layer HTTP asincrono per le strategie dello scanner conformità
+
+Le strategie Firenze / Sesto Fiorentino facevano decine di requests.post/get
+bloccanti in sequenza dentro funzioni async: il worker API restava fermo per
+tutta la scansione. Il fetcher:
+- usa un client httpx per host (ScannerClientPool: keep-alive, redirect seguiti come
+  requests.get, al massimo SCANNER_HTTP_MAX_CLIENTS client aperti, chiusi nel lifespan)
+- esegue il fan-out (es. matrice tipi atto × anni) in parallelo con concorrenza limitata
+- fa il parsing HTML (BeautifulSoup) in un thread pool, fuori dall'event loop
+- invia GET condizionali (If-None-Match / If-Modified-Since): su 304 riusa il
+  corpo già scaricato, tenuto in una cache LRU di processo
+- rispetta un HostRateLimiter opzionale (DistributedScraperQueue)
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlencode, urlparse
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Configurazione (override da environment)
+SCANNER_HTTP_CONCURRENCY = int(os.getenv("SCANNER_HTTP_CONCURRENCY", "6"))
+SCANNER_HTTP_TIMEOUT_SECONDS = float(os.getenv("SCANNER_HTTP_TIMEOUT_SECONDS", "15"))
+SCANNER_HTTP_CACHE_SIZE = int(os.getenv("SCANNER_HTTP_CACHE_SIZE", "512"))
+SCANNER_PARSE_WORKERS = int(os.getenv("SCANNER_PARSE_WORKERS", "4"))
+SCANNER_HTTP_MAX_CLIENTS = int(os.getenv("SCANNER_HTTP_MAX_CLIENTS", "16"))
+
+DEFAULT_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+
+
+@dataclass
+class FetchResponse:
+    """Risposta HTTP già letta (text) - anche quando servita dalla cache condizionale"""
+    url: str
+    status_code: int
+    text: str
+    headers: Dict[str, str] = field(default_factory=dict)
+    from_cache: bool = False
+    elapsed_seconds: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code == 200
+
+    def json(self) -> Any:
+        return json.loads(self.text)
+
+
+class ConditionalCache:
+    """
+    Validatori (ETag / Last-Modified) e corpo delle ultime GET, per URL (LRU di processo)
+
+    Condivisa tra istanze dello scanner: una seconda scansione dello stesso
+    comune riceve 304 per le pagine non cambiate.
+    """
+
+    _entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+    _lock = threading.Lock()
+    _stats = {"hits": 0, "stores": 0}
+
+    @classmethod
+    def get(cls, key: str) -> Optional[Dict[str, Any]]:
+        with cls._lock:
+            entry = cls._entries.get(key)
+            if entry is not None:
+                cls._entries.move_to_end(key)
+            return entry
+
+    @classmethod
+    def put(cls, key: str, etag: Optional[str], last_modified: Optional[str], text: str, headers: Dict[str, str]):
+        if not etag and not last_modified:
+            return
+        with cls._lock:
+            cls._entries[key] = {"etag": etag, "last_modified": last_modified, "text": text, "headers": headers}
+            cls._entries.move_to_end(key)
+            cls._stats["stores"] += 1
+            while len(cls._entries) > max(0, SCANNER_HTTP_CACHE_SIZE):
+                cls._entries.popitem(last=False)
+
+    @classmethod
+    def record_hit(cls):
+        with cls._lock:
+            cls._stats["hits"] += 1
+
+    @classmethod
+    def get_stats(cls) -> Dict[str, int]:
+        with cls._lock:
+            return {"entries": len(cls._entries), **cls._stats}
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._entries.clear()
+            cls._stats.update(hits=0, stores=0)
+
+
+class ScannerClientPool:
+    """
+    Client httpx per host dello scanner (LRU limitato, classmethod singleton)
+
+    Uno scrape-all visita migliaia di host: un client per host aperto fino allo
+    shutdown terrebbe aperti migliaia di pool. Oltre SCANNER_HTTP_MAX_CLIENTS il
+    client usato meno di recente e senza richieste in corso viene chiuso.
+    """
+
+    _clients: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+    _lock = threading.Lock()
+
+    @classmethod
+    @asynccontextmanager
+    async def client(cls, url: str) -> AsyncIterator[httpx.AsyncClient]:
+        """Client dell'host di url, riservato per la durata del blocco"""
+        parsed = urlparse(url)
+        origin = f"{parsed.scheme}://{parsed.netloc}"
+        loop = asyncio.get_running_loop()
+        stale = []
+        with cls._lock:
+            entry = cls._clients.get(origin)
+            # Le connessioni appartengono al loop che le ha aperte (script e test con asyncio.run)
+            if entry is None or entry["client"].is_closed or entry["loop"] is not loop:
+                if entry is not None:
+                    stale.append(entry)
+                entry = {"client": cls._build_client(), "loop": loop, "in_flight": 0}
+                cls._clients[origin] = entry
+            cls._clients.move_to_end(origin)
+            entry["in_flight"] += 1
+            stale.extend(cls._evict())
+        await cls._close(stale)
+        try:
+            yield entry["client"]
+        finally:
+            with cls._lock:
+                entry["in_flight"] -= 1
+                stale = cls._evict()
+            await cls._close(stale)
+
+    @staticmethod
+    def _build_client() -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            follow_redirects=True,
+            timeout=SCANNER_HTTP_TIMEOUT_SECONDS,
+            limits=httpx.Limits(max_keepalive_connections=max(1, SCANNER_HTTP_CONCURRENCY))
+        )
+
+    @classmethod
+    def _evict(cls) -> List[Dict[str, Any]]:
+        """Rimuove i client inattivi meno recenti oltre il limite (da chiamare con _lock)"""
+        evicted = []
+        for origin in list(cls._clients):
+            if len(cls._clients) <= max(1, SCANNER_HTTP_MAX_CLIENTS):
+                break
+            if cls._clients[origin]["in_flight"] == 0:
+                evicted.append(cls._clients.pop(origin))
+        return evicted
+
+    @staticmethod
+    async def _close(entries: List[Dict[str, Any]]):
+        current = asyncio.get_running_loop()
+        for entry in entries:
+            loop = entry["loop"]
+            try:
+                if loop is current:
+                    await entry["client"].aclose()
+                elif loop.is_running():
+                    asyncio.run_coroutine_threadsafe(entry["client"].aclose(), loop)
+                # Loop chiuso: le connessioni sono già state abbandonate con il loop
+            except Exception as e:
+                logger.debug(f"Scanner HTTP client close error: {e}")
+
+    @classmethod
+    def open_clients(cls) -> int:
+        with cls._lock:
+            return sum(1 for entry in cls._clients.values() if not entry["client"].is_closed)
+
+    @classmethod
+    async def aclose(cls):
+        """Chiude tutti i client (shutdown del servizio)"""
+        with cls._lock:
+            entries = list(cls._clients.values())
+            cls._clients.clear()
+        for entry in entries:
+            try:
+                await entry["client"].aclose()
+            except Exception as e:
+                logger.debug(f"Scanner HTTP client close error: {e}")
+
+
+class ScannerHTTPFetcher:
+    """
+    Fetch asincrono per lo scanner
+
+    Usage:
+        fetcher = ScannerHTTPFetcher()
+        responses = await fetcher.gather(fetcher.post(api_url, json=p) for p in payloads)
+        total_pages, docs = await fetcher.parse(parse_page, response.text)
+    """
+
+    _parse_executor: Optional[ThreadPoolExecutor] = None
+    _executor_lock = threading.Lock()
+
+    def __init__(
+        self,
+        concurrency: int = SCANNER_HTTP_CONCURRENCY,
+        timeout: float = SCANNER_HTTP_TIMEOUT_SECONDS,
+        headers: Optional[Dict[str, str]] = None,
+        rate_limiter: Optional[Any] = None,
+        conditional: bool = True
+    ):
+        """
+        Args:
+            concurrency: Richieste in volo al massimo per questo fetcher
+            timeout: Timeout per richiesta (secondi)
+            headers: Header di default (User-Agent incluso se assente)
+            rate_limiter: Oggetto con wait() async e adjust_for_response(elapsed, status)
+                (es. HostRateLimiter della DistributedScraperQueue)
+            conditional: Abilita GET condizionali con ConditionalCache
+        """
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.headers = {"User-Agent": DEFAULT_USER_AGENT, **(headers or {})}
+        self.rate_limiter = rate_limiter
+        self.conditional = conditional
+        self._slots: Optional[Tuple[asyncio.AbstractEventLoop, asyncio.Semaphore]] = None
+
+    # === HTTP ===
+
+    async def get(self, url: str, params: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None) -> Optional[FetchResponse]:
+        """GET (condizionale se abilitato); None su errore di rete"""
+        return await self.request("GET", url, params=params, headers=headers)
+
+    async def post(self, url: str, json: Any = None, headers: Optional[Dict[str, str]] = None) -> Optional[FetchResponse]:
+        """POST JSON; None su errore di rete"""
+        return await self.request("POST", url, json=json, headers=headers)
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        json: Any = None,
+        headers: Optional[Dict[str, str]] = None
+    ) -> Optional[FetchResponse]:
+        request_headers = {**self.headers, **(headers or {})}
+        cache_key = None
+        cached = None
+        if self.conditional and method == "GET":
+            cache_key = f"{url}?{urlencode(sorted((params or {}).items()))}" if params else url
+            cached = ConditionalCache.get(cache_key)
+            if cached:
+                if cached["etag"]:
+                    request_headers["If-None-Match"] = cached["etag"]
+                if cached["last_modified"]:
+                    request_headers["If-Modified-Since"] = cached["last_modified"]
+
+        async with self._get_slots():
+            if self.rate_limiter is not None:
+                await self.rate_limiter.wait()
+            started = time.perf_counter()
+            try:
+                async with ScannerClientPool.client(url) as client:
+                    response = await client.request(
+                        method, url, params=params, json=json, headers=request_headers,
+                        timeout=self.timeout, follow_redirects=True
+                    )
+            except httpx.HTTPError as e:
+                logger.debug(f"    HTTP {method} {url} fallita: {e}")
+                if self.rate_limiter is not None:
+                    self.rate_limiter.adjust_for_response(time.perf_counter() - started, 503)
+                return None
+            elapsed = time.perf_counter() - started
+            if self.rate_limiter is not None:
+                self.rate_limiter.adjust_for_response(elapsed, response.status_code)
+
+        if response.status_code == 304 and cached is not None:
+            ConditionalCache.record_hit()
+            return FetchResponse(url, 200, cached["text"], dict(cached["headers"]), from_cache=True, elapsed_seconds=elapsed)
+
+        result = FetchResponse(url, response.status_code, response.text, dict(response.headers), elapsed_seconds=elapsed)
+        if cache_key is not None and response.status_code == 200:
+            ConditionalCache.put(
+                cache_key,
+                response.headers.get("ETag"),
+                response.headers.get("Last-Modified"),
+                result.text,
+                {"content-type": response.headers.get("content-type", "")}
+            )
+        return result
+
+    async def gather(self, requests: Iterable[Awaitable[Any]]) -> List[Any]:
+        """
+        Esegue più richieste in parallelo (limite: concurrency), nell'ordine di input
+
+        Un'eccezione in una richiesta diventa None al suo posto.
+        """
+        results = await asyncio.gather(*requests, return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException) and not isinstance(result, Exception):
+                raise result
+        return [None if isinstance(result, Exception) else result for result in results]
+
+    # === Parsing ===
+
+    @classmethod
+    def _get_parse_executor(cls) -> ThreadPoolExecutor:
+        if cls._parse_executor is None:
+            with cls._executor_lock:
+                if cls._parse_executor is None:
+                    cls._parse_executor = ThreadPoolExecutor(
+                        max_workers=max(1, SCANNER_PARSE_WORKERS),
+                        thread_name_prefix="scanner-parse"
+                    )
+        return cls._parse_executor
+
+    async def parse(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Esegue un parser sincrono (HTML/BeautifulSoup) nel thread pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_parse_executor(), fn, *args)
+
+    @classmethod
+    def shutdown(cls):
+        with cls._executor_lock:
+            if cls._parse_executor is not None:
+                cls._parse_executor.shutdown(wait=False, cancel_futures=True)
+                cls._parse_executor = None
+
+    # === Internals ===
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        # Il semaforo appartiene all'event loop corrente (scanner riusato tra asyncio.run)
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots[0] is not loop:
+            self._slots = (loop, asyncio.Semaphore(self.concurrency))
+        return self._slots[1]
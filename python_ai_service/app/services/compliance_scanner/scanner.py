@@ -9,15 +9,20 @@ Integrato con sistema di scraping esistente:
 
 import logging
 import asyncio
+import re
 import sys
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urljoin
 import httpx
 import json
+from bs4 import BeautifulSoup
 from datetime import datetime
 from .models import ComplianceViolation, ComplianceReport
 from .atto_extractor import AttoExtractor
 from .comuni_tracker import ComuniScrapingTracker
+from .http_fetcher import ScannerHTTPFetcher
+from app.scrapers.utils.high_water_mark import HighWaterMark, load_high_water_mark, save_high_water_mark
 
 # Logger deve essere definito prima degli import che lo usano
 logger = logging.getLogger(__name__)
@@ -92,6 +97,32 @@ NORMATIVA = {
     }
 }
 
+# Strategie dirette Firenze / Sesto Fiorentino
+FIRENZE_BASE_URL = "https://accessoconcertificato.comune.fi.it"
+FIRENZE_TIPI_ATTO = [
+    ("DG", "Deliberazioni di Giunta"),
+    ("DC", "Deliberazioni di Consiglio"),
+    ("DD", "Determinazioni Dirigenziali"),
+    ("DS", "Decreti Sindacali"),
+    ("OD", "Ordinanze Dirigenziali")
+]
+FIRENZE_ANNI = list(range(2018, datetime.now().year + 1))  # 2018-anno corrente
+FIRENZE_API_HEADERS = {
+    'Accept': 'application/json, text/plain, */*',
+    'Accept-Language': 'it-IT,it;q=0.9',
+    'Content-Type': 'application/json',
+    'Origin': FIRENZE_BASE_URL,
+    'Referer': f'{FIRENZE_BASE_URL}/trasparenza-atti/',
+}
+
+SESTO_BASE_URL = "http://servizi.comune.sesto-fiorentino.fi.it"
+SESTO_ANNI = list(range(2018, datetime.now().year + 1))  # 2018-anno corrente
+SESTO_BATCH_SIZE = 1000
+SESTO_API_HEADERS = {
+    'Accept': 'application/json, text/plain, */*',
+    'Accept-Language': 'it-IT,it;q=0.9',
+}
+
 # Email template
 EMAIL_TEMPLATE = """
 Oggetto: Violazioni Normative Albo Pretorio - {comune_name}
@@ -120,7 +151,9 @@ class AlboPretorioComplianceScanner:
     Scanner completo conformità Albi Pretori comuni toscani
     """
     
-    def __init__(self, output_dir: Optional[str] = None):
+    def __init__(self, output_dir: Optional[str] = None, fetcher: Optional[ScannerHTTPFetcher] = None):
+        # Layer HTTP async condiviso dalle strategie (pool connessioni, fan-out limitato, GET condizionali)
+        self.fetcher = fetcher or ScannerHTTPFetcher()
         self.strategies = [
             self._strategy_requests,
             self._strategy_httpx,
@@ -143,7 +176,14 @@ class AlboPretorioComplianceScanner:
         self.output_dir.mkdir(parents=True, exist_ok=True)
         (self.output_dir / "json").mkdir(parents=True, exist_ok=True)
     
-    async def scan_comune(self, comune_slug: str, tenant_id: Optional[int] = None, dry_run: bool = False, mongodb_import: bool = False) -> ComplianceReport:
+    async def scan_comune(
+        self,
+        comune_slug: str,
+        tenant_id: Optional[int] = None,
+        dry_run: bool = False,
+        mongodb_import: bool = False,
+        incremental: bool = False
+    ) -> ComplianceReport:
         """
         Scansiona Albo Pretorio di un comune usando sistema scraping integrato
         
@@ -155,12 +195,22 @@ class AlboPretorioComplianceScanner:
         Args:
             comune_slug: Slug del comune (es: "firenze", "pisa")
             tenant_id: ID tenant per multi-tenancy
+            incremental: Solo atti successivi all'high-water mark del comune (tracker):
+                le API interrogano solo gli anni >= ultimo run, la paginazione si ferma
+                al primo atto già visto; ignorato in dry-run
             
         Returns:
             ComplianceReport completo con atti reali estratti
         """
         logger.info(f"🚀 Avvio scan conformità per comune: {comune_slug}")
         
+        # Scraping incrementale: atto più recente visto dal run precedente
+        high_water_mark = None
+        if incremental and not dry_run:
+            high_water_mark = await load_high_water_mark(comune_slug, tenant_id)
+            if high_water_mark:
+                logger.info(f"  📌 Incrementale: atti dopo {high_water_mark.data_pubblicazione:%d/%m/%Y} ({high_water_mark.numero})")
+        
         # Costruisci URL Albo Pretorio (pattern realistici per comuni toscani)
         albo_urls = self._get_albo_urls(comune_slug)
         
@@ -192,7 +242,7 @@ class AlboPretorioComplianceScanner:
                     logger.info(f"  ✅ API Firenze DRY RUN: {atti_count} atti trovati (primo e ultimo estratti per preview)")
                 else:
                     # Esecuzione normale: estrai tutti gli atti
-                    atti_firenze = await self._strategy_api_firenze()
+                    atti_firenze = await self._strategy_api_firenze(high_water_mark)
                     if atti_firenze and len(atti_firenze) > 0:
                         atti_count = len(atti_firenze)
                         atti_list = atti_firenze  # TUTTI gli atti
@@ -224,7 +274,7 @@ class AlboPretorioComplianceScanner:
                     logger.info(f"  ✅ API Sesto Fiorentino DRY RUN: {atti_count} atti trovati (primo e ultimo estratti per preview)")
                 else:
                     # Esecuzione normale: estrai tutti gli atti
-                    atti_sesto = await self._strategy_api_sesto_fiorentino()
+                    atti_sesto = await self._strategy_api_sesto_fiorentino(high_water_mark)
                     if atti_sesto and len(atti_sesto) > 0:
                         atti_count = len(atti_sesto)
                         atti_list = atti_sesto  # TUTTI gli atti
@@ -244,7 +294,8 @@ class AlboPretorioComplianceScanner:
                         url=url,
                         tenant_id=f"tenant_{tenant_id or 'toscana'}",
                         max_pages=2,  # Limita a 2 pagine per compliance scan
-                        save_to_mongodb=False  # Non salvare, solo estrarre
+                        save_to_mongodb=False,  # Non salvare, solo estrarre
+                        high_water_mark=high_water_mark  # Il mark lo salva lo scanner
                     )
                     
                     if result.status in ['success', 'partial'] and len(result.atti) > 0:
@@ -309,12 +360,20 @@ class AlboPretorioComplianceScanner:
             
             # Estrai atti da HTML se abbiamo contenuto
             if content:
-                atti_estratti = self.atto_extractor.extract_atti(content, working_url)
+                atti_estratti = await self.fetcher.parse(self.atto_extractor.extract_atti, content, working_url)
                 atti_count = len(atti_estratti)
                 atti_list = atti_estratti  # TUTTI gli atti estratti
                 metodo_usato = "HTML Parsing (fallback)"
                 logger.info(f"  ✅ HTML Parsing: {atti_count} atti estratti")
         
+        # Scraping incrementale: restano solo gli atti nuovi (atti_count = atti visti, per la conformità)
+        atti_gia_visti = 0
+        if high_water_mark is not None and atti_list:
+            atti_nuovi = [atto for atto in atti_list if not high_water_mark.is_known(_atto_data(atto), _atto_numero(atto))]
+            atti_gia_visti = len(atti_list) - len(atti_nuovi)
+            atti_list = atti_nuovi
+            logger.info(f"  📌 Incrementale: {len(atti_list)} atti nuovi, {atti_gia_visti} già visti")
+        
         # Se ancora nessun atto trovato
         if atti_count == 0:
             violations = [ComplianceViolation(
@@ -392,6 +451,12 @@ class AlboPretorioComplianceScanner:
             "metodo": metodo_usato or "Unknown",
             "json_backup_path": json_output_path  # Path del JSON salvato (per Laravel)
         }
+        if incremental and not dry_run:
+            report.metadata["incremental"] = {
+                "atti_nuovi": len(atti_list),
+                "atti_gia_visti": atti_gia_visti,
+                "since": high_water_mark.data_pubblicazione.isoformat() if high_water_mark else None
+            }
         
         # Salva tracking in MongoDB se scraping completato (non dry-run)
         if not dry_run and atti_count > 0:
@@ -420,62 +485,48 @@ class AlboPretorioComplianceScanner:
         logger.info(f"✅ Scan completato: score {score}/100, {len(violations)} violazioni, {atti_count} atti estratti ({metodo_usato})")
         
         # Import in MongoDB con embeddings se richiesto (non dry-run)
+        import_ok = True
         if mongodb_import and not dry_run and atti_list and len(atti_list) > 0:
             logger.info(f"  📊 Avvio import MongoDB con embeddings per {len(atti_list)} atti...")
             try:
-                from app.services.pa_act_mongodb_importer import PAActMongoDBImporter
-                
-                importer = PAActMongoDBImporter(tenant_id=tenant_id or 1, dry_run=False)
+                from app.services.bulk_importer import BulkActImporter, atto_from_scanner_dict
                 
-                imported_count = 0
-                errors_count = 0
-                
-                for atto_dict in atti_list:
-                    try:
-                        # Converti formato atto da Compliance Scanner a formato PAActMongoDBImporter
-                        atto_data = {
-                            'numero_atto': atto_dict.get('numero', atto_dict.get('numero_atto', '')),
-                            'tipo_atto': atto_dict.get('tipo', atto_dict.get('tipo_atto', '')),
-                            'oggetto': atto_dict.get('oggetto', atto_dict.get('descrizione', '')),
-                            'data_atto': atto_dict.get('data', atto_dict.get('data_pubblicazione', atto_dict.get('data_adozione', ''))),
-                            'anno': atto_dict.get('anno', ''),
-                            'scraper_type': 'compliance_scanner',
-                            'comune_slug': comune_slug
-                        }
-                        
-                        # URL PDF se disponibile
-                        pdf_url = atto_dict.get('url_pdf') or atto_dict.get('pdf_url') or atto_dict.get('link')
-                        
-                        # Import atto
-                        success = await importer.import_atto(
-                            atto_data=atto_data,
-                            pdf_url=pdf_url,
-                            ente=comune_slug.title()
-                        )
-                        
-                        if success:
-                            imported_count += 1
-                        else:
-                            errors_count += 1
-                            
-                    except Exception as e:
-                        logger.error(f"  ❌ Errore import atto {atto_dict.get('numero', 'N/A')}: {e}")
-                        errors_count += 1
+                # Pipeline bulk: download, estrazione e embedding in parallelo, scritture bulk_write
+                importer = BulkActImporter(
+                    tenant_id=tenant_id or 1,
+                    ente=comune_slug.title()
+                )
+                import_report = await importer.run(atto_from_scanner_dict(atto_dict, comune_slug) for atto_dict in atti_list)
+                imported_count = import_report['stats']['processed']
+                errors_count = import_report['stats']['errors']
                 
                 logger.info(f"  ✅ Import MongoDB completato: {imported_count}/{len(atti_list)} atti importati, {errors_count} errori")
+                import_ok = errors_count == 0
                 
                 # Aggiungi statistiche import al metadata
                 if report.metadata:
                     report.metadata['mongodb_import'] = {
                         'imported': imported_count,
+                        'skipped': import_report['stats']['skipped'],
                         'total': len(atti_list),
                         'errors': errors_count
                     }
                 
             except Exception as e:
                 logger.error(f"  ❌ Errore import MongoDB: {e}")
+                import_ok = False
                 # Non bloccare il report se l'import fallisce
         
+        # Avanza l'high-water mark solo se gli atti nuovi sono stati importati
+        # (altrimenti il prossimo run incrementale li salterebbe)
+        if incremental and not dry_run and atti_list and import_ok:
+            new_mark = HighWaterMark.from_acts(
+                ((_atto_data(atto), _atto_numero(atto)) for atto in atti_list),
+                previous=high_water_mark
+            )
+            if new_mark:
+                await save_high_water_mark(comune_slug, new_mark, tenant_id)
+        
         return report
     
     def _get_albo_urls(self, comune_slug: str) -> List[str]:
@@ -548,13 +599,12 @@ class AlboPretorioComplianceScanner:
         return violations
     
     async def _strategy_requests(self, url: str) -> Optional[str]:
-        """Strategia 1: requests standard"""
+        """Strategia 1: GET con il fetcher condiviso (pool connessioni, richiesta condizionale)"""
         try:
-            import requests
-            response = requests.get(url, timeout=10)
-            if response.status_code == 200:
+            response = await self.fetcher.get(url)
+            if response is not None and response.ok:
                 return response.text
-        except:
+        except Exception:
             pass
         return None
     
@@ -687,194 +737,99 @@ class AlboPretorioComplianceScanner:
         """Verifica presenza dati strutturati"""
         return "application/json" in content or "application/xml" in content or "<rss" in content
     
-    async def _strategy_api_firenze(self) -> Optional[List[Dict]]:
-        """Strategia completa Firenze - Estrae TUTTI i documenti pubblici (API + Albo Pretorio HTML)"""
+    async def _strategy_api_firenze(self, high_water_mark: Optional[HighWaterMark] = None) -> Optional[List[Dict]]:
+        """
+        Strategia completa Firenze - Estrae TUTTI i documenti pubblici (API + Albo Pretorio HTML)
+        
+        Con high_water_mark (incrementale): API solo per gli anni >= anno del mark,
+        Albo HTML fino alla prima pagina con un atto già visto.
+        """
         try:
-            import requests
-            from bs4 import BeautifulSoup
-            import re
-            from urllib.parse import urljoin
-            
-            base_url = "https://accessoconcertificato.comune.fi.it"
+            base_url = FIRENZE_BASE_URL
             tutti_documenti = []
-            
+
             # ============================================
             # PARTE 1: API Atti (Deliberazioni, Determinazioni, etc.)
             # ============================================
             logger.info(f"  📡 FASE 1: Estrazione da API Atti...")
-            
+
             api_url = f"{base_url}/trasparenza-atti-cat/searchAtti"
-            
-            # TUTTI i tipi di atti disponibili
-            tipi_atto = [
-                ("DG", "Deliberazioni di Giunta"),
-                ("DC", "Deliberazioni di Consiglio"),
-                ("DD", "Determinazioni Dirigenziali"),
-                ("DS", "Decreti Sindacali"),
-                ("OD", "Ordinanze Dirigenziali")
-            ]
-            
-            # TUTTI gli anni disponibili (2018-2025 tipicamente)
-            anni = list(range(2018, 2026))  # 2018-2025
-            
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-                'Accept': 'application/json, text/plain, */*',
-                'Accept-Language': 'it-IT,it;q=0.9',
-                'Content-Type': 'application/json',
-                'Origin': base_url,
-                'Referer': f'{base_url}/trasparenza-atti/',
-            }
-            
-            logger.info(f"    Scansione API: {len(tipi_atto)} tipi × {len(anni)} anni = {len(tipi_atto) * len(anni)} chiamate")
-            
-            for tipo_codice, tipo_nome in tipi_atto:
-                for anno in anni:
-                    payload = {
-                        "annoAdozione": str(anno),
-                        "tipiAtto": [tipo_codice],
-                        "competenza": tipo_codice,
-                        "notLoadIniziale": "ok"
-                    }
-                    
-                    try:
-                        response = requests.post(api_url, json=payload, headers=headers, timeout=15)
-                        
-                        if response.status_code == 200:
-                            data = response.json()
-                            
-                            # Estrai documenti dalla risposta
-                            documenti = []
-                            if isinstance(data, list):
-                                documenti = data
-                            elif isinstance(data, dict):
-                                documenti = data.get('data', data.get('results', data.get('items', data.get('records', []))))
-                            
-                            if isinstance(documenti, list) and len(documenti) > 0:
-                                tutti_documenti.extend(documenti)
-                                logger.debug(f"    API {tipo_codice} {anno}: {len(documenti)} documenti")
-                    
-                    except Exception as e:
-                        logger.debug(f"    Errore API {tipo_codice} {anno}: {e}")
-                        continue
-            
+            anni = _anni_da_interrogare(FIRENZE_ANNI, high_water_mark)
+            combinazioni = _firenze_api_matrix(anni)
+
+            logger.info(f"    Scansione API: {len(FIRENZE_TIPI_ATTO)} tipi × {len(anni)} anni = {len(combinazioni)} chiamate (concorrenza {self.fetcher.concurrency})")
+
+            # Fan-out parallelo della matrice tipi × anni (ordine dei risultati preservato)
+            responses = await self.fetcher.gather(
+                self.fetcher.post(api_url, json=_firenze_api_payload(tipo_codice, anno), headers=FIRENZE_API_HEADERS)
+                for tipo_codice, anno in combinazioni
+            )
+
+            for (tipo_codice, anno), response in zip(combinazioni, responses):
+                if response is None or not response.ok:
+                    continue
+                try:
+                    data = response.json()
+                except ValueError as e:
+                    logger.debug(f"    Errore API {tipo_codice} {anno}: {e}")
+                    continue
+
+                # Estrai documenti dalla risposta
+                documenti = []
+                if isinstance(data, list):
+                    documenti = data
+                elif isinstance(data, dict):
+                    documenti = data.get('data', data.get('results', data.get('items', data.get('records', []))))
+
+                if isinstance(documenti, list) and len(documenti) > 0:
+                    tutti_documenti.extend(documenti)
+                    logger.debug(f"    API {tipo_codice} {anno}: {len(documenti)} documenti")
+
             logger.info(f"  ✅ API: {len(tutti_documenti)} documenti estratti")
-            
+
             # ============================================
             # PARTE 2: Albo Pretorio HTML (documenti pubblicati)
             # ============================================
             logger.info(f"  📄 FASE 2: Estrazione da Albo Pretorio HTML...")
-            
+
             albo_url = f"{base_url}/AOL/Affissione/ComuneFi/Page"
-            session = requests.Session()
-            session.headers.update({
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            })
-            
-            # Ottieni prima pagina per determinare totale pagine
+
+            # Prima pagina: determina il totale pagine
             try:
-                response = session.get(albo_url, timeout=15)
-                if response.status_code == 200:
-                    soup = BeautifulSoup(response.text, 'html.parser')
-                    
-                    # Estrai totale pagine
-                    pagination_text = soup.find(string=re.compile(r'Pagina\s+\d+\s+di\s+\d+', re.IGNORECASE))
-                    total_pages = 1
-                    if pagination_text:
-                        match = re.search(r'Pagina\s+\d+\s+di\s+(\d+)', pagination_text, re.IGNORECASE)
-                        if match:
-                            total_pages = int(match.group(1))
-                    
+                response = await self.fetcher.get(albo_url)
+                if response is not None and response.ok:
+                    total_pages, documenti_albo = await self.fetcher.parse(_parse_firenze_albo_page, response.text, base_url)
+
                     logger.info(f"    Albo Pretorio: {total_pages} pagine trovate")
-                    
-                    # Scrapa tutte le pagine
-                    documenti_albo = []
-                    for page_num in range(1, total_pages + 1):
-                        if page_num > 1:
-                            import asyncio
-                            await asyncio.sleep(1)  # Rate limiting
-                            response = session.get(albo_url, params={'page': page_num}, timeout=15)
-                            if response.status_code != 200:
-                                continue
-                            soup = BeautifulSoup(response.text, 'html.parser')
-                        
-                        # Cerca card divs con atti
-                        card_divs = soup.find_all('div', class_='card concorso-card multi-line')
-                        
-                        for card in card_divs:
-                            try:
-                                text = card.get_text(separator='\n')
-                                lines = [line.strip() for line in card.stripped_strings]
-                                
-                                # Estrai dati
-                                numero_registro = ''
-                                numero_atto = ''
-                                data_inizio = ''
-                                data_fine = ''
-                                oggetto = ''
-                                
-                                # N° registro
-                                match = re.search(r'N°\s*registro\s*(\d+/\d+)', text, re.IGNORECASE)
-                                if match:
-                                    numero_registro = match.group(1)
-                                
-                                # N° atto
-                                match = re.search(r'N°\s*atto\s*(\d+/\d+)', text, re.IGNORECASE)
-                                if match:
-                                    numero_atto = match.group(1)
-                                
-                                # Date
-                                match = re.search(r'Inizio\s+pubblicazione\s*(\d{2}/\d{2}/\d{4})', text, re.IGNORECASE)
-                                if match:
-                                    data_inizio = match.group(1)
-                                
-                                match = re.search(r'Fine\s+pubblicazione\s*(\d{2}/\d{2}/\d{4})', text, re.IGNORECASE)
-                                if match:
-                                    data_fine = match.group(1)
-                                
-                                # Oggetto (ultimo testo lungo)
-                                for line in reversed(lines):
-                                    if len(line) > 50:
-                                        oggetto = line
-                                        break
-                                
-                                # Tipo atto (prima riga)
-                                tipo_atto = lines[0] if lines else 'Documento Albo'
-                                
-                                # Link PDF
-                                pdf_links = card.find_all('a', href=lambda x: x and '.pdf' in x.lower())
-                                pdf_url = ''
-                                if pdf_links:
-                                    pdf_url = urljoin(base_url, pdf_links[0].get('href', ''))
-                                
-                                # Crea documento solo se ha numero valido
-                                if numero_registro or numero_atto:
-                                    doc_albo = {
-                                        'numero': numero_atto or numero_registro,
-                                        'numero_registro': numero_registro,
-                                        'data': data_inizio or data_fine,
-                                        'data_inizio': data_inizio,
-                                        'data_fine': data_fine,
-                                        'oggetto': oggetto,
-                                        'tipo': tipo_atto,
-                                        'fonte': 'Albo Pretorio HTML',
-                                        'link': pdf_url
-                                    }
-                                    documenti_albo.append(doc_albo)
-                            
-                            except Exception as e:
-                                logger.debug(f"    Errore parsing card: {e}")
+
+                    # Pagine successive in parallelo (limite di concorrenza del fetcher).
+                    # Incrementale: a blocchi, fermandosi al primo blocco con atti già visti
+                    page_numbers = list(range(2, total_pages + 1))
+                    reached_known = _contiene_atti_visti(documenti_albo, high_water_mark)
+                    batch_size = self.fetcher.concurrency if high_water_mark is not None else max(1, len(page_numbers))
+                    for batch_start in range(0, len(page_numbers), batch_size):
+                        if reached_known:
+                            logger.info(f"    📌 Atti già visti raggiunti: paginazione interrotta a pagina {page_numbers[batch_start] - 1}/{total_pages}")
+                            break
+                        batch = page_numbers[batch_start:batch_start + batch_size]
+                        page_responses = await self.fetcher.gather(
+                            self.fetcher.get(albo_url, params={'page': page_num}) for page_num in batch
+                        )
+                        for page_num, page_response in zip(batch, page_responses):
+                            if page_response is None or not page_response.ok:
                                 continue
-                        
-                        logger.debug(f"    Pagina {page_num}/{total_pages}: {len(card_divs)} card, {len(documenti_albo)} documenti estratti")
-                    
+                            _, documenti_pagina = await self.fetcher.parse(_parse_firenze_albo_page, page_response.text, base_url)
+                            documenti_albo.extend(documenti_pagina)
+                            reached_known = reached_known or _contiene_atti_visti(documenti_pagina, high_water_mark)
+                            logger.debug(f"    Pagina {page_num}/{total_pages}: {len(documenti_pagina)} documenti estratti")
+
                     # Aggiungi documenti Albo Pretorio
                     tutti_documenti.extend(documenti_albo)
                     logger.info(f"  ✅ Albo Pretorio HTML: {len(documenti_albo)} documenti estratti")
-            
+
             except Exception as e:
                 logger.debug(f"  Errore scraping Albo Pretorio HTML: {e}")
-            
+
             # ============================================
             # CONVERSIONE FORMATO STANDARD
             # ============================================
@@ -892,245 +847,74 @@ class AlboPretorioComplianceScanner:
                         'fonte': doc.get('fonte', 'API Atti'),
                         'link': doc.get('url', doc.get('link', ''))
                     })
-                
+
                 logger.info(f"  ✅ TOTALE Firenze: {len(documenti_formattati)} documenti pubblici estratti (API + Albo Pretorio)")
                 return documenti_formattati
-        
+
         except Exception as e:
             logger.debug(f"  Strategia Firenze fallita: {e}")
-        
+
         return None
-    
-    async def _strategy_api_sesto_fiorentino(self) -> Optional[List[Dict]]:
-        """Strategia completa Sesto Fiorentino - Estrae TUTTI i documenti pubblici (API DataTables + Albo Pretorio HTML)"""
+
+    async def _strategy_api_sesto_fiorentino(self, high_water_mark: Optional[HighWaterMark] = None) -> Optional[List[Dict]]:
+        """
+        Strategia completa Sesto Fiorentino - Estrae TUTTI i documenti pubblici (API DataTables + Albo Pretorio HTML)
+        
+        Con high_water_mark (incrementale): API solo per gli anni >= anno del mark.
+        """
         try:
-            import requests
-            from bs4 import BeautifulSoup
-            import re
-            from urllib.parse import urljoin
-            
-            base_url = "http://servizi.comune.sesto-fiorentino.fi.it"
+            base_url = SESTO_BASE_URL
             tutti_documenti = []
-            
+
             # ============================================
             # PARTE 1: API DataTables (tutti gli anni disponibili)
             # ============================================
             logger.info(f"  📡 FASE 1: Estrazione da API DataTables Sesto Fiorentino...")
-            
+
             api_url = f"{base_url}/albo/search.php"
-            
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-                'Accept': 'application/json, text/plain, */*',
-                'Accept-Language': 'it-IT,it;q=0.9',
-            }
-            
-            # TUTTI gli anni disponibili (2018-2025 tipicamente)
-            anni = list(range(2018, 2026))  # 2018-2025
-            
+            anni = _anni_da_interrogare(SESTO_ANNI, high_water_mark)
+
             logger.info(f"    Scansione API: {len(anni)} anni da verificare")
-            
-            # Per ogni anno, estrai TUTTI i documenti
-            for anno in anni:
-                try:
-                    import asyncio
-                    await asyncio.sleep(0.3)  # Rate limiting tra anni
-                    
-                    # Chiamata iniziale per vedere quanti documenti ci sono per questo anno
-                    params_anno = {
-                        'draw': '1',
-                        'start': '0',
-                        'length': '1000',  # Provo a prendere tutti
-                        'search[value]': str(anno),
-                        'search[regex]': 'false',
-                        # Filtro colonna anno (colonna 1)
-                        'columns[1][data]': '1',
-                        'columns[1][searchable]': 'true',
-                        'columns[1][search][value]': str(anno),
-                        'columns[1][search][regex]': 'false'
-                    }
-                    
-                    response = requests.get(api_url, params=params_anno, headers=headers, timeout=15)
-                    
-                    if response.status_code == 200:
-                        data = response.json()
-                        
-                        if isinstance(data, dict):
-                            # Estrai documenti filtrati per anno
-                            filtered_docs = data.get('data', [])
-                            
-                            if isinstance(filtered_docs, list) and len(filtered_docs) > 0:
-                                # Verifica che siano effettivamente dell'anno richiesto
-                                docs_anno = []
-                                for doc in filtered_docs:
-                                    if isinstance(doc, list) and len(doc) > 1:
-                                        anno_doc = str(doc[1])
-                                        if anno_doc == str(anno):
-                                            docs_anno.append(doc)
-                                
-                                if len(docs_anno) > 0:
-                                    tutti_documenti.extend(docs_anno)
-                                    logger.debug(f"    Anno {anno}: {len(docs_anno)} documenti estratti")
-                                    
-                                    # Se ci sono più documenti, fai paginazione
-                                    records_filtered = data.get('recordsFiltered', len(docs_anno))
-                                    if records_filtered > len(docs_anno):
-                                        start = len(docs_anno)
-                                        draw = 2
-                                        batch_size = 1000
-                                        
-                                        while start < records_filtered:
-                                            params_batch = {
-                                                'draw': str(draw),
-                                                'start': str(start),
-                                                'length': str(batch_size),
-                                                'search[value]': str(anno),
-                                                'search[regex]': 'false',
-                                                'columns[1][data]': '1',
-                                                'columns[1][searchable]': 'true',
-                                                'columns[1][search][value]': str(anno),
-                                                'columns[1][search][regex]': 'false'
-                                            }
-                                            
-                                            try:
-                                                await asyncio.sleep(0.3)
-                                                response_batch = requests.get(api_url, params=params_batch, headers=headers, timeout=15)
-                                                
-                                                if response_batch.status_code == 200:
-                                                    batch_data = response_batch.json()
-                                                    if isinstance(batch_data, dict) and 'data' in batch_data:
-                                                        batch_docs = batch_data['data']
-                                                        if isinstance(batch_docs, list) and len(batch_docs) > 0:
-                                                            # Filtra solo documenti dell'anno corretto
-                                                            batch_anno = [d for d in batch_docs if isinstance(d, list) and len(d) > 1 and str(d[1]) == str(anno)]
-                                                            if len(batch_anno) > 0:
-                                                                tutti_documenti.extend(batch_anno)
-                                                                logger.debug(f"    Anno {anno} batch {draw}: {len(batch_anno)} documenti (totale anno: {len([d for d in tutti_documenti if isinstance(d, list) and len(d) > 1 and str(d[1]) == str(anno)])})")
-                                                                start += len(batch_anno)
-                                                                draw += 1
-                                                                
-                                                                if len(batch_anno) < batch_size:
-                                                                    break
-                                                            else:
-                                                                break
-                                                        else:
-                                                            break
-                                                    else:
-                                                        break
-                                                else:
-                                                    break
-                                            
-                                            except Exception as e:
-                                                logger.debug(f"    Errore batch anno {anno}: {e}")
-                                                break
-                
-                except Exception as e:
-                    logger.debug(f"    Errore anno {anno}: {e}")
-                    continue
-            
+
+            # Anni in parallelo; la paginazione dentro un anno resta sequenziale
+            documenti_per_anno = await self.fetcher.gather(self._fetch_sesto_year(api_url, anno) for anno in anni)
+            for anno, docs_anno in zip(anni, documenti_per_anno):
+                if docs_anno:
+                    tutti_documenti.extend(docs_anno)
+                    logger.debug(f"    Anno {anno}: {len(docs_anno)} documenti estratti")
+
             logger.info(f"  ✅ API DataTables: {len(tutti_documenti)} documenti estratti da {len(anni)} anni")
-            
+
             # ============================================
             # PARTE 2: Albo Pretorio HTML (se disponibile)
             # ============================================
             logger.info(f"  📄 FASE 2: Estrazione da Albo Pretorio HTML Sesto Fiorentino...")
-            
+
             albo_urls = [
                 f"{base_url}/albo/",
                 f"{base_url}/albo/index.php",
                 f"{base_url}/albo/albo.php"
             ]
-            
-            session = requests.Session()
-            session.headers.update({
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            })
-            
+
             documenti_albo = []
-            
+
             for albo_url in albo_urls:
                 try:
-                    response = session.get(albo_url, timeout=15)
-                    if response.status_code == 200:
-                        soup = BeautifulSoup(response.text, 'html.parser')
-                        
-                        # Cerca tabelle con atti
-                        tables = soup.find_all('table')
-                        for table in tables:
-                            rows = table.find_all('tr')
-                            for row in rows[1:]:  # Skip header
-                                cells = row.find_all(['td', 'th'])
-                                if len(cells) >= 3:
-                                    try:
-                                        # Estrai dati da riga tabella
-                                        numero = cells[0].get_text(strip=True) if len(cells) > 0 else ''
-                                        data = cells[1].get_text(strip=True) if len(cells) > 1 else ''
-                                        oggetto = cells[2].get_text(strip=True) if len(cells) > 2 else ''
-                                        
-                                        # Cerca link PDF
-                                        pdf_links = row.find_all('a', href=lambda x: x and '.pdf' in x.lower())
-                                        pdf_url = ''
-                                        if pdf_links:
-                                            pdf_url = urljoin(base_url, pdf_links[0].get('href', ''))
-                                        
-                                        if numero and oggetto:
-                                            doc_albo = {
-                                                'numero': numero,
-                                                'data': data,
-                                                'oggetto': oggetto,
-                                                'tipo': 'Documento Albo',
-                                                'fonte': 'Albo Pretorio HTML Sesto Fiorentino',
-                                                'link': pdf_url
-                                            }
-                                            documenti_albo.append(doc_albo)
-                                    except:
-                                        continue
-                        
-                        # Cerca anche div con atti
-                        divs_atti = soup.find_all('div', class_=lambda x: x and ('atto' in x.lower() or 'card' in x.lower() or 'pubblicazione' in x.lower()))
-                        for div in divs_atti:
-                            try:
-                                testo = div.get_text(separator='\n')
-                                lines = [line.strip() for line in div.stripped_strings]
-                                
-                                if len(lines) >= 2:
-                                    numero = lines[0] if lines else ''
-                                    oggetto = lines[1] if len(lines) > 1 else ''
-                                    
-                                    # Cerca date nel testo
-                                    match_data = re.search(r'(\d{2}/\d{2}/\d{4})', testo)
-                                    data = match_data.group(1) if match_data else ''
-                                    
-                                    # Link PDF
-                                    pdf_links = div.find_all('a', href=lambda x: x and '.pdf' in x.lower())
-                                    pdf_url = ''
-                                    if pdf_links:
-                                        pdf_url = urljoin(base_url, pdf_links[0].get('href', ''))
-                                    
-                                    if numero and oggetto:
-                                        doc_albo = {
-                                            'numero': numero,
-                                            'data': data,
-                                            'oggetto': oggetto,
-                                            'tipo': 'Documento Albo',
-                                            'fonte': 'Albo Pretorio HTML Sesto Fiorentino',
-                                            'link': pdf_url
-                                        }
-                                        documenti_albo.append(doc_albo)
-                            except:
-                                continue
-                        
+                    response = await self.fetcher.get(albo_url)
+                    if response is not None and response.ok:
+                        documenti_albo = await self.fetcher.parse(_parse_sesto_albo_page, response.text, base_url)
+
                         if len(documenti_albo) > 0:
                             logger.info(f"  ✅ Albo Pretorio HTML: {len(documenti_albo)} documenti estratti da {albo_url}")
                             break  # Se trovato, non provare altri URL
-                
+
                 except Exception as e:
                     logger.debug(f"  Errore scraping HTML {albo_url}: {e}")
                     continue
-            
+
             # Aggiungi documenti HTML a quelli API
             tutti_documenti.extend(documenti_albo)
-            
+
             # ============================================
             # CONVERSIONE FORMATO STANDARD
             # ============================================
@@ -1139,7 +923,7 @@ class AlboPretorioComplianceScanner:
                 for doc in tutti_documenti:
                     # DataTables restituisce array con 9 elementi
                     if isinstance(doc, list) and len(doc) >= 9:
-                        # [0]=numero_registro, [1]=anno, [2]=oggetto, [3]=pdf_links, 
+                        # [0]=numero_registro, [1]=anno, [2]=oggetto, [3]=pdf_links,
                         # [4]=categoria, [5]=tipo, [6]=direzione, [7]=data_inizio, [8]=data_fine
                         pdf_links_str = doc[3] if len(doc) > 3 else ''
                         pdf_url = ''
@@ -1148,7 +932,7 @@ class AlboPretorioComplianceScanner:
                             pdf_url = f"{base_url}/albo/{first_pdf}" if first_pdf else ''
                         elif pdf_links_str:
                             pdf_url = f"{base_url}/albo/{pdf_links_str.strip()}"
-                        
+
                         documenti_formattati.append({
                             'numero': f"{doc[0]}/{doc[1]}" if len(doc) > 1 else str(doc[0]) if len(doc) > 0 else 'N/A',
                             'numero_registro': str(doc[0]) if len(doc) > 0 else 'N/A',
@@ -1183,98 +967,114 @@ class AlboPretorioComplianceScanner:
                             'link': doc.get('link', doc.get('url', doc.get('pdf_url', ''))),
                             'fonte': doc.get('fonte', 'API DataTables Sesto Fiorentino')
                         })
-                
+
                 logger.info(f"  ✅ TOTALE Sesto Fiorentino: {len(documenti_formattati)} documenti pubblici estratti (API + Albo Pretorio)")
                 return documenti_formattati
-        
+
         except Exception as e:
             logger.debug(f"  Strategia Sesto Fiorentino fallita: {e}")
-        
+
         return None
-    
+
+    async def _fetch_sesto_year(self, api_url: str, anno: int) -> List[list]:
+        """Tutte le righe DataTables di un anno (Sesto Fiorentino), con paginazione"""
+        docs_anno = []
+        try:
+            # Chiamata iniziale per vedere quanti documenti ci sono per questo anno
+            response = await self.fetcher.get(api_url, params=_sesto_datatables_params(anno, draw=1, start=0), headers=SESTO_API_HEADERS)
+            if response is None or not response.ok:
+                return docs_anno
+
+            data = response.json()
+            if not isinstance(data, dict):
+                return docs_anno
+
+            # Verifica che siano effettivamente dell'anno richiesto
+            docs_anno = _sesto_rows_for_year(data.get('data', []), anno)
+            if not docs_anno:
+                return docs_anno
+
+            # Se ci sono più documenti, fai paginazione
+            records_filtered = data.get('recordsFiltered', len(docs_anno))
+            start = len(docs_anno)
+            draw = 2
+            while start < records_filtered:
+                response_batch = await self.fetcher.get(
+                    api_url, params=_sesto_datatables_params(anno, draw=draw, start=start), headers=SESTO_API_HEADERS
+                )
+                if response_batch is None or not response_batch.ok:
+                    break
+                batch_data = response_batch.json()
+                if not isinstance(batch_data, dict) or 'data' not in batch_data:
+                    break
+                batch_anno = _sesto_rows_for_year(batch_data['data'], anno)
+                if not batch_anno:
+                    break
+                docs_anno.extend(batch_anno)
+                logger.debug(f"    Anno {anno} batch {draw}: {len(batch_anno)} documenti (totale anno: {len(docs_anno)})")
+                start += len(batch_anno)
+                draw += 1
+                if len(batch_anno) < SESTO_BATCH_SIZE:
+                    break
+
+        except Exception as e:
+            logger.debug(f"    Errore anno {anno}: {e}")
+
+        return docs_anno
+
     async def _count_atti_firenze(self) -> int:
         """Conta velocemente gli atti di Firenze senza estrarli tutti (per dry-run)"""
         try:
-            import requests
-            
-            base_url = "https://accessoconcertificato.comune.fi.it"
-            api_url = f"{base_url}/trasparenza-atti-cat/searchAtti"
-            
-            tipi_atto = [("DG", "Deliberazioni di Giunta"), ("DC", "Deliberazioni di Consiglio"), 
-                        ("DD", "Determinazioni Dirigenziali"), ("DS", "Decreti Sindacali"), 
-                        ("OD", "Ordinanze Dirigenziali")]
-            anni = list(range(2018, 2026))  # 2018-2025
-            
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-                'Accept': 'application/json, text/plain, */*',
-                'Content-Type': 'application/json',
-                'Origin': base_url,
-                'Referer': f'{base_url}/trasparenza-atti/',
-            }
-            
-            total_count = 0
-            
+            api_url = f"{FIRENZE_BASE_URL}/trasparenza-atti-cat/searchAtti"
+            combinazioni = _firenze_api_matrix(FIRENZE_ANNI)
+
             # Conta per tipo e anno (la API restituisce TUTTI gli atti in una chiamata, non paginati)
-            for tipo_codice, tipo_nome in tipi_atto:
-                for anno in anni:
-                    payload = {
-                        "annoAdozione": str(anno),
-                        "tipiAtto": [tipo_codice],
-                        "competenza": tipo_codice,
-                        "notLoadIniziale": "ok"
-                    }
-                    
-                    try:
-                        response = requests.post(api_url, json=payload, headers=headers, timeout=10)
-                        if response.status_code == 200:
-                            data = response.json()
-                            if isinstance(data, list):
-                                total_count += len(data)
-                    except:
-                        continue
-            
+            responses = await self.fetcher.gather(
+                self.fetcher.post(api_url, json=_firenze_api_payload(tipo_codice, anno), headers=FIRENZE_API_HEADERS)
+                for tipo_codice, anno in combinazioni
+            )
+
+            total_count = 0
+            for response in responses:
+                if response is None or not response.ok:
+                    continue
+                try:
+                    data = response.json()
+                except ValueError:
+                    continue
+                if isinstance(data, list):
+                    total_count += len(data)
+
             return total_count
-            
+
         except Exception as e:
             logger.debug(f"Errore conteggio Firenze: {e}")
             return 0
-    
+
     async def _count_atti_sesto_fiorentino(self) -> int:
         """Conta velocemente gli atti di Sesto Fiorentino senza estrarli tutti (per dry-run)"""
         try:
-            import requests
-            
-            base_url = "http://servizi.comune.sesto-fiorentino.fi.it"
-            api_url = f"{base_url}/albo/search.php"
-            
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-                'Accept': 'application/json, text/plain, */*',
-            }
-            
+            api_url = f"{SESTO_BASE_URL}/albo/search.php"
+
             # Una chiamata per vedere il totale senza paginazione completa
             params = {
                 'draw': '1',
                 'start': '0',
                 'length': '1',  # Solo per vedere recordsTotal
             }
-            
-            try:
-                response = requests.get(api_url, params=params, headers=headers, timeout=10)
-                if response.status_code == 200:
-                    data = response.json()
-                    if isinstance(data, dict):
-                        return data.get('recordsTotal', 0)
-            except:
-                pass
-            
+
+            response = await self.fetcher.get(api_url, params=params, headers=SESTO_API_HEADERS)
+            if response is not None and response.ok:
+                data = response.json()
+                if isinstance(data, dict):
+                    return data.get('recordsTotal', 0)
+
             return 0
-            
+
         except Exception as e:
             logger.debug(f"Errore conteggio Sesto Fiorentino: {e}")
             return 0
-    
+
     def _save_json_backup(self, comune_slug: str, atti_list: List[Dict], tenant_id: Optional[int] = None) -> Optional[str]:
         """
         Salva backup JSON degli atti estratti (come gli altri scraper)
@@ -1310,3 +1110,223 @@ class AlboPretorioComplianceScanner:
             logger.error(f"Errore salvataggio JSON backup: {e}")
             return None
 
+
+
+# ============================================
+# Helper strategie dirette (parsing eseguito nel thread pool del fetcher)
+# ============================================
+
+def _firenze_api_matrix(anni: List[int]) -> List[tuple]:
+    """Combinazioni (tipo atto, anno) interrogate sull'API Atti di Firenze"""
+    return [(tipo_codice, anno) for tipo_codice, _ in FIRENZE_TIPI_ATTO for anno in anni]
+
+
+def _anni_da_interrogare(anni: List[int], high_water_mark: Optional[HighWaterMark]) -> List[int]:
+    """Anni da chiedere alle API: tutti, o solo quelli >= anno dell'ultimo run (incrementale)"""
+    if high_water_mark is None:
+        return list(anni)
+    return [anno for anno in anni if anno >= high_water_mark.year]
+
+
+def _atto_data(atto: Dict):
+    """Data di pubblicazione di un atto nei vari formati delle strategie"""
+    return atto.get('data_pubblicazione') or atto.get('data_inizio') or atto.get('data')
+
+
+def _atto_numero(atto: Dict):
+    return atto.get('numero') or atto.get('numero_atto') or atto.get('numero_registro')
+
+
+def _contiene_atti_visti(documenti: List[Dict], high_water_mark: Optional[HighWaterMark]) -> bool:
+    if high_water_mark is None:
+        return False
+    return any(high_water_mark.is_known(_atto_data(doc), _atto_numero(doc)) for doc in documenti)
+
+
+def _firenze_api_payload(tipo_codice: str, anno: int) -> Dict:
+    return {
+        "annoAdozione": str(anno),
+        "tipiAtto": [tipo_codice],
+        "competenza": tipo_codice,
+        "notLoadIniziale": "ok"
+    }
+
+
+def _parse_firenze_albo_page(html: str, base_url: str) -> Tuple[int, List[Dict]]:
+    """
+    Parsing di una pagina dell'Albo Pretorio HTML di Firenze
+
+    Returns:
+        (totale pagine indicato dalla paginazione, documenti delle card)
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # Estrai totale pagine
+    pagination_text = soup.find(string=re.compile(r'Pagina\s+\d+\s+di\s+\d+', re.IGNORECASE))
+    total_pages = 1
+    if pagination_text:
+        match = re.search(r'Pagina\s+\d+\s+di\s+(\d+)', pagination_text, re.IGNORECASE)
+        if match:
+            total_pages = int(match.group(1))
+
+    documenti_albo = []
+
+    # Cerca card divs con atti
+    for card in soup.find_all('div', class_='card concorso-card multi-line'):
+        try:
+            text = card.get_text(separator='\n')
+            lines = [line.strip() for line in card.stripped_strings]
+
+            # Estrai dati
+            numero_registro = ''
+            numero_atto = ''
+            data_inizio = ''
+            data_fine = ''
+            oggetto = ''
+
+            # N° registro
+            match = re.search(r'N°\s*registro\s*(\d+/\d+)', text, re.IGNORECASE)
+            if match:
+                numero_registro = match.group(1)
+
+            # N° atto
+            match = re.search(r'N°\s*atto\s*(\d+/\d+)', text, re.IGNORECASE)
+            if match:
+                numero_atto = match.group(1)
+
+            # Date
+            match = re.search(r'Inizio\s+pubblicazione\s*(\d{2}/\d{2}/\d{4})', text, re.IGNORECASE)
+            if match:
+                data_inizio = match.group(1)
+
+            match = re.search(r'Fine\s+pubblicazione\s*(\d{2}/\d{2}/\d{4})', text, re.IGNORECASE)
+            if match:
+                data_fine = match.group(1)
+
+            # Oggetto (ultimo testo lungo)
+            for line in reversed(lines):
+                if len(line) > 50:
+                    oggetto = line
+                    break
+
+            # Tipo atto (prima riga)
+            tipo_atto = lines[0] if lines else 'Documento Albo'
+
+            # Link PDF
+            pdf_links = card.find_all('a', href=lambda x: x and '.pdf' in x.lower())
+            pdf_url = ''
+            if pdf_links:
+                pdf_url = urljoin(base_url, pdf_links[0].get('href', ''))
+
+            # Crea documento solo se ha numero valido
+            if numero_registro or numero_atto:
+                documenti_albo.append({
+                    'numero': numero_atto or numero_registro,
+                    'numero_registro': numero_registro,
+                    'data': data_inizio or data_fine,
+                    'data_inizio': data_inizio,
+                    'data_fine': data_fine,
+                    'oggetto': oggetto,
+                    'tipo': tipo_atto,
+                    'fonte': 'Albo Pretorio HTML',
+                    'link': pdf_url
+                })
+
+        except Exception as e:
+            logger.debug(f"    Errore parsing card: {e}")
+            continue
+
+    return total_pages, documenti_albo
+
+
+def _sesto_datatables_params(anno: int, draw: int, start: int) -> Dict[str, str]:
+    return {
+        'draw': str(draw),
+        'start': str(start),
+        'length': str(SESTO_BATCH_SIZE),
+        'search[value]': str(anno),
+        'search[regex]': 'false',
+        # Filtro colonna anno (colonna 1)
+        'columns[1][data]': '1',
+        'columns[1][searchable]': 'true',
+        'columns[1][search][value]': str(anno),
+        'columns[1][search][regex]': 'false'
+    }
+
+
+def _sesto_rows_for_year(rows, anno: int) -> List[list]:
+    """Righe DataTables dell'anno richiesto (la ricerca full-text restituisce anche altri anni)"""
+    if not isinstance(rows, list):
+        return []
+    return [row for row in rows if isinstance(row, list) and len(row) > 1 and str(row[1]) == str(anno)]
+
+
+def _parse_sesto_albo_page(html: str, base_url: str) -> List[Dict]:
+    """Parsing dell'Albo Pretorio HTML di Sesto Fiorentino (tabelle e div di atti)"""
+    soup = BeautifulSoup(html, 'html.parser')
+    documenti_albo = []
+
+    # Cerca tabelle con atti
+    for table in soup.find_all('table'):
+        rows = table.find_all('tr')
+        for row in rows[1:]:  # Skip header
+            cells = row.find_all(['td', 'th'])
+            if len(cells) >= 3:
+                try:
+                    # Estrai dati da riga tabella
+                    numero = cells[0].get_text(strip=True)
+                    data = cells[1].get_text(strip=True)
+                    oggetto = cells[2].get_text(strip=True)
+
+                    # Cerca link PDF
+                    pdf_links = row.find_all('a', href=lambda x: x and '.pdf' in x.lower())
+                    pdf_url = ''
+                    if pdf_links:
+                        pdf_url = urljoin(base_url, pdf_links[0].get('href', ''))
+
+                    if numero and oggetto:
+                        documenti_albo.append({
+                            'numero': numero,
+                            'data': data,
+                            'oggetto': oggetto,
+                            'tipo': 'Documento Albo',
+                            'fonte': 'Albo Pretorio HTML Sesto Fiorentino',
+                            'link': pdf_url
+                        })
+                except Exception:
+                    continue
+
+    # Cerca anche div con atti
+    divs_atti = soup.find_all('div', class_=lambda x: x and ('atto' in x.lower() or 'card' in x.lower() or 'pubblicazione' in x.lower()))
+    for div in divs_atti:
+        try:
+            testo = div.get_text(separator='\n')
+            lines = [line.strip() for line in div.stripped_strings]
+
+            if len(lines) >= 2:
+                numero = lines[0]
+                oggetto = lines[1]
+
+                # Cerca date nel testo
+                match_data = re.search(r'(\d{2}/\d{2}/\d{4})', testo)
+                data = match_data.group(1) if match_data else ''
+
+                # Link PDF
+                pdf_links = div.find_all('a', href=lambda x: x and '.pdf' in x.lower())
+                pdf_url = ''
+                if pdf_links:
+                    pdf_url = urljoin(base_url, pdf_links[0].get('href', ''))
+
+                if numero and oggetto:
+                    documenti_albo.append({
+                        'numero': numero,
+                        'data': data,
+                        'oggetto': oggetto,
+                        'tipo': 'Documento Albo',
+                        'fonte': 'Albo Pretorio HTML Sesto Fiorentino',
+                        'link': pdf_url
+                    })
+        except Exception:
+            continue
+
+    return documenti_albo
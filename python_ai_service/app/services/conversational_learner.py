@@ -513,25 +513,25 @@ Genera solo il JSON array, niente altro testo prima o dopo."""
         Returns:
             Best match dict with similarity score or None
         """
-        from app.services.vector_search import cosine_similarity
-        
-        best_match = None
-        best_score = 0.0
-        
-        for learned in learned_responses:
-            embedding = learned.get("embedding")
-            if not embedding or not isinstance(embedding, list) or len(embedding) == 0:
-                continue
-            
-            # Calculate cosine similarity
-            similarity = cosine_similarity(query_embedding, embedding)
-            
-            if similarity > best_score and similarity >= threshold:
-                best_score = similarity
-                best_match = {
-                    "data": learned,
-                    "similarity": similarity
-                }
+        from app.services import vector_scoring
+        
+        # Una sola matmul su tutti gli embedding appresi (embedding non validi saltati)
+        matrix, positions = vector_scoring.build_matrix(
+            learned.get("embedding") if isinstance(learned.get("embedding"), list) else None
+            for learned in learned_responses
+        )
+        if len(positions) == 0:
+            return None
+        
+        hits = vector_scoring.search(query_embedding, matrix, k=1, min_score=threshold)
+        if not hits:
+            return None
+        
+        row, similarity = hits[0]
+        best_match = {
+            "data": learned_responses[positions[row]],
+            "similarity": similarity
+        }
         
         return best_match
     
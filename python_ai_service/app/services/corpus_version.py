@@ -0,0 +1,106 @@
+"""
+Corpus Version - contatore di versione dei documenti per tenant
+
+Ogni scrittura sulla collection "documents" (MongoDBService.insert_document,
+update_document, delete_documents) incrementa la versione del tenant nella
+collection corpus_versions (o la versione globale "_all" se il tenant non è
+noto). Le cache derivate dal corpus (es. SemanticAnswerCache) confrontano la
+versione per sapere se sono ancora valide, anche tra processi diversi.
+"""
+
+import os
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from app.services.tenant_ids import normalize_tenant_id
+
+logger = logging.getLogger(__name__)
+
+# Configurazione (override da environment)
+CORPUS_VERSION_TTL_SECONDS = float(os.getenv("CORPUS_VERSION_TTL_SECONDS", "5"))
+CORPUS_VERSION_COLLECTION = "corpus_versions"
+GLOBAL_KEY = "_all"
+
+
+class CorpusVersion:
+    """Versione del corpus per tenant (classmethod singleton, letture cachate per CORPUS_VERSION_TTL_SECONDS)"""
+
+    _lock = threading.Lock()
+    _cache: Dict[Any, Tuple[str, float]] = {}
+
+    @classmethod
+    def _collection(cls):
+        from app.services.mongodb_service import MongoDBService
+
+        return MongoDBService.get_collection(CORPUS_VERSION_COLLECTION)
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls._cache.clear()
+
+    @classmethod
+    def get(cls, tenant_id: Any) -> str:
+        """
+        Versione corrente del corpus del tenant ("<tenant>.<globale>")
+
+        Dopo una bump() nello stesso processo il valore è aggiornato subito;
+        le bump di altri processi sono viste entro CORPUS_VERSION_TTL_SECONDS.
+        """
+        tenant_id = normalize_tenant_id(tenant_id)
+        with cls._lock:
+            cached = cls._cache.get(tenant_id)
+        if cached is not None and time.monotonic() - cached[1] < CORPUS_VERSION_TTL_SECONDS:
+            return cached[0]
+
+        versions = {}
+        try:
+            collection = cls._collection()
+            if collection is not None:
+                for doc in collection.find({"_id": {"$in": [tenant_id, GLOBAL_KEY]}}):
+                    versions[doc["_id"]] = doc.get("version", 0)
+        except Exception as e:
+            logger.debug(f"Corpus version read failed for tenant {tenant_id}: {e}")
+
+        version = f"{versions.get(tenant_id, 0)}.{versions.get(GLOBAL_KEY, 0)}"
+        with cls._lock:
+            cls._cache[tenant_id] = (version, time.monotonic())
+        return version
+
+    @classmethod
+    async def aget(cls, tenant_id: Any) -> str:
+        """get() senza bloccare l'event loop"""
+        from app.services.mongodb_async import AsyncMongoDBService
+
+        return await AsyncMongoDBService.run(cls.get, tenant_id)
+
+    @classmethod
+    def bump(cls, tenant_id: Optional[Any] = None):
+        """Segnala che i documenti del tenant (o di tenant non noti, se None) sono cambiati"""
+        key = normalize_tenant_id(tenant_id) if tenant_id is not None else GLOBAL_KEY
+        try:
+            collection = cls._collection()
+            if collection is not None:
+                collection.update_one(
+                    {"_id": key},
+                    {"$inc": {"version": 1}, "$set": {"updated_at": datetime.utcnow()}},
+                    upsert=True
+                )
+        except Exception as e:
+            # Mai bloccare la scrittura del documento per la versione
+            logger.warning(f"⚠️ Corpus version bump failed for {key}: {e}")
+        # Dopo la scrittura: la prossima get() rilegge il valore aggiornato
+        with cls._lock:
+            if key == GLOBAL_KEY:
+                cls._cache.clear()
+            else:
+                cls._cache.pop(key, None)
+
+    @classmethod
+    def bump_for_filter(cls, filter: Dict[str, Any]):
+        """bump() del tenant indicato nel filtro, globale se il filtro non lo specifica"""
+        tenant_id = filter.get("tenant_id") if isinstance(filter, dict) else None
+        cls.bump(tenant_id if isinstance(tenant_id, (int, str)) else None)
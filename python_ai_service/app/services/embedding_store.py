@@ -0,0 +1,516 @@
+"""
+Embedding Store - Matrice di embedding persistente e memory-mapped per tenant
+
+Per ogni tenant su disco:
+- embeddings.f32: righe float32 pre-normalizzate, append-only (letta con np.memmap)
+- table.json: tabella id/offset (riga -> _id MongoDB, versione documento, riga attiva)
+- table.log: righe aggiunte/invalidate dopo l'ultima scrittura di table.json (JSON lines,
+  append-only), riassorbite in table.json quando crescono o alla compattazione
+- store.lock: lock esclusivo (flock) delle scritture, condiviso da worker API e script
+  di import che scrivono lo stesso store
+
+Lo scoring avviene sulla matrice mappata (zero-copy, nessuna decodifica BSON);
+da MongoDB si recupera solo il testo dei documenti vincenti, per _id.
+Un documento aggiornato (versione diversa) invalida la sua riga e ne appende una nuova;
+quando le righe invalidate superano la soglia la matrice viene compattata. Un upsert
+scrive solo i byte del vettore e una riga di log: il costo non cresce con lo store.
+"""
+
+import os
+import re
+import json
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: solo lock tra thread dello stesso processo
+    fcntl = None
+
+from app.services.vector_scoring import normalize_rows, top_k
+
+logger = logging.getLogger(__name__)
+
+# Configurazione (override da environment)
+EMBEDDING_STORE_DIR = os.getenv(
+    "EMBEDDING_STORE_DIR",
+    str(Path(__file__).parent.parent.parent / "storage" / "embeddings")
+)
+EMBEDDING_STORE_COMPACT_RATIO = float(os.getenv("EMBEDDING_STORE_COMPACT_RATIO", "0.3"))
+EMBEDDING_STORE_LOG_MIN_ENTRIES = int(os.getenv("EMBEDDING_STORE_LOG_MIN_ENTRIES", "1000"))
+
+MATRIX_FILENAME = "embeddings.f32"
+TABLE_FILENAME = "table.json"
+LOG_FILENAME = "table.log"
+LOCK_FILENAME = "store.lock"
+
+
+def document_version(value: Any) -> str:
+    """
+    Versione di un documento (updated_at) in forma confrontabile
+
+    MongoDB salva i datetime al millisecondo: la versione scritta dall'importer
+    e quella riletta dal DB devono coincidere.
+    """
+    if isinstance(value, dict):
+        value = value.get("updated_at") or value.get("created_at")
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None).isoformat(timespec="milliseconds")
+    return str(value) if value is not None else ""
+
+
+class TenantEmbeddingStore:
+    """
+    Store di un singolo tenant: matrice mmap + tabella id/offset
+    """
+
+    def __init__(self, tenant_id: Any, directory: Path):
+        self.tenant_id = tenant_id
+        self.directory = Path(directory)
+        self.matrix_path = self.directory / MATRIX_FILENAME
+        self.table_path = self.directory / TABLE_FILENAME
+        self.log_path = self.directory / LOG_FILENAME
+        self.lock_path = self.directory / LOCK_FILENAME
+
+        self.dimensions: Optional[int] = None
+        self.ids: List[str] = []
+        self.versions: List[str] = []
+        self._alive = np.zeros(0, dtype=bool)  # capacità >= righe, cresce per raddoppio
+        self.row_by_id: Dict[str, int] = {}
+        self.matrix = np.empty((0, 0), dtype=np.float32)
+        # Versione del corpus (CorpusVersion) con cui lo store è stato allineato a MongoDB in questo processo
+        self.synced_version: Optional[str] = None
+
+        self._table_mtime: Optional[int] = None
+        self._log_size = 0
+        self._log_entries = 0
+        self._lock = threading.RLock()
+        self._exclusive_depth = 0
+        self.load()
+
+    @contextmanager
+    def _exclusive(self):
+        """
+        Lock delle scritture tra thread e processi (flock su store.lock, rientrante)
+
+        refresh → append dei vettori → log/tabella devono essere atomici rispetto agli
+        altri processi: altrimenti _truncate_orphan_bytes di un processo taglia righe
+        appena appese da un altro e non ancora registrate nel log.
+        """
+        with self._lock:
+            if self._exclusive_depth or fcntl is None:
+                self._exclusive_depth += 1
+                try:
+                    yield
+                finally:
+                    self._exclusive_depth -= 1
+                return
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with open(self.lock_path, "a+b") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                self._exclusive_depth += 1
+                try:
+                    yield
+                finally:
+                    self._exclusive_depth -= 1
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @property
+    def alive(self) -> np.ndarray:
+        """Flag riga attiva (una per riga della matrice)"""
+        return self._alive[:len(self.ids)]
+
+    @alive.setter
+    def alive(self, value: np.ndarray):
+        self._alive = np.array(value, dtype=bool)
+
+    @property
+    def size(self) -> int:
+        """Numero di documenti attivi"""
+        return len(self.row_by_id)
+
+    @property
+    def row_count(self) -> int:
+        """Righe nella matrice (incluse quelle invalidate)"""
+        return len(self.ids)
+
+    def load(self):
+        """Carica tabella e mappa la matrice (no-op se lo store non esiste ancora)"""
+        with self._lock:
+            if not self.table_path.exists():
+                self._reset()
+                return
+
+            with open(self.table_path, "r", encoding="utf-8") as f:
+                table = json.load(f)
+
+            self.dimensions = table.get("dimensions")
+            rows = table.get("rows", [])
+            self.ids = [row[0] for row in rows]
+            self.versions = [row[1] for row in rows]
+            self.alive = np.array([bool(row[2]) for row in rows], dtype=bool)
+            self.row_by_id = {doc_id: i for i, doc_id in enumerate(self.ids) if self.alive[i]}
+            self._table_mtime = self.table_path.stat().st_mtime_ns
+            self._replay_log()
+            self._map_matrix()
+
+    def _replay_log(self):
+        """Applica le righe di table.log successive a table.json (riga finale incompleta ignorata)"""
+        self._log_size = 0
+        self._log_entries = 0
+        if not self.log_path.exists():
+            return
+        with open(self.log_path, "rb") as f:
+            data = f.read()
+        lines = data.split(b"\n")
+        for line in lines[:-1]:
+            if line:
+                self._apply_entry(json.loads(line))
+        self._log_size = len(data)
+        self._log_entries = len(lines) - 1
+
+    def _apply_entry(self, entry: List[Any]):
+        """
+        Applica una voce di log (idempotente: le voci già in table.json vengono saltate)
+
+        ["+", riga, doc_id, versione]: nuova riga (invalida la precedente del documento)
+        ["-", riga]: riga invalidata
+        """
+        if entry[0] == "+":
+            row, doc_id, version = entry[1], entry[2], entry[3]
+            if row != len(self.ids):
+                return
+            previous = self.row_by_id.get(doc_id)
+            if previous is not None:
+                self._alive[previous] = False
+            if row >= len(self._alive):
+                grown = np.zeros(max(64, 2 * len(self._alive), row + 1), dtype=bool)
+                grown[:len(self._alive)] = self._alive
+                self._alive = grown
+            self.ids.append(doc_id)
+            self.versions.append(version)
+            self._alive[row] = True
+            self.row_by_id[doc_id] = row
+        elif entry[0] == "-":
+            row = entry[1]
+            if row < len(self.ids) and self._alive[row]:
+                self._alive[row] = False
+                if self.row_by_id.get(self.ids[row]) == row:
+                    del self.row_by_id[self.ids[row]]
+
+    def _append_log(self, entries: List[List[Any]]):
+        """Registra le voci in table.log (table.json riscritta se il log è troppo lungo)"""
+        if self._table_mtime is None or self._log_entries + len(entries) > max(EMBEDDING_STORE_LOG_MIN_ENTRIES, self.row_count):
+            self._save_table()
+            return
+        with open(self.log_path, "ab") as f:
+            f.write(b"".join(json.dumps(entry).encode("utf-8") + b"\n" for entry in entries))
+            self._log_size = f.tell()
+        self._log_entries += len(entries)
+
+    def refresh(self):
+        """Ricarica se tabella o log sono cambiati (es. import da un altro processo)"""
+        try:
+            mtime = self.table_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        try:
+            log_size = self.log_path.stat().st_size
+        except FileNotFoundError:
+            log_size = 0
+        if mtime != self._table_mtime or log_size != self._log_size:
+            self.load()
+
+    def _reset(self):
+        self.dimensions = None
+        self.ids = []
+        self.versions = []
+        self.alive = np.zeros(0, dtype=bool)
+        self.row_by_id = {}
+        self.matrix = np.empty((0, 0), dtype=np.float32)
+        self._table_mtime = None
+
+    def _map_matrix(self):
+        """Mappa in sola lettura le righe registrate nella tabella"""
+        rows = len(self.ids)
+        if rows == 0 or not self.dimensions or not self.matrix_path.exists():
+            self.matrix = np.empty((0, self.dimensions or 0), dtype=np.float32)
+            return
+        self.matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="r", shape=(rows, self.dimensions))
+
+    def _save_table(self):
+        """Scrittura atomica della tabella (tmp + rename)"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        table = {
+            "tenant_id": str(self.tenant_id),
+            "dimensions": self.dimensions,
+            "rows": [
+                [doc_id, version, bool(alive)]
+                for doc_id, version, alive in zip(self.ids, self.versions, self.alive)
+            ]
+        }
+        tmp_path = self.table_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(table, f)
+        os.replace(tmp_path, self.table_path)
+        # Il log è ora incluso nella tabella (se resta per un crash, le sue voci sono idempotenti)
+        self.log_path.unlink(missing_ok=True)
+        self._log_size = 0
+        self._log_entries = 0
+        self._table_mtime = self.table_path.stat().st_mtime_ns
+
+    def get_version(self, doc_id: Any) -> Optional[str]:
+        row = self.row_by_id.get(str(doc_id))
+        return self.versions[row] if row is not None else None
+
+    def upsert(self, doc_id: Any, embedding: List[float], version: Any = None) -> bool:
+        """
+        Aggiunge o aggiorna l'embedding di un documento
+
+        Returns:
+            True se lo store è stato modificato, False se la versione era già presente
+        """
+        return self.upsert_many([(doc_id, embedding, version)]) > 0
+
+    def upsert_many(self, records: Iterable[Tuple[Any, List[float], Any]]) -> int:
+        """
+        Aggiunge o aggiorna gli embedding di più documenti: un solo append alla matrice,
+        una scrittura del log e un remap per l'intero batch
+
+        Args:
+            records: Tuple (doc_id, embedding, version)
+
+        Returns:
+            Numero di documenti scritti (esclusi quelli con versione già presente)
+        """
+        with self._exclusive():
+            self.refresh()
+            batch: Dict[str, Tuple[str, np.ndarray]] = {}
+            for doc_id, embedding, version in records:
+                if not embedding:
+                    continue
+                doc_id = str(doc_id)
+                version = document_version(version)
+                row = self.row_by_id.get(doc_id)
+                if doc_id not in batch and row is not None and self.versions[row] == version:
+                    continue
+
+                vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+                if self.dimensions is None or (self.size == 0 and not batch):
+                    if self.dimensions != vector.shape[0] and self.row_count:
+                        # Cambio modello di embedding: lo store riparte da zero
+                        self.rebuild([])
+                    self.dimensions = vector.shape[0]
+                elif vector.shape[0] != self.dimensions:
+                    logger.warning(
+                        f"⚠️ EmbeddingStore tenant {self.tenant_id}: dimensione {vector.shape[0]} "
+                        f"diversa da {self.dimensions}, documento {doc_id} ignorato"
+                    )
+                    continue
+                batch[doc_id] = (version, vector)
+
+            if not batch:
+                return 0
+
+            doc_ids = list(batch)
+            vectors = normalize_rows(np.stack([batch[doc_id][1] for doc_id in doc_ids]))
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._truncate_orphan_bytes()
+            with open(self.matrix_path, "ab") as f:
+                f.write(vectors.tobytes())
+
+            # Vettori su disco prima delle voci che li registrano
+            first_row = len(self.ids)
+            entries = [["+", first_row + offset, doc_id, batch[doc_id][0]] for offset, doc_id in enumerate(doc_ids)]
+            for entry in entries:
+                self._apply_entry(entry)
+            self._append_log(entries)
+            self._map_matrix()
+
+            if self.row_count and (self.row_count - self.size) / self.row_count > EMBEDDING_STORE_COMPACT_RATIO:
+                self.compact()
+            return len(doc_ids)
+
+    def _truncate_orphan_bytes(self):
+        """Scarta righe scritte ma mai registrate in tabella (append interrotto)"""
+        if not self.matrix_path.exists():
+            return
+        expected = self.row_count * (self.dimensions or 0) * 4
+        if self.matrix_path.stat().st_size != expected:
+            with open(self.matrix_path, "r+b") as f:
+                f.truncate(expected)
+
+    def remove(self, doc_id: Any) -> bool:
+        """Invalida la riga di un documento (es. documento eliminato)"""
+        return self.remove_many([doc_id]) > 0
+
+    def remove_many(self, doc_ids: Iterable[Any]) -> int:
+        """Invalida le righe di più documenti con una sola scrittura del log"""
+        with self._exclusive():
+            self.refresh()
+            entries = []
+            for doc_id in doc_ids:
+                row = self.row_by_id.get(str(doc_id))
+                if row is not None:
+                    entries.append(["-", row])
+                    self._apply_entry(entries[-1])
+            if entries:
+                self._append_log(entries)
+            return len(entries)
+
+    def rebuild(self, records: Iterable[Tuple[Any, List[float], Any]]):
+        """
+        Riscrive lo store da zero
+
+        Args:
+            records: Tuple (doc_id, embedding, version)
+        """
+        with self._exclusive():
+            ids: List[str] = []
+            versions: List[str] = []
+            vectors: List[List[float]] = []
+            dimensions: Optional[int] = None
+            for doc_id, embedding, version in records:
+                if not embedding:
+                    continue
+                if dimensions is None:
+                    dimensions = len(embedding)
+                if len(embedding) != dimensions:
+                    continue
+                ids.append(str(doc_id))
+                versions.append(document_version(version))
+                vectors.append(embedding)
+
+            self._write(ids, versions, normalize_rows(np.asarray(vectors, dtype=np.float32)) if vectors else None, dimensions)
+
+    def compact(self):
+        """Riscrive la matrice con le sole righe attive"""
+        with self._exclusive():
+            self.refresh()
+            keep = np.flatnonzero(self.alive)
+            vectors = np.array(self.matrix[keep]) if len(keep) else None
+            self._write(
+                [self.ids[i] for i in keep],
+                [self.versions[i] for i in keep],
+                vectors,
+                self.dimensions
+            )
+            logger.info(f"🗜️ EmbeddingStore tenant {self.tenant_id} compattato: {len(keep)} righe attive")
+
+    def _write(self, ids: List[str], versions: List[str], vectors: Optional[np.ndarray], dimensions: Optional[int]):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Rilascia la mappa corrente prima di sostituire il file
+        self.matrix = np.empty((0, dimensions or 0), dtype=np.float32)
+        tmp_path = self.matrix_path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            if vectors is not None:
+                f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        os.replace(tmp_path, self.matrix_path)
+
+        self.dimensions = dimensions
+        self.ids = ids
+        self.versions = versions
+        self.alive = np.ones(len(ids), dtype=bool)
+        self.row_by_id = {doc_id: i for i, doc_id in enumerate(ids)}
+        self._save_table()
+        self._map_matrix()
+
+    def search(
+        self,
+        query_embedding: List[float],
+        k: int,
+        min_score: Optional[float] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        Top-k documenti per similarità coseno
+
+        Returns:
+            Lista di (doc_id, score) ordinata per score decrescente
+        """
+        with self._lock:
+            self.refresh()
+            matrix, alive, ids = self.matrix, self.alive, self.ids
+
+        if not alive.any() or len(query_embedding) != matrix.shape[1]:
+            return []
+
+        scores = matrix @ normalize_rows(np.asarray(query_embedding, dtype=np.float32))[0]
+        scores[~alive[:len(scores)]] = -np.inf
+        indices, selected = top_k(scores, k, min_score)
+        return [(ids[i], float(s)) for i, s in zip(indices, selected) if np.isfinite(s)]
+
+
+class EmbeddingStore:
+    """Registry process-wide degli store per tenant (singleton)"""
+
+    _stores: Dict[str, TenantEmbeddingStore] = {}
+    _lock = threading.Lock()
+    base_dir = Path(EMBEDDING_STORE_DIR)
+
+    @staticmethod
+    def _key(tenant_id: Any) -> str:
+        """I tenant possono arrivare come int o str: stessa chiave"""
+        return re.sub(r"[^\w\-]", "_", str(tenant_id))
+
+    @classmethod
+    def get(cls, tenant_id: Any) -> TenantEmbeddingStore:
+        """Get (o apri) lo store del tenant"""
+        key = cls._key(tenant_id)
+        store = cls._stores.get(key)
+        if store is None:
+            with cls._lock:
+                store = cls._stores.get(key)
+                if store is None:
+                    store = TenantEmbeddingStore(tenant_id, cls.base_dir / f"tenant_{key}")
+                    cls._stores[key] = store
+        return store
+
+    @classmethod
+    def load_all(cls) -> int:
+        """
+        Mappa in memoria tutti gli store presenti su disco (avvio del servizio)
+
+        Returns:
+            Numero di store caricati
+        """
+        if not cls.base_dir.exists():
+            return 0
+        loaded = 0
+        for directory in sorted(cls.base_dir.glob("tenant_*")):
+            if (directory / TABLE_FILENAME).exists():
+                store = cls.get(directory.name[len("tenant_"):])
+                loaded += 1
+                logger.info(f"🗂️ EmbeddingStore tenant {store.tenant_id}: {store.size} embedding mappati")
+        return loaded
+
+    @classmethod
+    def upsert(cls, tenant_id: Any, doc_id: Any, embedding: List[float], version: Any = None) -> bool:
+        """Aggiorna lo store del tenant; errori di I/O non bloccano l'import"""
+        try:
+            return cls.get(tenant_id).upsert(doc_id, embedding, version)
+        except OSError as e:
+            logger.warning(f"⚠️ EmbeddingStore upsert fallito per tenant {tenant_id}: {e}")
+            return False
+
+    @classmethod
+    def upsert_many(cls, tenant_id: Any, records: Iterable[Tuple[Any, List[float], Any]]) -> int:
+        """upsert() di un batch di documenti (es. un batch del bulk importer)"""
+        try:
+            return cls.get(tenant_id).upsert_many(records)
+        except OSError as e:
+            logger.warning(f"⚠️ EmbeddingStore upsert fallito per tenant {tenant_id}: {e}")
+            return 0
+
+    @classmethod
+    def reset(cls, base_dir: Optional[Path] = None):
+        """Chiude tutti gli store (e cambia directory base, usato nei test)"""
+        with cls._lock:
+            cls._stores.clear()
+            if base_dir is not None:
+                cls.base_dir = Path(base_dir)
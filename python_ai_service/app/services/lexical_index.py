@@ -0,0 +1,355 @@
+"""
+Lexical Index - Indice BM25 in-process per tenant
+Indice invertito su titolo, protocol_number e testo dei chunk, con tokenizzazione
+italiana (accenti, stopword, stemming leggero) e token di protocollo ("123/2025").
+
+Sostituisce la gamba keyword del retriever basata su $text di MongoDB (indice spesso
+assente): le query con numero di protocollo o termini esatti trovano i documenti
+senza round trip aggiuntivi. Per ogni documento restano in memoria solo le frequenze
+dei termini e un estratto (titolo, protocollo, inizio del testo) usato come evidenza.
+
+L'indice viene costruito in modo lazy alla prima query del tenant, aggiornato
+documento per documento dagli importer e ricostruito alla scadenza del TTL
+(scritture da altri processi).
+"""
+
+import heapq
+import math
+import os
+import re
+import time
+import logging
+import threading
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.services.embedding_store import document_version
+from app.services.mongodb_service import MongoDBService
+from app.services.tenant_ids import normalize_tenant_id
+
+logger = logging.getLogger(__name__)
+
+# Configurazione (override da environment)
+LEXICAL_INDEX_ENABLED = os.getenv("LEXICAL_INDEX_ENABLED", "true").lower() == "true"
+LEXICAL_INDEX_TTL_SECONDS = int(os.getenv("LEXICAL_INDEX_TTL_SECONDS", "3600"))
+LEXICAL_INDEX_SNIPPET_CHARS = int(os.getenv("LEXICAL_INDEX_SNIPPET_CHARS", "2000"))
+LEXICAL_BM25_K1 = float(os.getenv("LEXICAL_BM25_K1", "1.2"))
+LEXICAL_BM25_B = float(os.getenv("LEXICAL_BM25_B", "0.75"))
+LEXICAL_TITLE_WEIGHT = float(os.getenv("LEXICAL_TITLE_WEIGHT", "3"))
+LEXICAL_PROTOCOL_WEIGHT = float(os.getenv("LEXICAL_PROTOCOL_WEIGHT", "5"))
+# Score BM25 grezzo minimo per un hit lessicale con score vettoriale sotto soglia (non
+# normalizzato: un singolo termine comune in comune con la domanda resta sotto soglia)
+LEXICAL_MIN_BM25_SCORE = float(os.getenv("LEXICAL_MIN_BM25_SCORE", "4"))
+
+# Token alfanumerici, anche composti da / - . (es. "123/2025", "d.lgs", "socio-sanitario")
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[/\-.][a-z0-9]+)*")
+_COMPOUND_SEPARATORS = re.compile(r"[/\-.]")
+
+ITALIAN_STOPWORDS = frozenset("""
+a ad al alla alle allo agli ai anche che chi ci col come con cui da dal dalla dalle dallo dagli dai
+degli dei del della delle dello di e ed gli i il in la le lo ma mi ne negli nei nel nella nelle nello
+non o per piu quale quali quando quanto quella quelle quello questa queste questo se sia sono su sul
+sulla sulle sullo sugli sui tra fra un una uno ha hanno essere stato stata stati state era sua suo
+sue suoi loro cosa dove perche tutti tutte tutto ogni molto n nr num
+""".split())
+
+
+def _strip_accents(text: str) -> str:
+    normalized = unicodedata.normalize("NFKD", text)
+    return "".join(char for char in normalized if not unicodedata.combining(char))
+
+
+def stem_italian(token: str) -> str:
+    """
+    Stemming leggero (flessione nominale): singolare/plurale e maschile/femminile
+    hanno la stessa radice ("delibera"/"delibere" -> "deliber", "pubblico"/"pubbliche" -> "pubblic")
+    """
+    if len(token) <= 4 or not token.isalpha():
+        return token
+    if token.endswith(("che", "chi", "ghe", "ghi")):
+        return token[:-2]
+    if token.endswith(("ia", "ie", "io", "ii")):
+        return token[:-2]
+    if token[-1] in "aeiou":
+        return token[:-1]
+    return token
+
+
+def _normalize_number(part: str) -> str:
+    return (part.lstrip("0") or "0") if part.isdigit() else part
+
+
+def tokenize(text: Any) -> List[str]:
+    """
+    Termini indicizzabili di un testo (stessa funzione per documenti e query)
+
+    I token composti con cifre (protocolli, date, riferimenti normativi) restano
+    anche interi, senza zeri iniziali: "n. 00123/2025" -> ["123/2025", "123", "2025"].
+    """
+    if not text:
+        return []
+    terms: List[str] = []
+    for match in _TOKEN_PATTERN.finditer(_strip_accents(str(text)).lower()):
+        token = match.group(0)
+        parts = _COMPOUND_SEPARATORS.split(token)
+        if len(parts) > 1 and any(part.isdigit() for part in parts):
+            terms.append("/".join(_normalize_number(part) for part in parts))
+        for part in parts:
+            if part in ITALIAN_STOPWORDS or (len(part) == 1 and not part.isdigit()):
+                continue
+            terms.append(_normalize_number(part) if part.isdigit() else stem_italian(part))
+    return terms
+
+
+def _chunk_texts(document: Dict[str, Any]) -> List[str]:
+    content = document.get("content")
+    if isinstance(content, str):
+        return [content]
+    if not isinstance(content, dict):
+        return []
+    chunks = content.get("chunks") or []
+    texts = [chunk.get("chunk_text", "") for chunk in chunks if isinstance(chunk, dict) and chunk.get("chunk_text")]
+    if not texts:
+        text = content.get("full_text") or content.get("raw_text")
+        texts = [text] if text else []
+    return texts
+
+
+class TenantLexicalIndex:
+    """
+    Indice invertito BM25 di un singolo tenant
+
+    Ogni riga è un documento MongoDB; le righe di documenti aggiornati o rimossi
+    vengono svuotate (le posting list non le contengono più) e recuperate alla
+    ricostruzione successiva.
+    """
+
+    # Campi letti da MongoDB per costruire l'indice
+    SOURCE_FIELDS = (
+        "document_id", "title", "protocol_number", "protocol_date", "metadata",
+        "content.chunks.chunk_text", "content.raw_text", "updated_at", "created_at"
+    )
+
+    def __init__(self, tenant_id: Any):
+        self.tenant_id = tenant_id
+        self.postings: Dict[str, Dict[int, float]] = {}
+        self.doc_terms: List[Optional[Dict[str, float]]] = []
+        self.doc_lengths: List[float] = []
+        self.payloads: List[Optional[Dict[str, Any]]] = []
+        self.ids: List[str] = []
+        self.versions: List[str] = []
+        self.row_by_id: Dict[str, int] = {}
+        self.total_length = 0.0
+        self.built_at = time.time()
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_documents(cls, tenant_id: Any, documents: Iterable[Dict[str, Any]]) -> "TenantLexicalIndex":
+        index = cls(tenant_id)
+        for doc in documents:
+            index.upsert(doc.get("_id"), doc)
+        index.built_at = time.time()
+        return index
+
+    @property
+    def size(self) -> int:
+        """Numero di documenti indicizzati"""
+        return len(self.row_by_id)
+
+    def is_expired(self, ttl_seconds: int = LEXICAL_INDEX_TTL_SECONDS) -> bool:
+        return (time.time() - self.built_at) > ttl_seconds
+
+    @staticmethod
+    def term_frequencies(document: Dict[str, Any]) -> Counter:
+        """Frequenze pesate: i termini di titolo e protocollo contano più del testo"""
+        frequencies: Counter = Counter()
+        for term in tokenize(document.get("title")):
+            frequencies[term] += LEXICAL_TITLE_WEIGHT
+        for term in tokenize(document.get("protocol_number")):
+            frequencies[term] += LEXICAL_PROTOCOL_WEIGHT
+        for text in _chunk_texts(document):
+            frequencies.update(tokenize(text))
+        return frequencies
+
+    @staticmethod
+    def build_payload(doc_id: Any, document: Dict[str, Any]) -> Dict[str, Any]:
+        """Campi dell'evidenza restituita per un hit lessicale (nessuna idratazione)"""
+        snippet = "\n\n".join(_chunk_texts(document))[:LEXICAL_INDEX_SNIPPET_CHARS]
+        return {
+            "_id": document.get("_id") or doc_id,
+            "document_id": document.get("document_id") or str(doc_id),
+            "title": document.get("title", "Documento senza titolo"),
+            "protocol_number": document.get("protocol_number", ""),
+            "protocol_date": document.get("protocol_date", ""),
+            "content": snippet,
+            "source": document.get("title", "Documento"),
+            "metadata": document.get("metadata", {}),
+        }
+
+    def upsert(self, doc_id: Any, document: Dict[str, Any]) -> bool:
+        """
+        Aggiunge o aggiorna un documento
+
+        Returns:
+            True se l'indice è stato modificato, False se la versione era già presente
+        """
+        if doc_id is None:
+            return False
+        payload = self.build_payload(doc_id, document)
+        doc_id = str(doc_id)
+        version = document_version(document)
+        frequencies = self.term_frequencies(document)
+
+        with self._lock:
+            row = self.row_by_id.get(doc_id)
+            if row is not None:
+                if self.versions[row] == version and version:
+                    return False
+                self._remove_row(row)
+
+            row = len(self.payloads)
+            terms = dict(frequencies)
+            length = float(sum(terms.values()))
+            for term, frequency in terms.items():
+                self.postings.setdefault(term, {})[row] = frequency
+            self.doc_terms.append(terms)
+            self.doc_lengths.append(length)
+            self.payloads.append(payload)
+            self.ids.append(doc_id)
+            self.versions.append(version)
+            self.row_by_id[doc_id] = row
+            self.total_length += length
+            return True
+
+    def remove(self, doc_id: Any) -> bool:
+        """Rimuove un documento (es. eliminato da MongoDB)"""
+        with self._lock:
+            row = self.row_by_id.get(str(doc_id))
+            if row is None:
+                return False
+            self._remove_row(row)
+            return True
+
+    def _remove_row(self, row: int):
+        terms = self.doc_terms[row] or {}
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(row, None)
+                if not posting:
+                    del self.postings[term]
+        self.total_length -= self.doc_lengths[row]
+        self.doc_terms[row] = None
+        self.doc_lengths[row] = 0.0
+        self.payloads[row] = None
+        self.row_by_id.pop(self.ids[row], None)
+
+    def search(self, query: str, k: int) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        Top-k documenti per score BM25
+
+        Returns:
+            Lista di (payload, score) ordinata per score decrescente
+        """
+        terms = set(tokenize(query))
+        if not terms or k <= 0:
+            return []
+
+        with self._lock:
+            count = self.size
+            if count == 0:
+                return []
+            average_length = (self.total_length / count) or 1.0
+            scores: Dict[int, float] = {}
+            for term in terms:
+                posting = self.postings.get(term)
+                if not posting:
+                    continue
+                frequency_df = len(posting)
+                idf = math.log(1.0 + (count - frequency_df + 0.5) / (frequency_df + 0.5))
+                for row, frequency in posting.items():
+                    norm = LEXICAL_BM25_K1 * (1.0 - LEXICAL_BM25_B + LEXICAL_BM25_B * self.doc_lengths[row] / average_length)
+                    scores[row] = scores.get(row, 0.0) + idf * frequency * (LEXICAL_BM25_K1 + 1.0) / (frequency + norm)
+
+            best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+            return [(dict(self.payloads[row]), score) for row, score in best]
+
+
+class LexicalIndexRegistry:
+    """Registry process-wide degli indici lessicali per tenant (singleton, build lazy)"""
+
+    _indexes: Dict[Any, TenantLexicalIndex] = {}
+    _lock = threading.Lock()
+    _build_locks: Dict[Any, threading.Lock] = {}
+
+    @classmethod
+    def _load_documents(cls, tenant_id: Any) -> Iterator[Dict[str, Any]]:
+        """Stream dei campi testuali dei documenti del tenant (niente embedding)"""
+        collection = MongoDBService.get_collection("documents")
+        if collection is None:
+            return
+        projection = {"_id": 1, **{field: 1 for field in TenantLexicalIndex.SOURCE_FIELDS}}
+        yield from collection.find({"tenant_id": tenant_id}, projection).batch_size(500)
+
+    @classmethod
+    def get_index(cls, tenant_id: Any) -> TenantLexicalIndex:
+        """
+        Get or build the tenant index (rebuilt when expired or invalidated)
+
+        Senza MongoDB restituisce un indice vuoto, non memorizzato.
+        """
+        tenant_id = normalize_tenant_id(tenant_id)
+        index = cls._indexes.get(tenant_id)
+        if index is not None and not index.is_expired():
+            return index
+
+        if not MongoDBService.is_connected():
+            return TenantLexicalIndex(tenant_id)
+
+        with cls._lock:
+            build_lock = cls._build_locks.setdefault(tenant_id, threading.Lock())
+
+        # Una sola build per tenant alla volta: le richieste concorrenti attendono
+        with build_lock:
+            index = cls._indexes.get(tenant_id)
+            if index is not None and not index.is_expired():
+                return index
+
+            start = time.time()
+            index = TenantLexicalIndex.from_documents(tenant_id, cls._load_documents(tenant_id))
+            cls._indexes[tenant_id] = index
+            logger.info(
+                f"🔤 Lexical index built for tenant {tenant_id}: {index.size} documents, "
+                f"{len(index.postings)} terms in {int((time.time() - start) * 1000)}ms"
+            )
+            return index
+
+    @classmethod
+    def upsert(cls, tenant_id: Any, doc_id: Any, document: Dict[str, Any]) -> bool:
+        """
+        Aggiornamento incrementale dall'import (no-op se l'indice del tenant non è
+        ancora costruito: la prima query lo leggerà da MongoDB)
+        """
+        index = cls._indexes.get(normalize_tenant_id(tenant_id))
+        if index is None:
+            return False
+        try:
+            return index.upsert(doc_id, document)
+        except Exception as e:
+            logger.warning(f"⚠️ Lexical index upsert fallito per tenant {tenant_id}: {e}")
+            return False
+
+    @classmethod
+    def remove(cls, tenant_id: Any, doc_id: Any) -> bool:
+        index = cls._indexes.get(normalize_tenant_id(tenant_id))
+        return index.remove(doc_id) if index is not None else False
+
+    @classmethod
+    def invalidate(cls, tenant_id: Optional[Any] = None):
+        """Invalida l'indice di un tenant (o tutti se tenant_id è None)"""
+        with cls._lock:
+            if tenant_id is None:
+                cls._indexes.clear()
+                return
+            cls._indexes.pop(normalize_tenant_id(tenant_id), None)
@@ -0,0 +1,237 @@
+"""
+Async MongoDB access layer - wrapper non bloccante di MongoDBService
+
+pymongo è sincrono: chiamarlo da un endpoint async blocca l'event loop e
+serializza le chat concorrenti. Questo layer esegue ogni chiamata su un
+thread pool limitato, con la stessa API di MongoDBService (ma awaitable),
+timeout per chiamata e metriche del pool.
+"""
+
+import os
+import time
+import asyncio
+import contextvars
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from app.services.mongodb_service import MongoDBService
+
+logger = logging.getLogger(__name__)
+
+# Configurazione (override da environment)
+MONGODB_ASYNC_POOL_SIZE = int(os.getenv("MONGODB_ASYNC_POOL_SIZE", "16"))
+MONGODB_ASYNC_TIMEOUT_SECONDS = float(os.getenv("MONGODB_ASYNC_TIMEOUT_SECONDS", "30"))
+MONGODB_ASYNC_BULK_TIMEOUT_SECONDS = float(os.getenv("MONGODB_ASYNC_BULK_TIMEOUT_SECONDS", "300"))
+
+
+class MongoDBTimeoutError(TimeoutError):
+    """Chiamata MongoDB oltre il timeout (il thread del pool termina comunque la query)"""
+
+
+class AsyncMongoDBService:
+    """Async MongoDB service (bounded thread pool, classmethod singleton)"""
+
+    _executor: Optional[ThreadPoolExecutor] = None
+    _lock = threading.Lock()
+    _pool_size = MONGODB_ASYNC_POOL_SIZE
+
+    _metrics: Dict[str, float] = {
+        "submitted": 0,
+        "completed": 0,
+        "failed": 0,
+        "timeouts": 0,
+        "in_flight": 0,
+        "peak_in_flight": 0,
+        "total_wait_ms": 0.0,
+        "total_run_ms": 0.0,
+    }
+
+    @classmethod
+    def get_executor(cls) -> ThreadPoolExecutor:
+        """Get or create the bounded thread pool"""
+        if cls._executor is None:
+            with cls._lock:
+                if cls._executor is None:
+                    cls._executor = ThreadPoolExecutor(
+                        max_workers=cls._pool_size,
+                        thread_name_prefix="mongodb-async"
+                    )
+                    logger.info(f"🧵 MongoDB async pool started ({cls._pool_size} workers)")
+        return cls._executor
+
+    @classmethod
+    def configure(cls, pool_size: Optional[int] = None):
+        """Cambia la dimensione del pool (ricreato alla prossima chiamata)"""
+        cls.shutdown(wait=False)
+        if pool_size:
+            cls._pool_size = pool_size
+
+    @classmethod
+    def shutdown(cls, wait: bool = True):
+        """Chiude il pool (shutdown del servizio)"""
+        with cls._lock:
+            executor, cls._executor = cls._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+    @classmethod
+    def _update_metrics(cls, **deltas: float):
+        with cls._lock:
+            for key, value in deltas.items():
+                cls._metrics[key] += value
+            cls._metrics["peak_in_flight"] = max(cls._metrics["peak_in_flight"], cls._metrics["in_flight"])
+
+    @classmethod
+    def get_stats(cls) -> Dict[str, Any]:
+        """Metriche del pool (per /system/status)"""
+        with cls._lock:
+            metrics = dict(cls._metrics)
+        finished = metrics["completed"] + metrics["failed"]
+        return {
+            "pool_size": cls._pool_size,
+            "active": cls._executor is not None,
+            "submitted": int(metrics["submitted"]),
+            "completed": int(metrics["completed"]),
+            "failed": int(metrics["failed"]),
+            "timeouts": int(metrics["timeouts"]),
+            "in_flight": int(metrics["in_flight"]),
+            "peak_in_flight": int(metrics["peak_in_flight"]),
+            "avg_wait_ms": round(metrics["total_wait_ms"] / finished, 2) if finished else 0.0,
+            "avg_run_ms": round(metrics["total_run_ms"] / finished, 2) if finished else 0.0,
+        }
+
+    @classmethod
+    def reset_stats(cls):
+        with cls._lock:
+            for key in cls._metrics:
+                if key != "in_flight":  # le chiamate in corso restano tracciate
+                    cls._metrics[key] = 0
+
+    @classmethod
+    async def run(
+        cls,
+        fn: Callable[..., Any],
+        *args: Any,
+        timeout: Optional[float] = None,
+        **kwargs: Any
+    ) -> Any:
+        """
+        Esegue una funzione bloccante sul pool senza bloccare l'event loop
+
+        Args:
+            fn: Funzione sincrona (tipicamente un metodo di MongoDBService o di una collection)
+            timeout: Timeout in secondi (default MONGODB_ASYNC_TIMEOUT_SECONDS)
+
+        Raises:
+            MongoDBTimeoutError: se la chiamata supera il timeout
+        """
+        submitted_at = time.perf_counter()
+        cls._update_metrics(submitted=1, in_flight=1)
+
+        def call():
+            started_at = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                finished_at = time.perf_counter()
+                cls._update_metrics(
+                    total_wait_ms=(started_at - submitted_at) * 1000,
+                    total_run_ms=(finished_at - started_at) * 1000
+                )
+
+        loop = asyncio.get_running_loop()
+        # Contesto copiato nel thread: la trace della richiesta vede anche i comandi MongoDB
+        future = loop.run_in_executor(cls.get_executor(), contextvars.copy_context().run, call)
+        try:
+            result = await asyncio.wait_for(future, timeout=timeout or MONGODB_ASYNC_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            cls._update_metrics(timeouts=1, failed=1, in_flight=-1)
+            name = getattr(fn, "__name__", "call")
+            logger.warning(f"⏱️ MongoDB async {name} timed out after {timeout or MONGODB_ASYNC_TIMEOUT_SECONDS}s")
+            raise MongoDBTimeoutError(f"MongoDB {name} timed out")
+        except Exception:
+            cls._update_metrics(failed=1, in_flight=-1)
+            raise
+
+        cls._update_metrics(completed=1, in_flight=-1)
+        return result
+
+    # === Stessa API di MongoDBService (awaitable) ===
+
+    @classmethod
+    async def is_connected(cls) -> bool:
+        return await cls.run(MongoDBService.is_connected)
+
+    @classmethod
+    async def find_documents(
+        cls,
+        collection_name: str,
+        filter: Dict[str, Any],
+        limit: Optional[int] = None,
+        sort: Optional[List[tuple]] = None,
+        timeout: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        return await cls.run(MongoDBService.find_documents, collection_name, filter, limit=limit, sort=sort, timeout=timeout)
+
+    @classmethod
+    async def insert_document(cls, collection_name: str, document: Dict[str, Any], timeout: Optional[float] = None) -> Optional[str]:
+        return await cls.run(MongoDBService.insert_document, collection_name, document, timeout=timeout)
+
+    @classmethod
+    async def update_document(
+        cls,
+        collection_name: str,
+        filter: Dict[str, Any],
+        update: Dict[str, Any],
+        timeout: Optional[float] = None
+    ) -> int:
+        return await cls.run(MongoDBService.update_document, collection_name, filter, update, timeout=timeout)
+
+    @classmethod
+    async def bulk_upsert(
+        cls,
+        collection_name: str,
+        documents: List[Dict[str, Any]],
+        timeout: Optional[float] = None,
+        **kwargs
+    ) -> Dict[str, int]:
+        return await cls.run(MongoDBService.bulk_upsert, collection_name, documents, timeout=timeout or MONGODB_ASYNC_BULK_TIMEOUT_SECONDS, **kwargs)
+
+    @classmethod
+    async def delete_documents(cls, collection_name: str, filter: Dict[str, Any], timeout: Optional[float] = None) -> int:
+        return await cls.run(MongoDBService.delete_documents, collection_name, filter, timeout=timeout)
+
+    @classmethod
+    async def count_documents(cls, collection_name: str, filter: Dict[str, Any], timeout: Optional[float] = None) -> int:
+        return await cls.run(MongoDBService.count_documents, collection_name, filter, timeout=timeout)
+
+    @classmethod
+    async def aggregate(cls, collection_name: str, pipeline: List[Dict[str, Any]], timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        return await cls.run(MongoDBService.aggregate, collection_name, pipeline, timeout=timeout)
+
+    @classmethod
+    async def hydrate_documents(
+        cls,
+        collection_name: str,
+        ids: Iterable[Any],
+        projection: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        return await cls.run(MongoDBService.hydrate_documents, collection_name, list(ids), projection, timeout=timeout)
+
+    @classmethod
+    async def fetch_embeddings(
+        cls,
+        collection_name: str,
+        filter: Dict[str, Any],
+        embedding_fields: Iterable[str] = ("embedding",),
+        fields: Iterable[str] = (),
+        timeout: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """Fase 1 del two-phase fetch, materializzata sul pool (cursore consumato nel thread)"""
+        return await cls.run(
+            lambda: list(MongoDBService.iter_embeddings(collection_name, filter, embedding_fields, fields)),
+            timeout=timeout or MONGODB_ASYNC_BULK_TIMEOUT_SECONDS
+        )
@@ -0,0 +1,289 @@
+"""
+MongoDB Health - Stato di connessione cachato, heartbeat e circuit breaker
+
+MongoDBService.is_connected() non esegue più un ping a ogni chiamata:
+- lo stato è cachato per MONGODB_HEALTH_TTL_SECONDS e aggiornato da un heartbeat in background;
+  con l'heartbeat attivo le richieste leggono sempre l'ultimo stato, senza ping sincroni
+- dopo MONGODB_CIRCUIT_FAILURE_THRESHOLD ping falliti consecutivi il circuito si apre e
+  le chiamate falliscono subito (niente attese di serverSelectionTimeout) per
+  MONGODB_CIRCUIT_RESET_SECONDS; poi un solo probe decide se richiuderlo
+- un listener pymongo raccoglie le statistiche del connection pool
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# Configurazione (override da environment)
+MONGODB_HEALTH_TTL_SECONDS = float(os.getenv("MONGODB_HEALTH_TTL_SECONDS", "5"))
+# Più breve del TTL: lo stato cachato non scade tra due heartbeat
+MONGODB_HEARTBEAT_INTERVAL_SECONDS = float(os.getenv("MONGODB_HEARTBEAT_INTERVAL_SECONDS", "4"))
+MONGODB_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("MONGODB_CIRCUIT_FAILURE_THRESHOLD", "3"))
+MONGODB_CIRCUIT_RESET_SECONDS = float(os.getenv("MONGODB_CIRCUIT_RESET_SECONDS", "30"))
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """
+    Statistiche del connection pool pymongo (socket in uso, attese in coda)
+
+    Check-out started e checked-out avvengono nello stesso thread:
+    il tempo di attesa si misura con un timestamp thread-local.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.stats: Dict[str, float] = {
+                "pools": 0,
+                "connections_open": 0,
+                "checked_out": 0,
+                "peak_checked_out": 0,
+                "checkouts": 0,
+                "checkout_failures": 0,
+                "wait_queue": 0,
+                "total_wait_ms": 0.0,
+                "max_wait_ms": 0.0,
+                "pool_clears": 0,
+            }
+
+    def _add(self, **deltas: float):
+        with self._lock:
+            for key, value in deltas.items():
+                self.stats[key] += value
+            self.stats["peak_checked_out"] = max(self.stats["peak_checked_out"], self.stats["checked_out"])
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+        checkouts = stats["checkouts"]
+        return {
+            "pools": int(stats["pools"]),
+            "connections_open": int(stats["connections_open"]),
+            "checked_out": int(stats["checked_out"]),
+            "peak_checked_out": int(stats["peak_checked_out"]),
+            "wait_queue": int(stats["wait_queue"]),
+            "checkouts": int(checkouts),
+            "checkout_failures": int(stats["checkout_failures"]),
+            "avg_wait_ms": round(stats["total_wait_ms"] / checkouts, 3) if checkouts else 0.0,
+            "max_wait_ms": round(stats["max_wait_ms"], 3),
+            "pool_clears": int(stats["pool_clears"]),
+        }
+
+    def _wait_ms(self) -> float:
+        started = getattr(self._local, "checkout_started", None)
+        self._local.checkout_started = None
+        return (time.perf_counter() - started) * 1000 if started is not None else 0.0
+
+    def pool_created(self, event):
+        self._add(pools=1)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._add(pool_clears=1)
+
+    def pool_closed(self, event):
+        self._add(pools=-1)
+
+    def connection_created(self, event):
+        self._add(connections_open=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._add(connections_open=-1)
+
+    def connection_check_out_started(self, event):
+        self._local.checkout_started = time.perf_counter()
+        self._add(wait_queue=1)
+
+    def connection_check_out_failed(self, event):
+        self._wait_ms()
+        self._add(wait_queue=-1, checkout_failures=1)
+
+    def connection_checked_out(self, event):
+        wait_ms = self._wait_ms()
+        self._add(wait_queue=-1, checked_out=1, checkouts=1, total_wait_ms=wait_ms)
+        with self._lock:
+            self.stats["max_wait_ms"] = max(self.stats["max_wait_ms"], wait_ms)
+
+    def connection_checked_in(self, event):
+        self._add(checked_out=-1)
+
+
+class MongoHealthMonitor:
+    """Stato di salute MongoDB condiviso dal processo (classmethod singleton)"""
+
+    _lock = threading.Lock()
+    _probe_lock = threading.Lock()
+    _heartbeat_task: Optional[asyncio.Task] = None
+
+    pool_listener = PoolStatsListener()
+
+    _state: Dict[str, Any] = {
+        "healthy": None,
+        "checked_at": 0.0,
+        "latency_ms": None,
+        "last_error": None,
+        "consecutive_failures": 0,
+        "circuit_open_until": 0.0,
+        "probes": 0,
+        "cache_hits": 0,
+        "fast_failures": 0,
+    }
+
+    @classmethod
+    def reset(cls):
+        """Azzera lo stato (usato nei test)"""
+        with cls._lock:
+            cls._state.update({
+                "healthy": None,
+                "checked_at": 0.0,
+                "latency_ms": None,
+                "last_error": None,
+                "consecutive_failures": 0,
+                "circuit_open_until": 0.0,
+                "probes": 0,
+                "cache_hits": 0,
+                "fast_failures": 0,
+            })
+
+    @classmethod
+    def circuit_open(cls) -> bool:
+        return time.time() < cls._state["circuit_open_until"]
+
+    @classmethod
+    def heartbeat_running(cls) -> bool:
+        return cls._heartbeat_task is not None and not cls._heartbeat_task.done()
+
+    @classmethod
+    def is_healthy(cls, probe: Callable[[], bool]) -> bool:
+        """
+        Stato di connessione senza round-trip quando possibile
+
+        Con l'heartbeat attivo restituisce l'ultimo stato anche oltre il TTL:
+        il ping lo esegue l'heartbeat, non il path della richiesta.
+
+        Args:
+            probe: Funzione che esegue il ping (True se ok, False/eccezione se ko)
+        """
+        if cls.circuit_open():
+            with cls._lock:
+                cls._state["fast_failures"] += 1
+            return False
+
+        healthy = cls._state["healthy"]
+        fresh = time.time() - cls._state["checked_at"] < MONGODB_HEALTH_TTL_SECONDS
+        if healthy is not None and (fresh or cls.heartbeat_running()):
+            with cls._lock:
+                cls._state["cache_hits"] += 1
+            return healthy
+
+        return cls.check(probe)
+
+    @classmethod
+    def check(cls, probe: Callable[[], bool]) -> bool:
+        """Esegue un probe e aggiorna lo stato (un solo probe alla volta)"""
+        if not cls._probe_lock.acquire(blocking=False):
+            # Un altro thread sta già verificando: usa subito l'ultimo stato noto
+            return bool(cls._state["healthy"])
+
+        try:
+            start = time.perf_counter()
+            error = None
+            try:
+                ok = bool(probe())
+            except Exception as e:
+                ok = False
+                error = str(e)
+            cls.record(ok, latency_ms=(time.perf_counter() - start) * 1000, error=error)
+            return ok
+        finally:
+            cls._probe_lock.release()
+
+    @classmethod
+    def record(cls, ok: bool, latency_ms: Optional[float] = None, error: Optional[str] = None):
+        """Registra l'esito di un probe e gestisce il circuit breaker"""
+        with cls._lock:
+            state = cls._state
+            was_healthy = state["healthy"]
+            state["healthy"] = ok
+            state["checked_at"] = time.time()
+            state["latency_ms"] = round(latency_ms, 2) if latency_ms is not None else None
+            state["probes"] += 1
+
+            if ok:
+                state["consecutive_failures"] = 0
+                state["circuit_open_until"] = 0.0
+                state["last_error"] = None
+            else:
+                state["consecutive_failures"] += 1
+                state["last_error"] = error
+                if state["consecutive_failures"] >= MONGODB_CIRCUIT_FAILURE_THRESHOLD:
+                    state["circuit_open_until"] = time.time() + MONGODB_CIRCUIT_RESET_SECONDS
+
+        if ok and was_healthy is False:
+            logger.info("✅ MongoDB reachable again, circuit closed")
+        elif not ok and cls.circuit_open():
+            logger.warning(
+                f"⚠️ MongoDB circuit open for {MONGODB_CIRCUIT_RESET_SECONDS}s "
+                f"after {cls._state['consecutive_failures']} failed pings: {error}"
+            )
+
+    @classmethod
+    def get_status(cls) -> Dict[str, Any]:
+        """Stato di salute + statistiche pool (per /system/status)"""
+        with cls._lock:
+            state = dict(cls._state)
+        return {
+            "healthy": state["healthy"],
+            "circuit": "open" if cls.circuit_open() else "closed",
+            "consecutive_failures": state["consecutive_failures"],
+            "last_check_age_s": round(time.time() - state["checked_at"], 1) if state["checked_at"] else None,
+            "latency_ms": state["latency_ms"],
+            "last_error": state["last_error"],
+            "probes": state["probes"],
+            "cache_hits": state["cache_hits"],
+            "fast_failures": state["fast_failures"],
+            "pool": cls.pool_listener.snapshot(),
+        }
+
+    @classmethod
+    async def _heartbeat(cls, probe: Callable[[], bool], interval: float):
+        while True:
+            try:
+                # Il probe è bloccante (pymongo): fuori dall'event loop
+                await asyncio.to_thread(cls.check, probe)
+            except Exception as e:
+                logger.debug(f"MongoDB heartbeat error: {e}")
+            await asyncio.sleep(interval)
+
+    @classmethod
+    def start_heartbeat(cls, probe: Callable[[], bool], interval: float = MONGODB_HEARTBEAT_INTERVAL_SECONDS):
+        """Avvia l'heartbeat in background (chiamare dentro un event loop attivo)"""
+        if cls._heartbeat_task is None or cls._heartbeat_task.done():
+            cls._heartbeat_task = asyncio.get_running_loop().create_task(cls._heartbeat(probe, interval))
+            logger.info(f"💓 MongoDB heartbeat started (every {interval}s)")
+
+    @classmethod
+    async def stop_heartbeat(cls):
+        task, cls._heartbeat_task = cls._heartbeat_task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
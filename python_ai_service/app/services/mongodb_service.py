@@ -1,7 +1,8 @@
 """MongoDB service for document storage and retrieval"""
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError
 from pymongo.collection import Collection
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterable, Iterator, List, Optional
 from app.config import (
     MONGODB_URI,
     MONGODB_DATABASE,
@@ -10,6 +11,11 @@ from app.config import (
     MONGODB_USERNAME,
     MONGODB_PASSWORD,
 )
+from app.services.mongodb_health import MongoHealthMonitor
+from app.services.tenant_ids import normalize_tenant_id
+from app.services.corpus_version import CorpusVersion
+from app.services.stats_rollup import StatsRollup
+from app.services.tracing import mongo_command_listener
 import os
 import logging
 
@@ -23,6 +29,34 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# Two-phase fetch: dimensione dei batch del cursore embedding e dei blocchi $in
+MONGODB_EMBEDDING_BATCH_SIZE = int(os.getenv("MONGODB_EMBEDDING_BATCH_SIZE", "500"))
+MONGODB_HYDRATE_CHUNK_SIZE = int(os.getenv("MONGODB_HYDRATE_CHUNK_SIZE", "1000"))
+
+# Proiezione testuale per l'idratazione: tutto ciò che serve ai risultati, nessun embedding
+DOCUMENT_TEXT_PROJECTION = {
+    "_id": 1,
+    "document_id": 1,
+    "tenant_id": 1,
+    "source_id": 1,
+    "title": 1,
+    "filename": 1,
+    "relative_path": 1,
+    "document_type": 1,
+    "file_type": 1,
+    "protocol_number": 1,
+    "protocol_date": 1,
+    "metadata": 1,
+    "content.full_text": 1,
+    "content.raw_text": 1,
+    "content.page_number": 1,
+    "content.chunks.chunk_index": 1,
+    "content.chunks.chunk_text": 1,
+    "content.chunks.text": 1,
+    "content.chunks.page_number": 1,
+    "content.chunks.metadata": 1,
+}
+
 class MongoDBService:
     """MongoDB connection and operations service"""
     
@@ -34,6 +68,9 @@ class MongoDBService:
     @classmethod
     def get_client(cls) -> Optional[MongoClient]:
         """Get or create MongoDB client (singleton)"""
+        if cls._client is None and MongoHealthMonitor.circuit_open():
+            # Circuit aperto: non attendere un altro serverSelectionTimeout
+            return None
         if cls._client is None:
             try:
                 # Support SSL for MongoDB Atlas
@@ -44,7 +81,8 @@ class MongoDBService:
                             MONGODB_URI,
                             tls=True,
                             tlsCAFile=certifi.where(),  # Use standard CA certificates
-                            serverSelectionTimeoutMS=5000
+                            serverSelectionTimeoutMS=5000,
+                            event_listeners=[MongoHealthMonitor.pool_listener, mongo_command_listener]
                         )
                     else:
                         # Fallback: SSL without certifi (less secure)
@@ -53,11 +91,16 @@ class MongoDBService:
                             MONGODB_URI,
                             tls=True,
                             tlsAllowInvalidCertificates=False,  # Still validate, just without certifi
-                            serverSelectionTimeoutMS=5000
+                            serverSelectionTimeoutMS=5000,
+                            event_listeners=[MongoHealthMonitor.pool_listener, mongo_command_listener]
                         )
                 else:
                     # Standard MongoDB connection (local or DocumentDB)
-                    cls._client = MongoClient(MONGODB_URI, serverSelectionTimeoutMS=5000)
+                    cls._client = MongoClient(
+                        MONGODB_URI,
+                        serverSelectionTimeoutMS=5000,
+                        event_listeners=[MongoHealthMonitor.pool_listener, mongo_command_listener]
+                    )
                 
                 # Test connection
                 cls._client.admin.command('ping')
@@ -88,7 +131,11 @@ class MongoDBService:
                         else:
                             fallback_uri = f"mongodb://127.0.0.1:{MONGODB_PORT}/{MONGODB_DATABASE}"
 
-                        cls._client = MongoClient(fallback_uri, serverSelectionTimeoutMS=5000)
+                        cls._client = MongoClient(
+                            fallback_uri,
+                            serverSelectionTimeoutMS=5000,
+                            event_listeners=[MongoHealthMonitor.pool_listener, mongo_command_listener]
+                        )
                         cls._client.admin.command("ping")
                         cls._connected = True
                         os.environ["MONGO_DB_HOST"] = "127.0.0.1"
@@ -103,12 +150,13 @@ class MongoDBService:
         return cls._client
     
     @classmethod
-    def is_connected(cls) -> bool:
-        """Check if MongoDB is connected"""
+    def ping(cls) -> bool:
+        """Round-trip ping (usato dall'health monitor, non chiamare nei percorsi caldi)"""
         # Se client non esiste, prova a crearlo
         if cls._client is None:
             cls.get_client()
         if cls._client is None:
+            cls._connected = False
             return False
         try:
             cls._client.admin.command('ping')
@@ -116,7 +164,12 @@ class MongoDBService:
             return True
         except Exception:
             cls._connected = False
-            return False
+            raise
+    
+    @classmethod
+    def is_connected(cls) -> bool:
+        """Check if MongoDB is connected (stato cachato dall'health monitor, circuit breaker)"""
+        return MongoHealthMonitor.is_healthy(cls.ping)
     
     @classmethod
     def get_database(cls):
@@ -162,6 +215,10 @@ class MongoDBService:
             if collection is None:
                 return None
             
+            # tenant_id sempre in forma canonica (intero)
+            if 'tenant_id' in document:
+                document['tenant_id'] = normalize_tenant_id(document['tenant_id'])
+            
             # CRITICAL: Check if document already exists by document_id BEFORE insert
             # This prevents duplicates even if unique index is missing
             document_id = document.get('document_id')
@@ -178,6 +235,9 @@ class MongoDBService:
                     return 'duplicate'  # Return duplicate BEFORE attempting insert
             
             result = collection.insert_one(document)
+            if collection_name == "documents":
+                CorpusVersion.bump(tenant_id)
+                StatsRollup.record_insert(document)
             return str(result.inserted_id)
         except Exception as e:
             error_msg = str(e)
@@ -218,6 +278,103 @@ class MongoDBService:
             logger.warning(f"MongoDB query failed for {collection_name}: {e}")
             return []
     
+    @classmethod
+    def aggregate(cls, collection_name: str, pipeline: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Run an aggregation pipeline (returns empty list if MongoDB unavailable)"""
+        if not cls.is_connected():
+            logger.debug(f"MongoDB not available, returning empty aggregation for {collection_name}")
+            return []
+        
+        try:
+            collection = cls.get_collection(collection_name)
+            if collection is None:
+                return []
+            return list(collection.aggregate(pipeline))
+        except Exception as e:
+            logger.warning(f"MongoDB aggregation failed for {collection_name}: {e}")
+            return []
+    
+    @classmethod
+    def iter_embeddings(
+        cls,
+        collection_name: str,
+        filter: Dict[str, Any],
+        embedding_fields: Iterable[str] = ("embedding",),
+        fields: Iterable[str] = (),
+        batch_size: Optional[int] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Two-phase fetch, fase 1: stream di _id + embedding (e pochi campi scalari)
+        
+        Il cursore scarica i documenti a batch senza decodificare testo e chunk:
+        lo scoring avviene su questi dati, il testo si recupera solo per i vincenti
+        con hydrate_documents().
+        
+        Args:
+            collection_name: MongoDB collection name
+            filter: Query filter dict
+            embedding_fields: Campi embedding da proiettare (es. "content.chunks.embedding")
+            fields: Campi aggiuntivi leggeri (es. per filtri: "document_type", "created_at")
+            batch_size: Documenti per batch del cursore
+        
+        Yields:
+            Documenti con solo _id, embedding e campi richiesti
+        """
+        if not cls.is_connected():
+            logger.debug(f"MongoDB not available, no embeddings streamed from {collection_name}")
+            return
+        
+        collection = cls.get_collection(collection_name)
+        if collection is None:
+            return
+        
+        projection = {"_id": 1}
+        projection.update({field: 1 for field in embedding_fields})
+        projection.update({field: 1 for field in fields})
+        
+        try:
+            cursor = collection.find(filter, projection).batch_size(batch_size or MONGODB_EMBEDDING_BATCH_SIZE)
+            for doc in cursor:
+                yield doc
+        except Exception as e:
+            logger.warning(f"MongoDB embedding stream failed for {collection_name}: {e}")
+    
+    @classmethod
+    def hydrate_documents(
+        cls,
+        collection_name: str,
+        ids: Iterable[Any],
+        projection: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Two-phase fetch, fase 2: recupera per _id ($in) solo i documenti sopravvissuti
+        
+        Args:
+            collection_name: MongoDB collection name
+            ids: _id dei documenti (ObjectId o stringhe)
+            projection: Proiezione (default DOCUMENT_TEXT_PROJECTION, senza embedding)
+        
+        Returns:
+            Dict str(_id) -> documento (documenti mancanti assenti)
+        """
+        unique_ids = list(dict.fromkeys(ids))
+        if not unique_ids or not cls.is_connected():
+            return {}
+        
+        collection = cls.get_collection(collection_name)
+        if collection is None:
+            return {}
+        
+        hydrated: Dict[str, Dict[str, Any]] = {}
+        try:
+            for start in range(0, len(unique_ids), MONGODB_HYDRATE_CHUNK_SIZE):
+                block = unique_ids[start:start + MONGODB_HYDRATE_CHUNK_SIZE]
+                for doc in collection.find({"_id": {"$in": block}}, projection or DOCUMENT_TEXT_PROJECTION):
+                    hydrated[str(doc["_id"])] = doc
+        except Exception as e:
+            logger.warning(f"MongoDB hydrate failed for {collection_name}: {e}")
+        return hydrated
+    
     @classmethod
     def update_document(
         cls,
@@ -227,14 +384,89 @@ class MongoDBService:
     ) -> int:
         """Update documents in collection"""
         collection = cls.get_collection(collection_name)
+        snapshot = StatsRollup.before_update(collection, filter, update) if collection_name == "documents" else []
         result = collection.update_many(filter, {"$set": update})
+        if collection_name == "documents" and result.modified_count:
+            CorpusVersion.bump_for_filter(filter)
+            StatsRollup.after_update(filter, snapshot, update)
         return result.modified_count
     
+    @classmethod
+    def bulk_upsert(
+        cls,
+        collection_name: str,
+        documents: List[Dict[str, Any]],
+        key_fields: Iterable[str] = ("tenant_id", "document_id"),
+        insert_only_fields: Iterable[str] = ("created_at",),
+        ordered: bool = False
+    ) -> Dict[str, int]:
+        """
+        Upsert di molti documenti con una sola bulk_write (un UpdateOne upsert per documento)
+        
+        Args:
+            collection_name: MongoDB collection name
+            documents: Documenti completi (senza _id)
+            key_fields: Campi che identificano il documento (filtro dell'upsert)
+            insert_only_fields: Campi scritti solo alla creazione ($setOnInsert)
+            ordered: False = MongoDB prosegue oltre i singoli errori
+        
+        Returns:
+            {"matched", "modified", "upserted"} (tutti 0 se MongoDB non disponibile)
+        """
+        counts = {"matched": 0, "modified": 0, "upserted": 0}
+        if not documents or not cls.is_connected():
+            return counts
+        
+        collection = cls.get_collection(collection_name)
+        if collection is None:
+            return counts
+        
+        key_fields = tuple(key_fields)
+        operations = []
+        tenants = set()
+        written = []
+        for document in documents:
+            document = {key: value for key, value in document.items() if key != "_id"}
+            if "tenant_id" in document:
+                document["tenant_id"] = normalize_tenant_id(document["tenant_id"])
+                tenants.add(document["tenant_id"])
+            on_insert = {field: document.pop(field) for field in insert_only_fields if field in document}
+            update = {"$set": document}
+            if on_insert:
+                update["$setOnInsert"] = on_insert
+            operations.append(UpdateOne({field: document.get(field) for field in key_fields}, update, upsert=True))
+            written.append(document)
+        
+        snapshot = StatsRollup.before_upsert(collection, written, key_fields) if collection_name == "documents" else []
+        try:
+            result = collection.bulk_write(operations, ordered=ordered)
+        except BulkWriteError:
+            # Scrittura parziale: versione del corpus avanzata e rollup da ricostruire
+            if collection_name == "documents":
+                for tenant_id in tenants or {None}:
+                    CorpusVersion.bump(tenant_id)
+                    StatsRollup.invalidate(tenant_id)
+            raise
+        counts = {
+            "matched": result.matched_count,
+            "modified": result.modified_count,
+            "upserted": result.upserted_count,
+        }
+        if collection_name == "documents" and (counts["modified"] or counts["upserted"]):
+            for tenant_id in tenants or {None}:
+                CorpusVersion.bump(tenant_id)
+            StatsRollup.after_upsert(snapshot, written, key_fields, result.upserted_ids)
+        return counts
+    
     @classmethod
     def delete_documents(cls, collection_name: str, filter: Dict[str, Any]) -> int:
         """Delete documents from collection"""
         collection = cls.get_collection(collection_name)
+        snapshot = StatsRollup.before_delete(collection, filter) if collection_name == "documents" else []
         result = collection.delete_many(filter)
+        if collection_name == "documents" and result.deleted_count:
+            CorpusVersion.bump_for_filter(filter)
+            StatsRollup.after_delete(filter, snapshot)
         return result.deleted_count
     
     @classmethod
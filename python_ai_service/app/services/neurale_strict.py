@@ -3,8 +3,11 @@ Neurale Strict - LLM genera claims atomici con source_ids
 Ogni frase = 1 claim, ogni claim deve avere source_ids
 """
 
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
+import os
 import json
+import asyncio
+import logging
 from app.services.retriever_service import RetrieverService
 from app.services.ai_router import AIRouter
 try:
@@ -16,6 +19,11 @@ except ImportError:
     sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
     from toon_utils import ToonConverter
 
+logger = logging.getLogger(__name__)
+
+# Budget complessivo per risposta + claims (eseguiti in parallelo)
+NEURALE_STRICT_TIMEOUT_SECONDS = float(os.getenv("NEURALE_STRICT_TIMEOUT_SECONDS", "120"))
+
 
 class NeuraleStrict:
     """
@@ -61,13 +69,24 @@ class NeuraleStrict:
         # Build context from chunks
         context = self._build_context(chunks)
         
-        # Step 1: Generate natural language answer first (synthesized response)
-        answer_result = await self._generate_natural_answer(
-            question=question,
-            context=context,
-            persona=persona,
-            model=model,
-            tenant_id=tenant_id
+        # Step 1+2: risposta naturale e claims atomici usano lo stesso contesto e
+        # sono indipendenti: due chiamate LLM in parallelo (latenza max(a, b))
+        answer_result, claims_result = await self._run_concurrently(
+            self._generate_natural_answer(
+                question=question,
+                context=context,
+                persona=persona,
+                model=model,
+                tenant_id=tenant_id
+            ),
+            self._generate_claims_from_context(
+                question=question,
+                context=context,
+                persona=persona,
+                model=model,
+                tenant_id=tenant_id,
+                chunks=chunks
+            )
         )
         
         # Extract answer text and token usage from result
@@ -81,16 +100,6 @@ class NeuraleStrict:
             answer_tokens = {"input_tokens": 0, "output_tokens": 0}
             answer_model = model
         
-        # Step 2: Generate atomic claims from the answer (for verification)
-        claims_result = await self._generate_claims_from_context(
-            question=question,
-            context=context,
-            persona=persona,
-            model=model,
-            tenant_id=tenant_id,
-            chunks=chunks
-        )
-        
         # Extract claims and token usage from result
         if isinstance(claims_result, dict):
             claims = claims_result.get("claims", [])
@@ -135,6 +144,37 @@ class NeuraleStrict:
             "persona": persona
         }
     
+    @staticmethod
+    async def _run_concurrently(answer_coro, claims_coro) -> Tuple[Any, Any]:
+        """
+        Esegue le due generazioni come task concorrenti con budget e cancellazione condivisi
+        
+        Se una delle due fallisce o il budget NEURALE_STRICT_TIMEOUT_SECONDS scade,
+        l'altra viene cancellata e l'errore propagato al chiamante.
+        """
+        tasks = [asyncio.ensure_future(answer_coro), asyncio.ensure_future(claims_coro)]
+        try:
+            done, pending = await asyncio.wait(
+                tasks,
+                timeout=NEURALE_STRICT_TIMEOUT_SECONDS,
+                return_when=asyncio.FIRST_EXCEPTION
+            )
+            for task in done:
+                if task.exception() is not None:
+                    raise task.exception()
+            if pending:
+                logger.warning(f"⏱️ Neurale Strict timeout after {NEURALE_STRICT_TIMEOUT_SECONDS}s")
+                raise asyncio.TimeoutError(
+                    f"Neurale Strict generation exceeded {NEURALE_STRICT_TIMEOUT_SECONDS}s"
+                )
+            return tasks[0].result(), tasks[1].result()
+        finally:
+            # Cancellazione condivisa (errore, timeout o cancellazione del chiamante)
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+    
     def _build_context(self, chunks: List[Dict[str, Any]]) -> str:
         """
         Build context string from chunks using TOON format for token optimization
@@ -4,7 +4,6 @@ Gestisce estrazione PDF, chunking, embeddings e salvataggio in MongoDB
 Con supporto dry-run e report dettagliato
 """
 
-import asyncio
 import hashlib
 import json
 import logging
@@ -21,6 +20,12 @@ sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 from app.services.mongodb_service import MongoDBService
 from app.services.ai_router import AIRouter
 from app.services.document_structure_parser import DocumentStructureParser
+from app.services.vector_index import VectorIndexRegistry
+from app.services.embedding_store import EmbeddingStore
+from app.services.lexical_index import LexicalIndexRegistry
+from app.services.search_projection import build_search_projection
+from app.services.pdf_extraction import PDF_TEXT_CACHE_ENABLED, PDFExtractionService, extract_text, split_text_into_chunks
+from app.services.tenant_ids import normalize_tenant_id
 
 logging.basicConfig(
     level=logging.INFO,
@@ -90,9 +95,11 @@ class PAActMongoDBImporter:
     CHUNK_SIZE = 2000  # characters (approx 500 tokens)
     CHUNK_OVERLAP = 200  # characters overlap between chunks
     
-    def __init__(self, tenant_id: int = 1, dry_run: bool = False):
-        self.tenant_id = tenant_id
+    def __init__(self, tenant_id: int = 1, dry_run: bool = False, use_pdf_cache: bool = PDF_TEXT_CACHE_ENABLED):
+        # Sempre in forma canonica (intero): i retriever fanno una sola ricerca per tenant
+        self.tenant_id = normalize_tenant_id(tenant_id)
         self.dry_run = dry_run
+        self.use_pdf_cache = use_pdf_cache
         self.ai_router = AIRouter()
         self.structure_parser = DocumentStructureParser()
         
@@ -142,85 +149,16 @@ class PAActMongoDBImporter:
             return None
     
     def extract_pdf_text(self, pdf_path: str) -> Optional[str]:
-        """Extract text from PDF file"""
-        try:
-            # Try PyPDF2 first
-            try:
-                import PyPDF2
-                text = ""
-                with open(pdf_path, 'rb') as f:
-                    pdf_reader = PyPDF2.PdfReader(f)
-                    for page in pdf_reader.pages:
-                        text += page.extract_text() + "\n"
-                return text.strip() if text else None
-            except ImportError:
-                # Try pdfplumber as fallback
-                try:
-                    import pdfplumber
-                    text = ""
-                    with pdfplumber.open(pdf_path) as pdf:
-                        for page in pdf.pages:
-                            page_text = page.extract_text()
-                            if page_text:
-                                text += page_text + "\n"
-                    return text.strip() if text else None
-                except ImportError:
-                    logger.warning("Né PyPDF2 né pdfplumber installati. Installa uno dei due per estrarre testo PDF.")
-                    return None
-        except Exception as e:
-            logger.error(f"Errore estrazione PDF {pdf_path}: {e}")
-            return None
+        """Extract text from PDF file (page by page, cached by PDF content hash)"""
+        return extract_text(pdf_path, use_cache=self.use_pdf_cache)
+    
+    async def aextract_pdf_text(self, pdf_path: str) -> Optional[str]:
+        """Extract text from PDF file in the extraction process pool (does not block the event loop)"""
+        return await PDFExtractionService.extract_text(pdf_path, use_cache=self.use_pdf_cache)
     
     def split_text_into_chunks(self, text: str) -> List[Dict[str, Any]]:
         """Split text into chunks for better retrieval"""
-        chunks = []
-        
-        # Clean text
-        text = text.strip()
-        if not text or len(text) < 50:
-            return chunks
-        
-        # Split by paragraphs first (double newlines)
-        paragraphs = re.split(r'\n\s*\n', text)
-        
-        current_chunk = ""
-        chunk_index = 0
-        
-        for para in paragraphs:
-            para = para.strip()
-            if not para:
-                continue
-            
-            # If adding this paragraph would exceed chunk size, save current chunk
-            if current_chunk and len(current_chunk) + len(para) + 2 > self.CHUNK_SIZE:
-                chunks.append({
-                    'chunk_index': chunk_index,
-                    'chunk_text': current_chunk.strip(),
-                    'tokens': len(current_chunk.split())  # Approximate
-                })
-                chunk_index += 1
-                
-                # Start new chunk with overlap
-                if self.CHUNK_OVERLAP > 0:
-                    overlap_text = current_chunk[-self.CHUNK_OVERLAP:]
-                    current_chunk = overlap_text + "\n\n" + para
-                else:
-                    current_chunk = para
-            else:
-                if current_chunk:
-                    current_chunk += "\n\n" + para
-                else:
-                    current_chunk = para
-        
-        # Add last chunk
-        if current_chunk.strip():
-            chunks.append({
-                'chunk_index': chunk_index,
-                'chunk_text': current_chunk.strip(),
-                'tokens': len(current_chunk.split())
-            })
-        
-        return chunks
+        return split_text_into_chunks(text, self.CHUNK_SIZE, self.CHUNK_OVERLAP)
     
     def generate_document_id(self, atto_data: Dict[str, Any], ente: str = "Firenze") -> str:
         """
@@ -287,6 +225,96 @@ class PAActMongoDBImporter:
             logger.error(f"Errore generazione embedding: {e}")
             return None, 0, None
     
+    async def generate_embeddings(self, texts: List[str]) -> List[Tuple[Optional[List[float]], int, Optional[str]]]:
+        """
+        Generate embeddings for many texts (adapter embed_batch: one request per provider batch)
+        
+        If the batch request fails, each text is retried alone (generate_embedding):
+        only the texts that fail again come back as (None, 0, None).
+        
+        Returns:
+            List of (embedding, tokens, model_used), same order as texts; (None, 0, None) on failure
+        """
+        if not texts:
+            return []
+        try:
+            context = {
+                "tenant_id": self.tenant_id,
+                "task_class": "embed"
+            }
+            adapter = self.ai_router.get_embedding_adapter(context)
+            results = await adapter.embed_batch(texts)
+        except Exception as e:
+            logger.warning(f"  ⚠️  Errore embedding batch ({len(texts)} testi), ritento testo per testo: {e}")
+            return [await self.generate_embedding(text) for text in texts]
+        
+        embeddings = []
+        for result in results:
+            tokens = result.get("tokens", 0)
+            model = result.get("model", "unknown")
+            # Track cost
+            if tokens > 0:
+                self.cost_tracker.add_usage(tokens, model)
+            embeddings.append((result.get("embedding", []), tokens, model))
+        return embeddings
+    
+    def build_document(
+        self,
+        atto_data: Dict[str, Any],
+        document_id: str,
+        ente: str,
+        text_content: str,
+        chunks: List[Dict[str, Any]],
+        doc_embedding: Optional[List[float]],
+        document_structure: Optional[Dict[str, Any]] = None,
+        pdf_path: Optional[str] = None,
+        pdf_url: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Build the MongoDB document for an atto (shared by import_atto and BulkActImporter)
+        
+        Args:
+            chunks: Chunks with embeddings
+            doc_embedding: Document-level embedding (oggetto + first chunk)
+        """
+        now = datetime.now()
+        document = {
+            "document_id": document_id,
+            "tenant_id": self.tenant_id,
+            "title": atto_data.get('oggetto', f"Atto {atto_data.get('numero_atto', 'N/A')}"),
+            "filename": pdf_path.split('/')[-1] if pdf_path else None,
+            "document_type": "pa_act",
+            "protocol_number": atto_data.get('numero_atto', ''),
+            "protocol_date": atto_data.get('data_atto', ''),
+            "embedding": doc_embedding,  # Document-level embedding
+            "content": {
+                "raw_text": text_content[:5000],  # Preview
+                "full_text": text_content,
+                "chunks": chunks,
+                "structure": document_structure  # Sezioni logiche identificate
+            },
+            "metadata": {
+                "source": "pa_scraper",
+                "ente": ente,
+                "tipo_atto": atto_data.get('tipo_atto', ''),
+                "numero_atto": atto_data.get('numero_atto', ''),
+                "data_atto": atto_data.get('data_atto', ''),
+                "anno": atto_data.get('anno', ''),
+                "pdf_url": pdf_url,
+                "pdf_path": pdf_path,
+                "imported_at": now.isoformat(),
+                "chunk_count": len(chunks),
+                "total_chars": len(text_content),
+                "scraper_type": atto_data.get('scraper_type', 'unknown')
+            },
+            "status": "active",
+            "created_at": now,
+            "updated_at": now
+        }
+        # Campi di ricerca normalizzati (search_terms, dipartimento, protocolli) per /commands
+        document.update(build_search_projection(document))
+        return document
+    
     async def import_atto(
         self,
         atto_data: Dict[str, Any],
@@ -315,7 +343,7 @@ class PAActMongoDBImporter:
             # Try local PDF path first
             if pdf_path and os.path.exists(pdf_path):
                 logger.info(f"  📄 Estraendo testo da PDF locale: {Path(pdf_path).name}")
-                text_content = self.extract_pdf_text(pdf_path)
+                text_content = await self.aextract_pdf_text(pdf_path)
             # If no local PDF but URL available, download it temporarily
             elif pdf_url and not pdf_path:
                 try:
@@ -323,7 +351,7 @@ class PAActMongoDBImporter:
                     temp_pdf_path = self.download_pdf_from_url(pdf_url, atto_data)
                     if temp_pdf_path and os.path.exists(temp_pdf_path):
                         logger.info(f"  📄 Estraendo testo da PDF scaricato: {Path(temp_pdf_path).name}")
-                        text_content = self.extract_pdf_text(temp_pdf_path)
+                        text_content = await self.aextract_pdf_text(temp_pdf_path)
                         if text_content:
                             extracted_chars = len(text_content.strip())
                             logger.info(f"  ✅ Testo estratto: {extracted_chars} caratteri")
@@ -394,31 +422,18 @@ class PAActMongoDBImporter:
                 self.stats["processed"] += 1
                 return True
             
-            # Generate embeddings for each chunk (batch processing)
+            # Generate embeddings for all chunks with batched upstream requests
+            logger.info(f"  🤖 Generando embeddings per {len(chunks)} chunks (batch)...")
             chunks_with_embeddings = []
-            batch_size = 5  # Process multiple chunks concurrently
+            results = await self.generate_embeddings([chunk['chunk_text'] for chunk in chunks])
             
-            for i in range(0, len(chunks), batch_size):
-                batch = chunks[i:i+batch_size]
-                logger.info(f"  🤖 Generando embeddings chunks {i+1}-{min(i+batch_size, len(chunks))}/{len(chunks)}...")
-                
-                # Generate embeddings in parallel
-                tasks = [self.generate_embedding(chunk['chunk_text']) for chunk in batch]
-                results = await asyncio.gather(*tasks, return_exceptions=True)
-                
-                # Attach embeddings to chunks
-                for chunk, result in zip(batch, results):
-                    if isinstance(result, Exception):
-                        logger.warning(f"  ⚠️  Errore embedding: {result}")
-                    elif result[0]:  # embedding exists
-                        chunk['embedding'] = result[0]
-                        chunk['tokens_used'] = result[1]
-                        chunk['model_used'] = result[2]
-                        chunks_with_embeddings.append(chunk)
-                
-                # Small delay between batches
-                if i + batch_size < len(chunks):
-                    await asyncio.sleep(0.2)
+            # Attach embeddings to chunks
+            for chunk, (embedding, tokens, model) in zip(chunks, results):
+                if embedding:
+                    chunk['embedding'] = embedding
+                    chunk['tokens_used'] = tokens
+                    chunk['model_used'] = model
+                    chunks_with_embeddings.append(chunk)
             
             if not chunks_with_embeddings:
                 logger.error(f"  ❌ Nessun embedding generato per atto {atto_data.get('numero_atto', 'N/A')}")
@@ -456,39 +471,17 @@ class PAActMongoDBImporter:
                         logger.info(f"  🔄 Usando document_id esistente per garantire update invece di creare duplicate")
                         document_id = existing_doc_id
             
-            document = {
-                "document_id": document_id,
-                "tenant_id": self.tenant_id,
-                "title": atto_data.get('oggetto', f"Atto {atto_data.get('numero_atto', 'N/A')}"),
-                "filename": pdf_path.split('/')[-1] if pdf_path else None,
-                "document_type": "pa_act",
-                "protocol_number": atto_data.get('numero_atto', ''),
-                "protocol_date": atto_data.get('data_atto', ''),
-                "embedding": doc_embedding,  # Document-level embedding
-                "content": {
-                    "raw_text": text_content[:5000],  # Preview
-                    "full_text": text_content,
-                    "chunks": chunks_with_embeddings,
-                    "structure": document_structure  # Sezioni logiche identificate
-                },
-                "metadata": {
-                    "source": "pa_scraper",
-                    "ente": ente,
-                    "tipo_atto": atto_data.get('tipo_atto', ''),
-                    "numero_atto": atto_data.get('numero_atto', ''),
-                    "data_atto": atto_data.get('data_atto', ''),
-                    "anno": atto_data.get('anno', ''),
-                    "pdf_url": pdf_url,
-                    "pdf_path": pdf_path,
-                    "imported_at": datetime.now().isoformat(),
-                    "chunk_count": len(chunks_with_embeddings),
-                    "total_chars": len(text_content),
-                    "scraper_type": atto_data.get('scraper_type', 'unknown')
-                },
-                "status": "active",
-                "created_at": datetime.now(),
-                "updated_at": datetime.now()
-            }
+            document = self.build_document(
+                atto_data,
+                document_id=document_id,
+                ente=ente,
+                text_content=text_content,
+                chunks=chunks_with_embeddings,
+                doc_embedding=doc_embedding,
+                document_structure=document_structure,
+                pdf_path=pdf_path,
+                pdf_url=pdf_url
+            )
             
             # Save to MongoDB (update if exists, insert if new)
             result_id = MongoDBService.insert_document("documents", document)
@@ -540,6 +533,7 @@ class PAActMongoDBImporter:
                             logger.info(f"  🔄 Aggiungendo struttura documento ({existing_structure_count} → {new_structure_count} sezioni)...")
                         
                         # Update document with new content
+                        updated_at = datetime.now()
                         update_result = MongoDBService.update_document("documents", {
                             "document_id": document_id,
                             "tenant_id": self.tenant_id
@@ -553,11 +547,19 @@ class PAActMongoDBImporter:
                             "metadata.total_chars": len(text_content),
                             "metadata.pdf_path": pdf_path,
                             "metadata.pdf_url": pdf_url,  # Aggiorna anche PDF URL se disponibile
-                            "updated_at": datetime.now()
+                            "updated_at": updated_at
                         })
                         
                         if update_result > 0:
                             logger.info(f"  ✅ Documento aggiornato in MongoDB: {document_id} ({existing_chars} → {new_chars} caratteri)")
+                            VectorIndexRegistry.invalidate(self.tenant_id)
+                            # Nuova versione: la riga precedente nello store viene invalidata
+                            EmbeddingStore.upsert(self.tenant_id, existing_doc.get("_id"), doc_embedding, updated_at)
+                            LexicalIndexRegistry.upsert(self.tenant_id, existing_doc.get("_id"), {
+                                **existing_doc,
+                                "content": {"chunks": chunks_with_embeddings, "raw_text": text_content[:5000]},
+                                "updated_at": updated_at
+                            })
                             self.stats["processed"] += 1
                             return True
                         else:
@@ -576,6 +578,9 @@ class PAActMongoDBImporter:
                     return True
             elif result_id:
                 logger.info(f"  ✅ Salvato in MongoDB: {document_id}")
+                VectorIndexRegistry.invalidate(self.tenant_id)
+                EmbeddingStore.upsert(self.tenant_id, result_id, doc_embedding, document["updated_at"])
+                LexicalIndexRegistry.upsert(self.tenant_id, result_id, document)
                 self.stats["processed"] += 1
                 self.stats["total_documents"] += 1
                 return True
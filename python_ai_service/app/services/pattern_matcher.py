@@ -0,0 +1,110 @@
+"""
+Pattern Matcher - automa Aho-Corasick per i pattern di classificazione
+
+QuestionClassifier confrontava la domanda con migliaia di frasi letterali
+(*_query_patterns.py) con una scansione `kw in text` per ogni pattern.
+MultiPatternMatcher compila tutti i gruppi di pattern (e i relativi pesi
+di confidenza) in un unico automa: una sola passata lineare sul testo
+restituisce, per ogni gruppo, i pattern trovati con il loro peso.
+
+Semantica identica a `pattern in text` (sottostringa esatta, case-sensitive,
+occorrenze sovrapposte incluse).
+"""
+
+from collections import deque
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+# (gruppo, pattern, peso)
+PatternMatch = Tuple[str, str, Optional[float]]
+
+
+class MultiPatternMatcher:
+    """Automa Aho-Corasick su più gruppi di pattern letterali"""
+
+    def __init__(
+        self,
+        groups: Mapping[str, Iterable[str]],
+        weights: Optional[Mapping[str, Mapping[str, float]]] = None
+    ):
+        """
+        Args:
+            groups: nome gruppo -> lista di pattern
+            weights: nome gruppo -> {pattern: peso} (opzionale, calcolato una volta)
+        """
+        weights = weights or {}
+        self.groups: List[str] = list(groups)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+        self._payloads: List[PatternMatch] = []
+        # Pattern vuoti: `"" in text` è sempre True
+        self._always: List[int] = []
+
+        for group, patterns in groups.items():
+            group_weights = weights.get(group, {})
+            for pattern in dict.fromkeys(patterns):
+                payload_id = len(self._payloads)
+                self._payloads.append((group, pattern, group_weights.get(pattern)))
+                if pattern:
+                    self._add(pattern, payload_id)
+                else:
+                    self._always.append(payload_id)
+        self._build()
+
+    @property
+    def size(self) -> int:
+        """Numero di stati dell'automa"""
+        return len(self._goto)
+
+    def _add(self, pattern: str, payload_id: int):
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = next_state
+        self._out[state].append(payload_id)
+
+    def _build(self):
+        """Calcola i link di fallimento (BFS) e unisce gli output dei suffissi"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+
+    def _matched_ids(self, text: str) -> List[int]:
+        goto, fail, out = self._goto, self._fail, self._out
+        seen = set(self._always)
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                seen.update(out[state])
+        return sorted(seen)
+
+    def find(self, text: str) -> Dict[str, List[Tuple[str, Optional[float]]]]:
+        """
+        Tutti i pattern contenuti nel testo, per gruppo
+
+        Returns:
+            gruppo -> [(pattern, peso)] nell'ordine della lista originale
+            (ogni gruppo è presente, eventualmente vuoto)
+        """
+        matches: Dict[str, List[Tuple[str, Optional[float]]]] = {group: [] for group in self.groups}
+        for payload_id in self._matched_ids(text):
+            group, pattern, weight = self._payloads[payload_id]
+            matches[group].append((pattern, weight))
+        return matches
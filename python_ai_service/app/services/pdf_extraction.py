@@ -0,0 +1,335 @@
+"""
+PDF Extraction - estrazione testo PDF a pagine, chunking incrementale e cache per hash
+
+- iter_pdf_pages: le pagine escono una alla volta dal parser (PyPDF2, fallback
+  pdfplumber), senza concatenare stringhe sempre più lunghe
+- IncrementalChunker: stesso algoritmo di PAActMongoDBImporter.split_text_into_chunks,
+  alimentato pagina per pagina (in memoria resta solo il paragrafo in corso)
+- PDFTextCache: testo estratto su disco indicizzato per SHA-256 del contenuto PDF;
+  un re-import dello stesso file non rifà il parsing
+- PDFExtractionService: esegue l'estrazione in un process pool, fuori dall'event loop
+"""
+
+import asyncio
+import gzip
+import hashlib
+import logging
+import multiprocessing
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+try:
+    import PyPDF2
+    PYPDF2_AVAILABLE = True
+except ImportError:
+    PYPDF2_AVAILABLE = False
+
+try:
+    import pdfplumber
+    PDFPLUMBER_AVAILABLE = True
+except ImportError:
+    PDFPLUMBER_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Configurazione (override da environment)
+PDF_TEXT_CACHE_ENABLED = os.getenv("PDF_TEXT_CACHE_ENABLED", "true").lower() == "true"
+PDF_TEXT_CACHE_DIR = os.getenv(
+    "PDF_TEXT_CACHE_DIR",
+    str(Path(__file__).parent.parent.parent / "storage" / "pdf_text_cache")
+)
+PDF_EXTRACTION_WORKERS = int(os.getenv("PDF_EXTRACTION_WORKERS", str(os.cpu_count() or 2)))
+
+# Come PAActMongoDBImporter.CHUNK_SIZE / CHUNK_OVERLAP
+DEFAULT_CHUNK_SIZE = 2000
+DEFAULT_CHUNK_OVERLAP = 200
+MIN_TEXT_CHARS = 50
+
+PAGE_SEPARATOR = "\f"
+HASH_BLOCK_SIZE = 1024 * 1024
+
+_PARAGRAPH_SPLIT = re.compile(r'\n\s*\n')
+_NON_SPACE = re.compile(r'\S')
+
+
+def pdf_content_hash(pdf_path: str) -> str:
+    """SHA-256 del file PDF (letto a blocchi)"""
+    digest = hashlib.sha256()
+    with open(pdf_path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def iter_pdf_pages(pdf_path: str) -> Iterator[str]:
+    """
+    Testo delle pagine di un PDF, una alla volta
+
+    Errori di parsing si propagano al chiamante; senza PyPDF2 né pdfplumber
+    non produce pagine.
+    """
+    if PYPDF2_AVAILABLE:
+        with open(pdf_path, "rb") as f:
+            for page in PyPDF2.PdfReader(f).pages:
+                yield page.extract_text() or ""
+    elif PDFPLUMBER_AVAILABLE:
+        with pdfplumber.open(pdf_path) as pdf:
+            for page in pdf.pages:
+                yield page.extract_text() or ""
+                # pdfplumber tiene in cache gli oggetti di ogni pagina letta
+                page.flush_cache()
+    else:
+        logger.warning("Né PyPDF2 né pdfplumber installati. Installa uno dei due per estrarre testo PDF.")
+
+
+class IncrementalChunker:
+    """
+    Chunking per paragrafi alimentato a pezzi (pagine)
+
+    feed() ritorna i chunk completati; finish() chiude l'ultimo. Il risultato
+    coincide con split_text_into_chunks sul testo concatenato.
+    """
+
+    def __init__(self, chunk_size: int = DEFAULT_CHUNK_SIZE, overlap: int = DEFAULT_CHUNK_OVERLAP):
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self._pending = ""       # paragrafo non ancora terminato
+        self._current = ""       # chunk in costruzione
+        self._index = 0
+        self._offset = 0
+        self._first_char: Optional[int] = None
+        self._last_char: Optional[int] = None
+
+    @property
+    def stripped_length(self) -> int:
+        """Lunghezza del testo ricevuto al netto degli spazi iniziali/finali (text.strip())"""
+        if self._first_char is None:
+            return 0
+        return self._last_char - self._first_char
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        if not text:
+            return []
+        if self._first_char is None:
+            match = _NON_SPACE.search(text)
+            if match:
+                self._first_char = self._offset + match.start()
+        content_end = len(text.rstrip())
+        if content_end:
+            self._last_char = self._offset + content_end
+        self._offset += len(text)
+
+        paragraphs = _PARAGRAPH_SPLIT.split(self._pending + text)
+        # L'ultimo pezzo può continuare nella pagina successiva
+        self._pending = paragraphs.pop()
+        return self._add_paragraphs(paragraphs)
+
+    def finish(self) -> List[Dict[str, Any]]:
+        chunks = self._add_paragraphs([self._pending])
+        if self._current.strip():
+            chunks.append(self._make_chunk(self._current))
+        self._pending = ""
+        self._current = ""
+        # Testo troppo corto: nessun chunk (sotto soglia non può esserci un chunk già emesso)
+        if self.stripped_length < MIN_TEXT_CHARS:
+            return []
+        return chunks
+
+    def _add_paragraphs(self, paragraphs: Iterable[str]) -> List[Dict[str, Any]]:
+        chunks = []
+        for para in paragraphs:
+            para = para.strip()
+            if not para:
+                continue
+            if self._current and len(self._current) + len(para) + 2 > self.chunk_size:
+                chunks.append(self._make_chunk(self._current))
+                if self.overlap > 0:
+                    self._current = self._current[-self.overlap:] + "\n\n" + para
+                else:
+                    self._current = para
+            elif self._current:
+                self._current += "\n\n" + para
+            else:
+                self._current = para
+        return chunks
+
+    def _make_chunk(self, text: str) -> Dict[str, Any]:
+        chunk = {
+            'chunk_index': self._index,
+            'chunk_text': text.strip(),
+            'tokens': len(text.split())
+        }
+        self._index += 1
+        return chunk
+
+
+def split_text_into_chunks(text: str, chunk_size: int = DEFAULT_CHUNK_SIZE, overlap: int = DEFAULT_CHUNK_OVERLAP) -> List[Dict[str, Any]]:
+    """Chunking di un testo già in memoria"""
+    chunker = IncrementalChunker(chunk_size, overlap)
+    return chunker.feed(text) + chunker.finish()
+
+
+class PDFTextCache:
+    """
+    Testo estratto per hash del contenuto PDF (file gzip, pagine separate da form feed)
+
+    Scrittura atomica (file temporaneo + rename): più processi del pool possono
+    estrarre lo stesso PDF senza lasciare file parziali.
+    """
+
+    base_dir = Path(PDF_TEXT_CACHE_DIR)
+
+    @classmethod
+    def _path(cls, content_hash: str, base_dir: Optional[Path] = None) -> Path:
+        return Path(base_dir or cls.base_dir) / content_hash[:2] / f"{content_hash}.txt.gz"
+
+    @classmethod
+    def get_pages(cls, content_hash: str, base_dir: Optional[Path] = None) -> Optional[List[str]]:
+        path = cls._path(content_hash, base_dir)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                return f.read().split(PAGE_SEPARATOR)
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, UnicodeDecodeError) as e:
+            logger.warning(f"⚠️ Cache testo PDF illeggibile ({path.name}): {e}")
+            return None
+
+    @classmethod
+    def put_pages(cls, content_hash: str, pages: List[str], base_dir: Optional[Path] = None) -> bool:
+        path = cls._path(content_hash, base_dir)
+        temp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with gzip.open(temp_path, "wt", encoding="utf-8") as f:
+                f.write(PAGE_SEPARATOR.join(page.replace(PAGE_SEPARATOR, "\n") for page in pages))
+            os.replace(temp_path, path)
+            return True
+        except OSError as e:
+            logger.warning(f"⚠️ Cache testo PDF non scritta ({path.name}): {e}")
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return False
+
+    @classmethod
+    def reset(cls, base_dir: Optional[Path] = None):
+        """Cambia directory base (usato nei test)"""
+        if base_dir is not None:
+            cls.base_dir = Path(base_dir)
+
+
+def extract_document(
+    pdf_path: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    overlap: int = DEFAULT_CHUNK_OVERLAP,
+    use_cache: bool = PDF_TEXT_CACHE_ENABLED,
+    cache_dir: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Estrae testo e chunk di un PDF in un solo passaggio sulle pagine
+
+    Funzione di modulo (picklable) per il process pool.
+
+    Returns:
+        {"text", "chunks", "page_count", "content_hash", "cached"}; text None
+        se il PDF non contiene testo
+    """
+    content_hash = pdf_content_hash(pdf_path) if use_cache else None
+    cached_pages = PDFTextCache.get_pages(content_hash, cache_dir) if content_hash else None
+    pages_source = cached_pages if cached_pages is not None else iter_pdf_pages(pdf_path)
+
+    chunker = IncrementalChunker(chunk_size, overlap)
+    chunks: List[Dict[str, Any]] = []
+    pages: List[str] = []
+    for page_text in pages_source:
+        pages.append(page_text)
+        chunks.extend(chunker.feed(page_text + "\n"))
+    chunks.extend(chunker.finish())
+
+    if content_hash and cached_pages is None and pages:
+        PDFTextCache.put_pages(content_hash, pages, cache_dir)
+
+    # Una sola join finale al posto di text += page (quadratico su atti lunghi)
+    text = "\n".join(pages).strip()
+    return {
+        "text": text or None,
+        "chunks": chunks,
+        "page_count": len(pages),
+        "content_hash": content_hash,
+        "cached": cached_pages is not None,
+    }
+
+
+def extract_text(pdf_path: str, use_cache: bool = PDF_TEXT_CACHE_ENABLED) -> Optional[str]:
+    """Solo il testo di un PDF (None se vuoto o illeggibile)"""
+    try:
+        return extract_document(pdf_path, use_cache=use_cache)["text"]
+    except Exception as e:
+        logger.error(f"Errore estrazione PDF {pdf_path}: {e}")
+        return None
+
+
+class PDFExtractionService:
+    """
+    Estrazione PDF in un process pool condiviso (singleton)
+
+    Usage:
+        result = await PDFExtractionService.extract(pdf_path)
+        text = await PDFExtractionService.extract_text(pdf_path)
+    """
+
+    _executor: Optional[ProcessPoolExecutor] = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_executor(cls) -> ProcessPoolExecutor:
+        if cls._executor is None:
+            with cls._lock:
+                if cls._executor is None:
+                    cls._executor = ProcessPoolExecutor(
+                        max_workers=max(1, PDF_EXTRACTION_WORKERS),
+                        # spawn: il processo API ha thread (pymongo, pool async) non sicuri con fork
+                        mp_context=multiprocessing.get_context("spawn")
+                    )
+        return cls._executor
+
+    @classmethod
+    async def extract(
+        cls,
+        pdf_path: str,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        overlap: int = DEFAULT_CHUNK_OVERLAP,
+        use_cache: bool = PDF_TEXT_CACHE_ENABLED
+    ) -> Dict[str, Any]:
+        """extract_document in un processo del pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            cls.get_executor(),
+            extract_document,
+            pdf_path,
+            chunk_size,
+            overlap,
+            use_cache,
+            str(PDFTextCache.base_dir)
+        )
+
+    @classmethod
+    async def extract_text(cls, pdf_path: str, use_cache: bool = PDF_TEXT_CACHE_ENABLED) -> Optional[str]:
+        try:
+            return (await cls.extract(pdf_path, use_cache=use_cache))["text"]
+        except Exception as e:
+            logger.error(f"Errore estrazione PDF {pdf_path}: {e}")
+            return None
+
+    @classmethod
+    def shutdown(cls):
+        with cls._lock:
+            if cls._executor is not None:
+                cls._executor.shutdown(wait=False, cancel_futures=True)
+                cls._executor = None
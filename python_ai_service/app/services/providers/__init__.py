@@ -1,13 +1,15 @@
 """AI Provider adapters"""
-from .base import BaseChatAdapter, BaseEmbeddingAdapter
+from .base import BaseChatAdapter, BaseEmbeddingAdapter, StreamCompletion
 from .openai_adapter import OpenAIChatAdapter, OpenAIEmbeddingAdapter
 from .anthropic_adapter import AnthropicChatAdapter
 from .ollama_adapter import OllamaChatAdapter, OllamaEmbeddingAdapter
 from .groq_adapter import GroqChatAdapter, LlamaChatAdapter
+from .http_client import HTTPClientRegistry
 
 __all__ = [
     "BaseChatAdapter",
     "BaseEmbeddingAdapter",
+    "StreamCompletion",
     "OpenAIChatAdapter",
     "OpenAIEmbeddingAdapter",
     "AnthropicChatAdapter",
@@ -15,6 +17,7 @@ __all__ = [
     "OllamaEmbeddingAdapter",
     "GroqChatAdapter",
     "LlamaChatAdapter",
+    "HTTPClientRegistry",
 ]
 
 
@@ -1,9 +1,12 @@
 """Anthropic (Claude) provider adapter"""
 import os
+import json
 import httpx
 import logging
-from typing import List, Dict, Any
-from .base import BaseChatAdapter
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
+from app.services.tracing import traced_provider_call, traced_provider_stream
+from .http_client import HTTPClientRegistry
+from .base import BaseChatAdapter, StreamCompletion
 from .api_errors import (
     APIError, 
     APIErrorType,
@@ -81,49 +84,50 @@ class AnthropicChatAdapter(BaseChatAdapter):
         for model_id in fallbacks:
             try:
                 # Test with minimal request (just to check if model exists)
-                async with httpx.AsyncClient(timeout=10.0) as client:
-                    # Make a minimal test request
-                    test_response = await client.post(
-                        f"{self.base_url}/messages",
-                        headers={
-                            "x-api-key": self.api_key,
-                            "anthropic-version": "2023-06-01",
-                            "Content-Type": "application/json"
-                        },
-                        json={
-                            "model": model_id,
-                            "max_tokens": 10,
-                            "messages": [{"role": "user", "content": "test"}]
-                        }
+                client = HTTPClientRegistry.get(self.base_url, "anthropic")
+                # Make a minimal test request
+                test_response = await client.post(
+                    f"{self.base_url}/messages",
+                    timeout=10.0,
+                    headers={
+                        "x-api-key": self.api_key,
+                        "anthropic-version": "2023-06-01",
+                        "Content-Type": "application/json"
+                    },
+                    json={
+                        "model": model_id,
+                        "max_tokens": 10,
+                        "messages": [{"role": "user", "content": "test"}]
+                    }
+                )
+                if test_response.status_code == 200:
+                    # Model exists and works!
+                    self._discovered_model = model_id
+                    import logging
+                    logger = logging.getLogger(__name__)
+                    logger.info(f"✅ Discovered working Anthropic model: {model_id} for base {self.base_model}")
+                    return model_id
+                
+                # Controlla errori specifici che non dovremmo ignorare
+                # 400 può essere anche "credit balance too low" su Anthropic
+                if test_response.status_code in [400, 401, 402, 429]:
+                    response_text = test_response.text.lower()
+                    # Controlla se è errore di credito/billing
+                    if any(kw in response_text for kw in ['credit', 'balance', 'billing', 'payment', 'insufficient']):
+                        error = parse_api_error(402, test_response.text, "anthropic")
+                        raise error
+                    # Altri errori 400 potrebbero essere modello non valido, proviamo il prossimo
+                    if test_response.status_code == 400:
+                        logger.warning(f"Model {model_id} returned 400: {test_response.text[:200]}")
+                        continue
+                    # 401, 402, 429 sono errori critici
+                    error = parse_api_error(
+                        test_response.status_code, 
+                        test_response.text, 
+                        "anthropic"
                     )
-                    if test_response.status_code == 200:
-                        # Model exists and works!
-                        self._discovered_model = model_id
-                        import logging
-                        logger = logging.getLogger(__name__)
-                        logger.info(f"✅ Discovered working Anthropic model: {model_id} for base {self.base_model}")
-                        return model_id
+                    raise error
                     
-                    # Controlla errori specifici che non dovremmo ignorare
-                    # 400 può essere anche "credit balance too low" su Anthropic
-                    if test_response.status_code in [400, 401, 402, 429]:
-                        response_text = test_response.text.lower()
-                        # Controlla se è errore di credito/billing
-                        if any(kw in response_text for kw in ['credit', 'balance', 'billing', 'payment', 'insufficient']):
-                            error = parse_api_error(402, test_response.text, "anthropic")
-                            raise error
-                        # Altri errori 400 potrebbero essere modello non valido, proviamo il prossimo
-                        if test_response.status_code == 400:
-                            logger.warning(f"Model {model_id} returned 400: {test_response.text[:200]}")
-                            continue
-                        # 401, 402, 429 sono errori critici
-                        error = parse_api_error(
-                            test_response.status_code, 
-                            test_response.text, 
-                            "anthropic"
-                        )
-                        raise error
-                        
             except (InsufficientFundsError, InvalidAPIKeyError, RateLimitError) as api_err:
                 # Errori critici che non dipendono dal modello - propagali
                 raise api_err
@@ -168,16 +172,9 @@ class AnthropicChatAdapter(BaseChatAdapter):
             )
         )
     
-    async def generate(self, messages: List[Dict[str, str]], **options) -> Dict[str, Any]:
-        """Generate chat response using Anthropic API"""
-        if not self.api_key:
-            raise ValueError("ANTHROPIC_API_KEY environment variable not set")
-        
-        # Discover model ID if not already discovered
-        if not self.model:
-            self.model = await self._discover_model()
-        
-        # Convert messages to Anthropic format
+    @staticmethod
+    def _convert_messages(messages: List[Dict[str, str]]) -> Tuple[List[Dict[str, str]], Optional[str]]:
+        """Convert messages to Anthropic format (system message separato)"""
         anthropic_messages = []
         system_message = None
         
@@ -191,89 +188,166 @@ class AnthropicChatAdapter(BaseChatAdapter):
                     "role": role,
                     "content": msg["content"]
                 })
+        return anthropic_messages, system_message
+    
+    @traced_provider_call("anthropic", "generate")
+    async def generate(self, messages: List[Dict[str, str]], **options) -> Dict[str, Any]:
+        """Generate chat response using Anthropic API"""
+        if not self.api_key:
+            raise ValueError("ANTHROPIC_API_KEY environment variable not set")
         
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            try:
+        # Discover model ID if not already discovered
+        if not self.model:
+            self.model = await self._discover_model()
+        
+        anthropic_messages, system_message = self._convert_messages(messages)
+        
+        client = HTTPClientRegistry.get(self.base_url, "anthropic")
+        try:
+            response = await client.post(
+                f"{self.base_url}/messages",
+                timeout=60.0,
+                headers={
+                    "x-api-key": self.api_key,
+                    "anthropic-version": "2023-06-01",
+                    "Content-Type": "application/json"
+                },
+            json={
+                "model": self.model,
+                "max_tokens": options.get("max_tokens", 8192),
+                "temperature": options.get("temperature", 0.7),
+                "messages": anthropic_messages,
+                **({"system": system_message} if system_message else {})
+            }
+            )
+            response.raise_for_status()
+            data = response.json()
+        except httpx.HTTPStatusError as e:
+            # Log dettagli errore per debug
+            logger.error(f"Anthropic API error {e.response.status_code}: {e.response.text}")
+            
+            # Gestisci errori critici (billing, auth, rate limit)
+            if e.response.status_code in [401, 402, 429]:
+                error = parse_api_error(
+                    e.response.status_code, 
+                    e.response.text, 
+                    "anthropic"
+                )
+                raise error
+            
+            if e.response.status_code == 404:
+                # Model might have been deprecated, re-discover
+                self._discovered_model = None
+                self.model = await self._discover_model()
+                # Retry with discovered model
                 response = await client.post(
                     f"{self.base_url}/messages",
+                    timeout=60.0,
                     headers={
                         "x-api-key": self.api_key,
                         "anthropic-version": "2023-06-01",
                         "Content-Type": "application/json"
                     },
-                json={
-                    "model": self.model,
-                    "max_tokens": options.get("max_tokens", 8192),
-                    "temperature": options.get("temperature", 0.7),
-                    "messages": anthropic_messages,
-                    **({"system": system_message} if system_message else {})
-                }
+                    json={
+                        "model": self.model,
+                        "max_tokens": options.get("max_tokens", 8192),
+                        "temperature": options.get("temperature", 0.7),
+                        "messages": anthropic_messages,
+                        **({"system": system_message} if system_message else {})
+                    }
                 )
                 response.raise_for_status()
                 data = response.json()
-            except httpx.HTTPStatusError as e:
-                # Log dettagli errore per debug
-                logger.error(f"Anthropic API error {e.response.status_code}: {e.response.text}")
-                
-                # Gestisci errori critici (billing, auth, rate limit)
-                if e.response.status_code in [401, 402, 429]:
-                    error = parse_api_error(
-                        e.response.status_code, 
-                        e.response.text, 
-                        "anthropic"
-                    )
-                    raise error
-                
-                if e.response.status_code == 404:
-                    # Model might have been deprecated, re-discover
-                    self._discovered_model = None
-                    self.model = await self._discover_model()
-                    # Retry with discovered model
-                    response = await client.post(
-                        f"{self.base_url}/messages",
-                        headers={
-                            "x-api-key": self.api_key,
-                            "anthropic-version": "2023-06-01",
-                            "Content-Type": "application/json"
-                        },
-                        json={
-                            "model": self.model,
-                            "max_tokens": options.get("max_tokens", 8192),
-                            "temperature": options.get("temperature", 0.7),
-                            "messages": anthropic_messages,
-                            **({"system": system_message} if system_message else {})
-                        }
-                    )
-                    response.raise_for_status()
-                    data = response.json()
-                else:
-                    # Errore generico - prova a parsarlo
-                    error = parse_api_error(
-                        e.response.status_code, 
-                        e.response.text, 
-                        "anthropic"
-                    )
-                    raise error
-            
-            content_text = ""
-            if isinstance(data["content"], list):
-                content_text = "".join(
-                    item.get("text", "") for item in data["content"] if item.get("type") == "text"
-                )
             else:
-                content_text = str(data["content"])
-            
-            return {
-                "content": content_text,
-                "usage": {
-                    "input_tokens": data["usage"]["input_tokens"],
-                    "output_tokens": data["usage"]["output_tokens"]
-                },
-                "model": data["model"],
-                "finish_reason": data.get("stop_reason", "stop")
+                # Errore generico - prova a parsarlo
+                error = parse_api_error(
+                    e.response.status_code, 
+                    e.response.text, 
+                    "anthropic"
+                )
+                raise error
+        
+        content_text = ""
+        if isinstance(data["content"], list):
+            content_text = "".join(
+                item.get("text", "") for item in data["content"] if item.get("type") == "text"
+            )
+        else:
+            content_text = str(data["content"])
+        
+        return {
+            "content": content_text,
+            "usage": {
+                "input_tokens": data["usage"]["input_tokens"],
+                "output_tokens": data["usage"]["output_tokens"]
+            },
+            "model": data["model"],
+            "finish_reason": data.get("stop_reason", "stop")
+        }
+    
+    @traced_provider_stream("anthropic")
+    async def generate_stream(self, messages: List[Dict[str, str]], **options) -> AsyncIterator[Any]:
+        """
+        Generate chat response as streamed text chunks (SSE content_block_delta)
+        
+        Usage: input_tokens from message_start, cumulative output_tokens from message_delta.
+        """
+        if not self.api_key:
+            raise ValueError("ANTHROPIC_API_KEY environment variable not set")
+        
+        if not self.model:
+            self.model = await self._discover_model()
+        
+        anthropic_messages, system_message = self._convert_messages(messages)
+        
+        client = HTTPClientRegistry.get(self.base_url, "anthropic")
+        async with client.stream(
+            "POST",
+            f"{self.base_url}/messages",
+            timeout=120.0,
+            headers={
+                "x-api-key": self.api_key,
+                "anthropic-version": "2023-06-01",
+                "Content-Type": "application/json"
+            },
+            json={
+                "model": self.model,
+                "max_tokens": options.get("max_tokens", 8192),
+                "temperature": options.get("temperature", 0.7),
+                "messages": anthropic_messages,
+                "stream": True,
+                **({"system": system_message} if system_message else {})
             }
-
-
-
-
-
+        ) as response:
+            if response.status_code >= 400:
+                body = (await response.aread()).decode("utf-8", errors="replace")
+                logger.error(f"Anthropic API stream error {response.status_code}: {body}")
+                raise parse_api_error(response.status_code, body, "anthropic")
+            completion = StreamCompletion(
+                usage={"input_tokens": 0, "output_tokens": 0}, model=self.model, finish_reason="stop"
+            )
+            async for line in response.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                try:
+                    event = json.loads(line[6:])
+                except json.JSONDecodeError:
+                    continue
+                if event.get("type") == "content_block_delta":
+                    text = event.get("delta", {}).get("text")
+                    if text:
+                        yield text
+                elif event.get("type") == "message_start":
+                    message = event.get("message", {})
+                    usage = message.get("usage", {})
+                    completion["model"] = message.get("model", completion["model"])
+                    completion["usage"]["input_tokens"] = usage.get("input_tokens", 0)
+                    completion["usage"]["output_tokens"] = usage.get("output_tokens", 0)
+                elif event.get("type") == "message_delta":
+                    if "output_tokens" in event.get("usage", {}):
+                        completion["usage"]["output_tokens"] = event["usage"]["output_tokens"]
+                    if event.get("delta", {}).get("stop_reason"):
+                        completion["finish_reason"] = event["delta"]["stop_reason"]
+                elif event.get("type") == "message_stop":
+                    break
+            yield completion
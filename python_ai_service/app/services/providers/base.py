@@ -1,6 +1,15 @@
 """Base classes for AI provider adapters"""
+import asyncio
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncIterator, Union
+
+
+class StreamCompletion(dict):
+    """
+    Terminal item of generate_stream(): 'usage', 'model' and 'finish_reason' of the
+    streamed response (same keys as generate(), without 'content')
+    """
+
 
 class BaseChatAdapter(ABC):
     """Base class for chat model adapters"""
@@ -18,6 +27,23 @@ class BaseChatAdapter(ABC):
             Dict with 'content', 'usage', 'model', 'finish_reason'
         """
         pass
+    
+    async def generate_stream(self, messages: List[Dict[str, str]], **options) -> AsyncIterator[Union[str, StreamCompletion]]:
+        """
+        Generate chat response as a stream of text chunks
+        
+        Default: a single chunk with the full generate() content. Adapters whose
+        provider supports streaming override this to yield tokens as they arrive.
+        The last item is a StreamCompletion with the usage reported by the provider.
+        """
+        result = await self.generate(messages, **options)
+        if result.get("content"):
+            yield result["content"]
+        yield StreamCompletion(
+            usage=result.get("usage") or {},
+            model=result.get("model") or getattr(self, "model", None) or "",
+            finish_reason=result.get("finish_reason", "stop")
+        )
 
 class BaseEmbeddingAdapter(ABC):
     """Base class for embedding model adapters"""
@@ -35,6 +61,18 @@ class BaseEmbeddingAdapter(ABC):
             Dict with 'embedding' (list of floats), 'dimensions', 'model', 'tokens'
         """
         pass
+    
+    async def embed_batch(self, texts: List[str], **options) -> List[Dict[str, Any]]:
+        """
+        Generate embeddings for many texts
+        
+        Default: concurrent single-text calls. Adapters whose provider accepts
+        list input override this with a single upstream request.
+        
+        Returns:
+            One dict per input text (same order and shape as embed())
+        """
+        return list(await asyncio.gather(*(self.embed(text, **options) for text in texts)))
 
 
 
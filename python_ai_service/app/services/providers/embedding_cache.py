@@ -0,0 +1,337 @@
+"""
+Embedding cache - cache content-addressed degli embedding
+
+Gli stessi testi vengono embeddati di continuo (domande ripetute, follow-up,
+query generative espanse, re-import di chunk invariati). La cache sta davanti
+all'adapter restituito da AIRouter.get_embedding_adapter:
+- chiave: sha256(modello | dimensioni | testo normalizzato)
+- tier 1: LRU in-process con limite di voci e TTL
+- tier 2 opzionale (EMBEDDING_CACHE_BACKEND): Redis o MongoDB, condiviso tra processi
+- metriche di hit rate per /system/status
+"""
+
+import os
+import time
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from .base import BaseEmbeddingAdapter
+
+logger = logging.getLogger(__name__)
+
+# Configurazione (override da environment)
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "10000"))
+EMBEDDING_CACHE_TTL_SECONDS = float(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", "86400"))
+EMBEDDING_CACHE_BACKEND = os.getenv("EMBEDDING_CACHE_BACKEND", "none").lower()  # none | redis | mongodb
+EMBEDDING_CACHE_PERSISTENT_TTL_SECONDS = int(os.getenv("EMBEDDING_CACHE_PERSISTENT_TTL_SECONDS", str(30 * 86400)))
+EMBEDDING_CACHE_REDIS_DB = int(os.getenv("EMBEDDING_CACHE_REDIS_DB", "3"))
+EMBEDDING_CACHE_COLLECTION = "embedding_cache"
+
+
+def normalize_text(text: str) -> str:
+    """Normalizzazione usata per la chiave: Unicode NFC e spazi compressi"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(model: str, dimensions: Any, text: str) -> str:
+    payload = f"{model}|{dimensions}|{normalize_text(text)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _encode(embedding: List[float]) -> bytes:
+    return np.asarray(embedding, dtype=np.float32).tobytes()
+
+
+def _decode(data: bytes) -> List[float]:
+    return np.frombuffer(data, dtype=np.float32).tolist()
+
+
+class RedisEmbeddingTier:
+    """Tier persistente su Redis (vettori float32 serializzati, scadenza nativa)"""
+
+    def __init__(self, ttl_seconds: int = EMBEDDING_CACHE_PERSISTENT_TTL_SECONDS):
+        import redis.asyncio as redis_asyncio
+
+        self.ttl_seconds = ttl_seconds
+        self.client = redis_asyncio.Redis(
+            host=os.getenv("REDIS_HOST", "127.0.0.1"),
+            port=int(os.getenv("REDIS_PORT", "6379")),
+            password=os.getenv("REDIS_PASSWORD") or None,
+            db=EMBEDDING_CACHE_REDIS_DB
+        )
+
+    async def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        values = await self.client.mget([f"emb:{key}" for key in keys])
+        return {key: _decode(value) for key, value in zip(keys, values) if value}
+
+    async def set_many(self, items: Dict[str, List[float]]):
+        async with self.client.pipeline(transaction=False) as pipe:
+            for key, embedding in items.items():
+                pipe.set(f"emb:{key}", _encode(embedding), ex=self.ttl_seconds)
+            await pipe.execute()
+
+
+class MongoEmbeddingTier:
+    """Tier persistente su MongoDB (collection embedding_cache con TTL index)"""
+
+    def __init__(self, ttl_seconds: int = EMBEDDING_CACHE_PERSISTENT_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._indexed = False
+
+    def _collection(self):
+        from app.services.mongodb_service import MongoDBService
+
+        collection = MongoDBService.get_collection(EMBEDDING_CACHE_COLLECTION)
+        if collection is not None and not self._indexed:
+            collection.create_index("expires_at", expireAfterSeconds=0)
+            self._indexed = True
+        return collection
+
+    def _get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        collection = self._collection()
+        if collection is None:
+            return {}
+        cursor = collection.find({"_id": {"$in": keys}}, {"vector": 1})
+        return {doc["_id"]: _decode(doc["vector"]) for doc in cursor}
+
+    def _set_many(self, items: Dict[str, List[float]]):
+        from pymongo import UpdateOne
+
+        collection = self._collection()
+        if collection is None or not items:
+            return
+        expires_at = datetime.utcnow() + timedelta(seconds=self.ttl_seconds)
+        collection.bulk_write([
+            UpdateOne({"_id": key}, {"$set": {"vector": _encode(embedding), "expires_at": expires_at}}, upsert=True)
+            for key, embedding in items.items()
+        ], ordered=False)
+
+    async def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        from app.services.mongodb_async import AsyncMongoDBService
+
+        return await AsyncMongoDBService.run(self._get_many, keys)
+
+    async def set_many(self, items: Dict[str, List[float]]):
+        from app.services.mongodb_async import AsyncMongoDBService
+
+        await AsyncMongoDBService.run(self._set_many, items)
+
+
+class EmbeddingCache:
+    """LRU in-process + tier persistente opzionale (classmethod singleton)"""
+
+    _lock = threading.Lock()
+    _entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (embedding, stored_at)
+    _max_entries = EMBEDDING_CACHE_MAX_ENTRIES
+    _ttl = EMBEDDING_CACHE_TTL_SECONDS
+    _tier: Optional[Any] = None
+    _tier_loaded = False
+
+    _metrics: Dict[str, int] = {
+        "lookups": 0,
+        "memory_hits": 0,
+        "persistent_hits": 0,
+        "misses": 0,
+        "evictions": 0,
+        "tier_errors": 0,
+    }
+
+    @classmethod
+    def configure(cls, max_entries: Optional[int] = None, ttl_seconds: Optional[float] = None, tier: Any = None):
+        """Cambia limiti e tier (usato nei test)"""
+        with cls._lock:
+            if max_entries is not None:
+                cls._max_entries = max_entries
+            if ttl_seconds is not None:
+                cls._ttl = ttl_seconds
+            cls._tier = tier
+            cls._tier_loaded = True
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls._entries.clear()
+            for key in cls._metrics:
+                cls._metrics[key] = 0
+            cls._max_entries = EMBEDDING_CACHE_MAX_ENTRIES
+            cls._ttl = EMBEDDING_CACHE_TTL_SECONDS
+            cls._tier = None
+            cls._tier_loaded = False
+
+    @classmethod
+    def get_tier(cls):
+        """Tier persistente configurato (creato alla prima richiesta)"""
+        if not cls._tier_loaded:
+            cls._tier_loaded = True
+            try:
+                if EMBEDDING_CACHE_BACKEND == "redis":
+                    cls._tier = RedisEmbeddingTier()
+                elif EMBEDDING_CACHE_BACKEND == "mongodb":
+                    cls._tier = MongoEmbeddingTier()
+                if cls._tier is not None:
+                    logger.info(f"🗄️ Embedding cache persistent tier: {EMBEDDING_CACHE_BACKEND}")
+            except Exception as e:
+                logger.warning(f"⚠️ Embedding cache tier '{EMBEDDING_CACHE_BACKEND}' non disponibile: {e}")
+                cls._tier = None
+        return cls._tier
+
+    @classmethod
+    def _count(cls, **deltas: int):
+        with cls._lock:
+            for key, value in deltas.items():
+                cls._metrics[key] += value
+
+    @classmethod
+    def _memory_get(cls, key: str) -> Optional[List[float]]:
+        with cls._lock:
+            entry = cls._entries.get(key)
+            if entry is None:
+                return None
+            embedding, stored_at = entry
+            if time.monotonic() - stored_at > cls._ttl:
+                del cls._entries[key]
+                return None
+            cls._entries.move_to_end(key)
+            return embedding
+
+    @classmethod
+    def _memory_put(cls, key: str, embedding: List[float]):
+        with cls._lock:
+            cls._entries[key] = (embedding, time.monotonic())
+            cls._entries.move_to_end(key)
+            while len(cls._entries) > cls._max_entries:
+                cls._entries.popitem(last=False)
+                cls._metrics["evictions"] += 1
+
+    @classmethod
+    async def get_many(cls, keys: Iterable[str]) -> Dict[str, List[float]]:
+        """Embedding in cache per le chiavi date (memoria, poi tier persistente)"""
+        keys = list(dict.fromkeys(keys))
+        found: Dict[str, List[float]] = {}
+        for key in keys:
+            embedding = cls._memory_get(key)
+            if embedding is not None:
+                found[key] = embedding
+        memory_hits = len(found)
+
+        missing = [key for key in keys if key not in found]
+        persistent: Dict[str, List[float]] = {}
+        tier = cls.get_tier()
+        if missing and tier is not None:
+            try:
+                persistent = await tier.get_many(missing)
+            except Exception as e:
+                cls._count(tier_errors=1)
+                logger.debug(f"Embedding cache tier get error: {e}")
+            for key, embedding in persistent.items():
+                cls._memory_put(key, embedding)
+                found[key] = embedding
+
+        cls._count(
+            lookups=len(keys),
+            memory_hits=memory_hits,
+            persistent_hits=len(persistent),
+            misses=len(keys) - len(found)
+        )
+        return found
+
+    @classmethod
+    async def put_many(cls, items: Dict[str, List[float]]):
+        for key, embedding in items.items():
+            cls._memory_put(key, embedding)
+        tier = cls.get_tier()
+        if items and tier is not None:
+            try:
+                await tier.set_many(items)
+            except Exception as e:
+                cls._count(tier_errors=1)
+                logger.debug(f"Embedding cache tier set error: {e}")
+
+    @classmethod
+    def get_stats(cls) -> Dict[str, Any]:
+        """Hit rate e occupazione (per /system/status)"""
+        with cls._lock:
+            metrics = dict(cls._metrics)
+            size = len(cls._entries)
+        lookups = metrics["lookups"]
+        hits = metrics["memory_hits"] + metrics["persistent_hits"]
+        return {
+            **metrics,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "size": size,
+            "max_entries": cls._max_entries,
+            "backend": EMBEDDING_CACHE_BACKEND if cls._tier is not None else "memory",
+        }
+
+
+class CachingEmbeddingAdapter(BaseEmbeddingAdapter):
+    """Adapter che serve dalla cache gli embedding già calcolati; i miss vanno all'adapter interno"""
+
+    def __init__(self, adapter: BaseEmbeddingAdapter):
+        self._adapter = adapter
+
+    def _key(self, text: str, options: Dict[str, Any]) -> str:
+        dimensions = options.get("dimensions", getattr(self._adapter, "dimensions", None))
+        return cache_key(str(getattr(self._adapter, "model", type(self._adapter).__name__)), dimensions, text)
+
+    def _cached_result(self, embedding: List[float]) -> Dict[str, Any]:
+        return {
+            "embedding": embedding,
+            "dimensions": len(embedding),
+            "model": str(getattr(self._adapter, "model", "")),
+            "tokens": 0,  # nessuna chiamata al provider
+            "cached": True,
+        }
+
+    async def embed(self, text: str, **options) -> Dict[str, Any]:
+        key = self._key(text, options)
+        found = await EmbeddingCache.get_many([key])
+        if key in found:
+            return self._cached_result(found[key])
+
+        result = await self._adapter.embed(text, **options)
+        if result.get("embedding"):
+            await EmbeddingCache.put_many({key: result["embedding"]})
+        return result
+
+    async def embed_batch(self, texts: List[str], **options) -> List[Dict[str, Any]]:
+        keys = [self._key(text, options) for text in texts]
+        found = await EmbeddingCache.get_many(keys)
+
+        # Solo i testi mancanti (una volta sola) vanno al provider
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+
+        computed: Dict[str, Dict[str, Any]] = {}
+        if missing:
+            results = await self._adapter.embed_batch(list(missing.values()), **options)
+            computed = dict(zip(missing.keys(), results))
+            await EmbeddingCache.put_many({
+                key: result["embedding"] for key, result in computed.items() if result.get("embedding")
+            })
+
+        output = []
+        emitted = set()
+        for key in keys:
+            if key in computed:
+                result = computed[key]
+                if key in emitted:
+                    result = {**result, "tokens": 0}  # duplicato: token contati una sola volta
+                emitted.add(key)
+                output.append(result)
+            else:
+                output.append(self._cached_result(found[key]))
+        return output
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._adapter, name)
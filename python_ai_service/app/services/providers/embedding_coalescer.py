@@ -0,0 +1,132 @@
+"""
+Embedding coalescer - micro-batching delle chiamate embed() concorrenti
+
+Chat concorrenti generano ciascuna l'embedding della propria domanda con
+una richiesta separata. Il coalescer raccoglie le chiamate embed() che
+arrivano entro EMBEDDING_COALESCE_WINDOW_MS e le invia al provider con
+una sola embed_batch() (testi duplicati calcolati una volta).
+"""
+
+import os
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from .base import BaseEmbeddingAdapter
+
+logger = logging.getLogger(__name__)
+
+# Configurazione (override da environment); window 0 disattiva il coalescing
+EMBEDDING_COALESCE_WINDOW_MS = float(os.getenv("EMBEDDING_COALESCE_WINDOW_MS", "5"))
+EMBEDDING_COALESCE_MAX_BATCH = int(os.getenv("EMBEDDING_COALESCE_MAX_BATCH", "64"))
+
+
+class EmbeddingCoalescer:
+    """Raggruppa le embed() concorrenti verso lo stesso modello (una istanza per modello)"""
+
+    _instances: Dict[Tuple[str, str], "EmbeddingCoalescer"] = {}
+
+    def __init__(
+        self,
+        adapter: BaseEmbeddingAdapter,
+        window_ms: float = EMBEDDING_COALESCE_WINDOW_MS,
+        max_batch: int = EMBEDDING_COALESCE_MAX_BATCH
+    ):
+        self.adapter = adapter
+        self.window = window_ms / 1000
+        self.max_batch = max(1, max_batch)
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stats = {"calls": 0, "upstream_requests": 0, "texts_sent": 0, "largest_batch": 0}
+
+    @classmethod
+    def for_adapter(cls, adapter: BaseEmbeddingAdapter) -> "EmbeddingCoalescer":
+        """Coalescer condiviso da tutti gli AIRouter per lo stesso provider/modello"""
+        key = (type(adapter).__name__, str(getattr(adapter, "model", "")))
+        if key not in cls._instances:
+            cls._instances[key] = cls(adapter)
+        return cls._instances[key]
+
+    @classmethod
+    def reset(cls):
+        cls._instances.clear()
+
+    @classmethod
+    def get_stats(cls) -> Dict[str, Dict[str, Any]]:
+        stats = {}
+        for (adapter_name, model), coalescer in cls._instances.items():
+            values = dict(coalescer.stats)
+            requests = values["upstream_requests"]
+            values["avg_batch"] = round(values["calls"] / requests, 2) if requests else 0.0
+            stats[f"{adapter_name}:{model}"] = values
+        return stats
+
+    async def embed(self, text: str, **options) -> Dict[str, Any]:
+        # Opzioni per chiamata (es. dimensions) cambiano la richiesta: nessun raggruppamento
+        if options:
+            return await self.adapter.embed(text, **options)
+
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Nuovo event loop (script/test con asyncio.run): lo stato precedente non è riusabile
+            self._loop, self._pending, self._timer = loop, [], None
+
+        future = loop.create_future()
+        self._pending.append((text, future))
+        self.stats["calls"] += 1
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            self._loop.create_task(self._send(batch))
+
+    async def _send(self, batch: List[Tuple[str, asyncio.Future]]):
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        self.stats["upstream_requests"] += 1
+        self.stats["texts_sent"] += len(texts)
+        self.stats["largest_batch"] = max(self.stats["largest_batch"], len(batch))
+
+        try:
+            if len(texts) == 1:
+                results = [await self.adapter.embed(texts[0])]
+            else:
+                results = await self.adapter.embed_batch(texts)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        by_text = dict(zip(texts, results))
+        for text, future in batch:
+            if not future.done():
+                future.set_result(by_text[text])
+        if len(batch) > 1:
+            logger.debug(f"🧩 Coalesced {len(batch)} embed() calls into 1 request ({len(texts)} unique texts)")
+
+
+class CoalescingEmbeddingAdapter(BaseEmbeddingAdapter):
+    """Adapter che instrada embed() nel coalescer; gli altri attributi sono quelli dell'adapter originale"""
+
+    def __init__(self, adapter: BaseEmbeddingAdapter):
+        self._adapter = adapter
+        self._coalescer = EmbeddingCoalescer.for_adapter(adapter)
+
+    async def embed(self, text: str, **options) -> Dict[str, Any]:
+        return await self._coalescer.embed(text, **options)
+
+    async def embed_batch(self, texts: List[str], **options) -> List[Dict[str, Any]]:
+        return await self._adapter.embed_batch(texts, **options)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._adapter, name)
@@ -13,7 +13,9 @@ import os
 import httpx
 import logging
 from typing import List, Dict, Any
-from .base import BaseChatAdapter
+from app.services.tracing import traced_provider_call, traced_provider_stream
+from .http_client import HTTPClientRegistry
+from .base import BaseChatAdapter, StreamCompletion
 from .api_errors import (
     APIError,
     APIErrorType,
@@ -70,6 +72,7 @@ class GroqChatAdapter(BaseChatAdapter):
             
         logger.info(f"Groq adapter initialized with model: {self.model}")
     
+    @traced_provider_call("groq", "generate")
     async def generate(self, messages: List[Dict[str, str]], **options) -> Dict[str, Any]:
         """
         Genera risposta usando Groq API (compatibile OpenAI).
@@ -88,109 +91,126 @@ class GroqChatAdapter(BaseChatAdapter):
             )
         
         # Groq usa formato OpenAI-compatibile
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            try:
-                response = await client.post(
-                    f"{self.base_url}/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {self.api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": self.model,
-                        "messages": messages,
-                        "max_tokens": options.get("max_tokens", 8192),
-                        "temperature": options.get("temperature", 0.7),
-                        "top_p": options.get("top_p", 1.0),
-                        "stream": False
-                    }
-                )
-                
-                # Gestione errori HTTP
-                if response.status_code != 200:
-                    error_text = response.text
-                    logger.error(f"Groq API error {response.status_code}: {error_text}")
-                    
-                    # Parse errore specifico
-                    error = parse_api_error(response.status_code, error_text, "groq")
-                    raise error
-                
-                data = response.json()
-                
-                # Estrai contenuto dalla risposta
-                content = data["choices"][0]["message"]["content"]
-                
-                return {
-                    "content": content,
-                    "usage": {
-                        "input_tokens": data["usage"]["prompt_tokens"],
-                        "output_tokens": data["usage"]["completion_tokens"],
-                        "total_tokens": data["usage"]["total_tokens"]
-                    },
-                    "model": data["model"],
-                    "finish_reason": data["choices"][0].get("finish_reason", "stop")
+        client = HTTPClientRegistry.get(self.base_url, "groq")
+        try:
+            response = await client.post(
+                f"{self.base_url}/chat/completions",
+                timeout=120.0,
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json"
+                },
+                json={
+                    "model": self.model,
+                    "messages": messages,
+                    "max_tokens": options.get("max_tokens", 8192),
+                    "temperature": options.get("temperature", 0.7),
+                    "top_p": options.get("top_p", 1.0),
+                    "stream": False
                 }
+            )
+            
+            # Gestione errori HTTP
+            if response.status_code != 200:
+                error_text = response.text
+                logger.error(f"Groq API error {response.status_code}: {error_text}")
                 
-            except httpx.HTTPStatusError as e:
-                logger.error(f"Groq HTTP error: {e.response.status_code} - {e.response.text}")
-                error = parse_api_error(e.response.status_code, e.response.text, "groq")
+                # Parse errore specifico
+                error = parse_api_error(response.status_code, error_text, "groq")
                 raise error
-                
-            except httpx.TimeoutException:
-                raise APIError(
-                    message="Groq API timeout",
-                    error_type=APIErrorType.TIMEOUT,
-                    provider="groq"
-                )
-                
-            except Exception as e:
-                logger.error(f"Groq unexpected error: {str(e)}")
-                raise APIError(
-                    message=str(e),
-                    error_type=APIErrorType.UNKNOWN,
-                    provider="groq"
-                )
-    
+            
+            data = response.json()
+            
+            # Estrai contenuto dalla risposta
+            content = data["choices"][0]["message"]["content"]
+            
+            return {
+                "content": content,
+                "usage": {
+                    "input_tokens": data["usage"]["prompt_tokens"],
+                    "output_tokens": data["usage"]["completion_tokens"],
+                    "total_tokens": data["usage"]["total_tokens"]
+                },
+                "model": data["model"],
+                "finish_reason": data["choices"][0].get("finish_reason", "stop")
+            }
+            
+        except httpx.HTTPStatusError as e:
+            logger.error(f"Groq HTTP error: {e.response.status_code} - {e.response.text}")
+            error = parse_api_error(e.response.status_code, e.response.text, "groq")
+            raise error
+            
+        except httpx.TimeoutException:
+            raise APIError(
+                message="Groq API timeout",
+                error_type=APIErrorType.TIMEOUT,
+                provider="groq"
+            )
+            
+        except Exception as e:
+            logger.error(f"Groq unexpected error: {str(e)}")
+            raise APIError(
+                message=str(e),
+                error_type=APIErrorType.UNKNOWN,
+                provider="groq"
+            )
+
+    @traced_provider_stream("groq")
     async def generate_stream(self, messages: List[Dict[str, str]], **options):
         """
         Genera risposta in streaming (per UX real-time).
         
         Yields:
-            Chunks di testo man mano che arrivano
+            Chunks di testo man mano che arrivano, poi uno StreamCompletion con l'usage
         """
         if not self.api_key:
             raise InvalidAPIKeyError(provider="groq")
         
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            async with client.stream(
-                "POST",
-                f"{self.base_url}/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": self.model,
-                    "messages": messages,
-                    "max_tokens": options.get("max_tokens", 8192),
-                    "temperature": options.get("temperature", 0.7),
-                    "stream": True
-                }
-            ) as response:
-                async for line in response.aiter_lines():
-                    if line.startswith("data: "):
-                        data = line[6:]
-                        if data == "[DONE]":
-                            break
-                        try:
-                            import json
-                            chunk = json.loads(data)
-                            content = chunk["choices"][0].get("delta", {}).get("content", "")
-                            if content:
-                                yield content
-                        except:
-                            continue
-    
+        client = HTTPClientRegistry.get(self.base_url, "groq")
+        async with client.stream(
+            "POST",
+            f"{self.base_url}/chat/completions",
+            timeout=120.0,
+            headers={
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json"
+            },
+            json={
+                "model": self.model,
+                "messages": messages,
+                "max_tokens": options.get("max_tokens", 8192),
+                "temperature": options.get("temperature", 0.7),
+                "stream": True,
+                "stream_options": {"include_usage": True}
+            }
+        ) as response:
+            completion = StreamCompletion(usage={}, model=self.model, finish_reason="stop")
+            async for line in response.aiter_lines():
+                if line.startswith("data: "):
+                    data = line[6:]
+                    if data == "[DONE]":
+                        break
+                    try:
+                        import json
+                        chunk = json.loads(data)
+                    except:
+                        continue
+                    # Usage nel chunk finale (stream_options) o in x_groq per le versioni precedenti
+                    usage = chunk.get("usage") or (chunk.get("x_groq") or {}).get("usage")
+                    if usage:
+                        completion["usage"] = {
+                            "input_tokens": usage.get("prompt_tokens", 0),
+                            "output_tokens": usage.get("completion_tokens", 0),
+                            "total_tokens": usage.get("total_tokens", 0)
+                        }
+                    choices = chunk.get("choices") or [{}]
+                    if choices[0].get("finish_reason"):
+                        completion["finish_reason"] = choices[0]["finish_reason"]
+                    content = choices[0].get("delta", {}).get("content", "")
+                    if content:
+                        yield content
+            yield completion
+
     def get_model_info(self) -> Dict[str, Any]:
         """Restituisce info sul modello corrente"""
         return {
@@ -0,0 +1,137 @@
+"""
+HTTP client pool condiviso per i provider AI
+
+Ogni adapter apriva un httpx.AsyncClient per chiamata: handshake TCP+TLS
+a ogni richiesta LLM/embedding. Il registry mantiene un client per base URL
+(keep-alive, HTTP/2 se il pacchetto h2 è installato, limiti configurabili),
+chiuso nel lifespan di app/main.py, e misura il riuso delle connessioni
+per provider.
+"""
+
+import os
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+try:
+    import h2  # noqa: F401 - richiesto da httpx per HTTP/2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Configurazione (override da environment)
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("HTTP_KEEPALIVE_EXPIRY_SECONDS", "30"))
+HTTP_DEFAULT_TIMEOUT_SECONDS = float(os.getenv("HTTP_DEFAULT_TIMEOUT_SECONDS", "60"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true" and HTTP2_AVAILABLE
+
+
+class HTTPClientRegistry:
+    """Client httpx condivisi per base URL (classmethod singleton)"""
+
+    _clients: Dict[str, Tuple[httpx.AsyncClient, Optional[asyncio.AbstractEventLoop]]] = {}
+    _providers: Dict[str, str] = {}
+    _lock = threading.Lock()
+    _metrics: Dict[str, Dict[str, int]] = {}
+
+    @classmethod
+    def _record(cls, provider: str, **deltas: int):
+        with cls._lock:
+            metrics = cls._metrics.setdefault(provider, {"requests": 0, "new_connections": 0, "errors": 0})
+            for key, value in deltas.items():
+                metrics[key] += value
+
+    @classmethod
+    def _build_client(cls, base_url: str, provider: str) -> httpx.AsyncClient:
+        async def trace(event_name: str, info: Dict[str, Any]):
+            # httpcore emette connect_tcp solo quando apre una nuova connessione
+            if event_name == "connection.connect_tcp.complete":
+                cls._record(provider, new_connections=1)
+
+        async def on_request(request: httpx.Request):
+            request.extensions["trace"] = trace
+            cls._record(provider, requests=1)
+
+        async def on_response(response: httpx.Response):
+            if response.status_code >= 400:
+                cls._record(provider, errors=1)
+
+        return httpx.AsyncClient(
+            base_url=base_url,
+            http2=HTTP2_ENABLED,
+            timeout=HTTP_DEFAULT_TIMEOUT_SECONDS,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS
+            ),
+            event_hooks={"request": [on_request], "response": [on_response]}
+        )
+
+    @classmethod
+    def get(cls, base_url: str, provider: Optional[str] = None) -> httpx.AsyncClient:
+        """
+        Client condiviso per un base URL
+
+        Le connessioni di un client appartengono all'event loop che le ha aperte:
+        se il loop cambia (es. script e test con asyncio.run) il client viene ricreato.
+
+        Args:
+            base_url: URL base del provider (es. https://api.openai.com/v1)
+            provider: Nome per le metriche (default: base URL)
+        """
+        key = base_url.rstrip("/")
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+
+        with cls._lock:
+            entry = cls._clients.get(key)
+            if entry is not None and not entry[0].is_closed and (loop is None or entry[1] in (None, loop)):
+                return entry[0]
+            provider = provider or cls._providers.get(key) or key
+            client = cls._build_client(key, provider)
+            cls._clients[key] = (client, loop)
+            cls._providers[key] = provider
+
+        logger.info(f"🔌 HTTP client pool created for {provider} ({key}, http2={HTTP2_ENABLED})")
+        return client
+
+    @classmethod
+    def get_stats(cls) -> Dict[str, Any]:
+        """Metriche di riuso connessioni per provider (per /system/status)"""
+        with cls._lock:
+            metrics = {provider: dict(values) for provider, values in cls._metrics.items()}
+            open_clients = sum(1 for client, _ in cls._clients.values() if not client.is_closed)
+        for values in metrics.values():
+            requests = values["requests"]
+            reused = max(requests - values["new_connections"], 0)
+            values["reused_connections"] = reused
+            values["reuse_ratio"] = round(reused / requests, 3) if requests else 0.0
+        return {"http2": HTTP2_ENABLED, "open_clients": open_clients, "providers": metrics}
+
+    @classmethod
+    def reset_stats(cls):
+        with cls._lock:
+            cls._metrics.clear()
+
+    @classmethod
+    async def aclose(cls):
+        """Chiude tutti i client (shutdown del servizio)"""
+        with cls._lock:
+            entries = list(cls._clients.values())
+            cls._clients.clear()
+        for client, _ in entries:
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.debug(f"HTTP client close error: {e}")
+        if entries:
+            logger.info(f"🔌 Closed {len(entries)} HTTP client pools")
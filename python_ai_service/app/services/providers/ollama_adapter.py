@@ -1,8 +1,14 @@
 """Ollama provider adapters (local models)"""
 import os
+import json
 import httpx
-from typing import List, Dict, Any
-from .base import BaseChatAdapter, BaseEmbeddingAdapter
+import logging
+from typing import List, Dict, Any, AsyncIterator
+from app.services.tracing import traced_provider_call, traced_provider_stream
+from .http_client import HTTPClientRegistry
+from .base import BaseChatAdapter, BaseEmbeddingAdapter, StreamCompletion
+
+logger = logging.getLogger(__name__)
 
 class OllamaChatAdapter(BaseChatAdapter):
     """Ollama local chat adapter"""
@@ -18,40 +24,101 @@ class OllamaChatAdapter(BaseChatAdapter):
         }
         self.model = self.model_map.get(model, model)
     
-    async def generate(self, messages: List[Dict[str, str]], **options) -> Dict[str, Any]:
-        """Generate chat response using Ollama API"""
-        # Convert messages format for Ollama
+    @staticmethod
+    def _build_prompt(messages: List[Dict[str, str]]) -> str:
+        """Convert messages format for Ollama"""
         prompt = ""
         for msg in messages:
             role_prefix = "Human" if msg["role"] == "user" else "Assistant"
             prompt += f"{role_prefix}: {msg['content']}\n\n"
         prompt += "Assistant:"
+        return prompt
+    
+    @traced_provider_call("ollama", "generate")
+    async def generate(self, messages: List[Dict[str, str]], **options) -> Dict[str, Any]:
+        """Generate chat response using Ollama API"""
+        prompt = self._build_prompt(messages)
         
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            response = await client.post(
-                f"{self.base_url}/api/generate",
-                json={
-                    "model": self.model,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": options.get("temperature", 0.7),
-                        "num_predict": options.get("max_tokens", 2048),
-                    }
+        client = HTTPClientRegistry.get(self.base_url, "ollama")
+        response = await client.post(
+            f"{self.base_url}/api/generate",
+            timeout=120.0,
+            json={
+                "model": self.model,
+                "prompt": prompt,
+                "stream": False,
+                "options": {
+                    "temperature": options.get("temperature", 0.7),
+                    "num_predict": options.get("max_tokens", 2048),
                 }
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            return {
-                "content": data["response"],
-                "usage": {
-                    "input_tokens": data.get("prompt_eval_count", 0),
-                    "output_tokens": data.get("eval_count", 0)
-                },
+            }
+        )
+        response.raise_for_status()
+        data = response.json()
+        
+        return {
+            "content": data["response"],
+            "usage": {
+                "input_tokens": data.get("prompt_eval_count", 0),
+                "output_tokens": data.get("eval_count", 0)
+            },
+            "model": self.model,
+            "finish_reason": "stop"
+        }
+    
+    @traced_provider_stream("ollama")
+    async def generate_stream(self, messages: List[Dict[str, str]], **options) -> AsyncIterator[Any]:
+        """Generate chat response as streamed text chunks (NDJSON); usage from the final 'done' chunk"""
+        client = HTTPClientRegistry.get(self.base_url, "ollama")
+        async with client.stream(
+            "POST",
+            f"{self.base_url}/api/generate",
+            timeout=300.0,
+            json={
                 "model": self.model,
-                "finish_reason": "stop"
+                "prompt": self._build_prompt(messages),
+                "stream": True,
+                "options": {
+                    "temperature": options.get("temperature", 0.7),
+                    "num_predict": options.get("max_tokens", 2048),
+                }
             }
+        ) as response:
+            if response.status_code >= 400:
+                await response.aread()
+                response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.strip():
+                    continue
+                try:
+                    chunk = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if chunk.get("response"):
+                    yield chunk["response"]
+                if chunk.get("done"):
+                    yield StreamCompletion(
+                        usage={
+                            "input_tokens": chunk.get("prompt_eval_count", 0),
+                            "output_tokens": chunk.get("eval_count", 0)
+                        },
+                        model=chunk.get("model", self.model),
+                        finish_reason=chunk.get("done_reason", "stop")
+                    )
+                    break
+
+def _is_model_not_found(response) -> bool:
+    """
+    404 di Ollama per modello assente o non ancora caricato ({"error": "model ... not found"}),
+    da non confondere con l'endpoint mancante nelle versioni precedenti a /api/embed
+    """
+    try:
+        error = response.json().get("error", "")
+    except (ValueError, AttributeError):
+        return False
+    error = str(error).lower()
+    return "model" in error and "not found" in error
+
 
 class OllamaEmbeddingAdapter(BaseEmbeddingAdapter):
     """Ollama local embedding adapter"""
@@ -60,26 +127,62 @@ class OllamaEmbeddingAdapter(BaseEmbeddingAdapter):
         self.base_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
         self.model = model
         self.dimensions = 768  # nomic-embed default
+        self._batch_supported = True
     
+    @traced_provider_call("ollama", "embed")
     async def embed(self, text: str, **options) -> Dict[str, Any]:
         """Generate embedding using Ollama API"""
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
-                f"{self.base_url}/api/embeddings",
-                json={
-                    "model": self.model,
-                    "prompt": text
-                }
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            return {
-                "embedding": data["embedding"],
-                "dimensions": len(data["embedding"]),
+        client = HTTPClientRegistry.get(self.base_url, "ollama")
+        response = await client.post(
+            f"{self.base_url}/api/embeddings",
+            timeout=60.0,
+            json={
+                "model": self.model,
+                "prompt": text
+            }
+        )
+        response.raise_for_status()
+        data = response.json()
+        
+        return {
+            "embedding": data["embedding"],
+            "dimensions": len(data["embedding"]),
+            "model": self.model,
+            "tokens": len(text.split())  # Approximate
+        }
+    
+    @traced_provider_call("ollama", "embed_batch")
+    async def embed_batch(self, texts: List[str], **options) -> List[Dict[str, Any]]:
+        """Generate embeddings for many texts with /api/embed (list input, Ollama >= 0.3)"""
+        if not self._batch_supported:
+            return await super().embed_batch(texts, **options)
+        
+        client = HTTPClientRegistry.get(self.base_url, "ollama")
+        response = await client.post(
+            f"{self.base_url}/api/embed",
+            timeout=120.0,
+            json={
+                "model": self.model,
+                "input": texts
+            }
+        )
+        if response.status_code == 404 and not _is_model_not_found(response):
+            # Ollama precedente a /api/embed: richieste singole concorrenti
+            logger.warning("Ollama /api/embed non disponibile, uso /api/embeddings per singolo testo")
+            self._batch_supported = False
+            return await super().embed_batch(texts, **options)
+        response.raise_for_status()
+        data = response.json()
+        
+        return [
+            {
+                "embedding": embedding,
+                "dimensions": len(embedding),
                 "model": self.model,
                 "tokens": len(text.split())  # Approximate
             }
+            for text, embedding in zip(texts, data["embeddings"])
+        ]
 
 
 
@@ -1,10 +1,13 @@
 """OpenAI provider adapters"""
 import os
+import json
 import httpx
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncIterator
 from pathlib import Path
 from dotenv import load_dotenv
-from .base import BaseChatAdapter, BaseEmbeddingAdapter
+from app.services.tracing import traced_provider_call, traced_provider_stream
+from .http_client import HTTPClientRegistry
+from .base import BaseChatAdapter, BaseEmbeddingAdapter, StreamCompletion
 
 # Load .env to ensure API keys are available
 env_path = Path(__file__).parent.parent.parent.parent / '.env'
@@ -18,38 +21,94 @@ class OpenAIChatAdapter(BaseChatAdapter):
         self.base_url = "https://api.openai.com/v1"
         self.model = model
     
+    @traced_provider_call("openai", "generate")
     async def generate(self, messages: List[Dict[str, str]], **options) -> Dict[str, Any]:
         """Generate chat response using OpenAI API"""
         if not self.api_key:
             raise ValueError("OPENAI_API_KEY environment variable not set")
         
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
-                f"{self.base_url}/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": self.model,
-                    "messages": messages,
-                    "temperature": options.get("temperature", 0.7),
-                    "max_tokens": options.get("max_tokens", 4096),
-                }
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            return {
-                "content": data["choices"][0]["message"]["content"],
-                "usage": data["usage"],
-                "model": data["model"],
-                "finish_reason": data["choices"][0]["finish_reason"]
+        client = HTTPClientRegistry.get(self.base_url, "openai")
+        response = await client.post(
+            f"{self.base_url}/chat/completions",
+            timeout=60.0,
+            headers={
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json"
+            },
+            json={
+                "model": self.model,
+                "messages": messages,
+                "temperature": options.get("temperature", 0.7),
+                "max_tokens": options.get("max_tokens", 4096),
+            }
+        )
+        response.raise_for_status()
+        data = response.json()
+        
+        return {
+            "content": data["choices"][0]["message"]["content"],
+            "usage": data["usage"],
+            "model": data["model"],
+            "finish_reason": data["choices"][0]["finish_reason"]
+        }
+    
+    @traced_provider_stream("openai")
+    async def generate_stream(self, messages: List[Dict[str, str]], **options) -> AsyncIterator[Any]:
+        """Generate chat response as streamed text chunks (SSE), then a StreamCompletion with the usage"""
+        if not self.api_key:
+            raise ValueError("OPENAI_API_KEY environment variable not set")
+        
+        client = HTTPClientRegistry.get(self.base_url, "openai")
+        async with client.stream(
+            "POST",
+            f"{self.base_url}/chat/completions",
+            timeout=120.0,
+            headers={
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json"
+            },
+            json={
+                "model": self.model,
+                "messages": messages,
+                "temperature": options.get("temperature", 0.7),
+                "max_tokens": options.get("max_tokens", 4096),
+                "stream": True,
+                # Ultimo chunk (choices vuote) con l'usage della risposta
+                "stream_options": {"include_usage": True}
             }
+        ) as response:
+            if response.status_code >= 400:
+                await response.aread()
+                response.raise_for_status()
+            completion = StreamCompletion(usage={}, model=self.model, finish_reason="stop")
+            async for line in response.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                data = line[6:]
+                if data == "[DONE]":
+                    break
+                try:
+                    chunk = json.loads(data)
+                except json.JSONDecodeError:
+                    continue
+                if chunk.get("usage"):
+                    completion["usage"] = chunk["usage"]
+                if chunk.get("model"):
+                    completion["model"] = chunk["model"]
+                choices = chunk.get("choices") or [{}]
+                if choices[0].get("finish_reason"):
+                    completion["finish_reason"] = choices[0]["finish_reason"]
+                content = choices[0].get("delta", {}).get("content")
+                if content:
+                    yield content
+            yield completion
 
 class OpenAIEmbeddingAdapter(BaseEmbeddingAdapter):
     """OpenAI embedding adapter"""
     
+    # Input per richiesta (l'API ne accetta fino a 2048, ma limita anche i token totali)
+    max_batch_size = int(os.getenv("OPENAI_EMBEDDING_MAX_BATCH_SIZE", "256"))
+    
     def __init__(self, model: str = "text-embedding-3-small"):
         self.api_key = os.getenv("OPENAI_API_KEY")
         self.base_url = "https://api.openai.com/v1"
@@ -60,33 +119,74 @@ class OpenAIEmbeddingAdapter(BaseEmbeddingAdapter):
             "text-embedding-3-small": 1536
         }.get(model, 1536)
     
+    @traced_provider_call("openai", "embed")
     async def embed(self, text: str, **options) -> Dict[str, Any]:
         """Generate embedding using OpenAI API"""
         if not self.api_key:
             raise ValueError("OPENAI_API_KEY environment variable not set")
         
-        async with httpx.AsyncClient(timeout=60.0) as client:
+        client = HTTPClientRegistry.get(self.base_url, "openai")
+        response = await client.post(
+            f"{self.base_url}/embeddings",
+            timeout=60.0,
+            headers={
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json"
+            },
+            json={
+                "model": self.model,
+                "input": text,
+                "dimensions": options.get("dimensions", self.dimensions)
+            }
+        )
+        response.raise_for_status()
+        data = response.json()
+        
+        return {
+            "embedding": data["data"][0]["embedding"],
+            "dimensions": len(data["data"][0]["embedding"]),
+            "model": data["model"],
+            "tokens": data["usage"]["total_tokens"]
+        }
+    
+    @traced_provider_call("openai", "embed_batch")
+    async def embed_batch(self, texts: List[str], **options) -> List[Dict[str, Any]]:
+        """Generate embeddings for many texts with list input (one request per max_batch_size texts)"""
+        if not self.api_key:
+            raise ValueError("OPENAI_API_KEY environment variable not set")
+        
+        client = HTTPClientRegistry.get(self.base_url, "openai")
+        results: List[Dict[str, Any]] = []
+        for start in range(0, len(texts), self.max_batch_size):
+            batch = texts[start:start + self.max_batch_size]
             response = await client.post(
                 f"{self.base_url}/embeddings",
+                timeout=120.0,
                 headers={
                     "Authorization": f"Bearer {self.api_key}",
                     "Content-Type": "application/json"
                 },
                 json={
                     "model": self.model,
-                    "input": text,
+                    "input": batch,
                     "dimensions": options.get("dimensions", self.dimensions)
                 }
             )
             response.raise_for_status()
             data = response.json()
             
-            return {
-                "embedding": data["data"][0]["embedding"],
-                "dimensions": len(data["data"][0]["embedding"]),
-                "model": data["model"],
-                "tokens": data["usage"]["total_tokens"]
-            }
+            # L'API riporta solo i token totali: ripartiti in proporzione alla lunghezza
+            total_tokens = data["usage"]["total_tokens"]
+            total_chars = sum(len(text) for text in batch) or 1
+            for item in sorted(data["data"], key=lambda d: d["index"]):
+                text = batch[item["index"]]
+                results.append({
+                    "embedding": item["embedding"],
+                    "dimensions": len(item["embedding"]),
+                    "model": data["model"],
+                    "tokens": round(total_tokens * len(text) / total_chars)
+                })
+        return results
 
 
 
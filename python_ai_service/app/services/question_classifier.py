@@ -3,9 +3,12 @@ Question Classifier - Classifica le domande per intent detection
 Usa AI leggero per determinare il tipo di query
 """
 
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
 from enum import Enum
+from functools import lru_cache
+import os
 import json
+import logging
 from app.services.ai_router import AIRouter
 from app.services.personal_query_patterns import PERSONAL_QUERY_PATTERNS
 from app.services.conversational_query_patterns import CONVERSATIONAL_QUERY_PATTERNS
@@ -18,7 +21,13 @@ from app.services.procedure_query_patterns import PROCEDURE_QUERY_PATTERNS
 from app.services.temporal_query_patterns import TEMPORAL_QUERY_PATTERNS
 from app.services.interpretation_query_patterns import INTERPRETATION_QUERY_PATTERNS
 from app.services.spatial_query_patterns import SPATIAL_QUERY_PATTERNS
-from app.services.pattern_weights import get_weighted_confidence
+from app.services.pattern_weights import ConfidenceLevel, get_pattern_confidence
+from app.services.pattern_matcher import MultiPatternMatcher
+
+logger = logging.getLogger(__name__)
+
+# Domande normalizzate memoizzate (/chat/estimate e /chat classificano la stessa domanda)
+QUESTION_CLASSIFIER_CACHE_SIZE = int(os.getenv("QUESTION_CLASSIFIER_CACHE_SIZE", "4096"))
 
 
 class QueryIntent(str, Enum):
@@ -80,11 +89,63 @@ class QuestionClassifier:
             SPATIAL_QUERY_PATTERNS,
     }
     
+    # Pattern personali ad altissima specificità (nome, età, professione, nascita):
+    # PRIORITÀ ASSOLUTA, bypassano tutti gli altri controlli
+    HIGH_PRIORITY_PERSONAL_PATTERNS = [
+        "mi chiamo", "il mio nome è", "sono nato", "sono nata",
+        "ho ", "anni", "lavoro come", "faccio il", "la mia professione",
+        "vivo a", "abito a", "risiedo a", "la mia città",
+        "mia moglie", "mio marito", "mia figlia", "mio figlio",
+    ]
+    
+    # Keyword di richiesta documenti: prevalgono sulla classificazione conversazionale
+    DOCUMENT_REQUEST_KEYWORDS = [
+        "tokenomics", "documento", "documenti", "dati", "dato", "informazioni",
+        "estrai", "estrae", "estraggo", "estragga",
+        "cerca", "cercare", "trova", "trovare", "mostra", "mostrami", "mostrare",
+        "forniscimi", "fornisci", "fornire",
+        "analizza", "analizzare", "analisi",
+        "delibera", "delibere", "atto", "atti", "procedura", "procedure",
+        "legge", "leggi", "regolamento", "regolamenti", "circolare", "circolari",
+        "bando", "bandi", "gara", "gare", "appalto", "appalti",
+        "protocollo", "numero", "data", "importo", "costo", "prezzo"
+    ]
+    
+    # Metafore/frasi idiomatiche comuni (e termini inventati/nonsensici)
+    IDIOM_PATTERNS = [
+        "ago in un pagliaio", "ago nel pagliaio", "ago in pagliaio",
+        "è come cercare", "sembra impossibile", "troppo difficile",
+        "missione impossibile", "introvabile", "cercare l'introvabile",
+        "rintracciare l'impossibile", "metaforfosi", "clorofilliana"
+    ]
+    
+    # Pattern conversazionali (sai + verbo, puoi + verbo, etc.)
+    CONVERSATIONAL_VERB_PATTERNS = [
+        "sai ", "puoi ", "vuoi ", "fai ", "conosci ", "ti piace",
+        "che fai", "cosa fai", "dimmi", "raccontami", "parlami",
+        "cosa potresti", "cosa faresti", "cosa faresti se"
+    ]
+    
+    IMPOSSIBLE_TERMS = [
+        "metaforfosi", "clorofilliana", "introvabile", "impossibile",
+        "fantastico", "magico", "nonsensico"
+    ]
+    
+    # Richieste documentali: fact_check (chi/cosa/quando) vs interpretation (perché/come)
+    DOCUMENT_FACT_KEYWORDS = ["quando", "dove", "chi", "cosa", "quale", "quanti", "quante"]
+    DOCUMENT_INTERPRETATION_KEYWORDS = ["perché", "motivo", "ragione", "come", "procedura"]
+    
+    # Interpretation con constraint di selezione → fact_check
+    SELECTION_KEYWORDS = ["quale", "quali", "seleziona"]
+    
     @staticmethod
     def classify(question: str, tenant_id: int, model: str = "light") -> Dict[str, Any]:
         """
         Classifica una domanda
         
+        Keyword-based: una sola passata dell'automa compilato (vedi
+        _keyword_matcher) e risultato memoizzato per domanda normalizzata.
+        
         Args:
             question: Testo della domanda
             tenant_id: ID tenant per context
@@ -96,157 +157,20 @@ class QuestionClassifier:
                 - confidence: float (0.0 - 1.0)
                 - constraints: Dict[str, Any] (filters, date ranges, etc.)
         """
-        question_lower = question.lower().strip()
-        
-        # PRE-CHECK: Pattern ad altissima specificità (nome, età, professione, nascita)
-        # Questi hanno PRIORITÀ ASSOLUTA e bypassano tutti gli altri controlli
-        high_priority_personal_patterns = [
-            "mi chiamo", "il mio nome è", "sono nato", "sono nata",
-            "ho ", "anni", "lavoro come", "faccio il", "la mia professione",
-            "vivo a", "abito a", "risiedo a", "la mia città",
-            "mia moglie", "mio marito", "mia figlia", "mio figlio",
-        ]
+        intent, confidence, high_priority = _classify_keywords(question.lower().strip())
         
-        matched_high_priority = [p for p in high_priority_personal_patterns if p in question_lower]
-        if matched_high_priority:
-            # Pattern personale ad alta priorità → CONVERSATIONAL con confidence 0.95
-            intent = QueryIntent.CONVERSATIONAL
-            confidence = get_weighted_confidence(matched_high_priority, 'PERSONAL')
+        if high_priority:
+            # Pattern personale ad alta priorità → CONVERSATIONAL
             return {
                 "intent": intent,
                 "confidence": confidence,
                 "constraints": {}
             }
         
-        # TODO: Implementare con AI leggero (es. fine-tuned model)
-        # Per ora: keyword-based classification
-        
-        intent = QueryIntent.FACT_CHECK
-        confidence = 0.6  # Default confidence per keyword-based
-        constraints = {}
-        
-        # Check conversational first (higher priority)
-        # Use more sophisticated matching for conversational queries
-        
-        # IMPORTANT: Check if this is a document request FIRST (even if contains conversational verbs)
-        # Document request keywords that override conversational classification
-        document_request_keywords = [
-            "tokenomics", "documento", "documenti", "dati", "dato", "informazioni",
-            "estrai", "estrae", "estraggo", "estragga",
-            "cerca", "cercare", "trova", "trovare", "mostra", "mostrami", "mostrare",
-            "forniscimi", "fornisci", "fornire",
-            "analizza", "analizzare", "analisi",
-            "delibera", "delibere", "atto", "atti", "procedura", "procedure",
-            "legge", "leggi", "regolamento", "regolamenti", "circolare", "circolari",
-            "bando", "bandi", "gara", "gare", "appalto", "appalti",
-            "protocollo", "numero", "data", "importo", "costo", "prezzo"
-        ]
-        
-        has_document_request = any(doc_kw in question_lower for doc_kw in document_request_keywords)
-        
-        # Conversational keywords
-        conv_keywords = QuestionClassifier.KEYWORD_PATTERNS.get(QueryIntent.CONVERSATIONAL, [])
-        
-        # Trova pattern che matchano per calcolare confidenza pesata
-        matched_conv_patterns = [kw for kw in conv_keywords if kw in question_lower]
-        
-        # Check for GENERATIVE queries FIRST (create, generate, suggest, matrix, etc.)
-        # PRIORITÀ ALTA: Query generative hanno priorità su conversazionali
-        # Query generative possono (e devono) usare documenti tenant come contesto
-        generative_keywords = QuestionClassifier.KEYWORD_PATTERNS.get(QueryIntent.GENERATIVE, [])
-        matched_generative = [kw for kw in generative_keywords if kw in question_lower]
-        
-        if matched_generative:
-            # Ha pattern generativi → GENERATIVE con alta confidenza
-            intent = QueryIntent.GENERATIVE
-            confidence = 0.90  # Alta confidenza per pattern generativi
-        # Check for exact keyword matches, BUT skip if it's a document request
-        elif not has_document_request and matched_conv_patterns:
-            # Filtra pattern troppo generici (<=2 char) che possono matchare parti di parole
-            meaningful_conv_patterns = [p for p in matched_conv_patterns if len(p) > 2]
-            if meaningful_conv_patterns:
-                intent = QueryIntent.CONVERSATIONAL
-                # Usa sistema pesi per determinare confidenza
-                confidence = get_weighted_confidence(meaningful_conv_patterns, 'PERSONAL')
-            else:
-                # Solo pattern generici matchati → probabilmente falso positivo, usa fact_check
-                intent = QueryIntent.FACT_CHECK
-                confidence = 0.6
-        # Check for metafore/frasi idiomatiche comuni
-        elif any(idiom in question_lower for idiom in [
-            "ago in un pagliaio", "ago nel pagliaio", "ago in pagliaio",
-            "è come cercare", "sembra impossibile", "troppo difficile",
-            "missione impossibile", "introvabile", "cercare l'introvabile",
-            "rintracciare l'impossibile", "metaforfosi", "clorofilliana"  # Termini inventati/nonsensici
-        ]):
-            # Metafore sono sempre conversazionali
-            intent = QueryIntent.CONVERSATIONAL
-            confidence = 0.95
-        # Check for conversational patterns (sai + verb, puoi + verb, etc.)
-        elif not has_document_request and any(pattern in question_lower for pattern in [
-            "sai ", "puoi ", "vuoi ", "fai ", "conosci ", "ti piace",
-            "che fai", "cosa fai", "dimmi", "raccontami", "parlami",
-            "cosa potresti", "cosa faresti", "cosa faresti se"
-        ]):
-            # Additional check: if it's a simple personal question (not document-related)
-            # These are likely conversational ONLY if NOT a document request
-            # Special case: if contains "documento" BUT also impossible/invented terms, it's conversational
-            impossible_terms = ["metaforfosi", "clorofilliana", "introvabile", "impossibile", 
-                               "fantastico", "magico", "impossibile", "nonsensico"]
-            has_impossible = any(term in question_lower for term in impossible_terms)
-            
-            if has_impossible:
-                # Contains impossible terms → conversational (probabilmente domanda inventata/nonsensica)
-                intent = QueryIntent.CONVERSATIONAL
-                confidence = 0.90
-            else:
-                # Simple conversational pattern without document keywords
-                intent = QueryIntent.CONVERSATIONAL
-                confidence = 0.85
-        else:
-            # If it's a document request, prioritize fact_check or interpretation
-            if has_document_request:
-                # Document requests should use RAG, not conversational
-                if any(kw in question_lower for kw in ["quando", "dove", "chi", "cosa", "quale", "quanti", "quante"]):
-                    intent = QueryIntent.FACT_CHECK
-                    confidence = 0.85
-                elif any(kw in question_lower for kw in ["perché", "motivo", "ragione", "come", "procedura"]):
-                    intent = QueryIntent.INTERPRETATION
-                    confidence = 0.80
-                else:
-                    # Generic document request -> fact_check (will use RAG)
-                    intent = QueryIntent.FACT_CHECK
-                    confidence = 0.80
-            else:
-                # Keyword matching for other intents
-                for intent_type, keywords in QuestionClassifier.KEYWORD_PATTERNS.items():
-                    if intent_type == QueryIntent.CONVERSATIONAL:
-                        continue  # Already checked
-                    if any(keyword in question_lower for keyword in keywords):
-                        intent = intent_type
-                        confidence = 0.75
-                        break
-        
-        # Block interpretation/intent troppo aperto
-        # BUT allow interpretation if it's a document request
-        if intent == QueryIntent.INTERPRETATION:
-            # If it's a document request, interpretation is OK (will use RAG)
-            if has_document_request:
-                # Keep as interpretation, will be routed to RAG
-                confidence = max(confidence, 0.75)
-            elif any(word in question_lower for word in ["quale", "quali", "seleziona"]):
-                # Convert to fact_check se ha constraint
-                intent = QueryIntent.FACT_CHECK
-                confidence = 0.7
-            else:
-                # Block open interpretation (only if NOT a document request)
-                intent = QueryIntent.BLOCKED
-                confidence = 0.9
-        
         return {
             "intent": intent.value,
             "confidence": confidence,
-            "constraints": constraints,
+            "constraints": {},
             "model": model,
             "question": question
         }
@@ -413,3 +337,125 @@ Classify this question:"""
 
 
 
+
+
+def _max_weight(matches: List[Tuple[str, Optional[float]]]) -> float:
+    """Confidenza aggregata (come get_weighted_confidence) dai pesi precalcolati"""
+    if not matches:
+        return ConfidenceLevel.MEDIUM_LOW
+    return max(weight for _, weight in matches)
+
+
+@lru_cache(maxsize=1)
+def _keyword_matcher() -> MultiPatternMatcher:
+    """Automa unico con tutti i pattern del classificatore (compilato una volta)"""
+    groups = {
+        "high_priority": QuestionClassifier.HIGH_PRIORITY_PERSONAL_PATTERNS,
+        "document_request": QuestionClassifier.DOCUMENT_REQUEST_KEYWORDS,
+        "idiom": QuestionClassifier.IDIOM_PATTERNS,
+        "conversational_verb": QuestionClassifier.CONVERSATIONAL_VERB_PATTERNS,
+        "impossible": QuestionClassifier.IMPOSSIBLE_TERMS,
+        "document_fact": QuestionClassifier.DOCUMENT_FACT_KEYWORDS,
+        "document_interpretation": QuestionClassifier.DOCUMENT_INTERPRETATION_KEYWORDS,
+        "selection": QuestionClassifier.SELECTION_KEYWORDS,
+    }
+    for intent_type, keywords in QuestionClassifier.KEYWORD_PATTERNS.items():
+        groups[intent_type.value] = keywords
+    
+    # Pesi di confidenza dei pattern personali/conversazionali (categoria PERSONAL)
+    weights = {
+        group: {pattern: get_pattern_confidence(pattern, 'PERSONAL') for pattern in groups[group]}
+        for group in ("high_priority", QueryIntent.CONVERSATIONAL.value)
+    }
+    matcher = MultiPatternMatcher(groups, weights)
+    logger.info(f"🔤 Question classifier automaton compiled ({matcher.size} states)")
+    return matcher
+
+
+@lru_cache(maxsize=QUESTION_CLASSIFIER_CACHE_SIZE)
+def _classify_keywords(question_lower: str) -> Tuple[QueryIntent, float, bool]:
+    """
+    Classificazione keyword-based di una domanda normalizzata
+    
+    Returns:
+        (intent, confidence, high_priority)
+    """
+    matches = _keyword_matcher().find(question_lower)
+    
+    if matches["high_priority"]:
+        return QueryIntent.CONVERSATIONAL, _max_weight(matches["high_priority"]), True
+    
+    # TODO: Implementare con AI leggero (es. fine-tuned model)
+    # Per ora: keyword-based classification
+    intent = QueryIntent.FACT_CHECK
+    confidence = 0.6  # Default confidence per keyword-based
+    
+    # IMPORTANT: Check if this is a document request FIRST (even if contains conversational verbs)
+    has_document_request = bool(matches["document_request"])
+    
+    # Pattern conversazionali matchati (per confidenza pesata)
+    matched_conv_patterns = matches[QueryIntent.CONVERSATIONAL.value]
+    
+    if matches[QueryIntent.GENERATIVE.value]:
+        # PRIORITÀ ALTA: Query generative hanno priorità su conversazionali
+        # Query generative possono (e devono) usare documenti tenant come contesto
+        intent = QueryIntent.GENERATIVE
+        confidence = 0.90  # Alta confidenza per pattern generativi
+    elif not has_document_request and matched_conv_patterns:
+        # Filtra pattern troppo generici (<=2 char) che possono matchare parti di parole
+        meaningful_conv_patterns = [m for m in matched_conv_patterns if len(m[0]) > 2]
+        if meaningful_conv_patterns:
+            intent = QueryIntent.CONVERSATIONAL
+            # Usa sistema pesi per determinare confidenza
+            confidence = _max_weight(meaningful_conv_patterns)
+        else:
+            # Solo pattern generici matchati → probabilmente falso positivo, usa fact_check
+            intent = QueryIntent.FACT_CHECK
+            confidence = 0.6
+    elif matches["idiom"]:
+        # Metafore sono sempre conversazionali
+        intent = QueryIntent.CONVERSATIONAL
+        confidence = 0.95
+    elif not has_document_request and matches["conversational_verb"]:
+        # Domanda conversazionale semplice (non documentale); con termini
+        # impossibili/inventati probabilmente è una domanda nonsensica
+        intent = QueryIntent.CONVERSATIONAL
+        confidence = 0.90 if matches["impossible"] else 0.85
+    elif has_document_request:
+        # Document requests should use RAG, not conversational
+        if matches["document_fact"]:
+            intent = QueryIntent.FACT_CHECK
+            confidence = 0.85
+        elif matches["document_interpretation"]:
+            intent = QueryIntent.INTERPRETATION
+            confidence = 0.80
+        else:
+            # Generic document request -> fact_check (will use RAG)
+            intent = QueryIntent.FACT_CHECK
+            confidence = 0.80
+    else:
+        # Keyword matching for other intents (ordine di KEYWORD_PATTERNS)
+        for intent_type in QuestionClassifier.KEYWORD_PATTERNS:
+            if intent_type == QueryIntent.CONVERSATIONAL:
+                continue  # Already checked
+            if matches[intent_type.value]:
+                intent = intent_type
+                confidence = 0.75
+                break
+    
+    # Block interpretation/intent troppo aperto
+    # BUT allow interpretation if it's a document request
+    if intent == QueryIntent.INTERPRETATION:
+        if has_document_request:
+            # Keep as interpretation, will be routed to RAG
+            confidence = max(confidence, 0.75)
+        elif matches["selection"]:
+            # Convert to fact_check se ha constraint
+            intent = QueryIntent.FACT_CHECK
+            confidence = 0.7
+        else:
+            # Block open interpretation (only if NOT a document request)
+            intent = QueryIntent.BLOCKED
+            confidence = 0.9
+    
+    return intent, confidence, False
@@ -0,0 +1,189 @@
+"""
+Map-reduce con concorrenza limitata per la sintesi multi-step
+
+Lo stage "map" di _multi_step_synthesis (estrazione per batch) non dipende
+dall'ordine: le chiamate LLM partono insieme, limitate da:
+- max_in_flight: chiamate contemporanee per richiesta
+- rate limit per provider (richieste/minuto, condiviso dal processo)
+- tolleranza ai fallimenti parziali: il reduce procede se almeno
+  min_success_ratio dei batch è andato a buon fine
+"""
+
+import time
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+
+from app.services.providers.api_errors import RateLimitError
+
+logger = logging.getLogger(__name__)
+
+# Attesa di default dopo un 429 senza Retry-After
+DEFAULT_RATE_LIMIT_BACKOFF_SECONDS = 2.0
+
+
+def provider_name(adapter: Any) -> str:
+    """Nome del provider di un adapter (OpenAIChatAdapter -> "openai")"""
+    name = type(adapter).__name__
+    for suffix in ("ChatAdapter", "EmbeddingAdapter", "Adapter"):
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+            break
+    return name.lower() or "unknown"
+
+
+class ProviderRateLimiter:
+    """
+    Limita le richieste/minuto verso un provider (finestra scorrevole)
+
+    Le istanze sono condivise per provider (classmethod get): richieste
+    concorrenti di utenti diversi rispettano lo stesso limite.
+    """
+
+    _limiters: Dict[str, "ProviderRateLimiter"] = {}
+
+    def __init__(self, provider: str, requests_per_minute: int):
+        self.provider = provider
+        self.requests_per_minute = requests_per_minute
+        self._sent: List[float] = []
+        self._lock = asyncio.Lock()
+        self._blocked_until = 0.0
+
+    @classmethod
+    def get(cls, provider: str, requests_per_minute: Optional[int]) -> Optional["ProviderRateLimiter"]:
+        """Limiter condiviso del provider (None se non configurato)"""
+        if not requests_per_minute:
+            return None
+        limiter = cls._limiters.get(provider)
+        if limiter is None or limiter.requests_per_minute != requests_per_minute:
+            limiter = cls(provider, requests_per_minute)
+            cls._limiters[provider] = limiter
+        return limiter
+
+    @classmethod
+    def reset(cls):
+        cls._limiters.clear()
+
+    def block_for(self, seconds: float):
+        """Sospende le richieste dopo un 429 del provider"""
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        """Attende uno slot libero nella finestra di 60 secondi"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+                self._sent = [t for t in self._sent if now - t < 60.0]
+                if len(self._sent) < self.requests_per_minute:
+                    self._sent.append(now)
+                    return
+                await asyncio.sleep(60.0 - (now - self._sent[0]))
+
+
+class MapStageError(RuntimeError):
+    """Troppi batch falliti per produrre una sintesi affidabile"""
+
+    def __init__(self, message: str, errors: Sequence[BaseException] = ()):
+        super().__init__(message)
+        self.errors = list(errors)
+
+
+@dataclass
+class MapResult:
+    """Esito dello stage map: risultati in ordine di input, None per i falliti"""
+    results: List[Optional[Any]]
+    failures: List[Tuple[int, str]] = field(default_factory=list)
+    elapsed_ms: float = 0.0
+
+    @property
+    def succeeded(self) -> List[Tuple[int, Any]]:
+        return [(i, r) for i, r in enumerate(self.results) if r is not None]
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Secondi di attesa suggeriti se l'errore è un rate limit, None altrimenti"""
+    if isinstance(error, RateLimitError):
+        return float(error.retry_after or DEFAULT_RATE_LIMIT_BACKOFF_SECONDS)
+    if isinstance(error, httpx.HTTPStatusError) and error.response.status_code == 429:
+        header = error.response.headers.get("retry-after")
+        try:
+            return float(header) if header else DEFAULT_RATE_LIMIT_BACKOFF_SECONDS
+        except ValueError:
+            return DEFAULT_RATE_LIMIT_BACKOFF_SECONDS
+    return None
+
+
+class BoundedMapExecutor:
+    """Esegue lo stage map con concorrenza limitata e rate limit per provider"""
+
+    def __init__(
+        self,
+        max_in_flight: int = 4,
+        rate_limiter: Optional[ProviderRateLimiter] = None,
+        min_success_ratio: float = 0.5,
+        rate_limit_retries: int = 1
+    ):
+        self.max_in_flight = max(1, max_in_flight)
+        self.rate_limiter = rate_limiter
+        self.min_success_ratio = min_success_ratio
+        self.rate_limit_retries = rate_limit_retries
+
+    async def _call(self, semaphore: asyncio.Semaphore, fn: Callable[[Any], Awaitable[Any]], item: Any) -> Any:
+        attempt = 0
+        while True:
+            async with semaphore:
+                if self.rate_limiter is not None:
+                    await self.rate_limiter.acquire()
+                try:
+                    return await fn(item)
+                except Exception as e:
+                    wait = _retry_after(e)
+                    if wait is None or attempt >= self.rate_limit_retries:
+                        raise
+                    attempt += 1
+                    if self.rate_limiter is not None:
+                        self.rate_limiter.block_for(wait)
+            # Attesa fuori dal semaforo: gli slot restano disponibili agli altri batch
+            logger.warning(f"⏳ Rate limit provider, retry tra {wait}s")
+            await asyncio.sleep(wait)
+
+    async def map(self, items: Sequence[Any], fn: Callable[[Any], Awaitable[Any]]) -> MapResult:
+        """
+        Applica fn a ogni item in modo concorrente
+
+        Raises:
+            MapStageError: se i batch riusciti sono meno di min_success_ratio
+        """
+        start = time.perf_counter()
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+        outcomes = await asyncio.gather(
+            *(self._call(semaphore, fn, item) for item in items),
+            return_exceptions=True
+        )
+
+        result = MapResult(results=[])
+        errors = []
+        for index, outcome in enumerate(outcomes):
+            if isinstance(outcome, BaseException):
+                errors.append(outcome)
+                result.results.append(None)
+                result.failures.append((index, str(outcome) or type(outcome).__name__))
+                logger.warning(f"⚠️ Map batch {index + 1}/{len(items)} fallito: {outcome}")
+            else:
+                result.results.append(outcome)
+        result.elapsed_ms = (time.perf_counter() - start) * 1000
+
+        succeeded = len(result.succeeded)
+        if items and (succeeded == 0 or succeeded < self.min_success_ratio * len(items)):
+            raise MapStageError(
+                f"Solo {succeeded}/{len(items)} batch riusciti "
+                f"(minimo {self.min_success_ratio:.0%})",
+                errors
+            )
+        return result
@@ -12,9 +12,14 @@ from .gap_detector import GapDetector
 from .constrained_synthesizer import ConstrainedSynthesizer
 from .hostile_factchecker import HostileFactChecker
 from .urs_calculator import URSCalculator
+from .map_reduce import BoundedMapExecutor, MapStageError, ProviderRateLimiter, provider_name
+from .stream_events import emit, generate_streaming
+from app.services.tracing import PIPELINE_TRACE_IN_RESPONSE, mark_stage, span, start_trace
 from app.services.ai_router import AIRouter
 from app.services.providers.api_errors import APIError, APIErrorType
 from app.config.rag_config import get_rag_config
+from app.services.answer_cache import ANSWER_CACHE_ENABLED, SemanticAnswerCache
+from app.services.corpus_version import CorpusVersion
 
 logger = logging.getLogger(__name__)
 
@@ -1243,6 +1248,7 @@ La matrice deve restare VUOTA per essere compilata dagli uffici competenti.
             
             # STEP 1: Retrieve evidenze (over-retrieve 100)
             logger.info("STEP 1: Retrieval evidenze...")
+            mark_stage("retrieval")
             
             # Se la query è generativa, espandila per migliorare il retrieval
             is_generative = self._is_generative_query(question)
@@ -1252,42 +1258,26 @@ La matrice deve restare VUOTA per essere compilata dagli uffici competenti.
                 search_queries = await self._expand_generative_query(question)
                 logger.info(f"Query generativa rilevata, uso {len(search_queries)} query per retrieval: {search_queries}")
             
-            # Esegui ricerche multiple e combina risultati
-            all_evidences = []
-            seen_ids = set()
-            
-            for search_query in search_queries:
-                # Per query generative, abbassa la soglia di rilevanza
-                temp_threshold = self.retriever.relevance_threshold
-                if is_generative:
-                    self.retriever.relevance_threshold = 0.0  # Accetta tutti i risultati per query generative
-                
-                try:
-                    # Per query generative, usa top_k moderato per bilanciare recall e velocità
-                    # OTTIMIZZAZIONE: Ridotto da 200 a 100 per evitare timeout con fallback manuale
-                    retrieval_top_k = 100 if not is_generative else 100
-                    
-                    query_evidences = await self.retriever.retrieve_evidence(
-                        question=search_query,
-                        tenant_id=str(tenant_id),
-                        user_id=user_id,  # Passa user_id per memorie personalizzate
-                        top_k=retrieval_top_k
-                    )
-                    
-                    # Aggiungi solo evidenze non duplicate
-                    for ev in query_evidences:
-                        ev_id = ev.get("evidence_id") or ev.get("_id")
-                        if ev_id and ev_id not in seen_ids:
-                            seen_ids.add(ev_id)
-                            all_evidences.append(ev)
-                finally:
-                    # Ripristina soglia originale
-                    self.retriever.relevance_threshold = temp_threshold
+            # Ricerche concorrenti (embedding in batch) fuse con reciprocal-rank fusion.
+            # Per query generative la soglia di rilevanza è 0.0 (accetta tutti i risultati),
+            # passata per chiamata: nessuna mutazione dello stato condiviso del retriever
+            # OTTIMIZZAZIONE: top_k 100 (non 200) per evitare timeout con fallback manuale
+            all_evidences = await self.retriever.retrieve_evidence_multi(
+                questions=search_queries,
+                tenant_id=str(tenant_id),
+                user_id=user_id,  # Passa user_id per memorie personalizzate
+                top_k=100,
+                relevance_threshold=0.0 if is_generative else None
+            )
             
             # Usa configurazione centralizzata per max_evidences
             rag_config = get_rag_config()
             evidences = all_evidences[:rag_config.max_evidences]
             logger.info(f"Trovate {len(evidences)} evidenze totali dopo ricerche multiple (max={rag_config.max_evidences}, profilo={rag_config.profile_name})")
+            emit("stage", {"stage": "retrieval", "evidences": len(evidences), "mode": mode})
+            if evidences:
+                retrieved_sources = self._build_sources_list(evidences)
+                emit("sources", {"sources": retrieved_sources, "total": len(retrieved_sources)})
             
             if not evidences:
                 # Se la query è generativa E non ci sono evidenze, NON generare template
@@ -1328,6 +1318,8 @@ La matrice deve restare VUOTA per essere compilata dagli uffici competenti.
             # MODE STRICT: Pipeline completa con verifiche rigorose
             # STEP 2: Verifica evidenze
             logger.info("STEP 2: Verifica evidenze...")
+            emit("stage", {"stage": "verification"})
+            mark_stage("verification")
             verified_evidences = await self.evidence_verifier.verify_evidence(
                 user_question=question,
                 evidences=evidences
@@ -1365,6 +1357,8 @@ La matrice deve restare VUOTA per essere compilata dagli uffici competenti.
             
             # STEP 3: Estrai claim atomiche
             logger.info("STEP 3: Estrazione claim...")
+            emit("stage", {"stage": "claim_extraction"})
+            mark_stage("claim_extraction")
             claims = await self.claim_extractor.extract_atomic_claims(relevant_evidences)
             
             if not claims or claims == ["[NO_CLAIMS]"]:
@@ -1381,10 +1375,14 @@ La matrice deve restare VUOTA per essere compilata dagli uffici competenti.
             
             # STEP 4: Rileva gap
             logger.info("STEP 4: Rilevamento gap...")
+            emit("stage", {"stage": "gap_detection"})
+            mark_stage("gap_detection")
             gaps = await self.gap_detector.detect_gaps(question, claims)
             
             # STEP 5: Sintetizza risposta
             logger.info("STEP 5: Sintesi risposta...")
+            emit("stage", {"stage": "synthesis"})
+            mark_stage("synthesis")
             answer = await self.synthesizer.synthesize_response(
                 user_question=question,
                 claims=claims,
@@ -1393,6 +1391,8 @@ La matrice deve restare VUOTA per essere compilata dagli uffici competenti.
             
             # STEP 6: Fact-checking ostile
             logger.info("STEP 6: Fact-checking ostile...")
+            emit("stage", {"stage": "fact_check"})
+            mark_stage("fact_check")
             hallucinations = await self.fact_checker.hostile_check(answer, claims)
             
             # Se ci sono allucinazioni, calcola URS e gestisci con modalità "supporto parziale"
@@ -1465,6 +1465,8 @@ La matrice deve restare VUOTA per essere compilata dagli uffici competenti.
             
             # STEP 7: Calcola URS finale
             logger.info("STEP 7: Calcolo URS...")
+            emit("stage", {"stage": "urs"})
+            mark_stage("urs")
             claim_numbers = self._extract_claim_numbers(answer)
             urs_result = self.urs_calculator.calculate_urs(
                 claims_used=len(claim_numbers),
@@ -1610,8 +1612,8 @@ La matrice deve restare VUOTA per essere compilata dagli uffici competenti.
         Sintesi multi-step per processare grandi volumi di documenti (>10)
         
         Strategia:
-        1. Divide documenti in batch da 10
-        2. Estrae informazioni chiave da ogni batch
+        1. Divide documenti in batch (batch_size del profilo RAG)
+        2. Estrae informazioni chiave dai batch in parallelo (map_max_in_flight, rate limit per provider)
         3. Aggrega risultati e crea sintesi finale
         
         Args:
@@ -1631,6 +1633,8 @@ La matrice deve restare VUOTA per essere compilata dagli uffici competenti.
             num_batches = (total_docs + batch_size - 1) // batch_size  # Ceiling division
             
             logger.info(f"🔄 MULTI-STEP: Processamento {total_docs} documenti in {num_batches} batch da {batch_size} (profilo={rag_config.profile_name})")
+            emit("stage", {"stage": "batch_extraction", "documents": total_docs, "batches": num_batches})
+            mark_stage("batch_extraction", batches=num_batches)
             
             # Genera messaggio di avviso per l'utente (usa parametri keyword per nuova signature)
             processing_notice = self._generate_processing_notice(
@@ -1640,9 +1644,9 @@ La matrice deve restare VUOTA per essere compilata dagli uffici competenti.
             )
             logger.info(f"📢 Processing notice: {processing_notice}")
             
-            # STEP 1: Estrai informazioni chiave da ogni batch
-            batch_summaries = []
-            all_sources = []
+            # STEP 1: Prepara i batch (contesto + fonti), poi estrai le informazioni
+            # chiave da tutti i batch in parallelo (map con concorrenza limitata)
+            batches = []
             
             for batch_idx in range(num_batches):
                 start_idx = batch_idx * batch_size
@@ -1691,19 +1695,24 @@ La matrice deve restare VUOTA per essere compilata dagli uffici competenti.
                             "citation": citation  # Salva citazione per riferimento
                         })
                 
-                all_sources.extend(batch_sources)
-                
+                batches.append({
+                    "index": batch_idx,
+                    "start": start_idx,
+                    "end": end_idx,
+                    "context": "\n\n".join(batch_docs),
+                    "sources": batch_sources
+                })
+            
+            adapter_context = {
+                "tenant_id": int(tenant_id),
+                "persona": "strategic",
+                "task_class": "extraction"
+            }
+            
+            adapter = self.ai_router.get_chat_adapter(adapter_context)
+            
+            async def extract_batch(batch: Dict) -> str:
                 # Chiedi all'AI di estrarre informazioni chiave dal batch
-                batch_context = "\n\n".join(batch_docs)
-                
-                adapter_context = {
-                    "tenant_id": int(tenant_id),
-                    "persona": "strategic",
-                    "task_class": "extraction"
-                }
-                
-                adapter = self.ai_router.get_chat_adapter(adapter_context)
-                
                 extraction_prompt = [
                     {
                         "role": "system",
@@ -1722,9 +1731,9 @@ Rispondi in formato strutturato e conciso, max 500 parole per batch."""
                         "role": "user",
                         "content": f"""Domanda utente: {question}
 
-Documenti batch {batch_idx + 1}/{num_batches}:
+Documenti batch {batch["index"] + 1}/{num_batches}:
 
-{batch_context}
+{batch["context"]}
 
 Estrai le informazioni chiave rilevanti per rispondere alla domanda dell'utente."""
                     }
@@ -1737,9 +1746,38 @@ Estrai le informazioni chiave rilevanti per rispondere alla domanda dell'utente.
                 )
                 
                 batch_summary = result["content"].strip()
-                batch_summaries.append(f"**BATCH {batch_idx + 1} (Documenti {start_idx + 1}-{end_idx}):**\n{batch_summary}")
-                
-                logger.info(f"✅ Batch {batch_idx + 1} processato: {len(batch_summary)} caratteri estratti")
+                logger.info(f"✅ Batch {batch['index'] + 1} processato: {len(batch_summary)} caratteri estratti")
+                emit("batch_summary", {"index": batch["index"] + 1, "total": num_batches, "summary": batch_summary})
+                return batch_summary
+            
+            provider = provider_name(adapter)
+            map_executor = BoundedMapExecutor(
+                max_in_flight=rag_config.map_max_in_flight,
+                rate_limiter=ProviderRateLimiter.get(provider, rag_config.provider_rate_limits.get(provider)),
+                min_success_ratio=rag_config.map_min_success_ratio
+            )
+            
+            try:
+                map_result = await map_executor.map(batches, extract_batch)
+            except MapStageError as map_err:
+                # Se i batch falliscono per errori API, restituisci il messaggio user-friendly
+                api_errors = [err for err in map_err.errors if isinstance(err, APIError)]
+                if api_errors:
+                    raise api_errors[0]
+                raise
+            
+            logger.info(
+                f"⚡ Map stage: {len(map_result.succeeded)}/{num_batches} batch in {map_result.elapsed_ms:.0f}ms "
+                f"(max_in_flight={map_executor.max_in_flight}, provider={provider})"
+            )
+            
+            # Solo i batch riusciti contribuiscono a sintesi e fonti (ordine originale)
+            batch_summaries = []
+            all_sources = []
+            for batch_idx, batch_summary in map_result.succeeded:
+                batch = batches[batch_idx]
+                all_sources.extend(batch["sources"])
+                batch_summaries.append(f"**BATCH {batch_idx + 1} (Documenti {batch['start'] + 1}-{batch['end']}):**\n{batch_summary}")
             
             # STEP 2: Aggrega tutti i batch e crea sintesi finale
             logger.info(f"🔄 Aggregazione {len(batch_summaries)} batch per sintesi finale")
@@ -1856,7 +1894,10 @@ Elabora la risposta seguendo la struttura obbligatoria."""
                 }
             ]
             
-            result = await adapter.generate(
+            emit("stage", {"stage": "synthesis", "batches": len(batch_summaries)})
+            mark_stage("synthesis")
+            result = await generate_streaming(
+                adapter,
                 final_prompt,
                 temperature=0.7,
                 max_tokens=4000
@@ -1873,6 +1914,7 @@ Elabora la risposta seguendo la struttura obbligatoria."""
             infographic = None
             if self._requires_visualization(question):
                 logger.info("📊 Query richiede visualizzazione, genero infografica...")
+                mark_stage("infographic")
                 infographic = await self._generate_infographic_for_response(
                     question=question,
                     answer=answer_with_links,
@@ -1880,10 +1922,11 @@ Elabora la risposta seguendo la struttura obbligatoria."""
                     tenant_id=tenant_id
                 )
             
+            skipped_note = f" ({len(map_result.failures)} batch non elaborati per errori)" if map_result.failures else ""
             response = {
                 "answer": answer_with_links,
                 "urs_score": None,
-                "urs_explanation": f"Modalità GENERATIVA MULTI-STEP: sintesi da {total_docs} documenti processati in {num_batches} batch. Non applicate verifiche URS rigorose.",
+                "urs_explanation": f"Modalità GENERATIVA MULTI-STEP: sintesi da {total_docs} documenti processati in {num_batches} batch{skipped_note}. Non applicate verifiche URS rigorose.",
                 "claims_used": [],
                 "sources": all_sources[:50],  # Limita fonti a prime 50 per visualizzazione
                 "hallucinations_found": [],
@@ -2216,7 +2259,10 @@ Elabora la risposta seguendo la struttura obbligatoria."""
                 }
             ]
             
-            result = await adapter.generate(
+            emit("stage", {"stage": "synthesis", "documents": len(sources)})
+            mark_stage("synthesis")
+            result = await generate_streaming(
+                adapter,
                 prompt_messages,
                 temperature=0.7,  # Temperatura per creatività bilanciata
                 max_tokens=3000  # Token per risposte complesse
@@ -2581,10 +2627,54 @@ async def rag_fortress(
         messages: Cronologia completa dei messaggi della conversazione (opzionale)
         
     Returns:
-        Dict con risposta completa e metadata
+        Dict con risposta completa e metadata; "usage" con i token di tutte le chiamate
+        LLM ({"prompt", "completion", "total"}), "trace" solo se PIPELINE_TRACE_IN_RESPONSE
     """
     global _pipeline_instance
     if _pipeline_instance is None:
         _pipeline_instance = RAGFortressPipeline()
     
-    return await _pipeline_instance.rag_fortress(question, tenant_id, user_id, mode, messages)
+    with start_trace(f"rag_fortress_{mode}") as trace:
+        result = await _cached_rag_fortress(question, tenant_id, user_id, mode, messages)
+        if trace is not None:
+            trace.mark_stage(None)
+            trace_data = trace.to_dict()
+            result = {**result, "usage": trace_data["tokens"]}
+            if PIPELINE_TRACE_IN_RESPONSE:
+                result["trace"] = trace_data
+    return result
+
+
+async def _cached_rag_fortress(
+    question: str,
+    tenant_id: str,
+    user_id: Optional[str],
+    mode: str,
+    messages: Optional[List]
+) -> Dict:
+    """Pipeline dietro la cache semantica delle risposte"""
+    # Cache semantica: solo domande senza cronologia (la risposta dipende dal contesto)
+    question_embedding = None
+    corpus_version = None
+    if ANSWER_CACHE_ENABLED and not _has_conversation_history(messages):
+        try:
+            with span("answer_cache_lookup"):
+                question_embedding = await _pipeline_instance.retriever._generate_embedding(question)
+                corpus_version = await CorpusVersion.aget(tenant_id)
+                cached = SemanticAnswerCache.lookup(tenant_id, mode, user_id, question_embedding, corpus_version)
+            if cached is not None:
+                return cached
+        except Exception as e:
+            logger.debug(f"Answer cache non disponibile: {e}")
+            question_embedding = None
+    
+    result = await _pipeline_instance.rag_fortress(question, tenant_id, user_id, mode, messages)
+    
+    if question_embedding is not None:
+        SemanticAnswerCache.store(tenant_id, mode, user_id, question_embedding, corpus_version, result)
+    return result
+
+
+def _has_conversation_history(messages: Optional[List]) -> bool:
+    """True se prima della domanda corrente ci sono altri messaggi"""
+    return bool(messages) and len(messages) > 1
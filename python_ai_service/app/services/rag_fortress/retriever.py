@@ -1,32 +1,68 @@
 """
 Retriever avanzato con hybrid search MongoDB Atlas
 Multi-tenant con reranking per massima accuratezza
+
+Gamba lessicale: indice BM25 in-process per tenant (LexicalIndexRegistry), fuso con
+il ranking vettoriale tramite reciprocal-rank fusion.
 """
 
+import asyncio
 import logging
-from typing import List, Dict, Optional
-import numpy as np
+from typing import List, Dict, Optional, Sequence
+from bson import ObjectId
 from app.services.mongodb_service import MongoDBService
+from app.services.mongodb_async import AsyncMongoDBService, MONGODB_ASYNC_BULK_TIMEOUT_SECONDS
+from app.services.tracing import span
+from app.services import vector_scoring
+from app.services.corpus_version import CorpusVersion
+from app.services.embedding_store import EmbeddingStore, document_version
+from app.services.lexical_index import LexicalIndexRegistry, LEXICAL_INDEX_ENABLED, LEXICAL_MIN_BM25_SCORE
+from app.services.tenant_ids import normalize_tenant_id
+from app.services.vector_scoring import cosine_similarity  # Re-export per compatibilità
 from app.services.ai_router import AIRouter
 from app.services.providers import OpenAIEmbeddingAdapter
 import os
 
-def cosine_similarity(vec1: List[float], vec2: List[float]) -> float:
-    """Calcola cosine similarity tra due vettori"""
-    try:
-        vec1_array = np.array(vec1)
-        vec2_array = np.array(vec2)
-        dot_product = np.dot(vec1_array, vec2_array)
-        norm1 = np.linalg.norm(vec1_array)
-        norm2 = np.linalg.norm(vec2_array)
-        if norm1 == 0 or norm2 == 0:
-            return 0.0
-        return float(dot_product / (norm1 * norm2))
-    except Exception:
-        return 0.0
-
 logger = logging.getLogger(__name__)
 
+# Costante k della reciprocal-rank fusion (valore standard della letteratura)
+RRF_K = 60
+
+# Embedding scaricati per round trip durante il riallineamento dell'EmbeddingStore
+EMBEDDING_SYNC_BATCH_SIZE = int(os.getenv("EMBEDDING_SYNC_BATCH_SIZE", "500"))
+
+
+def reciprocal_rank_fusion(ranked_lists: Sequence[List[Dict]], k: int = RRF_K) -> List[Dict]:
+    """
+    Fonde più liste di evidenze ordinate con reciprocal-rank fusion
+
+    Ogni evidenza riceve sum(1 / (k + rank)) sulle liste in cui compare: premia
+    i documenti trovati da più query senza confrontare score di scale diverse.
+
+    Args:
+        ranked_lists: Liste di evidenze, ciascuna ordinata per rilevanza
+        k: Costante di smorzamento del rank
+
+    Returns:
+        Evidenze uniche ordinate per rrf_score (campo aggiunto), "score" = massimo originale
+    """
+    fused: Dict[str, Dict] = {}
+    for evidences in ranked_lists:
+        for rank, ev in enumerate(evidences, start=1):
+            ev_id = ev.get("evidence_id") or ev.get("_id")
+            if not ev_id:
+                continue
+            ev_id = str(ev_id)
+            contribution = 1.0 / (k + rank)
+            if ev_id not in fused:
+                fused[ev_id] = {**ev, "rrf_score": contribution}
+            else:
+                entry = fused[ev_id]
+                entry["rrf_score"] += contribution
+                entry["score"] = max(entry.get("score", 0.0), ev.get("score", 0.0))
+    return sorted(fused.values(), key=lambda ev: ev["rrf_score"], reverse=True)
+
+
 class HybridRetriever:
     """
     Retriever ibrido avanzato per MongoDB Atlas
@@ -52,6 +88,23 @@ class HybridRetriever:
             logger.error(f"Errore generazione embedding: {e}")
             raise
     
+    async def _generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        Genera gli embedding di più testi con una sola richiesta quando l'adapter
+        supporta embed_batch, altrimenti con richieste singole concorrenti
+        """
+        try:
+            context = {"task_class": "embedding"}
+            adapter = self.ai_router.get_embedding_adapter(context)
+            if hasattr(adapter, "embed_batch"):
+                results = await adapter.embed_batch(texts)
+            else:
+                results = await asyncio.gather(*(adapter.embed(text) for text in texts))
+            return [result["embedding"] for result in results]
+        except Exception as e:
+            logger.error(f"Errore generazione embedding batch: {e}")
+            raise
+    
     async def _detect_keywords(self, question: str) -> bool:
         """
         Rileva se la domanda contiene keyword per text search
@@ -65,6 +118,45 @@ class HybridRetriever:
         question_lower = question.lower()
         return any(keyword in question_lower for keyword in pa_keywords)
     
+    async def _lexical_search(self, question: str, tenant_id, limit: int) -> List[Dict]:
+        """
+        Ricerca BM25 sull'indice lessicale in-process del tenant
+        
+        Returns:
+            Evidenze con lexical_score normalizzato sul miglior hit (0-1, solo per il ranking),
+            bm25_score grezzo (per la soglia) e score 0: "score" è solo similarità vettoriale
+        """
+        try:
+            index = await AsyncMongoDBService.run(
+                LexicalIndexRegistry.get_index, tenant_id,
+                timeout=MONGODB_ASYNC_BULK_TIMEOUT_SECONDS
+            )
+            hits = await asyncio.to_thread(index.search, question, limit)
+        except Exception as e:
+            logger.warning(f"⚠️ Ricerca lessicale non disponibile per tenant {tenant_id}: {e}")
+            return []
+        
+        if not hits:
+            return []
+        best_score = hits[0][1] or 1.0
+        return [
+            {**payload, "score": 0.0, "lexical_score": score / best_score, "bm25_score": score}
+            for payload, score in hits
+        ]
+    
+    @staticmethod
+    def _lexical_match(chunk: Dict) -> bool:
+        """
+        Hit lessicale rilevante: BM25 grezzo >= LEXICAL_MIN_BM25_SCORE
+
+        Anche per i chunk presenti in entrambe le liste RRF: la ricerca vettoriale
+        restituisce sempre top-k, un hit vettoriale debole con un solo termine in comune
+        non basta (lo score vettoriale viene confrontato con la soglia a parte).
+        """
+        if chunk.get("lexical_score") is None:
+            return False
+        return (chunk.get("bm25_score") or 0.0) >= LEXICAL_MIN_BM25_SCORE
+    
     async def _rerank_chunks(
         self, 
         question: str, 
@@ -72,25 +164,36 @@ class HybridRetriever:
         top_k: int = 20
     ) -> List[Dict]:
         """
-        Rerank chunks usando bge-reranker o Cohere Rerank 3.5
-        Per ora implementazione semplificata basata su score MongoDB
-        TODO: Integrare servizio reranking esterno se disponibile
+        Fonde il ranking vettoriale e quello lessicale (BM25) con reciprocal-rank fusion
+        
+        I chunk trovati da entrambe le ricerche salgono in classifica; "score" resta
+        lo score vettoriale (0 per gli hit solo lessicali).
+        Senza una delle due liste l'ordine è quello dello score MongoDB, poi BM25.
         """
-        # Per ora usiamo lo score MongoDB come base
-        # In produzione integrare servizio reranking dedicato
-        sorted_chunks = sorted(
-            chunks, 
-            key=lambda x: x.get("score", 0), 
+        semantic = sorted(
+            (chunk for chunk in chunks if chunk.get("vector_score") is not None),
+            key=lambda x: x["vector_score"],
+            reverse=True
+        )
+        lexical = sorted(
+            (chunk for chunk in chunks if chunk.get("lexical_score") is not None),
+            key=lambda x: x["lexical_score"],
             reverse=True
         )
-        return sorted_chunks[:top_k]
+        if not semantic or not lexical:
+            return sorted(
+                chunks, key=lambda x: (x.get("score", 0), x.get("lexical_score") or 0), reverse=True
+            )[:top_k]
+        return reciprocal_rank_fusion([semantic, lexical])[:top_k]
     
     async def retrieve_evidence(
         self, 
         question: str, 
         tenant_id: str,
         user_id: Optional[int] = None,
-        top_k: int = 100
+        top_k: int = 100,
+        relevance_threshold: Optional[float] = None,
+        question_embedding: Optional[List[float]] = None
     ) -> List[Dict]:
         """
         Recupera evidenze usando hybrid search MongoDB Atlas + user memories
@@ -100,13 +203,15 @@ class HybridRetriever:
             tenant_id: ID del tenant per isolamento dati (può essere stringa o intero)
             user_id: ID utente per memorie personalizzate (opzionale)
             top_k: Numero massimo di chunk da recuperare inizialmente
+            relevance_threshold: Soglia per questa chiamata (default self.relevance_threshold)
+            question_embedding: Embedding già calcolato della domanda (evita una chiamata al provider)
             
         Returns:
             Lista di dict con evidenze verificate (documenti PA + memorie utente)
             Ogni dict contiene: evidence_id, content, source, metadata, score, exact_quote
         """
         try:
-            if not MongoDBService.is_connected():
+            if not await AsyncMongoDBService.is_connected():
                 logger.warning("MongoDB non connesso, ritorno lista vuota")
                 return []
             
@@ -115,22 +220,21 @@ class HybridRetriever:
                 logger.warning("Collection 'documents' non trovata")
                 return []
             
-            # Normalizza tenant_id: prova sia come intero che come stringa
-            # I documenti possono avere tenant_id come int o str
-            try:
-                tenant_id_int = int(tenant_id)
-            except (ValueError, TypeError):
-                tenant_id_int = None
+            # tenant_id in forma canonica (migrazione scripts/normalize_tenant_ids.py):
+            # una sola ricerca per query invece di ripeterla per stringa e intero
+            tenant_id = normalize_tenant_id(tenant_id)
+            
+            if relevance_threshold is None:
+                relevance_threshold = self.relevance_threshold
             
-            # Step 1: Genera embedding per la domanda
-            question_embedding = await self._generate_embedding(question)
+            # Step 1: Genera embedding per la domanda (se non già fornito)
+            if question_embedding is None:
+                with span("embedding"):
+                    question_embedding = await self._generate_embedding(question)
             
             # Step 2: Over-retrieve chunk con vector search
-            # MongoDB Atlas $vectorSearch non supporta $in, quindi facciamo 2 ricerche separate
             vector_results = []
-            
-            # Ricerca 1: tenant_id come stringa
-            vector_search_pipeline_str = [
+            vector_search_pipeline = [
                 {
                     "$vectorSearch": {
                         "index": "vector_index",
@@ -139,7 +243,7 @@ class HybridRetriever:
                         "numCandidates": top_k * 2,
                         "limit": top_k,
                         "filter": {
-                            "tenant_id": tenant_id  # Stringa
+                            "tenant_id": tenant_id
                         }
                     }
                 },
@@ -159,49 +263,10 @@ class HybridRetriever:
             ]
             
             try:
-                vector_results_str = list(collection.aggregate(vector_search_pipeline_str))
-                vector_results.extend(vector_results_str)
-                logger.debug(f"Vector search con tenant_id stringa: {len(vector_results_str)} risultati")
+                with span("vector_search", top_k=top_k):
+                    vector_results = await AsyncMongoDBService.run(lambda: list(collection.aggregate(vector_search_pipeline)))
             except Exception as e:
-                logger.debug(f"Vector search con tenant_id stringa fallita: {e}")
-            
-            # Ricerca 2: tenant_id come intero (SEMPRE se convertibile)
-            # Fix: esegui sempre entrambe le ricerche per gestire documenti con int o str
-            if tenant_id_int is not None:
-                vector_search_pipeline_int = [
-                    {
-                        "$vectorSearch": {
-                            "index": "vector_index",
-                            "path": "embedding",
-                            "queryVector": question_embedding,
-                            "numCandidates": top_k * 2,
-                            "limit": top_k,
-                            "filter": {
-                                "tenant_id": tenant_id_int  # Intero
-                            }
-                        }
-                    },
-                    {
-                        "$project": {
-                            "_id": 1,
-                            "document_id": 1,
-                            "title": 1,
-                            "protocol_number": 1,
-                            "protocol_date": 1,
-                            "content": 1,
-                            "source": 1,
-                            "metadata": 1,
-                            "score": {"$meta": "vectorSearchScore"}
-                        }
-                    }
-                ]
-                
-                try:
-                    vector_results_int = list(collection.aggregate(vector_search_pipeline_int))
-                    vector_results.extend(vector_results_int)
-                    logger.debug(f"Vector search con tenant_id intero: {len(vector_results_int)} risultati")
-                except Exception as e:
-                    logger.debug(f"Vector search con tenant_id intero fallita: {e}")
+                logger.debug(f"Vector search fallita: {e}")
             
             logger.info(f"Vector search totale: {len(vector_results)} risultati")
             
@@ -212,51 +277,52 @@ class HybridRetriever:
                 # Per query generative, aumenta top_k per recuperare più documenti
                 # Una query generica deve trovare molti documenti, non solo 5-10
                 fallback_top_k = top_k * 2 if top_k < 50 else top_k  # Almeno il doppio per query generative
-                vector_results = await self._fallback_manual_vector_search(
-                    question_embedding, tenant_id, tenant_id_int, fallback_top_k
-                )
+                with span("fallback_scan", top_k=fallback_top_k):
+                    vector_results = await self._fallback_manual_vector_search(
+                        question_embedding, tenant_id, fallback_top_k
+                    )
                 used_fallback = True
                 logger.info(f"Fallback ricerca manuale: {len(vector_results)} risultati")
             
-            # Step 3: Se keywords rilevate, aggiungi text search
+            # Step 3: Ricerca lessicale (BM25 in-process); $text MongoDB solo se l'indice locale è disabilitato
             text_results = []
-            if await self._detect_keywords(question):
-                # Text search: prova sia con stringa che intero
-                text_filters = [{"tenant_id": tenant_id}]
-                if tenant_id_int is not None and str(tenant_id_int) != tenant_id:
-                    text_filters.append({"tenant_id": tenant_id_int})
-                
-                for text_filter in text_filters:
-                    try:
-                        text_search_pipeline = [
-                            {
-                                "$match": {
-                                    **text_filter,
-                                    "$text": {"$search": question}
-                                }
-                            },
-                            {
-                                "$project": {
-                                    "_id": 1,
-                                    "document_id": 1,
-                                    "title": 1,
-                                    "protocol_number": 1,
-                                    "protocol_date": 1,
-                                    "content": 1,
-                                    "source": 1,
-                                    "metadata": 1,
-                                    "score": {"$meta": "textScore"}
-                                }
-                            },
-                            {
-                                "$limit": top_k // 2  # Metà chunk da text search
+            lexical_results = []
+            if LEXICAL_INDEX_ENABLED:
+                with span("lexical_search"):
+                    lexical_results = await self._lexical_search(question, tenant_id, top_k // 2)
+                if lexical_results:
+                    logger.info(f"Ricerca lessicale: {len(lexical_results)} risultati")
+            elif await self._detect_keywords(question):
+                try:
+                    text_search_pipeline = [
+                        {
+                            "$match": {
+                                "tenant_id": tenant_id,
+                                "$text": {"$search": question}
+                            }
+                        },
+                        {
+                            "$project": {
+                                "_id": 1,
+                                "document_id": 1,
+                                "title": 1,
+                                "protocol_number": 1,
+                                "protocol_date": 1,
+                                "content": 1,
+                                "source": 1,
+                                "metadata": 1,
+                                "score": {"$meta": "textScore"}
                             }
-                        ]
-                        text_results_batch = list(collection.aggregate(text_search_pipeline))
-                        text_results.extend(text_results_batch)
-                    except Exception as e:
-                        # Text index non disponibile - skip text search
-                        logger.debug(f"Text search non disponibile (text index mancante): {e}")
+                        },
+                        {
+                            "$limit": top_k // 2  # Metà chunk da text search
+                        }
+                    ]
+                    with span("text_search"):
+                        text_results = await AsyncMongoDBService.run(lambda: list(collection.aggregate(text_search_pipeline)))
+                except Exception as e:
+                    # Text index non disponibile - skip text search
+                    logger.debug(f"Text search non disponibile (text index mancante): {e}")
             
             # Step 3.5: Recupera memorie utente se user_id fornito
             user_memories = []
@@ -271,8 +337,10 @@ class HybridRetriever:
             
             # Step 4: Combina risultati (documenti PA + memorie utente)
             all_chunks = {}
-            for chunk in vector_results + text_results + user_memories:
+            for chunk in vector_results + text_results + user_memories + lexical_results:
                 chunk_id = str(chunk.get("_id"))
+                lexical_score = chunk.get("lexical_score")
+                vector_score = chunk.get("score", 0.0) if lexical_score is None else None
                 if chunk_id not in all_chunks:
                     # Estrai document_id: prova dal campo document_id, poi da metadata, poi usa chunk_id
                     document_id = chunk.get("document_id")
@@ -293,6 +361,9 @@ class HybridRetriever:
                         "source": chunk.get("source", "unknown"),
                         "metadata": chunk.get("metadata", {}),
                         "score": chunk.get("score", 0.0),
+                        "vector_score": vector_score,
+                        "lexical_score": lexical_score,
+                        "bm25_score": chunk.get("bm25_score"),
                         "exact_quote": None  # Sarà popolato da evidence_verifier
                     }
                 else:
@@ -301,25 +372,25 @@ class HybridRetriever:
                         all_chunks[chunk_id]["score"],
                         chunk.get("score", 0.0)
                     )
+                    if lexical_score is not None:
+                        all_chunks[chunk_id]["lexical_score"] = lexical_score
+                        all_chunks[chunk_id]["bm25_score"] = chunk.get("bm25_score")
+                    elif all_chunks[chunk_id]["vector_score"] is None:
+                        all_chunks[chunk_id]["vector_score"] = vector_score
             
-            # Step 5: Rerank con bge-reranker o Cohere
+            # Step 5: Fusione ranking vettoriale + lessicale (RRF)
             chunks_list = list(all_chunks.values())
-            
-            # Se abbiamo usato fallback (cosine similarity), salta il reranking e usa direttamente i risultati
-            # perché il reranker potrebbe modificare gli score in modo incompatibile
-            if used_fallback and len(chunks_list) > 0:
-                logger.info(f"Usando risultati fallback direttamente senza reranking (cosine similarity già calcolata)")
-                # Prendi i top_k risultati già ordinati per score
-                filtered_chunks = sorted(chunks_list, key=lambda x: x.get("score", 0), reverse=True)[:top_k]
-                # Rimuovi filtro soglia per fallback (cosine similarity va da -1 a 1, non da 0 a 10)
-                filtered_chunks = [chunk for chunk in filtered_chunks if chunk.get("score", 0) >= 0.3]
-            else:
+            with span("rerank", candidates=len(chunks_list)):
                 reranked_chunks = await self._rerank_chunks(question, chunks_list, top_k)
-                # Step 6: Filtra per relevance_score > 8.8 (per risultati da vector search)
-                filtered_chunks = [
-                    chunk for chunk in reranked_chunks
-                    if chunk.get("score", 0) >= self.relevance_threshold
-                ]
+            
+            # Step 6: Filtra per rilevanza. Il fallback usa cosine similarity (-1..1):
+            # soglia fissa 0.3 invece di quella di Atlas. Passano i chunk con score
+            # vettoriale sopra soglia o con BM25 grezzo sopra LEXICAL_MIN_BM25_SCORE
+            min_score = 0.3 if used_fallback else relevance_threshold
+            filtered_chunks = [
+                chunk for chunk in reranked_chunks
+                if chunk.get("score", 0) >= min_score or self._lexical_match(chunk)
+            ]
             
             logger.info(f"Retrieved {len(filtered_chunks)} evidenze per tenant {tenant_id}")
             
@@ -329,11 +400,72 @@ class HybridRetriever:
             logger.error(f"Errore durante retrieval evidenze: {e}", exc_info=True)
             return []
     
+    async def retrieve_evidence_multi(
+        self,
+        questions: List[str],
+        tenant_id: str,
+        user_id: Optional[int] = None,
+        top_k: int = 100,
+        relevance_threshold: Optional[float] = None
+    ) -> List[Dict]:
+        """
+        Fan-out del retrieval su più query (es. espansione di query generative)
+        
+        Embedding di tutte le query in un'unica richiesta, ricerche concorrenti,
+        fusione dei risultati con reciprocal-rank fusion: la latenza è circa
+        quella di una singola query.
+        
+        Args:
+            questions: Query di ricerca
+            tenant_id: ID del tenant
+            user_id: ID utente per memorie personalizzate (opzionale)
+            top_k: Numero massimo di chunk per query
+            relevance_threshold: Soglia per queste chiamate (default self.relevance_threshold)
+            
+        Returns:
+            Evidenze uniche ordinate per rrf_score
+        """
+        if not questions:
+            return []
+        if len(questions) == 1:
+            return await self.retrieve_evidence(
+                question=questions[0], tenant_id=tenant_id, user_id=user_id,
+                top_k=top_k, relevance_threshold=relevance_threshold
+            )
+        
+        try:
+            with span("embedding", texts=len(questions)):
+                embeddings = await self._generate_embeddings(questions)
+        except Exception:
+            return []
+        
+        results = await asyncio.gather(*(
+            self.retrieve_evidence(
+                question=question,
+                tenant_id=tenant_id,
+                user_id=user_id,
+                top_k=top_k,
+                relevance_threshold=relevance_threshold,
+                question_embedding=embedding
+            )
+            for question, embedding in zip(questions, embeddings)
+        ), return_exceptions=True)
+        
+        ranked_lists = []
+        for question, result in zip(questions, results):
+            if isinstance(result, BaseException):
+                logger.warning(f"Retrieval fallito per query '{question[:50]}': {result}")
+                continue
+            ranked_lists.append(result)
+        
+        fused = reciprocal_rank_fusion(ranked_lists)
+        logger.info(f"Fan-out retrieval: {len(questions)} query, {len(fused)} evidenze uniche dopo RRF")
+        return fused
+    
     async def _fallback_manual_vector_search(
         self,
         question_embedding: List[float],
-        tenant_id: str,
-        tenant_id_int: Optional[int],
+        tenant_id,
         top_k: int
     ) -> List[Dict]:
         """
@@ -341,118 +473,103 @@ class HybridRetriever:
         
         Args:
             question_embedding: Embedding della query
-            tenant_id: Tenant ID come stringa
-            tenant_id_int: Tenant ID come intero (se diverso)
+            tenant_id: Tenant ID (normalizzato in forma canonica)
             top_k: Numero massimo di risultati
             
         Returns:
             Lista di documenti con score di similarità
         """
         try:
-            collection = MongoDBService.get_collection("documents")
-            if collection is None:
-                return []
-            
-            # Filtro tenant: cerca sia intero che stringa
-            # IMPORTANTE: I documenti nel DB hanno tenant_id come intero, quindi priorità all'intero
-            tenant_filters = []
-            if tenant_id_int is not None:
-                tenant_filters.append({"tenant_id": tenant_id_int})  # Priorità: intero
-            if str(tenant_id_int) != tenant_id:  # Aggiungi stringa solo se diversa
-                tenant_filters.append({"tenant_id": tenant_id})
+            tenant_id = normalize_tenant_id(tenant_id)
+            
+            # Scoring sulla matrice mmap del tenant: nessun download di embedding/contenuti
+            store = EmbeddingStore.get(tenant_id)
+            await self._ensure_embedding_store(store, tenant_id)
+            
+            # Margine sui candidati: alcuni documenti potrebbero non avere contenuto testuale
+            hits = store.search(question_embedding, k=top_k * 2)
+            
+            # Idrata solo i documenti vincenti, per _id
+            object_ids = [ObjectId(doc_id) if ObjectId.is_valid(doc_id) else doc_id for doc_id, _ in hits]
+            hydrated = await AsyncMongoDBService.hydrate_documents("documents", object_ids, projection={
+                "_id": 1,
+                "document_id": 1,
+                "title": 1,
+                "protocol_number": 1,
+                "protocol_date": 1,
+                "content.full_text": 1,
+                "content.raw_text": 1,
+                "content.chunks": {"$slice": 1},
+                "metadata": 1,
+                "updated_at": 1,
+                "created_at": 1
+            })
             
             all_results = []
-            
-            for tenant_filter_base in tenant_filters:
-                # Query documenti con embedding (crea copia per non modificare l'originale)
-                tenant_filter = tenant_filter_base.copy()
-                tenant_filter["embedding"] = {"$exists": True, "$ne": None}
+            stale_ids = []
+            skipped_missing = 0
+            skipped_no_content = 0
+            for doc_id, score in hits:
+                doc = hydrated.get(doc_id)
+                if doc is None:
+                    # Documento eliminato da MongoDB: rimuovilo dallo store
+                    store.remove(doc_id)
+                    skipped_missing += 1
+                    continue
                 
-                logger.debug(f"Fallback: cercando documenti con filtro {tenant_filter}")
+                if document_version(doc) != store.get_version(doc_id):
+                    stale_ids.append(doc["_id"])
                 
-                # Recupera tutti i documenti con embedding
-                # OTTIMIZZAZIONE: Ridotto limite per evitare timeout con fallback manuale
-                # Limite ridotto a 800 per bilanciare recall e performance
-                limit_docs = 800 if top_k > 50 else 500
+                # Estrai contenuto: prova content.full_text o content.raw_text
+                content = ""
+                if "content" in doc:
+                    content_obj = doc["content"]
+                    if isinstance(content_obj, dict):
+                        content = content_obj.get("full_text") or content_obj.get("raw_text") or ""
+                    elif isinstance(content_obj, str):
+                        content = content_obj
                 
-                documents = list(collection.find(tenant_filter, {
-                    "_id": 1,
-                    "document_id": 1,
-                    "title": 1,
-                    "protocol_number": 1,
-                    "protocol_date": 1,
-                    "content": 1,
-                    "metadata": 1,
-                    "embedding": 1
-                }).limit(limit_docs))
+                # Se non c'è contenuto, prova a prendere dai chunks
+                if not content and "content" in doc and isinstance(doc["content"], dict):
+                    chunks = doc["content"].get("chunks", [])
+                    if chunks and isinstance(chunks, list) and len(chunks) > 0:
+                        # Prendi il primo chunk
+                        first_chunk = chunks[0]
+                        if isinstance(first_chunk, dict):
+                            content = first_chunk.get("chunk_text", "")
                 
-                logger.debug(f"Fallback: recuperati {len(documents)} documenti dal database (limite: {limit_docs})")
+                if not content:
+                    skipped_no_content += 1
+                    continue
                 
-                logger.debug(f"Fallback: trovati {len(documents)} documenti con filtro {tenant_filter}")
+                # Estrai document_id: prova dal campo document_id o usa _id come fallback
+                document_id = doc.get("document_id")
+                if not document_id:
+                    # Fallback: usa _id come document_id
+                    document_id = str(doc.get("_id"))
                 
-                # Calcola cosine similarity per ogni documento
-                logger.debug(f"Fallback: elaborando {len(documents)} documenti per calcolo similarity")
-                processed = 0
-                skipped_no_embedding = 0
-                skipped_no_content = 0
+                all_results.append({
+                    "_id": doc.get("_id"),
+                    "evidence_id": str(doc.get("_id")),
+                    "document_id": document_id,
+                    "title": doc.get("title", "Documento senza titolo"),
+                    "protocol_number": doc.get("protocol_number", ""),
+                    "protocol_date": doc.get("protocol_date", ""),
+                    "content": content[:2000],  # Limita a 2000 caratteri
+                    "source": doc.get("title", "Documento"),
+                    "metadata": doc.get("metadata", {}),
+                    "score": score,
+                    "exact_quote": None
+                })
                 
-                for doc in documents:
-                    doc_embedding = doc.get("embedding")
-                    if not doc_embedding or not isinstance(doc_embedding, list):
-                        skipped_no_embedding += 1
-                        continue
-                    
-                    # Calcola similarity
-                    similarity = cosine_similarity(question_embedding, doc_embedding)
-                    
-                    # Estrai contenuto: prova content.full_text o content.raw_text
-                    content = ""
-                    if "content" in doc:
-                        content_obj = doc["content"]
-                        if isinstance(content_obj, dict):
-                            content = content_obj.get("full_text") or content_obj.get("raw_text") or ""
-                        elif isinstance(content_obj, str):
-                            content = content_obj
-                    
-                    # Se non c'è contenuto, prova a prendere dai chunks
-                    if not content and "content" in doc and isinstance(doc["content"], dict):
-                        chunks = doc["content"].get("chunks", [])
-                        if chunks and isinstance(chunks, list) and len(chunks) > 0:
-                            # Prendi il primo chunk
-                            first_chunk = chunks[0]
-                            if isinstance(first_chunk, dict):
-                                content = first_chunk.get("chunk_text", "")
-                    
-                    if not content:
-                        skipped_no_content += 1
-                        continue
-                    
-                    processed += 1
-                    
-                    # Estrai document_id: prova dal campo document_id o usa _id come fallback
-                    document_id = doc.get("document_id")
-                    if not document_id:
-                        # Fallback: usa _id come document_id
-                        document_id = str(doc.get("_id"))
-                    
-                    all_results.append({
-                        "_id": doc.get("_id"),
-                        "evidence_id": str(doc.get("_id")),
-                        "document_id": document_id,
-                        "title": doc.get("title", "Documento senza titolo"),
-                        "protocol_number": doc.get("protocol_number", ""),
-                        "protocol_date": doc.get("protocol_date", ""),
-                        "content": content[:2000],  # Limita a 2000 caratteri
-                        "source": doc.get("title", "Documento"),
-                        "metadata": doc.get("metadata", {}),
-                        "score": similarity,
-                        "exact_quote": None
-                    })
+                if len(all_results) >= top_k:
+                    break
             
-            # Ordina per score decrescente e prendi top_k
-            all_results.sort(key=lambda x: x.get("score", 0), reverse=True)
+            # Documenti aggiornati fuori dall'importer: riallinea le loro righe
+            if stale_ids:
+                await AsyncMongoDBService.run(self._refresh_embedding_store, store, stale_ids)
             
-            logger.info(f"Fallback ricerca manuale: {len(all_results)} risultati totali (processati: {processed}, saltati no-embedding: {skipped_no_embedding}, saltati no-content: {skipped_no_content}), restituisco top {top_k}")
+            logger.info(f"Fallback ricerca manuale: {len(all_results)} risultati totali (store: {store.size} embedding, saltati eliminati: {skipped_missing}, saltati no-content: {skipped_no_content}), restituisco top {top_k}")
             
             return all_results[:top_k]
             
@@ -460,6 +577,89 @@ class HybridRetriever:
             logger.error(f"Errore durante fallback ricerca manuale: {e}", exc_info=True)
             return []
     
+    async def _ensure_embedding_store(self, store, tenant_id) -> None:
+        """
+        Allinea lo store a MongoDB quando la versione del corpus del tenant cambia
+
+        Copre i documenti scritti da altri processi (secondo worker API, script di import):
+        senza riallineamento lo store li ignorerebbe fino alla ricostruzione.
+        """
+        if not await AsyncMongoDBService.is_connected():
+            return
+        version = await CorpusVersion.aget(tenant_id)
+        if store.synced_version == version:
+            return
+        try:
+            await AsyncMongoDBService.run(
+                self._populate_embedding_store if store.size == 0 else self._sync_embedding_store,
+                store, tenant_id,
+                timeout=MONGODB_ASYNC_BULK_TIMEOUT_SECONDS
+            )
+            # Versione letta prima del riallineamento: scritture concorrenti forzano il prossimo
+            store.synced_version = version
+        except Exception as e:
+            logger.warning(f"⚠️ EmbeddingStore tenant {tenant_id} non riallineato: {e}")
+    
+    def _sync_embedding_store(self, store, tenant_id) -> None:
+        """
+        Riallinea lo store del tenant: legge solo _id e versione dei documenti con embedding,
+        scarica gli embedding dei documenti nuovi o aggiornati e invalida quelli eliminati
+        """
+        collection = MongoDBService.get_collection("documents")
+        if collection is None:
+            return
+        seen = set()
+        changed = []
+        cursor = collection.find(
+            {"tenant_id": tenant_id, "embedding": {"$exists": True, "$ne": None}},
+            {"_id": 1, "updated_at": 1, "created_at": 1}
+        )
+        for doc in cursor:
+            doc_id = str(doc["_id"])
+            seen.add(doc_id)
+            if store.get_version(doc_id) != document_version(doc):
+                changed.append(doc["_id"])
+        
+        removed = [doc_id for doc_id in list(store.row_by_id) if doc_id not in seen]
+        for start in range(0, len(changed), EMBEDDING_SYNC_BATCH_SIZE):
+            self._refresh_embedding_store(store, changed[start:start + EMBEDDING_SYNC_BATCH_SIZE])
+        store.remove_many(removed)
+        if changed or removed:
+            logger.info(f"🗂️ EmbeddingStore tenant {store.tenant_id} riallineato: {len(changed)} aggiornati, {len(removed)} rimossi")
+    
+    def _populate_embedding_store(self, store, tenant_id) -> None:
+        """
+        Costruisce lo store embedding del tenant (primo uso o store vuoto)
+        
+        Scarica solo _id, embedding e versione: il testo resta in MongoDB.
+        """
+        cursor = MongoDBService.iter_embeddings(
+            "documents",
+            {"tenant_id": tenant_id, "embedding": {"$exists": True, "$ne": None}},
+            fields=("updated_at", "created_at")
+        )
+        store.rebuild(
+            (doc["_id"], doc.get("embedding") if isinstance(doc.get("embedding"), list) else None, document_version(doc))
+            for doc in cursor
+        )
+        logger.info(f"🗂️ EmbeddingStore tenant {store.tenant_id} costruito: {store.size} embedding")
+    
+    def _refresh_embedding_store(self, store, stale_ids: List) -> None:
+        """Aggiorna nello store gli embedding di documenti con versione cambiata"""
+        refreshed = MongoDBService.hydrate_documents(
+            "documents", stale_ids, projection={"_id": 1, "embedding": 1, "updated_at": 1, "created_at": 1}
+        )
+        records = []
+        removed = []
+        for doc in refreshed.values():
+            embedding = doc.get("embedding")
+            if isinstance(embedding, list) and embedding:
+                records.append((doc["_id"], embedding, document_version(doc)))
+            else:
+                removed.append(doc["_id"])
+        store.upsert_many(records)
+        store.remove_many(removed)
+    
     async def _retrieve_user_memories(
         self,
         user_id: int,
@@ -486,57 +686,59 @@ class HybridRetriever:
                 return []
             
             # Query memorie attive per questo utente con embedding
-            memories = list(memories_collection.find({
+            memories = await AsyncMongoDBService.run(lambda: list(memories_collection.find({
                 "user_id": user_id,
                 "is_active": True,
                 "embedding": {"$exists": True, "$ne": None}
-            }).limit(50))  # Recupera più memorie per scoring
+            }).limit(50)))  # Recupera più memorie per scoring
             
             if not memories:
                 return []
             
             logger.debug(f"💭 Trovate {len(memories)} memorie per user_id={user_id}")
             
-            # Calcola similarità per ogni memoria
+            # Calcola similarità per tutte le memorie con una sola matmul
+            matrix, positions = vector_scoring.build_matrix(
+                memory.get("embedding") if isinstance(memory.get("embedding"), list) else None
+                for memory in memories
+            )
+            
             scored_memories = []
-            for memory in memories:
-                memory_embedding = memory.get("embedding")
-                if not memory_embedding or not isinstance(memory_embedding, list):
+            for row, similarity in vector_scoring.search(question_embedding, matrix, k=len(positions), min_score=min_score):
+                memory = memories[positions[row]]
+                
+                # Formatta memoria come evidenza per RAG-Fortress
+                memory_id = str(memory.get("_id", ""))
+                content = memory.get("content", "")
+                
+                if not content:
                     continue
                 
-                similarity = cosine_similarity(question_embedding, memory_embedding)
+                scored_memories.append({
+                    "_id": memory.get("_id"),
+                    "evidence_id": f"memory_{memory_id}",
+                    "document_id": f"user_memory_{memory_id}",
+                    "title": f"💭 Memoria Personale: {memory.get('memory_type', 'generale')}",
+                    "protocol_number": "",
+                    "protocol_date": "",
+                    "content": content,
+                    "source": "Memoria Utente",
+                    "metadata": {
+                        "type": "user_memory",
+                        "memory_type": memory.get("memory_type", "general"),
+                        "memory_id": memory_id,
+                        "created_at": memory.get("created_at"),
+                        "is_memory": True
+                    },
+                    "score": similarity,
+                    "exact_quote": None
+                })
                 
-                if similarity >= min_score:
-                    # Formatta memoria come evidenza per RAG-Fortress
-                    memory_id = str(memory.get("_id", ""))
-                    content = memory.get("content", "")
-                    
-                    if not content:
-                        continue
-                    
-                    scored_memories.append({
-                        "_id": memory.get("_id"),
-                        "evidence_id": f"memory_{memory_id}",
-                        "document_id": f"user_memory_{memory_id}",
-                        "title": f"💭 Memoria Personale: {memory.get('memory_type', 'generale')}",
-                        "protocol_number": "",
-                        "protocol_date": "",
-                        "content": content,
-                        "source": "Memoria Utente",
-                        "metadata": {
-                            "type": "user_memory",
-                            "memory_type": memory.get("memory_type", "general"),
-                            "memory_id": memory_id,
-                            "created_at": memory.get("created_at"),
-                            "is_memory": True
-                        },
-                        "score": float(similarity),
-                        "exact_quote": None
-                    })
+                # Già ordinate per similarità: fermati al limite
+                if len(scored_memories) >= max_memories:
+                    break
             
-            # Ordina per similarità e limita
-            scored_memories.sort(key=lambda x: x.get("score", 0), reverse=True)
-            result = scored_memories[:max_memories]
+            result = scored_memories
             
             logger.info(f"💭 Restituite {len(result)} memorie con score >= {min_score}")
             return result
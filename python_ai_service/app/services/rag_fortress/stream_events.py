@@ -0,0 +1,122 @@
+"""
+Stream Events - eventi di avanzamento RAG-Fortress per le risposte in streaming
+
+La pipeline chiama emit() nei punti in cui un risultato intermedio è pronto
+(fonti recuperate, step completati, sintesi dei batch, token della sintesi
+finale). Gli eventi finiscono nella coda dello stream attivo nel contesto
+corrente (ContextVar, ereditata dai task asyncio figli); senza stream attivo
+emit() non fa nulla e la pipeline si comporta come prima.
+
+Eventi:
+    stage          {"stage": nome step, ...dettagli}
+    sources        {"sources": [...], "total": n}
+    batch_summary  {"index", "total", "summary"} (multi-step synthesis)
+    token          {"text": chunk} (sintesi finale, prima del post-processing link)
+    result         risposta finale completa (emesso da stream_events())
+"""
+
+import asyncio
+import logging
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Dict, List, Optional
+
+from app.services.providers.base import StreamCompletion
+
+logger = logging.getLogger(__name__)
+
+_event_queue: ContextVar[Optional[asyncio.Queue]] = ContextVar("rag_fortress_event_queue", default=None)
+
+
+def is_streaming() -> bool:
+    """True se c'è uno stream attivo nel contesto corrente"""
+    return _event_queue.get() is not None
+
+
+def emit(event: str, data: Dict[str, Any]):
+    """Pubblica un evento sullo stream attivo (no-op senza stream)"""
+    queue = _event_queue.get()
+    if queue is not None:
+        queue.put_nowait({"event": event, "data": data})
+
+
+async def generate_streaming(adapter: Any, messages: List[Dict[str, str]], **options) -> Dict[str, Any]:
+    """
+    adapter.generate() che, con uno stream attivo, emette i token man mano
+
+    Returns:
+        Dict come generate() ('content', 'usage', 'model', 'finish_reason');
+        usage, model e finish_reason vengono dallo StreamCompletion finale
+    """
+    if not is_streaming() or not hasattr(adapter, "generate_stream"):
+        return await adapter.generate(messages, **options)
+
+    chunks = []
+    completion = StreamCompletion()
+    async for chunk in adapter.generate_stream(messages, **options):
+        if isinstance(chunk, StreamCompletion):
+            completion = chunk
+            continue
+        chunks.append(chunk)
+        emit("token", {"text": chunk})
+    return {
+        "content": "".join(chunks),
+        "usage": completion.get("usage") or {},
+        "model": completion.get("model") or getattr(adapter, "model", None) or "",
+        "finish_reason": completion.get("finish_reason") or "stop"
+    }
+
+
+async def stream_events(
+    coro: Awaitable[Any],
+    heartbeat_seconds: Optional[float] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Esegue coro con uno stream attivo e ne restituisce gli eventi man mano
+
+    L'ultimo evento è {"event": "result", "data": valore di ritorno}; le
+    eccezioni di coro vengono propagate. Se il consumatore smette di leggere
+    (es. client disconnesso) il task viene cancellato.
+
+    Args:
+        coro: Coroutine da eseguire (es. chat_inference)
+        heartbeat_seconds: Se impostato, evento "heartbeat" dopo ogni intervallo
+            senza eventi (mantiene aperte le connessioni dietro proxy)
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    token = _event_queue.set(queue)
+    try:
+        # Il task copia il contesto corrente: eredita la coda
+        task = asyncio.ensure_future(coro)
+    finally:
+        _event_queue.reset(token)
+
+    getter = None
+    try:
+        while True:
+            if getter is None:
+                getter = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait(
+                {getter, task},
+                timeout=heartbeat_seconds,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            if getter in done:
+                event, getter = getter.result(), None
+                yield event
+            elif task in done:
+                break
+            else:
+                yield {"event": "heartbeat", "data": {}}
+
+        # Prima di svuotare la coda: un getter pendente potrebbe consumare un evento
+        getter.cancel()
+        getter = None
+        while not queue.empty():
+            yield queue.get_nowait()
+        yield {"event": "result", "data": task.result()}
+    finally:
+        if getter is not None and not getter.done():
+            getter.cancel()
+        if not task.done():
+            task.cancel()
+            logger.info("🛑 Stream interrotto: pipeline cancellata")
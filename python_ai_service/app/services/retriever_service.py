@@ -1,11 +1,14 @@
 """
 Retriever Service - Estrae chunks citabili con source_ref precisi
-MongoDB vector similarity search
+Vector similarity search su indice ANN in-process (VectorIndexRegistry),
+testo idratato da MongoDB solo per i chunk vincenti
 """
 
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import numpy as np
 from app.services.mongodb_service import MongoDBService
+from app.services.vector_index import VectorIndexRegistry
+from app.services.vector_scoring import cosine_similarity
 
 
 class RetrieverService:
@@ -52,8 +55,6 @@ class RetrieverService:
         if limit is None:
             limit = 100  # Default alto per OS3 STATISTICS RULE
         
-        from app.services.mongodb_service import MongoDBService
-        
         # Check if MongoDB is available - force connection attempt
         if not MongoDBService.is_connected():
             # Try to force connection
@@ -62,69 +63,40 @@ class RetrieverService:
                 # Return empty list - pipeline will work without retrieved chunks
                 return []
         
-        # Build query filter
-        query_filter = {
-            "tenant_id": tenant_id,
-            "embedding": {"$exists": True}  # Only documents with embeddings
-        }
-        
-        # Add optional filters
-        if filters:
-            if "document_type" in filters:
-                query_filter["document_type"] = filters["document_type"]
-            if "date_from" in filters or "date_to" in filters:
-                query_filter["created_at"] = {}
-                if "date_from" in filters:
-                    query_filter["created_at"]["$gte"] = filters["date_from"]
-                if "date_to" in filters:
-                    query_filter["created_at"]["$lte"] = filters["date_to"]
-        
-        # Get candidates from MongoDB - ensure connection first
-        import logging
-        logger = logging.getLogger(__name__)
+        # Get candidates from the in-memory ANN index (built lazily per tenant)
         try:
-            candidates = MongoDBService.find_documents("documents", query_filter)
-            if not candidates:
+            index = VectorIndexRegistry.get_index(tenant_id)
+            if index.size == 0:
                 # CRITICAL: Empty database = no documents to retrieve
-                logger.warning(f"⚠️ CRITICAL: No documents found in MongoDB with filter: {query_filter}")
+                logger.warning(f"⚠️ CRITICAL: No documents with embeddings found in MongoDB for tenant {tenant_id}")
                 logger.warning(f"⚠️ CRITICAL: Filter used: tenant_id={tenant_id}, embedding exists=True")
                 logger.warning(f"⚠️ CRITICAL: Possible causes: 1) No documents imported for tenant {tenant_id}, 2) Documents don't have embeddings, 3) tenant_id mismatch")
                 
                 # DIAGNOSTIC: Check if there are ANY documents for this tenant (even without embeddings)
+                # Solo conteggi: nessun documento viene scaricato
                 diagnostic_filter = {"tenant_id": tenant_id}
-                all_docs = MongoDBService.find_documents("documents", diagnostic_filter, limit=5)
-                logger.info(f"🔍 DIAGNOSTIC: Found {len(all_docs)} total documents for tenant {tenant_id} (including those without embeddings)")
+                total_docs = MongoDBService.count_documents("documents", diagnostic_filter)
+                logger.info(f"🔍 DIAGNOSTIC: Found {total_docs} total documents for tenant {tenant_id} (including those without embeddings)")
                 
-                if all_docs:
-                    docs_with_embeddings = [d for d in all_docs if d.get("embedding")]
-                    docs_with_chunk_embeddings = [d for d in all_docs if d.get("content", {}).get("chunks") and any(c.get("embedding") for c in d.get("content", {}).get("chunks", []))]
-                    logger.warning(f"⚠️ DIAGNOSTIC: {len(docs_with_embeddings)} docs have document-level embeddings, {len(docs_with_chunk_embeddings)} docs have chunk embeddings")
+                if total_docs:
+                    docs_with_embeddings = MongoDBService.count_documents("documents", {**diagnostic_filter, "embedding": {"$exists": True, "$ne": None}})
+                    docs_with_chunk_embeddings = MongoDBService.count_documents("documents", {**diagnostic_filter, "content.chunks.embedding": {"$exists": True}})
+                    logger.warning(f"⚠️ DIAGNOSTIC: {docs_with_embeddings} docs have document-level embeddings, {docs_with_chunk_embeddings} docs have chunk embeddings")
                 
                 return []  # Return empty - verifica postuma bloccherà risposta
             
             # Log retrieval info for debugging
-            logger.info(f"🔍 Retriever: Found {len(candidates)} candidate documents for tenant {tenant_id}")
-            
-            # DIAGNOSTIC: Log document types found
-            doc_types = {}
-            for doc in candidates[:10]:  # Sample first 10
-                doc_type = doc.get("document_type", "unknown")
-                doc_types[doc_type] = doc_types.get(doc_type, 0) + 1
-            if doc_types:
-                logger.info(f"🔍 Retriever: Document types found: {doc_types}")
+            logger.info(f"🔍 Retriever: Index has {index.size} vectors from {index.document_count} candidate documents for tenant {tenant_id}")
                 
         except Exception as e:
             logger.error(f"❌ CRITICAL: Error retrieving documents from MongoDB: {e}", exc_info=True)
             return []  # Return empty on error
         
-        # Calculate cosine similarity with minimum threshold
-        results = []
-        query_vector = np.array(query_embedding)
         # CRITICAL: Adaptive threshold based on document count
         # For generic/analysis queries, we need to be more permissive
         # If we have many documents, we can afford to be more selective
         # If we have few documents or query is generic, we need lower threshold
-        document_count = len(candidates)
+        document_count = index.document_count
         
         # Adaptive threshold: lower for generic queries or when we have fewer documents
         if document_count < 50:
@@ -144,191 +116,25 @@ class RetrieverService:
         effective_threshold = max(min_score, MIN_SIMILARITY_THRESHOLD)
         logger.info(f"🔍 Effective similarity threshold: {effective_threshold} (min_score={min_score}, adaptive={MIN_SIMILARITY_THRESHOLD})")
         
-        for doc in candidates:
-            # Check if document has chunks with embeddings (preferred) or document-level embedding
-            chunks = doc.get("content", {}).get("chunks", [])
-            doc_embedding = doc.get("embedding")
-            
-            if chunks and len(chunks) > 0:
-                # Process chunks (each chunk has its own embedding)
-                for chunk in chunks:
-                    chunk_embedding = chunk.get("embedding")
-                    if not chunk_embedding:
-                        continue
-                    
-                    chunk_vector = np.array(chunk_embedding)
-                    similarity = float(np.dot(query_vector, chunk_vector) / (np.linalg.norm(query_vector) * np.linalg.norm(chunk_vector)))
-                    
-                    if similarity < effective_threshold:
-                        logger.debug(f"⚠️ Chunk similarity {similarity:.3f} below threshold {effective_threshold} for doc {doc.get('document_id', 'N/A')[:30]}")
-                        continue
-                    
-                    # Chunk passed threshold
-                    if similarity >= effective_threshold:
-                        # Log successful retrieval
-                        logger.debug(f"✅ Chunk retrieved: similarity {similarity:.3f} >= {effective_threshold} for doc {doc.get('document_id', 'N/A')[:30]}")
-                        
-                        # CRITICAL: Get chunk_text and ensure it's not empty
-                        chunk_text = chunk.get("chunk_text", "")
-                        if not chunk_text:
-                            # Try alternative field names
-                            chunk_text = chunk.get("text", "") or chunk.get("content", "") or ""
-                        
-                        # Log first chunk details for debugging
-                        if len(results) == 0:
-                            logger.info(f"🔍 Retriever: First chunk being added:")
-                            logger.info(f"   Chunk keys: {list(chunk.keys())}")
-                            logger.info(f"   chunk_text type: {type(chunk_text)}, length: {len(str(chunk_text))}")
-                            logger.info(f"   chunk_text preview: {str(chunk_text)[:200] if chunk_text else 'EMPTY'}")
-                        
-                        results.append({
-                            "document_id": doc.get("document_id"),
-                            "chunk_index": chunk.get("chunk_index"),
-                            "chunk_text": chunk_text,  # Use validated chunk_text
-                            "similarity": similarity,
-                            "source_ref": {
-                                "document_id": doc.get("document_id"),
-                                "title": doc.get("title", doc.get("filename", "Documento")),
-                                "filename": doc.get("filename"),
-                                "relative_path": doc.get("relative_path"),
-                                "url": f"#doc-{doc.get('document_id')}",  # Internal document reference
-                                "chunk_index": chunk.get("chunk_index"),
-                                "page_number": chunk.get("page_number"),  # If available
-                            },
-                            "metadata": {
-                                "document_type": doc.get("document_type"),
-                                "file_type": doc.get("file_type"),
-                                **chunk.get("metadata", {})
-                            }
-                        })
-            elif doc_embedding:
-                # Fallback to document-level embedding (when no chunks available)
-                doc_vector = np.array(doc_embedding)
-                
-                # Cosine similarity
-                similarity = self._cosine_similarity(query_vector, doc_vector)
-                
-                if similarity < effective_threshold:
-                    logger.debug(f"⚠️ Doc similarity {similarity:.3f} below threshold {effective_threshold} for doc {doc.get('document_id', 'N/A')[:30]}")
-                    continue
-                
-                # Document passed threshold
-                if similarity >= effective_threshold:
-                    # Get source reference
-                    source_ref = self._build_source_ref(doc)
-                    
-                    # Try to get full_text from content dict, fallback to raw_text
-                    content = doc.get("content", {})
-                    chunk_text = ""
-                    if isinstance(content, dict):
-                        chunk_text = content.get("full_text", content.get("raw_text", ""))
-                    elif isinstance(content, str):
-                        chunk_text = content
-                    
-                    # Limit chunk_text to first 2000 chars for display
-                    if len(chunk_text) > 2000:
-                        chunk_text = chunk_text[:2000] + "..."
-                    
-                    results.append({
-                        "chunk_id": str(doc.get("_id", "")),
-                        "chunk_index": 0,  # Document-level, no chunk index
-                        "chunk_text": chunk_text,
-                        "document_id": doc.get("document_id"),
-                        "similarity": float(similarity),
-                        "source_ref": source_ref,
-                        "metadata": {
-                            "document_type": doc.get("document_type"),
-                            "file_type": doc.get("file_type"),
-                            **doc.get("metadata", {})
-                        }
-                    })
-        
-        # Sort by similarity (descending)
-        results.sort(key=lambda x: x.get("similarity", x.get("similarity_score", 0)), reverse=True)
+        # Top-k ANN search: only the nearest vectors are scored against the threshold
+        hits = index.search(query_embedding, k=limit, min_score=effective_threshold, filters=filters)
+        results = self._hydrate_results(hits)
         
         # Log final results for debugging
         if results:
             top_similarity = results[0].get('similarity', 0) if results else 0.0
-            logger.info(f"✅ Retriever: Returning {len(results[:limit])} chunks (top similarity: {top_similarity:.3f}, threshold: {effective_threshold:.3f})")
+            logger.info(f"✅ Retriever: Returning {len(results)} chunks (top similarity: {top_similarity:.3f}, threshold: {effective_threshold:.3f})")
         else:
             logger.warning(f"⚠️ Retriever: No chunks found above threshold {effective_threshold:.3f} for tenant {tenant_id}")
             logger.warning(f"⚠️ Retriever: Found {document_count} candidate documents, but none passed similarity threshold")
             
             # FALLBACK: For generic/analysis queries, if no results found with vector search,
-            # return recent documents even with lower similarity (but only if we have documents)
+            # return nearest documents even with lower similarity (but only if we have documents)
             if document_count > 0:
-                logger.info(f"🔄 Retriever: Attempting fallback - returning recent documents with lower threshold")
+                logger.info(f"🔄 Retriever: Attempting fallback - returning nearest documents with lower threshold")
                 fallback_threshold = 0.1  # Very permissive for fallback
-                fallback_results = []
-                
-                for doc in candidates[:limit * 2]:  # Check more documents for fallback
-                    chunks = doc.get("content", {}).get("chunks", [])
-                    doc_embedding = doc.get("embedding")
-                    
-                    if chunks and len(chunks) > 0:
-                        for chunk in chunks[:3]:  # Max 3 chunks per doc for fallback
-                            chunk_embedding = chunk.get("embedding")
-                            if not chunk_embedding:
-                                continue
-                            
-                            chunk_vector = np.array(chunk_embedding)
-                            similarity = float(np.dot(query_vector, chunk_vector) / (np.linalg.norm(query_vector) * np.linalg.norm(chunk_vector)))
-                            
-                            if similarity >= fallback_threshold:
-                                fallback_results.append({
-                                    "document_id": doc.get("document_id"),
-                                    "chunk_index": chunk.get("chunk_index"),
-                                    "chunk_text": chunk.get("chunk_text", ""),
-                                    "similarity": similarity,
-                                    "source_ref": {
-                                        "document_id": doc.get("document_id"),
-                                        "title": doc.get("title", doc.get("filename", "Documento")),
-                                        "filename": doc.get("filename"),
-                                        "relative_path": doc.get("relative_path"),
-                                        "url": f"#doc-{doc.get('document_id')}",
-                                        "chunk_index": chunk.get("chunk_index"),
-                                        "page_number": chunk.get("page_number"),
-                                    },
-                                    "metadata": {
-                                        "document_type": doc.get("document_type"),
-                                        "file_type": doc.get("file_type"),
-                                        **chunk.get("metadata", {}),
-                                        "_fallback": True  # Mark as fallback result
-                                    }
-                                })
-                    elif doc_embedding:
-                        doc_vector = np.array(doc_embedding)
-                        similarity = self._cosine_similarity(query_vector, doc_vector)
-                        
-                        if similarity >= fallback_threshold:
-                            content = doc.get("content", {})
-                            chunk_text = ""
-                            if isinstance(content, dict):
-                                chunk_text = content.get("full_text", content.get("raw_text", ""))
-                            elif isinstance(content, str):
-                                chunk_text = content
-                            
-                            if len(chunk_text) > 2000:
-                                chunk_text = chunk_text[:2000] + "..."
-                            
-                            fallback_results.append({
-                                "chunk_id": str(doc.get("_id", "")),
-                                "chunk_index": 0,
-                                "chunk_text": chunk_text,
-                                "document_id": doc.get("document_id"),
-                                "similarity": float(similarity),
-                                "source_ref": self._build_source_ref(doc),
-                                "metadata": {
-                                    "document_type": doc.get("document_type"),
-                                    "file_type": doc.get("file_type"),
-                                    **doc.get("metadata", {}),
-                                    "_fallback": True  # Mark as fallback result
-                                }
-                            })
-                
-                # Sort fallback results by similarity
-                fallback_results.sort(key=lambda x: x.get("similarity", 0), reverse=True)
-                fallback_results = fallback_results[:limit]
+                fallback_hits = index.search(query_embedding, k=limit, min_score=fallback_threshold, filters=filters)
+                fallback_results = self._hydrate_results(fallback_hits, fallback=True)
                 
                 if fallback_results:
                     logger.info(f"✅ Retriever: Fallback successful - returning {len(fallback_results)} chunks (top similarity: {fallback_results[0].get('similarity', 0):.3f})")
@@ -339,8 +145,107 @@ class RetrieverService:
         # NOTE: User memories are now handled in RAG-Fortress HybridRetriever, not here
         # This retriever_service is for legacy USE pipeline only
         
-        # Limit results
-        return results[:limit]
+        return results
+    
+    def _hydrate_results(self, hits: List[Tuple[Dict[str, Any], float]], fallback: bool = False) -> List[Dict[str, Any]]:
+        """
+        Fetch text only for the surviving hits (bulk $in by _id, no embeddings)
+        
+        Args:
+            hits: (index entry, similarity) from the ANN search
+            fallback: Mark results as low-threshold fallback
+        
+        Returns:
+            Result dicts in hit order (hits whose document was deleted are dropped)
+        """
+        if not hits:
+            return []
+        
+        documents = MongoDBService.hydrate_documents("documents", (entry["_id"] for entry, _ in hits))
+        results = []
+        for entry, similarity in hits:
+            doc = documents.get(str(entry["_id"]))
+            if doc is None:
+                continue
+            results.append(self._build_result(entry, doc, similarity, fallback=fallback))
+        return results
+    
+    def _build_result(self, entry: Dict[str, Any], doc: Dict[str, Any], similarity: float, fallback: bool = False) -> Dict[str, Any]:
+        """
+        Build the retrieval result dict consumed by the USE pipeline
+        
+        Args:
+            entry: Index entry ({"kind", "_id", "chunk_position", "doc"})
+            doc: Hydrated document (text projection)
+            similarity: Cosine similarity with the query
+            fallback: Mark result as low-threshold fallback
+        
+        Returns:
+            Chunk dict with source_ref, metadata, similarity score
+        """
+        extra_metadata = {"_fallback": True} if fallback else {}
+        
+        if entry["kind"] == "chunk":
+            content = doc.get("content", {})
+            chunks = content.get("chunks", []) if isinstance(content, dict) else []
+            position = entry["chunk_position"]
+            chunk = chunks[position] if position < len(chunks) else {}
+            
+            # CRITICAL: Get chunk_text and ensure it's not empty
+            chunk_text = chunk.get("chunk_text", "")
+            if not chunk_text:
+                # Try alternative field names
+                chunk_text = chunk.get("text", "") or chunk.get("content", "") or ""
+            
+            return {
+                "document_id": doc.get("document_id"),
+                "chunk_index": chunk.get("chunk_index"),
+                "chunk_text": chunk_text,
+                "similarity": similarity,
+                "source_ref": {
+                    "document_id": doc.get("document_id"),
+                    "title": doc.get("title", doc.get("filename", "Documento")),
+                    "filename": doc.get("filename"),
+                    "relative_path": doc.get("relative_path"),
+                    "url": f"#doc-{doc.get('document_id')}",  # Internal document reference
+                    "chunk_index": chunk.get("chunk_index"),
+                    "page_number": chunk.get("page_number"),  # If available
+                },
+                "metadata": {
+                    "document_type": doc.get("document_type"),
+                    "file_type": doc.get("file_type"),
+                    **chunk.get("metadata", {}),
+                    **extra_metadata
+                }
+            }
+        
+        # Document-level embedding (when no chunks available)
+        # Try to get full_text from content dict, fallback to raw_text
+        content = doc.get("content", {})
+        chunk_text = ""
+        if isinstance(content, dict):
+            chunk_text = content.get("full_text", content.get("raw_text", ""))
+        elif isinstance(content, str):
+            chunk_text = content
+        
+        # Limit chunk_text to first 2000 chars for display
+        if len(chunk_text) > 2000:
+            chunk_text = chunk_text[:2000] + "..."
+        
+        return {
+            "chunk_id": str(doc.get("_id", "")),
+            "chunk_index": 0,  # Document-level, no chunk index
+            "chunk_text": chunk_text,
+            "document_id": doc.get("document_id"),
+            "similarity": float(similarity),
+            "source_ref": self._build_source_ref(doc),
+            "metadata": {
+                "document_type": doc.get("document_type"),
+                "file_type": doc.get("file_type"),
+                **doc.get("metadata", {}),
+                **extra_metadata
+            }
+        }
     
     @staticmethod
     def _cosine_similarity(vec1: np.ndarray, vec2: np.ndarray) -> float:
@@ -354,14 +259,7 @@ class RetrieverService:
         Returns:
             Cosine similarity (0.0 - 1.0)
         """
-        dot_product = np.dot(vec1, vec2)
-        norm1 = np.linalg.norm(vec1)
-        norm2 = np.linalg.norm(vec2)
-        
-        if norm1 == 0 or norm2 == 0:
-            return 0.0
-        
-        return dot_product / (norm1 * norm2)
+        return cosine_similarity(vec1, vec2)
     
     def _build_source_ref(self, doc: Dict[str, Any]) -> Dict[str, Any]:
         """
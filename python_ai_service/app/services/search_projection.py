@@ -0,0 +1,276 @@
+"""
+Search Projection - Campi di ricerca normalizzati sui documenti, scritti all'import
+
+I filtri di /commands/atti, /atto e /natural-query cercavano con $regex non ancorate
+su title/description/metadata.title e con $or su 3-4 campi alternativi per
+dipartimento e responsabile: nessun indice utilizzabile, scansione del tenant
+a ogni chiamata. La proiezione aggiunge a ogni documento:
+- search_terms: termini canonici (stessa tokenizzazione dell'indice lessicale)
+- search_department / search_responsible: valore canonico del primo campo presente
+- search_protocols / search_types: numeri di protocollo e tipi atto canonici
+
+I filtri compilati usano questi campi (indici composti con tenant_id) e ricadono
+sulle condizioni originali solo per i documenti storici senza proiezione
+(search_terms assente: ramo anch'esso risolto sull'indice). La migrazione
+app/scripts/build_search_projection.py completa i documenti esistenti.
+"""
+
+import re
+import logging
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional
+
+from pymongo import UpdateOne
+
+from app.services.lexical_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+SEARCH_TERMS_FIELD = "search_terms"
+
+# Campi sorgente (ordine di priorità) per i valori canonici
+TEXT_SOURCE_FIELDS = ("title", "description", "metadata.title")
+DEPARTMENT_SOURCE_FIELDS = ("department", "metadata.dipartimento", "metadata.department", "metadata.direzione")
+RESPONSIBLE_SOURCE_FIELDS = ("responsible", "metadata.responsabile")
+PROTOCOL_SOURCE_FIELDS = ("protocol_number", "metadata.numero_atto", "metadata.protocollo")
+TYPE_SOURCE_FIELDS = ("document_type", "metadata.tipo_atto")
+
+# Indici composti sulla collection documents
+SEARCH_INDEXES = [
+    {"name": "tenant_id_search_terms", "keys": [("tenant_id", 1), ("search_terms", 1)]},
+    {"name": "tenant_id_search_department", "keys": [("tenant_id", 1), ("search_department", 1), ("protocol_date", -1)]},
+    {"name": "tenant_id_search_responsible", "keys": [("tenant_id", 1), ("search_responsible", 1), ("protocol_date", -1)]},
+    {"name": "tenant_id_search_protocols", "keys": [("tenant_id", 1), ("search_protocols", 1)]},
+    {"name": "tenant_id_search_types", "keys": [("tenant_id", 1), ("search_types", 1), ("protocol_date", -1)]},
+    {"name": "tenant_id_protocol_date", "keys": [("tenant_id", 1), ("protocol_date", -1), ("created_at", -1)]},
+    {"name": "tenant_id_data_atto", "keys": [("tenant_id", 1), ("metadata.data_atto", -1)]},
+]
+
+_WHITESPACE = re.compile(r"\s+")
+# Pattern $regex senza metacaratteri (eventualmente con .* iniziale/finale): testo semplice
+_PLAIN_PATTERN = re.compile(r"^(?:\.\*)?([^.^$*+?()\[\]{}|\\]+)(?:\.\*)?$")
+
+
+def canonical_value(value: Any) -> Optional[str]:
+    """Forma canonica di un valore testuale: minuscolo, senza accenti, spazi compattati"""
+    if value is None:
+        return None
+    text = unicodedata.normalize("NFKD", str(value))
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    text = _WHITESPACE.sub(" ", text).strip().lower()
+    return text or None
+
+
+def _get_path(document: Dict[str, Any], path: str) -> Any:
+    value: Any = document
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def _first_value(document: Dict[str, Any], fields: Iterable[str]) -> Optional[str]:
+    for field in fields:
+        value = canonical_value(_get_path(document, field))
+        if value:
+            return value
+    return None
+
+
+def _all_values(document: Dict[str, Any], fields: Iterable[str]) -> List[str]:
+    values: List[str] = []
+    for field in fields:
+        value = canonical_value(_get_path(document, field))
+        if value and value not in values:
+            values.append(value)
+    return values
+
+
+def search_terms(text: Any) -> List[str]:
+    """Termini canonici di un testo, senza duplicati"""
+    return list(dict.fromkeys(tokenize(text)))
+
+
+def build_search_projection(document: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Campi di ricerca di un documento (da unire al documento prima della scrittura)
+    """
+    terms: List[str] = []
+    for field in TEXT_SOURCE_FIELDS:
+        terms.extend(search_terms(_get_path(document, field)))
+    return {
+        SEARCH_TERMS_FIELD: list(dict.fromkeys(terms)),
+        "search_department": _first_value(document, DEPARTMENT_SOURCE_FIELDS),
+        "search_responsible": _first_value(document, RESPONSIBLE_SOURCE_FIELDS),
+        "search_protocols": _all_values(document, PROTOCOL_SOURCE_FIELDS),
+        "search_types": _all_values(document, TYPE_SOURCE_FIELDS),
+    }
+
+
+# === Compilazione dei filtri ===
+
+def _with_legacy(indexed: Dict[str, Any], legacy: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Condizione indicizzata, più le condizioni originali per i documenti senza proiezione"""
+    return {
+        "$or": [
+            indexed,
+            {"$and": [{SEARCH_TERMS_FIELD: {"$exists": False}}, {"$or": legacy}]},
+        ]
+    }
+
+
+def _canonical_list(values: Iterable[Any]) -> List[str]:
+    return [value for value in (canonical_value(v) for v in values) if value]
+
+
+def text_condition(text: str, fields: Iterable[str] = TEXT_SOURCE_FIELDS) -> Dict[str, Any]:
+    """Tutti i termini del testo in search_terms (prima: $regex non ancorata su ogni campo)"""
+    legacy = [{field: {"$regex": re.escape(text), "$options": "i"}} for field in fields]
+    terms = search_terms(text)
+    if not terms:
+        return {"$or": legacy}
+    return _with_legacy({SEARCH_TERMS_FIELD: {"$all": terms}}, legacy)
+
+
+def department_condition(departments: Iterable[Any]) -> Dict[str, Any]:
+    departments = list(departments)
+    legacy = [{field: {"$in": departments}} for field in DEPARTMENT_SOURCE_FIELDS]
+    return _with_legacy({"search_department": {"$in": _canonical_list(departments)}}, legacy)
+
+
+def responsible_condition(responsibles: Iterable[Any]) -> Dict[str, Any]:
+    responsibles = list(responsibles)
+    legacy = [{field: {"$in": responsibles}} for field in RESPONSIBLE_SOURCE_FIELDS]
+    return _with_legacy({"search_responsible": {"$in": _canonical_list(responsibles)}}, legacy)
+
+
+def protocol_condition(protocol_numbers: Iterable[Any]) -> Dict[str, Any]:
+    protocol_numbers = [numero for numero in protocol_numbers if numero]
+    legacy = [{field: {"$in": protocol_numbers}} for field in PROTOCOL_SOURCE_FIELDS[:2]]
+    return _with_legacy({"search_protocols": {"$in": _canonical_list(protocol_numbers)}}, legacy)
+
+
+def type_condition(types: Iterable[Any]) -> Dict[str, Any]:
+    types = list(types)
+    legacy = [{field: {"$in": types}} for field in TYPE_SOURCE_FIELDS]
+    return _with_legacy({"search_types": {"$in": _canonical_list(types)}}, legacy)
+
+
+def _plain_regex_text(condition: Any) -> Optional[str]:
+    """Testo di una condizione {"$regex": ...} senza metacaratteri, altrimenti None"""
+    if not isinstance(condition, dict) or "$regex" not in condition:
+        return None
+    if set(condition) - {"$regex", "$options"}:
+        return None
+    match = _PLAIN_PATTERN.match(str(condition["$regex"]).strip())
+    return match.group(1) if match else None
+
+
+def _compile_field(field: str, condition: Any) -> Optional[Dict[str, Any]]:
+    """Traduce una singola condizione field -> campo indicizzato (None se non traducibile)"""
+    if field in TEXT_SOURCE_FIELDS:
+        text = _plain_regex_text(condition)
+        if text is None or not search_terms(text):
+            return None
+        return _with_legacy({SEARCH_TERMS_FIELD: {"$all": search_terms(text)}}, [{field: condition}])
+
+    for target, sources in (
+        ("search_department", DEPARTMENT_SOURCE_FIELDS),
+        ("search_responsible", RESPONSIBLE_SOURCE_FIELDS),
+        ("search_protocols", PROTOCOL_SOURCE_FIELDS),
+    ):
+        if field not in sources:
+            continue
+        if isinstance(condition, str):
+            indexed: Any = canonical_value(condition)
+        elif isinstance(condition, dict) and set(condition) == {"$in"} and isinstance(condition["$in"], list):
+            indexed = {"$in": _canonical_list(condition["$in"])}
+        elif _plain_regex_text(condition) is not None:
+            # Regex sulle sole chiavi dell'indice (nessun fetch dei documenti)
+            indexed = {"$regex": re.escape(canonical_value(_plain_regex_text(condition)) or "")}
+        else:
+            return None
+        return _with_legacy({target: indexed}, [{field: condition}])
+    return None
+
+
+def compile_filter(value: Any) -> Any:
+    """
+    Riscrive un filtro MongoDB (es. generato da /natural-query) sui campi indicizzati
+
+    Solo le condizioni riconosciute (regex semplici su titolo/descrizione, uguaglianze
+    e $in su dipartimento, responsabile, protocollo) vengono tradotte; il resto resta invariato.
+    """
+    if isinstance(value, list):
+        return [compile_filter(item) for item in value]
+    if not isinstance(value, dict):
+        return value
+
+    result: Dict[str, Any] = {}
+    compiled: List[Dict[str, Any]] = []
+    for key, nested in value.items():
+        if key.startswith("$"):
+            result[key] = compile_filter(nested)
+            continue
+        condition = _compile_field(key, nested)
+        if condition is None:
+            result[key] = nested
+        else:
+            compiled.append(condition)
+
+    if compiled:
+        result.setdefault("$and", [])
+        if not isinstance(result["$and"], list):
+            result["$and"] = [result["$and"]]
+        result["$and"].extend(compiled)
+    return result
+
+
+# === Indici e migrazione ===
+
+def ensure_search_indexes(collection) -> List[str]:
+    """Crea (idempotente) gli indici composti dei campi di ricerca"""
+    names = []
+    for index in SEARCH_INDEXES:
+        names.append(collection.create_index(index["keys"], name=index["name"]))
+    return names
+
+
+def backfill_collection(collection, tenant_id: Any = None, dry_run: bool = False, batch_size: int = 500) -> int:
+    """
+    Scrive la proiezione sui documenti che non la hanno
+
+    Args:
+        collection: pymongo Collection (documents)
+        tenant_id: Limita a un tenant (None = tutti)
+        dry_run: Conta soltanto, senza modificare
+        batch_size: Update per bulk_write
+
+    Returns:
+        Numero di documenti (da) aggiornare
+    """
+    filter_query: Dict[str, Any] = {SEARCH_TERMS_FIELD: {"$exists": False}}
+    if tenant_id is not None:
+        filter_query["tenant_id"] = tenant_id
+    if dry_run:
+        return collection.count_documents(filter_query)
+
+    source_fields = (
+        TEXT_SOURCE_FIELDS + DEPARTMENT_SOURCE_FIELDS + RESPONSIBLE_SOURCE_FIELDS
+        + PROTOCOL_SOURCE_FIELDS + TYPE_SOURCE_FIELDS
+    )
+    projection = {"_id": 1, **{field: 1 for field in source_fields}}
+
+    updated = 0
+    operations: List[UpdateOne] = []
+    for document in collection.find(filter_query, projection).batch_size(batch_size):
+        operations.append(UpdateOne({"_id": document["_id"]}, {"$set": build_search_projection(document)}))
+        if len(operations) >= batch_size:
+            updated += collection.bulk_write(operations, ordered=False).modified_count
+            operations = []
+    if operations:
+        updated += collection.bulk_write(operations, ordered=False).modified_count
+
+    logger.info(f"🔎 {collection.name}: proiezione di ricerca scritta su {updated} documenti")
+    return updated
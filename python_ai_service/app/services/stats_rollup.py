@@ -0,0 +1,458 @@
+"""
+Stats Rollup - Contatori materializzati per tenant sulla collection documents
+
+/commands/stats eseguiva a ogni chiamata un $group per document_type più un
+count_documents sullo stesso $match, e /chat/estimate un count_documents degli
+atti con embedding prima di ogni chat. Il rollup tiene un documento per tenant
+nella collection stats_rollups con:
+- total, embedded, not_embedded
+- by_type / by_month / by_scraper: conteggi per document_type, mese (YYYY-MM di
+  protocol_date o metadata.data_atto) e scraper_type
+- cells: conteggi per mese|scraper|tipo, per /stats filtrato per periodo o scraper
+
+Le scritture di MongoDBService sulla collection documents applicano i delta con
+$inc (solo i campi statistici dei documenti toccati vengono letti). Il rollup è
+ricostruito (rebuild) alla prima lettura del tenant, quando è marcato stale
+(scrittura troppo ampia per calcolarne il delta, errori), quando l'ultimo rebuild
+è più vecchio di STATS_ROLLUP_MAX_AGE_HOURS (recupera la deriva dei delta calcolati
+da letture precedenti a scritture concorrenti) o su richiesta
+(POST /commands/stats/rebuild).
+"""
+
+import os
+import re
+import logging
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import unquote
+
+from app.services.tenant_ids import normalize_tenant_id
+
+logger = logging.getLogger(__name__)
+
+# Configurazione (override da environment)
+STATS_ROLLUP_ENABLED = os.getenv("STATS_ROLLUP_ENABLED", "true").lower() == "true"
+STATS_ROLLUP_DELTA_MAX_DOCS = int(os.getenv("STATS_ROLLUP_DELTA_MAX_DOCS", "1000"))
+STATS_ROLLUP_MAX_AGE_HOURS = float(os.getenv("STATS_ROLLUP_MAX_AGE_HOURS", "24"))
+STATS_ROLLUP_COLLECTION = "stats_rollups"
+
+UNKNOWN_MONTH = "unknown"
+
+# Campi dei documenti da cui dipendono i contatori (più l'esistenza di "embedding")
+STATS_FIELDS = ("tenant_id", "document_type", "protocol_date", "metadata.data_atto", "metadata.scraper_type", "scraper_type")
+STATS_PROJECTION = {field: 1 for field in STATS_FIELDS}
+
+# Chiavi dei contatori: "." "$" "|" non ammessi nei nomi di campo / separatore delle celle
+_KEY_ESCAPES = {"%": "%25", ".": "%2E", "$": "%24", "|": "%7C"}
+_EMPTY_KEY = "%"
+_ISO_MONTH = re.compile(r"^(\d{4})-(\d{2})")
+_ITALIAN_DATE = re.compile(r"^\d{1,2}/(\d{1,2})/(\d{4})")
+
+# (tenant_id, document_type, mese, scraper_type, embedded)
+Cell = Tuple[Any, str, str, str, bool]
+
+
+def _encode_key(value: Any) -> str:
+    text = "" if value is None else str(value)
+    return "".join(_KEY_ESCAPES.get(char, char) for char in text) or _EMPTY_KEY
+
+
+def _decode_key(key: str) -> str:
+    return "" if key == _EMPTY_KEY else unquote(key)
+
+
+def _get_path(document: Dict[str, Any], path: str) -> Any:
+    value: Any = document
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def _set_path(document: Dict[str, Any], path: str, value: Any):
+    *parents, leaf = path.split(".")
+    node = document
+    for part in parents:
+        if not isinstance(node.get(part), dict):
+            node[part] = {}
+        node = node[part]
+    node[leaf] = value
+
+
+def month_of(value: Any) -> Optional[str]:
+    """
+    Mese (YYYY-MM) di una data atto: epoch ms (ora locale, come _build_date_condition
+    di /commands), datetime, stringa ISO o gg/mm/aaaa
+    """
+    if isinstance(value, datetime):
+        return f"{value.year:04d}-{value.month:02d}"
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        try:
+            moment = datetime.fromtimestamp(value / 1000)
+        except (OverflowError, OSError, ValueError):
+            return None
+        return f"{moment.year:04d}-{moment.month:02d}"
+    if isinstance(value, str):
+        text = value.strip()
+        if match := _ISO_MONTH.match(text):
+            return f"{match.group(1)}-{match.group(2)}"
+        if match := _ITALIAN_DATE.match(text):
+            return f"{match.group(2)}-{int(match.group(1)):02d}"
+    return None
+
+
+def _cell(document: Dict[str, Any], embedded: bool) -> Cell:
+    month = month_of(document.get("protocol_date")) or month_of(_get_path(document, "metadata.data_atto"))
+    scraper = _get_path(document, "metadata.scraper_type") or document.get("scraper_type")
+    return (
+        document.get("tenant_id"),
+        str(document.get("document_type") or ""),
+        month or UNKNOWN_MONTH,
+        str(scraper or ""),
+        bool(embedded),
+    )
+
+
+def _increments(cells: Counter) -> Dict[Any, Counter]:
+    """Delta per cella -> campi $inc per tenant ("by_type.<tipo>", "cells.<mese>|<scraper>|<tipo>", ...)"""
+    per_tenant: Dict[Any, Counter] = {}
+    for (tenant_id, document_type, month, scraper, embedded), delta in cells.items():
+        if not delta or tenant_id is None:
+            continue
+        fields = per_tenant.setdefault(tenant_id, Counter())
+        type_key, month_key, scraper_key = _encode_key(document_type), _encode_key(month), _encode_key(scraper)
+        fields["total"] += delta
+        fields["embedded" if embedded else "not_embedded"] += delta
+        fields[f"by_type.{type_key}"] += delta
+        fields[f"by_month.{month_key}"] += delta
+        fields[f"by_scraper.{scraper_key}"] += delta
+        fields[f"cells.{month_key}|{scraper_key}|{type_key}"] += delta
+    return per_tenant
+
+
+def _affects_stats(path: str) -> bool:
+    for field in STATS_FIELDS + ("embedding",):
+        if path == field or field.startswith(path + ".") or path.startswith(field + "."):
+            return True
+    return False
+
+
+def month_range(date_from: Optional[str], date_to: Optional[str]) -> Optional[Tuple[Optional[str], Optional[str]]]:
+    """
+    Intervallo di mesi equivalente al filtro per date di /commands/stats
+
+    Returns:
+        (primo mese, ultimo mese) inclusi (None = aperto); None se una data non è
+        allineata al mese (primo giorno per date_from, ultimo giorno per date_to)
+    """
+    def parse(value: Optional[str]) -> Optional[datetime]:
+        try:
+            return datetime.fromisoformat(value) if value else None
+        except ValueError:
+            return None
+
+    start, end = parse(date_from), parse(date_to)
+    midnight = lambda moment: (moment.hour, moment.minute, moment.second, moment.microsecond) == (0, 0, 0, 0)
+    if start and not (start.day == 1 and midnight(start)):
+        return None
+    if end and not ((end + timedelta(days=1)).day == 1 and midnight(end)):
+        return None
+    return (month_of(start) if start else None, month_of(end) if end else None)
+
+
+class StatsRollup:
+    """Rollup statistico per tenant (classmethod singleton, un documento per tenant in stats_rollups)"""
+
+    @classmethod
+    def _collection(cls, name: str = STATS_ROLLUP_COLLECTION):
+        from app.services.mongodb_service import MongoDBService
+
+        if not STATS_ROLLUP_ENABLED or not MongoDBService.is_connected():
+            return None
+        return MongoDBService.get_collection(name)
+
+    # === Letture ===
+
+    @classmethod
+    def get(cls, tenant_id: Any) -> Optional[Dict[str, Any]]:
+        """
+        Rollup del tenant (una find_one per _id), ricostruito se assente, stale o
+        più vecchio di STATS_ROLLUP_MAX_AGE_HOURS
+
+        Returns:
+            Documento rollup, None se disabilitato o MongoDB non disponibile
+        """
+        tenant_id = normalize_tenant_id(tenant_id)
+        collection = cls._collection()
+        if collection is None:
+            return None
+        try:
+            rollup = collection.find_one({"_id": tenant_id})
+            if rollup is None or rollup.get("stale") or cls._expired(rollup):
+                rollup = cls.rebuild(tenant_id)
+            return rollup
+        except Exception as e:
+            logger.warning(f"⚠️ Stats rollup read failed for tenant {tenant_id}: {e}")
+            return None
+
+    @staticmethod
+    def _expired(rollup: Dict[str, Any]) -> bool:
+        rebuilt_at = rollup.get("rebuilt_at")
+        if STATS_ROLLUP_MAX_AGE_HOURS <= 0 or not isinstance(rebuilt_at, datetime):
+            return False
+        return datetime.utcnow() - rebuilt_at > timedelta(hours=STATS_ROLLUP_MAX_AGE_HOURS)
+
+    @classmethod
+    def embedded_count(cls, tenant_id: Any) -> Optional[int]:
+        """Documenti con embedding del tenant (None se il rollup non è disponibile)"""
+        rollup = cls.get(tenant_id)
+        return int(rollup.get("embedded", 0)) if rollup is not None else None
+
+    @staticmethod
+    def summary(rollup: Dict[str, Any]) -> Dict[str, Any]:
+        """Contatori del rollup con chiavi decodificate (conteggi a zero esclusi)"""
+        def decoded(counters: Dict[str, int]) -> Dict[str, int]:
+            return {_decode_key(key): int(count) for key, count in (counters or {}).items() if count}
+
+        return {
+            "tenant_id": rollup.get("_id"),
+            "total": int(rollup.get("total", 0)),
+            "embedded": int(rollup.get("embedded", 0)),
+            "not_embedded": int(rollup.get("not_embedded", 0)),
+            "by_type": decoded(rollup.get("by_type")),
+            "by_month": dict(sorted(decoded(rollup.get("by_month")).items())),
+            "by_scraper": decoded(rollup.get("by_scraper")),
+            "rebuilt_at": rollup.get("rebuilt_at"),
+            "updated_at": rollup.get("updated_at"),
+        }
+
+    @staticmethod
+    def type_counts(
+        rollup: Dict[str, Any],
+        months: Tuple[Optional[str], Optional[str]] = (None, None),
+        scraper_type: Optional[str] = None,
+        limit: int = 10
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Conteggi per document_type (come il $group di /commands/stats) dalle celle del rollup
+
+        Args:
+            rollup: Documento rollup
+            months: Intervallo di mesi inclusi (da month_range)
+            scraper_type: Filtra per scraper
+            limit: Righe restituite (ordinate per conteggio)
+
+        Returns:
+            (righe {"document_type", "count"}, totale atti nel filtro)
+        """
+        first, last = months
+        by_type: Counter = Counter()
+        for key, count in (rollup.get("cells") or {}).items():
+            if not count:
+                continue
+            month, scraper, document_type = (_decode_key(part) for part in key.split("|"))
+            if first or last:
+                if month == UNKNOWN_MONTH or (first and month < first) or (last and month > last):
+                    continue
+            if scraper_type and scraper != scraper_type:
+                continue
+            by_type[document_type] += int(count)
+
+        rows = [{"document_type": document_type, "count": count} for document_type, count in by_type.most_common(limit)]
+        return rows, sum(by_type.values())
+
+    # === Rebuild e invalidazione ===
+
+    @classmethod
+    def rebuild(cls, tenant_id: Any) -> Optional[Dict[str, Any]]:
+        """Ricalcola il rollup del tenant dai documenti (solo campi statistici e _id degli atti con embedding)"""
+        tenant_id = normalize_tenant_id(tenant_id)
+        collection = cls._collection()
+        documents = cls._collection("documents")
+        if collection is None or documents is None:
+            return None
+
+        embedded_ids = {row["_id"] for row in documents.find({"tenant_id": tenant_id, "embedding": {"$exists": True}}, {"_id": 1})}
+        cells: Counter = Counter()
+        for document in documents.find({"tenant_id": tenant_id}, STATS_PROJECTION):
+            cells[_cell(document, document["_id"] in embedded_ids)] += 1
+
+        now = datetime.utcnow()
+        rollup: Dict[str, Any] = {
+            "tenant_id": tenant_id,
+            "total": 0, "embedded": 0, "not_embedded": 0,
+            "by_type": {}, "by_month": {}, "by_scraper": {}, "cells": {},
+        }
+        for path, count in _increments(cells).get(tenant_id, Counter()).items():
+            _set_path(rollup, path, count)
+        rollup.update({"stale": False, "rebuilt_at": now, "updated_at": now})
+
+        collection.update_one({"_id": tenant_id}, {"$set": rollup}, upsert=True)
+        logger.info(f"📊 Stats rollup ricostruito per tenant {tenant_id}: {rollup['total']} documenti")
+        return {"_id": tenant_id, **rollup}
+
+    @classmethod
+    def invalidate(cls, tenant_id: Optional[Any] = None):
+        """Marca stale il rollup del tenant (tutti se None): la prossima lettura lo ricostruisce"""
+        collection = cls._collection()
+        if collection is None:
+            return
+        try:
+            if tenant_id is None:
+                collection.update_many({}, {"$set": {"stale": True}})
+            else:
+                collection.update_one({"_id": normalize_tenant_id(tenant_id)}, {"$set": {"stale": True}})
+        except Exception as e:
+            logger.warning(f"⚠️ Stats rollup invalidation failed for {tenant_id}: {e}")
+
+    @classmethod
+    def _invalidate_for_filter(cls, filter: Dict[str, Any]):
+        tenant_id = filter.get("tenant_id") if isinstance(filter, dict) else None
+        cls.invalidate(tenant_id if isinstance(tenant_id, (int, str)) else None)
+
+    # === Delta dalle scritture di MongoDBService (mai bloccanti per la scrittura) ===
+
+    @classmethod
+    def _apply(cls, cells: Counter):
+        collection = cls._collection()
+        if collection is None:
+            return
+        now = datetime.utcnow()
+        for tenant_id, fields in _increments(cells).items():
+            increments = {path: delta for path, delta in fields.items() if delta}
+            if not increments:
+                continue
+            try:
+                # Senza upsert: un tenant senza rollup viene calcolato per intero alla prima lettura
+                collection.update_one({"_id": tenant_id}, {"$inc": increments, "$set": {"updated_at": now}})
+            except Exception as e:
+                logger.warning(f"⚠️ Stats rollup update failed for tenant {tenant_id}: {e}")
+                cls.invalidate(tenant_id)
+
+    @classmethod
+    def _snapshot(cls, documents, filter: Dict[str, Any], fields: Iterable[str] = ()) -> Optional[List[Dict[str, Any]]]:
+        """Campi statistici dei documenti del filtro prima della scrittura (None = troppi documenti)"""
+        projection = dict(STATS_PROJECTION, **{field: 1 for field in fields})
+        rows = list(documents.find(filter, projection).limit(STATS_ROLLUP_DELTA_MAX_DOCS + 1))
+        if len(rows) > STATS_ROLLUP_DELTA_MAX_DOCS:
+            return None
+        if rows:
+            embedded_ids = {row["_id"] for row in documents.find(
+                {"_id": {"$in": [row["_id"] for row in rows]}, "embedding": {"$exists": True}}, {"_id": 1}
+            )}
+            for row in rows:
+                row["_embedded"] = row["_id"] in embedded_ids
+        return rows
+
+    @classmethod
+    def record_insert(cls, document: Dict[str, Any]):
+        """Documento inserito (insert_document)"""
+        if cls._collection() is None:
+            return
+        cls._apply(Counter({_cell(document, "embedding" in document): 1}))
+
+    @classmethod
+    def before_update(cls, documents, filter: Dict[str, Any], update: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+        """Stato precedente per update_document ([] se l'update non tocca campi statistici)"""
+        if cls._collection() is None or not any(_affects_stats(path) for path in update):
+            return []
+        try:
+            return cls._snapshot(documents, filter)
+        except Exception as e:
+            logger.warning(f"⚠️ Stats rollup snapshot failed: {e}")
+            return None
+
+    @classmethod
+    def after_update(cls, filter: Dict[str, Any], snapshot: Optional[List[Dict[str, Any]]], update: Dict[str, Any]):
+        """Delta di un update_many con $set (snapshot da before_update)"""
+        if snapshot is None:
+            cls._invalidate_for_filter(filter)
+            return
+        cells: Counter = Counter()
+        for row in snapshot:
+            after = {key: value for key, value in row.items() if key != "_embedded"}
+            embedded = row["_embedded"]
+            for path, value in update.items():
+                if path == "embedding" or path.startswith("embedding."):
+                    embedded = True
+                elif _affects_stats(path):
+                    _set_path(after, path, value)
+            cells[_cell(row, row["_embedded"])] -= 1
+            cells[_cell(after, embedded)] += 1
+        cls._apply(cells)
+
+    @classmethod
+    def before_delete(cls, documents, filter: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+        """Stato precedente per delete_documents"""
+        if cls._collection() is None:
+            return []
+        try:
+            return cls._snapshot(documents, filter)
+        except Exception as e:
+            logger.warning(f"⚠️ Stats rollup snapshot failed: {e}")
+            return None
+
+    @classmethod
+    def after_delete(cls, filter: Dict[str, Any], snapshot: Optional[List[Dict[str, Any]]]):
+        """Delta di un delete_many (snapshot da before_delete)"""
+        if snapshot is None:
+            cls._invalidate_for_filter(filter)
+            return
+        cells: Counter = Counter()
+        for row in snapshot:
+            cells[_cell(row, row["_embedded"])] -= 1
+        cls._apply(cells)
+
+    @classmethod
+    def before_upsert(cls, documents, items: List[Dict[str, Any]], key_fields: Tuple[str, ...]) -> Optional[List[Dict[str, Any]]]:
+        """Stato precedente dei documenti di bulk_upsert (cercati per key_fields)"""
+        if cls._collection() is None or not items:
+            return []
+        try:
+            keys = [{field: item.get(field) for field in key_fields} for item in items]
+            return cls._snapshot(documents, {"$or": keys}, key_fields)
+        except Exception as e:
+            logger.warning(f"⚠️ Stats rollup snapshot failed: {e}")
+            return None
+
+    @classmethod
+    def after_upsert(
+        cls,
+        snapshot: Optional[List[Dict[str, Any]]],
+        items: List[Dict[str, Any]],
+        key_fields: Tuple[str, ...],
+        upserted_ids: Dict[int, Any]
+    ):
+        """
+        Delta di bulk_upsert: documenti nuovi +1, aggiornati spostati di cella se cambiano i campi statistici
+
+        Gli inserimenti vengono da upserted_ids del risultato (indice -> _id), non dallo
+        snapshot: un documento aggiornato ma assente dallo snapshot è stato inserito da
+        una scrittura concorrente, il suo stato precedente non è noto e il tenant viene
+        marcato stale.
+        """
+        if snapshot is None:
+            for tenant_id in {item.get("tenant_id") for item in items}:
+                cls.invalidate(tenant_id)
+            return
+        current = {tuple(_get_path(row, field) for field in key_fields): row for row in snapshot}
+        cells: Counter = Counter()
+        unknown_tenants = set()
+        for index, item in enumerate(items):
+            key = tuple(item.get(field) for field in key_fields)
+            before = None if index in upserted_ids else current.get(key)
+            if before is None and index not in upserted_ids:
+                unknown_tenants.add(item.get("tenant_id"))
+                continue
+            if before is not None:
+                cells[_cell(before, before["_embedded"])] -= 1
+            # $set a livello top: i campi del documento sostituiscono quelli esistenti
+            after = {**(before or {}), **item}
+            after["_embedded"] = "embedding" in item or bool(before and before["_embedded"])
+            cells[_cell(after, after["_embedded"])] += 1
+            current[key] = after
+        cls._apply(cells)
+        for tenant_id in unknown_tenants:
+            cls.invalidate(tenant_id)
@@ -0,0 +1,63 @@
+"""
+Tenant IDs - Forma canonica di tenant_id
+
+I documenti storici hanno tenant_id sia intero che stringa ("1" e 1), il che
+costringeva i retriever a ripetere ogni ricerca per entrambe le forme.
+La forma canonica è l'intero: l'importer e MongoDBService.insert_document
+scrivono sempre quella, e normalize_collection() migra i dati esistenti.
+"""
+
+import logging
+from typing import Any, Dict, Iterable
+
+logger = logging.getLogger(__name__)
+
+# Collection che contengono tenant_id
+TENANT_COLLECTIONS = ("documents", "user_memories", "sources")
+
+# Stringhe numeriche (al più 9 cifre per restare in Int32)
+_NUMERIC_STRING_FILTER = {"tenant_id": {"$type": "string", "$regex": r"^\s*\d{1,9}\s*$"}}
+
+
+def normalize_tenant_id(tenant_id: Any) -> Any:
+    """
+    Forma canonica di un tenant_id
+
+    Returns:
+        int per valori numerici ("1", " 1 ", 1), il valore originale altrimenti
+    """
+    if isinstance(tenant_id, bool):
+        return tenant_id
+    if isinstance(tenant_id, int):
+        return tenant_id
+    if isinstance(tenant_id, str) and tenant_id.strip().isdigit():
+        return int(tenant_id.strip())
+    return tenant_id
+
+
+def normalize_collection(collection, dry_run: bool = False) -> int:
+    """
+    Converte in intero i tenant_id stringa numerici di una collection
+
+    Args:
+        collection: pymongo Collection
+        dry_run: Conta soltanto, senza modificare
+
+    Returns:
+        Numero di documenti (da) convertire
+    """
+    pending = collection.count_documents(_NUMERIC_STRING_FILTER)
+    if dry_run or pending == 0:
+        return pending
+
+    result = collection.update_many(
+        _NUMERIC_STRING_FILTER,
+        [{"$set": {"tenant_id": {"$toInt": {"$trim": {"input": "$tenant_id"}}}}}]
+    )
+    logger.info(f"🔧 {collection.name}: tenant_id normalizzato su {result.modified_count} documenti")
+    return result.modified_count
+
+
+def normalize_collections(database, collections: Iterable[str] = TENANT_COLLECTIONS, dry_run: bool = False) -> Dict[str, int]:
+    """Normalizza tenant_id su tutte le collection indicate"""
+    return {name: normalize_collection(database[name], dry_run=dry_run) for name in collections}
@@ -0,0 +1,432 @@
+"""
+Pipeline Tracing - latenza e token per stage della pipeline RAG-Fortress
+
+Una Trace (ContextVar, ereditata dai task asyncio figli e dai thread di
+AsyncMongoDBService) raccoglie:
+- span per stage (retrieval, embedding, vector_search, fallback_scan,
+  verification, claim_extraction, gap_detection, synthesis, fact_check, ...)
+- chiamate ai provider AI con durata e token (dall'usage degli adapter)
+- comandi MongoDB con durata (CommandListener pymongo)
+
+La trace è restituita nel campo debug della risposta; gli stessi dati sono
+aggregati in PipelineMetrics ed esposti in formato Prometheus (/metrics).
+Se opentelemetry è installato gli span sono anche esportati come span OTel.
+"""
+
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from pymongo import monitoring
+
+try:
+    from opentelemetry import trace as otel_trace
+    OTEL_AVAILABLE = True
+except ImportError:
+    OTEL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Configurazione (override da environment)
+PIPELINE_TRACING_ENABLED = os.getenv("PIPELINE_TRACING_ENABLED", "true").lower() == "true"
+PIPELINE_TRACE_IN_RESPONSE = os.getenv("PIPELINE_TRACE_IN_RESPONSE", "false").lower() == "true"
+
+# Bucket istogrammi di latenza (secondi, convenzione Prometheus)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("pipeline_trace", default=None)
+# Chiamata provider in corso (evita doppio conteggio, es. embed_batch che ricade su embed)
+_in_provider_call: ContextVar[bool] = ContextVar("in_provider_call", default=False)
+
+
+def _otel_tracer():
+    return otel_trace.get_tracer("natan.rag_fortress") if OTEL_AVAILABLE else None
+
+
+def normalize_usage(usage: Optional[Dict[str, Any]]) -> Tuple[int, int]:
+    """(input_tokens, output_tokens) dall'usage di qualsiasi provider"""
+    if not isinstance(usage, dict):
+        return 0, 0
+    input_tokens = usage.get("input_tokens") or usage.get("prompt_tokens") or 0
+    output_tokens = usage.get("output_tokens") or usage.get("completion_tokens") or 0
+    return int(input_tokens), int(output_tokens)
+
+
+class Trace:
+    """Dati di tracing di una richiesta"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started_at = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self.providers: Dict[str, Dict[str, Any]] = {}
+        self.mongo: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        # Stage "a giro" aperto da mark_stage(): (nome, inizio, attributi, span OTel)
+        self._open_stage: Optional[Tuple[str, float, Dict[str, Any], Any]] = None
+
+    def _offset_ms(self, at: float) -> float:
+        return round((at - self.started_at) * 1000, 1)
+
+    def add_span(self, stage: str, started_at: float, duration_s: float, attrs: Optional[Dict[str, Any]] = None):
+        with self._lock:
+            self.spans.append({
+                "stage": stage,
+                "start_ms": self._offset_ms(started_at),
+                "ms": round(duration_s * 1000, 1),
+                **(attrs or {})
+            })
+
+    def add_provider_call(self, provider: str, model: str, operation: str, duration_s: float,
+                          input_tokens: int, output_tokens: int, error: bool):
+        key = f"{provider}:{model}" if model else provider
+        with self._lock:
+            entry = self.providers.setdefault(key, {
+                "calls": 0, "ms": 0.0, "input_tokens": 0, "output_tokens": 0, "errors": 0, "operations": {}
+            })
+            entry["calls"] += 1
+            entry["ms"] = round(entry["ms"] + duration_s * 1000, 1)
+            entry["input_tokens"] += input_tokens
+            entry["output_tokens"] += output_tokens
+            entry["errors"] += int(error)
+            entry["operations"][operation] = entry["operations"].get(operation, 0) + 1
+
+    def add_mongo_op(self, command: str, duration_s: float, failed: bool):
+        with self._lock:
+            entry = self.mongo.setdefault(command, {"calls": 0, "ms": 0.0, "failures": 0})
+            entry["calls"] += 1
+            entry["ms"] = round(entry["ms"] + duration_s * 1000, 1)
+            entry["failures"] += int(failed)
+
+    def mark_stage(self, stage: Optional[str], **attrs: Any):
+        """Chiude lo stage sequenziale aperto e (se stage non è None) ne apre uno nuovo"""
+        now = time.perf_counter()
+        if self._open_stage is not None:
+            name, started_at, open_attrs, otel_span = self._open_stage
+            self._open_stage = None
+            self.add_span(name, started_at, now - started_at, open_attrs)
+            PipelineMetrics.observe_stage(name, now - started_at)
+            if otel_span is not None:
+                otel_span.end()
+        if stage is not None:
+            tracer = _otel_tracer()
+            otel_span = tracer.start_span(stage, attributes=attrs or None) if tracer else None
+            self._open_stage = (stage, now, attrs, otel_span)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            providers = {key: {**value, "operations": dict(value["operations"])} for key, value in self.providers.items()}
+            mongo = {key: dict(value) for key, value in self.mongo.items()}
+            spans = sorted(self.spans, key=lambda span: span["start_ms"])
+        input_tokens = sum(p["input_tokens"] for p in providers.values())
+        output_tokens = sum(p["output_tokens"] for p in providers.values())
+        return {
+            "name": self.name,
+            "total_ms": self._offset_ms(time.perf_counter()),
+            "stages": spans,
+            "providers": providers,
+            "mongo": mongo,
+            "tokens": {
+                "prompt": input_tokens,
+                "completion": output_tokens,
+                "total": input_tokens + output_tokens
+            }
+        }
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def start_trace(name: str) -> Iterator[Optional[Trace]]:
+    """Apre una trace per la richiesta corrente (None se il tracing è disattivato)"""
+    if not PIPELINE_TRACING_ENABLED:
+        yield None
+        return
+    trace = Trace(name)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        trace.mark_stage(None)
+        _current_trace.reset(token)
+        PipelineMetrics.observe_request(name, time.perf_counter() - trace.started_at)
+
+
+@contextmanager
+def span(stage: str, **attrs: Any) -> Iterator[None]:
+    """Span annidabile attorno a un blocco (anche concorrente, es. una ricerca per query)"""
+    tracer = _otel_tracer()
+    otel_cm = tracer.start_as_current_span(stage, attributes=attrs or None) if tracer else None
+    if otel_cm is not None:
+        otel_cm.__enter__()
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - started_at
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_span(stage, started_at, duration, attrs)
+        PipelineMetrics.observe_stage(stage, duration)
+        if otel_cm is not None:
+            otel_cm.__exit__(None, None, None)
+
+
+def mark_stage(stage: Optional[str], **attrs: Any):
+    """
+    Stage sequenziale della pipeline: chiude il precedente e apre il nuovo
+
+    Per i passi in sequenza (STEP 1..7) evita di annidare interi blocchi in un with.
+    """
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.mark_stage(stage, **attrs)
+
+
+def record_provider_call(provider: str, model: Optional[str], operation: str, duration_s: float,
+                         usage: Optional[Dict[str, Any]] = None, error: bool = False):
+    input_tokens, output_tokens = normalize_usage(usage)
+    model = str(model or "")
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_provider_call(provider, model, operation, duration_s, input_tokens, output_tokens, error)
+    PipelineMetrics.observe_provider(provider, model, operation, duration_s, input_tokens, output_tokens, error)
+
+
+def _result_usage(result: Any) -> Dict[str, int]:
+    """Usage da un risultato di generate() / embed() / embed_batch()"""
+    if isinstance(result, list):
+        return {"input_tokens": sum(int(item.get("tokens") or 0) for item in result if isinstance(item, dict))}
+    if isinstance(result, dict):
+        if "usage" in result:
+            return result["usage"]
+        return {"input_tokens": int(result.get("tokens") or 0)}
+    return {}
+
+
+def traced_provider_call(provider: str, operation: str):
+    """Decorator per i metodi async degli adapter (generate, embed, embed_batch)"""
+    def decorator(fn):
+        @wraps(fn)
+        async def wrapper(self, *args, **kwargs):
+            if _in_provider_call.get():
+                return await fn(self, *args, **kwargs)
+            token = _in_provider_call.set(True)
+            started_at = time.perf_counter()
+            try:
+                result = await fn(self, *args, **kwargs)
+            except Exception:
+                record_provider_call(provider, getattr(self, "model", None), operation,
+                                     time.perf_counter() - started_at, error=True)
+                raise
+            finally:
+                _in_provider_call.reset(token)
+            model = getattr(self, "model", None)
+            if isinstance(result, dict) and result.get("model"):
+                model = result["model"]
+            record_provider_call(provider, model, operation, time.perf_counter() - started_at, _result_usage(result))
+            return result
+        return wrapper
+    return decorator
+
+
+def traced_provider_stream(provider: str, operation: str = "generate_stream"):
+    """
+    Decorator per generate_stream degli adapter (async generator)
+
+    La chiamata viene registrata alla chiusura dello stream: durata complessiva e
+    usage dell'ultimo record con 'usage' (StreamCompletion). Uno stream interrotto
+    dal consumatore viene registrato senza usage.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        async def wrapper(self, *args, **kwargs):
+            if _in_provider_call.get():
+                async for item in fn(self, *args, **kwargs):
+                    yield item
+                return
+            stream = fn(self, *args, **kwargs)
+            started_at = time.perf_counter()
+            completion: Dict[str, Any] = {}
+            error = False
+            try:
+                while True:
+                    # Flag impostato solo durante ogni passo: tra due yield il
+                    # consumatore può fare altre chiamate ai provider
+                    token = _in_provider_call.set(True)
+                    try:
+                        item = await stream.__anext__()
+                    except StopAsyncIteration:
+                        break
+                    finally:
+                        _in_provider_call.reset(token)
+                    if isinstance(item, dict) and "usage" in item:
+                        completion = item
+                    yield item
+            except Exception:
+                error = True
+                raise
+            finally:
+                await stream.aclose()
+                record_provider_call(provider, completion.get("model") or getattr(self, "model", None), operation,
+                                     time.perf_counter() - started_at, _result_usage(completion), error=error)
+        return wrapper
+    return decorator
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Durata dei comandi MongoDB (per trace corrente e metriche)"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event.command_name, event.duration_micros, failed=False)
+
+    def failed(self, event):
+        self._record(event.command_name, event.duration_micros, failed=True)
+
+    @staticmethod
+    def _record(command: str, duration_micros: int, failed: bool):
+        duration = duration_micros / 1_000_000
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_mongo_op(command, duration, failed)
+        PipelineMetrics.observe_mongo(command, duration, failed)
+
+
+mongo_command_listener = MongoCommandListener()
+
+
+class _Histogram:
+    __slots__ = ("buckets", "total", "count")
+
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.total += value
+        self.count += 1
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    return ",".join(f'{key}="{_escape(value)}"' for key, value in labels)
+
+
+class PipelineMetrics:
+    """Metriche aggregate di processo (classmethod singleton), esportate in formato Prometheus"""
+
+    _lock = threading.Lock()
+    _histograms: Dict[str, Dict[Tuple[Tuple[str, str], ...], _Histogram]] = {}
+    _counters: Dict[str, Dict[Tuple[Tuple[str, str], ...], float]] = {}
+
+    HELP = {
+        "natan_pipeline_request_duration_seconds": ("histogram", "Durata totale della richiesta tracciata"),
+        "natan_pipeline_stage_duration_seconds": ("histogram", "Durata per stage della pipeline"),
+        "natan_provider_request_duration_seconds": ("histogram", "Durata delle chiamate ai provider AI"),
+        "natan_provider_tokens_total": ("counter", "Token consumati per provider/modello"),
+        "natan_provider_errors_total": ("counter", "Chiamate ai provider AI fallite"),
+        "natan_mongo_command_duration_seconds": ("histogram", "Durata dei comandi MongoDB"),
+        "natan_mongo_command_failures_total": ("counter", "Comandi MongoDB falliti"),
+    }
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls._histograms.clear()
+            cls._counters.clear()
+
+    @classmethod
+    def _observe(cls, metric: str, labels: Dict[str, str], value: float):
+        key = tuple(sorted(labels.items()))
+        with cls._lock:
+            cls._histograms.setdefault(metric, {}).setdefault(key, _Histogram()).observe(value)
+
+    @classmethod
+    def _inc(cls, metric: str, labels: Dict[str, str], value: float = 1):
+        key = tuple(sorted(labels.items()))
+        with cls._lock:
+            series = cls._counters.setdefault(metric, {})
+            series[key] = series.get(key, 0) + value
+
+    @classmethod
+    def observe_request(cls, name: str, duration_s: float):
+        cls._observe("natan_pipeline_request_duration_seconds", {"pipeline": name}, duration_s)
+
+    @classmethod
+    def observe_stage(cls, stage: str, duration_s: float):
+        cls._observe("natan_pipeline_stage_duration_seconds", {"stage": stage}, duration_s)
+
+    @classmethod
+    def observe_provider(cls, provider: str, model: str, operation: str, duration_s: float,
+                         input_tokens: int, output_tokens: int, error: bool):
+        labels = {"provider": provider, "model": model, "operation": operation}
+        cls._observe("natan_provider_request_duration_seconds", labels, duration_s)
+        if input_tokens:
+            cls._inc("natan_provider_tokens_total", {"provider": provider, "model": model, "direction": "input"}, input_tokens)
+        if output_tokens:
+            cls._inc("natan_provider_tokens_total", {"provider": provider, "model": model, "direction": "output"}, output_tokens)
+        if error:
+            cls._inc("natan_provider_errors_total", {"provider": provider, "operation": operation})
+
+    @classmethod
+    def observe_mongo(cls, command: str, duration_s: float, failed: bool):
+        cls._observe("natan_mongo_command_duration_seconds", {"command": command}, duration_s)
+        if failed:
+            cls._inc("natan_mongo_command_failures_total", {"command": command})
+
+    @classmethod
+    def get_stats(cls) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """Conteggio e latenza media per serie (per /system/status)"""
+        with cls._lock:
+            return {
+                metric.replace("natan_", "").replace("_duration_seconds", ""): {
+                    _labels(key): {"count": hist.count, "avg_ms": round(hist.total / hist.count * 1000, 1) if hist.count else 0.0}
+                    for key, hist in series.items()
+                }
+                for metric, series in cls._histograms.items()
+            }
+
+    @classmethod
+    def render_prometheus(cls) -> str:
+        """Testo in formato di esposizione Prometheus 0.0.4"""
+        lines: List[str] = []
+        with cls._lock:
+            for metric, (kind, help_text) in cls.HELP.items():
+                if kind == "histogram":
+                    series = cls._histograms.get(metric, {})
+                    if not series:
+                        continue
+                    lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+                    for key, hist in series.items():
+                        base = _labels(key)
+                        sep = "," if base else ""
+                        for bound, bucket_count in zip(LATENCY_BUCKETS, hist.buckets):
+                            lines.append(f'{metric}_bucket{{{base}{sep}le="{bound}"}} {bucket_count}')
+                        lines.append(f'{metric}_bucket{{{base}{sep}le="+Inf"}} {hist.count}')
+                        lines.append(f"{metric}_sum{{{base}}} {hist.total:.6f}")
+                        lines.append(f"{metric}_count{{{base}}} {hist.count}")
+                else:
+                    series = cls._counters.get(metric, {})
+                    if not series:
+                        continue
+                    lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+                    for key, value in series.items():
+                        lines.append(f"{metric}{{{_labels(key)}}} {value:g}")
+        return "\n".join(lines) + "\n"
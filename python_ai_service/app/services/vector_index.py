@@ -0,0 +1,340 @@
+"""
+Vector Index - Indice ANN in-process per tenant
+Inverted File Index (IVF) costruito su NumPy sopra gli embedding di chunk e documenti.
+In memoria restano solo i vettori e i riferimenti (_id, posizione chunk), non il testo.
+
+L'indice viene costruito in modo lazy alla prima query del tenant, mantenuto in memoria
+e ricostruito alla scadenza del TTL, dopo un'invalidazione esplicita (es. import atti) o
+quando la versione del corpus (CorpusVersion) cambia, anche per scritture di altri processi.
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.corpus_version import CorpusVersion
+from app.services.mongodb_service import MongoDBService
+from app.services.vector_scoring import normalize_rows, top_k
+from app.services.tenant_ids import normalize_tenant_id
+
+logger = logging.getLogger(__name__)
+
+# Configurazione (override da environment)
+VECTOR_INDEX_TTL_SECONDS = int(os.getenv("VECTOR_INDEX_TTL_SECONDS", "600"))
+VECTOR_INDEX_MIN_IVF_SIZE = int(os.getenv("VECTOR_INDEX_MIN_IVF_SIZE", "2048"))
+VECTOR_INDEX_KMEANS_ITERATIONS = int(os.getenv("VECTOR_INDEX_KMEANS_ITERATIONS", "8"))
+
+
+class IVFIndex:
+    """
+    Inverted File Index su vettori normalizzati (cosine similarity = prodotto scalare)
+
+    Sotto VECTOR_INDEX_MIN_IVF_SIZE vettori la ricerca è esatta (una sola matmul):
+    il costo del clustering non si ripaga su corpus piccoli.
+    """
+
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        nlist: Optional[int] = None,
+        nprobe: Optional[int] = None,
+        min_ivf_size: int = VECTOR_INDEX_MIN_IVF_SIZE,
+        seed: int = 42
+    ):
+        """
+        Args:
+            vectors: Matrice (n, dim) di embedding
+            nlist: Numero di cluster (default ~ 4*sqrt(n))
+            nprobe: Cluster visitati per query (default nlist/10, minimo 8)
+            min_ivf_size: Sotto questa soglia usa ricerca esatta
+            seed: Seed per inizializzazione k-means (build deterministico)
+        """
+        self.vectors = normalize_rows(vectors) if len(vectors) else np.asarray(vectors, dtype=np.float32)
+        self.size = self.vectors.shape[0]
+        self.is_exact = self.size < max(min_ivf_size, 1)
+
+        self.centroids: Optional[np.ndarray] = None
+        self.lists: List[np.ndarray] = []
+
+        if self.is_exact:
+            self.nlist = 0
+            self.nprobe = 0
+            return
+
+        self.nlist = nlist or max(8, int(4 * np.sqrt(self.size)))
+        self.nprobe = nprobe or max(8, self.nlist // 10)
+        self._train(seed)
+
+    def _train(self, seed: int):
+        """K-means sferico sui vettori normalizzati, poi assegnazione alle liste"""
+        rng = np.random.default_rng(seed)
+
+        # Allenamento su un campione per contenere i tempi di build
+        sample_size = min(self.size, self.nlist * 64)
+        sample = self.vectors[rng.choice(self.size, sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, self.nlist, replace=False)].copy()
+
+        for _ in range(VECTOR_INDEX_KMEANS_ITERATIONS):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(self.nlist):
+                members = sample[assignments == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids = normalize_rows(centroids)
+
+        self.centroids = centroids
+
+        # Assegna tutti i vettori al centroide più vicino
+        assignments = np.argmax(self.vectors @ centroids.T, axis=1)
+        order = np.argsort(assignments, kind="stable")
+        bounds = np.searchsorted(assignments[order], np.arange(self.nlist + 1))
+        self.lists = [order[bounds[c]:bounds[c + 1]] for c in range(self.nlist)]
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int,
+        mask: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k per similarità coseno
+
+        Args:
+            query: Vettore query (dim,)
+            k: Numero di risultati
+            mask: Maschera booleana (n,) per filtri; se presente la ricerca è esatta
+                  sul sottoinsieme (i filtri riducono già lo spazio di ricerca)
+
+        Returns:
+            (indici, score) ordinati per score decrescente
+        """
+        if self.size == 0 or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        q = np.asarray(query, dtype=np.float32)
+        q_norm = np.linalg.norm(q)
+        if q_norm == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        q = q / q_norm
+
+        if mask is not None:
+            candidates = np.flatnonzero(mask)
+        elif self.is_exact:
+            candidates = None
+        else:
+            centroid_scores = self.centroids @ q
+            probe = np.argpartition(-centroid_scores, min(self.nprobe, self.nlist) - 1)[:self.nprobe]
+            candidates = np.concatenate([self.lists[c] for c in probe])
+
+        if candidates is None:
+            scores = self.vectors @ q
+            ids = np.arange(self.size)
+        else:
+            if len(candidates) == 0:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+            scores = self.vectors[candidates] @ q
+            ids = candidates
+
+        top, top_scores = top_k(scores, k)
+        return ids[top], top_scores
+
+
+class TenantVectorIndex:
+    """
+    Indice di un singolo tenant: IVF + riferimento di ogni vettore indicizzato
+
+    Ogni entry è un chunk (se il documento ha chunk con embedding) oppure il
+    documento intero (embedding document-level), come nel retrieval originale.
+    Le entry contengono solo _id, posizione del chunk e i campi dei filtri:
+    il testo dei risultati si idrata da MongoDB per i soli vincenti.
+    """
+
+    # Campi leggeri caricati con gli embedding (usati da build_mask)
+    FILTER_FIELDS = ("document_type", "created_at")
+    EMBEDDING_FIELDS = ("embedding", "content.chunks.embedding")
+
+    def __init__(self, tenant_id: Any, entries: List[Dict[str, Any]], vectors: np.ndarray, document_count: int):
+        self.tenant_id = tenant_id
+        self.entries = entries
+        self.document_count = document_count
+        self.index = IVFIndex(vectors)
+        self.built_at = time.time()
+        # Versione (generazioni locali, CorpusVersion) letta prima del caricamento dei documenti
+        self.version: Optional[Tuple[int, int, str]] = None
+
+    @classmethod
+    def from_documents(cls, tenant_id: Any, documents: Iterable[Dict[str, Any]]) -> "TenantVectorIndex":
+        """Costruisce l'indice dai documenti MongoDB del tenant (bastano _id, embedding e FILTER_FIELDS)"""
+        entries: List[Dict[str, Any]] = []
+        vectors: List[List[float]] = []
+        dimensions: Optional[int] = None
+        document_count = 0
+
+        for doc in documents:
+            document_count += 1
+            content = doc.get("content", {})
+            chunks = content.get("chunks", []) if isinstance(content, dict) else []
+            doc_embedding = doc.get("embedding")
+            filter_fields = {field: doc.get(field) for field in cls.FILTER_FIELDS}
+
+            if chunks:
+                for position, chunk in enumerate(chunks):
+                    chunk_embedding = chunk.get("embedding")
+                    if not chunk_embedding:
+                        continue
+                    if dimensions is None:
+                        dimensions = len(chunk_embedding)
+                    if len(chunk_embedding) != dimensions:
+                        continue
+                    entries.append({"kind": "chunk", "_id": doc.get("_id"), "chunk_position": position, "doc": filter_fields})
+                    vectors.append(chunk_embedding)
+            elif doc_embedding:
+                if dimensions is None:
+                    dimensions = len(doc_embedding)
+                if len(doc_embedding) != dimensions:
+                    continue
+                entries.append({"kind": "document", "_id": doc.get("_id"), "chunk_position": None, "doc": filter_fields})
+                vectors.append(doc_embedding)
+
+        matrix = np.asarray(vectors, dtype=np.float32) if vectors else np.empty((0, dimensions or 0), dtype=np.float32)
+        return cls(tenant_id, entries, matrix, document_count=document_count)
+
+    @property
+    def size(self) -> int:
+        return len(self.entries)
+
+    def is_expired(self, ttl_seconds: int = VECTOR_INDEX_TTL_SECONDS) -> bool:
+        return (time.time() - self.built_at) > ttl_seconds
+
+    def build_mask(self, filters: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """
+        Traduce i filtri del retriever (document_type, date_from, date_to) in maschera
+
+        Returns:
+            Maschera booleana o None se nessun filtro applicabile
+        """
+        if not filters:
+            return None
+
+        predicates: List[Callable[[Dict[str, Any]], bool]] = []
+        if "document_type" in filters:
+            document_type = filters["document_type"]
+            predicates.append(lambda doc: doc.get("document_type") == document_type)
+        if "date_from" in filters:
+            date_from = filters["date_from"]
+            predicates.append(lambda doc: doc.get("created_at") is not None and doc.get("created_at") >= date_from)
+        if "date_to" in filters:
+            date_to = filters["date_to"]
+            predicates.append(lambda doc: doc.get("created_at") is not None and doc.get("created_at") <= date_to)
+
+        if not predicates:
+            return None
+
+        def matches(doc: Dict[str, Any]) -> bool:
+            try:
+                return all(predicate(doc) for predicate in predicates)
+            except TypeError:
+                return False
+
+        return np.fromiter((matches(entry["doc"]) for entry in self.entries), dtype=bool, count=self.size)
+
+    def search(
+        self,
+        query_embedding: List[float],
+        k: int,
+        min_score: float = 0.0,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        Returns:
+            Lista di (entry, similarity) con similarity >= min_score, ordinata desc
+        """
+        if self.size == 0:
+            return []
+        ids, scores = self.index.search(np.asarray(query_embedding), k, mask=self.build_mask(filters))
+        return [
+            (self.entries[i], float(score))
+            for i, score in zip(ids, scores)
+            if score >= min_score
+        ]
+
+
+class VectorIndexRegistry:
+    """Registry process-wide degli indici per tenant (singleton, build lazy)"""
+
+    _indexes: Dict[Any, TenantVectorIndex] = {}
+    _lock = threading.Lock()
+    _build_locks: Dict[Any, threading.Lock] = {}
+    # Contatori delle invalidate() del processo (globale e per tenant):
+    # una build già in corso al momento dell'invalidazione non resta valida
+    _generation = 0
+    _tenant_generations: Dict[Any, int] = {}
+
+    @classmethod
+    def _load_documents(cls, tenant_id: Any) -> Iterator[Dict[str, Any]]:
+        """Stream di _id + embedding dei documenti del tenant (fase 1 del two-phase fetch)"""
+        return MongoDBService.iter_embeddings(
+            "documents",
+            {"tenant_id": tenant_id, "embedding": {"$exists": True}},
+            embedding_fields=TenantVectorIndex.EMBEDDING_FIELDS,
+            fields=TenantVectorIndex.FILTER_FIELDS
+        )
+
+    @classmethod
+    def _current_version(cls, tenant_id: Any) -> Tuple[int, int, str]:
+        return cls._generation, cls._tenant_generations.get(tenant_id, 0), CorpusVersion.get(tenant_id)
+
+    @classmethod
+    def _is_fresh(cls, index: Optional[TenantVectorIndex], version: Tuple[int, int, str]) -> bool:
+        return index is not None and index.version == version and not index.is_expired()
+
+    @classmethod
+    def get_index(cls, tenant_id: Any) -> TenantVectorIndex:
+        """
+        Get or build the tenant index (rebuilt when expired, invalidated or the corpus version changed)
+        """
+        tenant_id = normalize_tenant_id(tenant_id)
+        index = cls._indexes.get(tenant_id)
+        if cls._is_fresh(index, cls._current_version(tenant_id)):
+            return index
+
+        with cls._lock:
+            build_lock = cls._build_locks.setdefault(tenant_id, threading.Lock())
+
+        # Una sola build per tenant alla volta: le richieste concorrenti attendono
+        with build_lock:
+            # Versione letta prima del caricamento: le scritture durante la build la fanno avanzare
+            version = cls._current_version(tenant_id)
+            index = cls._indexes.get(tenant_id)
+            if cls._is_fresh(index, version):
+                return index
+
+            start = time.time()
+            documents = cls._load_documents(tenant_id)
+            index = TenantVectorIndex.from_documents(tenant_id, documents)
+            index.version = version
+            with cls._lock:
+                cls._indexes[tenant_id] = index
+            logger.info(
+                f"🧭 Vector index built for tenant {tenant_id}: {index.size} vectors "
+                f"from {index.document_count} documents "
+                f"({'exact' if index.index.is_exact else f'IVF nlist={index.index.nlist}'}) "
+                f"in {int((time.time() - start) * 1000)}ms"
+            )
+            return index
+
+    @classmethod
+    def invalidate(cls, tenant_id: Optional[Any] = None):
+        """Invalida l'indice di un tenant (o tutti se tenant_id è None)"""
+        with cls._lock:
+            if tenant_id is None:
+                cls._generation += 1
+                cls._indexes.clear()
+                return
+            tenant_id = normalize_tenant_id(tenant_id)
+            cls._tenant_generations[tenant_id] = cls._tenant_generations.get(tenant_id, 0) + 1
+            cls._indexes.pop(tenant_id, None)
@@ -0,0 +1,166 @@
+"""
+Vector Scoring - Motore di scoring coseno vettorizzato condiviso dai retriever
+
+Tutti i retriever convertono una volta i propri embedding in una matrice float32
+pre-normalizzata; lo scoring di una o più query è una singola matmul e il top-k
+usa argpartition (O(n)) invece di ordinare tutti i candidati.
+"""
+
+from typing import Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+Vector = Union[Sequence[float], np.ndarray]
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """
+    Normalizza le righe a norma unitaria (float32)
+
+    Le righe nulle restano nulle: il loro score coseno è 0, come nel calcolo scalare.
+    """
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def build_matrix(
+    vectors: Iterable[Optional[Vector]],
+    dimensions: Optional[int] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Costruisce la matrice pre-normalizzata da una sequenza di embedding
+
+    Embedding mancanti, vuoti o con dimensione diversa vengono saltati.
+
+    Args:
+        vectors: Embedding (liste o array), anche None
+        dimensions: Dimensione attesa (default: la prima valida)
+
+    Returns:
+        (matrice normalizzata (m, dim), posizioni originali delle m righe valide)
+    """
+    rows = []
+    positions = []
+    for position, vector in enumerate(vectors):
+        if vector is None or isinstance(vector, (str, bytes, dict)):
+            continue
+        length = len(vector)
+        if length == 0:
+            continue
+        if dimensions is None:
+            dimensions = length
+        if length != dimensions:
+            continue
+        rows.append(vector)
+        positions.append(position)
+
+    if not rows:
+        return np.empty((0, dimensions or 0), dtype=np.float32), np.empty(0, dtype=np.int64)
+
+    return normalize_rows(np.asarray(rows, dtype=np.float32)), np.asarray(positions, dtype=np.int64)
+
+
+def cosine_scores(queries: Union[Vector, Sequence[Vector]], matrix: np.ndarray) -> np.ndarray:
+    """
+    Similarità coseno di una o più query contro una matrice pre-normalizzata
+
+    Args:
+        queries: Un vettore (dim,) oppure più vettori (q, dim)
+        matrix: Matrice pre-normalizzata (n, dim)
+
+    Returns:
+        Array (n,) per una query singola, (q, n) per più query
+    """
+    query_matrix = np.asarray(queries, dtype=np.float32)
+    single = query_matrix.ndim == 1
+    scores = normalize_rows(query_matrix) @ matrix.T
+    return scores[0] if single else scores
+
+
+def top_k(
+    scores: np.ndarray,
+    k: int,
+    min_score: Optional[float] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top-k di un vettore di score con argpartition
+
+    Returns:
+        (indici, score) ordinati per score decrescente, filtrati per min_score
+    """
+    if k <= 0 or scores.size == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=scores.dtype)
+
+    k = min(k, scores.size)
+    if k < scores.size:
+        indices = np.argpartition(-scores, k - 1)[:k]
+    else:
+        indices = np.arange(scores.size)
+    indices = indices[np.argsort(-scores[indices], kind="stable")]
+    selected = scores[indices]
+
+    if min_score is not None:
+        keep = selected >= min_score
+        indices, selected = indices[keep], selected[keep]
+
+    return indices, selected
+
+
+def search(
+    query: Vector,
+    matrix: np.ndarray,
+    k: int,
+    min_score: Optional[float] = None
+) -> List[Tuple[int, float]]:
+    """
+    Top-k di una query: lista di (riga, score) ordinata per score decrescente
+    """
+    if matrix.shape[0] == 0 or len(query) != matrix.shape[1]:
+        return []
+    indices, selected = top_k(cosine_scores(query, matrix), k, min_score)
+    return [(int(i), float(s)) for i, s in zip(indices, selected)]
+
+
+def batch_search(
+    queries: Sequence[Vector],
+    matrix: np.ndarray,
+    k: int,
+    min_score: Optional[float] = None
+) -> List[List[Tuple[int, float]]]:
+    """
+    Top-k di più query con una sola matmul (q, dim) x (dim, n)
+    """
+    if not len(queries):
+        return []
+    if matrix.shape[0] == 0:
+        return [[] for _ in queries]
+    scores = cosine_scores(queries, matrix)
+    if scores.ndim == 1:
+        scores = scores.reshape(1, -1)
+    results = []
+    for row in scores:
+        indices, selected = top_k(row, k, min_score)
+        results.append([(int(i), float(s)) for i, s in zip(indices, selected)])
+    return results
+
+
+def cosine_similarity(vec1: Vector, vec2: Vector) -> float:
+    """
+    Similarità coseno di una singola coppia (compatibilità con le API esistenti)
+
+    Returns:
+        Score coseno, 0.0 se un vettore è nullo o le dimensioni non coincidono
+    """
+    a = np.asarray(vec1, dtype=np.float32)
+    b = np.asarray(vec2, dtype=np.float32)
+    if a.shape != b.shape or a.size == 0:
+        return 0.0
+    norm1 = np.linalg.norm(a)
+    norm2 = np.linalg.norm(b)
+    if norm1 == 0 or norm2 == 0:
+        return 0.0
+    return float(np.dot(a, b) / (norm1 * norm2))
@@ -1,30 +1,27 @@
 """Vector similarity search (cosine similarity)"""
-import numpy as np
 from typing import List, Dict, Any, Tuple, Optional
 from app.services.mongodb_service import MongoDBService
+from app.services import vector_scoring
+from app.services.vector_scoring import cosine_similarity  # Re-export for existing callers
 
-def cosine_similarity(vec1: List[float], vec2: List[float]) -> float:
-    """
-    Calculate cosine similarity between two vectors
-    
-    Args:
-        vec1: First vector
-        vec2: Second vector
-    
-    Returns:
-        Cosine similarity score (0-1)
-    """
-    vec1_array = np.array(vec1)
-    vec2_array = np.array(vec2)
-    
-    dot_product = np.dot(vec1_array, vec2_array)
-    norm1 = np.linalg.norm(vec1_array)
-    norm2 = np.linalg.norm(vec2_array)
-    
-    if norm1 == 0 or norm2 == 0:
-        return 0.0
-    
-    return float(dot_product / (norm1 * norm2))
+# Phase-2 projections: metadata/text of the winners only, never embeddings
+KNN_METADATA_PROJECTION = {
+    "_id": 1,
+    "document_id": 1,
+    "title": 1,
+    "document_type": 1,
+    "protocol_number": 1,
+    "protocol_date": 1,
+    "content.raw_text": 1,
+}
+CHUNK_TEXT_PROJECTION = {
+    "_id": 1,
+    "document_id": 1,
+    "chunks.chunk_index": 1,
+    "chunks.chunk_text": 1,
+    "chunks.page_number": 1,
+    "chunks.tokens": 1,
+}
 
 class VectorSearchService:
     """Vector similarity search service using cosine similarity"""
@@ -50,49 +47,50 @@ class VectorSearchService:
         Returns:
             List of documents with similarity scores, sorted by score (desc)
         """
-        # Get all documents with embeddings for this tenant
+        # Phase 1: stream only _id + embedding for this tenant
         filter_query = {
             "tenant_id": tenant_id,
             "embedding": {"$exists": True, "$ne": None}
         }
         
-        documents = MongoDBService.find_documents(
+        documents = list(MongoDBService.iter_embeddings(collection_name, filter_query))
+        
+        # Calculate similarities (single matmul over the pre-normalized matrix)
+        matrix, positions = vector_scoring.build_matrix(
+            doc.get("embedding") if isinstance(doc.get("embedding"), list) else None
+            for doc in documents
+        )
+        hits = [
+            (documents[positions[row]]["_id"], score)
+            for row, score in vector_scoring.search(query_vector, matrix, k=k, min_score=min_score)
+        ]
+        
+        # Phase 2: hydrate metadata of the top K only
+        hydrated = MongoDBService.hydrate_documents(
             collection_name,
-            filter_query,
-            limit=None  # Need all for comparison
+            (doc_id for doc_id, _ in hits),
+            projection=KNN_METADATA_PROJECTION
         )
         
-        # Calculate similarities
         results = []
-        for doc in documents:
-            if "embedding" not in doc or not doc["embedding"]:
-                continue
-            
-            embedding = doc.get("embedding", [])
-            if not isinstance(embedding, list) or len(embedding) == 0:
+        for doc_id, score in hits:
+            doc = hydrated.get(str(doc_id))
+            if doc is None:
                 continue
-            
-            score = cosine_similarity(query_vector, embedding)
-            
-            if score >= min_score:
-                results.append({
-                    "document_id": doc.get("document_id"),
-                    "score": score,
-                    "metadata": {
-                        "title": doc.get("title"),
-                        "document_type": doc.get("document_type"),
-                        "protocol_number": doc.get("protocol_number"),
-                        "protocol_date": str(doc.get("protocol_date", "")),
-                        "content_preview": doc.get("content", {}).get("raw_text", "")[:200] if isinstance(doc.get("content"), dict) else ""
-                    },
-                    "document": doc  # Full document for reference
-                })
-        
-        # Sort by score descending
-        results.sort(key=lambda x: x["score"], reverse=True)
-        
-        # Return top K
-        return results[:k]
+            results.append({
+                "document_id": doc.get("document_id"),
+                "score": score,
+                "metadata": {
+                    "title": doc.get("title"),
+                    "document_type": doc.get("document_type"),
+                    "protocol_number": doc.get("protocol_number"),
+                    "protocol_date": str(doc.get("protocol_date", "")),
+                    "content_preview": doc.get("content", {}).get("raw_text", "")[:200] if isinstance(doc.get("content"), dict) else ""
+                }
+            })
+        
+        # Already sorted by score descending, top K
+        return results
     
     @staticmethod
     def search_chunks(
@@ -123,34 +121,49 @@ class VectorSearchService:
         if document_id:
             filter_query["document_id"] = document_id
         
-        documents = MongoDBService.find_documents("documents", filter_query)
+        # Phase 1: only chunk embeddings, chunk text is fetched for the winners
+        documents = MongoDBService.iter_embeddings("documents", filter_query, embedding_fields=("chunks.embedding",))
         
-        results = []
+        chunk_refs = []
         for doc in documents:
             chunks = doc.get("chunks", [])
             if not isinstance(chunks, list):
                 continue
-            
-            for chunk in chunks:
-                if "embedding" not in chunk or not chunk.get("embedding"):
-                    continue
-                
-                score = cosine_similarity(query_vector, chunk["embedding"])
-                
-                if score >= min_score:
-                    results.append({
-                        "document_id": doc.get("document_id"),
-                        "chunk_index": chunk.get("chunk_index"),
-                        "chunk_text": chunk.get("chunk_text", "")[:500],
-                        "score": score,
-                        "metadata": {
-                            "page_number": chunk.get("page_number"),
-                            "tokens": chunk.get("tokens")
-                        }
-                    })
-        
-        # Sort by score descending
-        results.sort(key=lambda x: x["score"], reverse=True)
-        
-        return results[:k]
+            for position, chunk in enumerate(chunks):
+                if chunk.get("embedding"):
+                    chunk_refs.append((doc["_id"], position, chunk["embedding"]))
+        
+        matrix, positions = vector_scoring.build_matrix(embedding for _, _, embedding in chunk_refs)
+        hits = [
+            (chunk_refs[positions[row]], score)
+            for row, score in vector_scoring.search(query_vector, matrix, k=k, min_score=min_score)
+        ]
+        
+        # Phase 2: hydrate the documents owning the top K chunks
+        hydrated = MongoDBService.hydrate_documents(
+            "documents",
+            (doc_id for (doc_id, _, _), _ in hits),
+            projection=CHUNK_TEXT_PROJECTION
+        )
+        
+        results = []
+        for (doc_id, position, _), score in hits:
+            doc = hydrated.get(str(doc_id))
+            chunks = doc.get("chunks", []) if doc else []
+            if position >= len(chunks):
+                continue
+            chunk = chunks[position]
+            results.append({
+                "document_id": doc.get("document_id"),
+                "chunk_index": chunk.get("chunk_index"),
+                "chunk_text": chunk.get("chunk_text", "")[:500],
+                "score": score,
+                "metadata": {
+                    "page_number": chunk.get("page_number"),
+                    "tokens": chunk.get("tokens")
+                }
+            })
+        
+        # Already sorted by score descending
+        return results
 
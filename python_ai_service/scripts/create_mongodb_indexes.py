@@ -13,6 +13,7 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from app.services.mongodb_service import MongoDBService
 from app.config import MONGODB_DATABASE
+from app.services.search_projection import SEARCH_INDEXES
 
 # Colors
 GREEN = '\033[0;32m'
@@ -67,6 +68,9 @@ def create_indexes():
             "keys": [("tenant_id", 1)],
             "description": "Tenant isolation queries"
         }
+    ] + [
+        {**index, "description": "Search projection (/commands filters)"}
+        for index in SEARCH_INDEXES
     ]
     
     print(f"{CYAN}Creating indexes on collection 'documents'...{NC}\n")
@@ -141,8 +141,11 @@ def find_duplicates(tenant_id: int = None, dry_run: bool = True):
         # Elimina gli altri
         for doc in sorted_docs[1:]:
             try:
-                result = coll.delete_one({'_id': doc['_id']})
-                if result.deleted_count > 0:
+                # Tramite MongoDBService: versione del corpus e rollup del tenant aggiornati
+                delete_filter = {'_id': doc['_id']}
+                if 'tenant_id' in doc:
+                    delete_filter['tenant_id'] = doc['tenant_id']
+                if MongoDBService.delete_documents("documents", delete_filter) > 0:
                     deleted_count += 1
                 else:
                     errors.append(f"Documento {doc['_id']} non eliminato")
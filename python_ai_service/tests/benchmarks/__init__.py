@@ -0,0 +1,7 @@
+"""
+Benchmark suite NATAN_LOC - hot path di retrieval e pipeline su tenant sintetici
+
+Uso:
+    python -m tests.benchmarks.suite --sizes 100,500,1000 --output bench.json
+    python -m tests.benchmarks.suite --baseline bench.json   # exit 1 se regressioni
+"""
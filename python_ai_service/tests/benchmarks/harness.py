@@ -0,0 +1,720 @@
+"""
+Benchmark Harness - tenant sintetici, MongoDB in-memory e adapter AI stub
+
+- SyntheticCorpus: N documenti × M chunk con embedding (default 1536 dim)
+  raggruppati per argomento, così le query trovano vicini sopra soglia
+- InMemoryClient: stand-in di MongoClient con il sottoinsieme di API usato
+  da MongoDBService (find/projection/$in/$exists/$all/$regex, count, insert, update,
+  bulk_write di UpdateOne).
+  Come un MongoDB non-Atlas rifiuta $vectorSearch e $text: il retriever
+  percorre il fallback su EmbeddingStore, cioè il percorso reale in locale
+- StubEmbeddingAdapter / StubChatAdapter: latenza configurabile, risposte
+  deterministiche compatibili con i parser della pipeline
+
+bench_environment() collega tutto ai servizi (MongoDBService, AIRouter,
+EmbeddingStore in una directory temporanea) e ripristina lo stato all'uscita.
+Con un MongoClient reale (es. mongod locale) il corpus viene caricato in un
+database usa-e-getta.
+"""
+
+import asyncio
+import hashlib
+import tempfile
+import re
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from pymongo import UpdateOne
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+from unittest.mock import patch
+
+from app.services.ai_router import AIRouter
+from app.services.corpus_version import CorpusVersion
+from app.services.embedding_store import EmbeddingStore
+from app.services.lexical_index import LexicalIndexRegistry
+from app.services.mongodb_service import MongoDBService
+from app.services.providers.base import BaseChatAdapter, BaseEmbeddingAdapter
+from app.services.rag_fortress import pipeline
+from app.services.vector_index import VectorIndexRegistry
+
+BENCH_DATABASE = "natan_bench"
+
+DOCUMENT_TYPES = [
+    "Delibera di Giunta",
+    "Delibera di Consiglio",
+    "Determinazione dirigenziale",
+    "Ordinanza sindacale",
+    "Decreto",
+]
+
+SUBJECTS = [
+    "riqualificazione del parco urbano",
+    "manutenzione straordinaria degli edifici scolastici",
+    "contributi alle associazioni sportive",
+    "piano urbano della mobilità sostenibile",
+    "affidamento del servizio di refezione scolastica",
+    "variazione di bilancio",
+    "efficientamento dell'illuminazione pubblica",
+    "realizzazione di nuove piste ciclabili",
+    "regolamento per l'occupazione di suolo pubblico",
+    "gestione dei rifiuti urbani",
+    "interventi di edilizia residenziale pubblica",
+    "servizi sociali per anziani",
+]
+
+# Risposta stub: ogni parser della pipeline ci trova il suo formato
+# (claim estratte, copertura piena, nessuna allucinazione)
+STUB_CHAT_RESPONSE = (
+    "[CLAIM_001] L'atto approva gli interventi richiesti (SOURCE: documento recuperato)\n"
+    "[CLAIM_002] La spesa è imputata al bilancio dell'esercizio corrente (SOURCE: documento recuperato)\n"
+    "FULL_COVERAGE\n"
+    "NESSUNA_ALLUCINAZIONE"
+)
+
+
+# === Corpus sintetico ===
+
+class SyntheticCorpus:
+    """
+    Corpus deterministico di atti PA con embedding per documento e per chunk
+
+    Ogni documento appartiene a un argomento: il suo embedding (e quelli dei
+    chunk) è il centroide dell'argomento più rumore. Gli embedding delle
+    domande (embed_text) cadono vicino a un centroide scelto dall'hash del testo.
+    """
+
+    def __init__(
+        self,
+        documents: int,
+        chunks_per_document: int = 4,
+        dimensions: int = 1536,
+        topics: int = 32,
+        noise: float = 0.35,
+        seed: int = 0
+    ):
+        self.documents = documents
+        self.chunks_per_document = chunks_per_document
+        self.dimensions = dimensions
+        self.noise = noise
+        self.seed = seed
+
+        rng = np.random.default_rng(seed)
+        centroids = rng.standard_normal((topics, dimensions)).astype(np.float32)
+        self.centroids = centroids / np.linalg.norm(centroids, axis=1, keepdims=True)
+
+    @property
+    def vector_count(self) -> int:
+        """Embedding totali (documento + chunk)"""
+        return self.documents * (self.chunks_per_document + 1)
+
+    def _vectors(self, topic: int, count: int, rng: np.random.Generator) -> np.ndarray:
+        vectors = self.centroids[topic] + self.noise * rng.standard_normal((count, self.dimensions)).astype(np.float32) / np.sqrt(self.dimensions)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    def embed_text(self, text: str) -> List[float]:
+        """Embedding deterministico di un testo (vicino a uno dei centroidi)"""
+        digest = int(hashlib.md5(text.encode("utf-8")).hexdigest(), 16)
+        rng = np.random.default_rng(digest % (2 ** 32))
+        return self._vectors(digest % len(self.centroids), 1, rng)[0].tolist()
+
+    @staticmethod
+    def paragraph(index: int, subject: str, year: int) -> str:
+        return (
+            f"Art. {index + 1} - Il Comune, in merito alla {subject}, dispone quanto segue per l'anno {year}. "
+            f"Visto il Testo Unico degli Enti Locali (D.Lgs. 267/2000) e il regolamento comunale vigente, "
+            f"si approva il quadro economico dell'intervento per un importo di euro {(index + 1) * 12500:,}. "
+            f"Il responsabile del procedimento cura la pubblicazione all'Albo Pretorio e gli adempimenti "
+            f"di trasparenza previsti dal D.Lgs. 33/2013."
+        )
+
+    def long_text(self, paragraphs: int = 120) -> str:
+        """Testo di un atto lungo (input di split_text_into_chunks)"""
+        return "\n\n".join(self.paragraph(i, SUBJECTS[i % len(SUBJECTS)], 2024) for i in range(paragraphs))
+
+    def iter_documents(self, tenant_id: int) -> Iterator[Dict[str, Any]]:
+        """Documenti nel formato di PAActMongoDBImporter"""
+        rng = np.random.default_rng(self.seed + 1)
+        base_date = datetime(2024, 1, 1)
+        for i in range(self.documents):
+            topic = i % len(self.centroids)
+            subject = SUBJECTS[topic % len(SUBJECTS)]
+            doc_type = DOCUMENT_TYPES[i % len(DOCUMENT_TYPES)]
+            year = 2020 + i % 5
+            vectors = self._vectors(topic, self.chunks_per_document + 1, rng)
+            paragraphs = [self.paragraph(j, subject, year) for j in range(self.chunks_per_document)]
+            created_at = base_date + timedelta(hours=i)
+            yield {
+                "_id": ObjectId(hashlib.md5(f"{tenant_id}-{i}".encode()).hexdigest()[:24]),
+                "document_id": f"pa_act_bench_{tenant_id}_{i}",
+                "tenant_id": tenant_id,
+                "title": f"{doc_type} n. {i + 1}/{year} - {subject}",
+                "document_type": "pa_act",
+                "protocol_number": f"{i + 1}/{year}",
+                "protocol_date": f"{year}-{(i % 12) + 1:02d}-15",
+                "embedding": vectors[0].tolist(),
+                "content": {
+                    "full_text": "\n\n".join(paragraphs),
+                    "chunks": [
+                        {
+                            "chunk_index": j,
+                            "chunk_text": paragraph,
+                            "embedding": vectors[j + 1].tolist(),
+                            "tokens": len(paragraph.split()),
+                        }
+                        for j, paragraph in enumerate(paragraphs)
+                    ],
+                },
+                "metadata": {"tipo_atto": doc_type, "anno": year, "ente": "Comune Sintetico"},
+                "created_at": created_at,
+                "updated_at": created_at,
+            }
+
+    @staticmethod
+    def question(index: int) -> str:
+        """Domanda i-esima, distinta per ogni indice (niente hit delle cache tra iterazioni)"""
+        return (
+            f"Quali delibere del comune riguardano {SUBJECTS[index % len(SUBJECTS)]} "
+            f"nel {2020 + index % 5}? (richiesta {index})"
+        )
+
+
+# === Stand-in MongoDB ===
+
+def _clone(value: Any) -> Any:
+    """Copia come una decodifica BSON (liste di scalari copiate in blocco)"""
+    if isinstance(value, dict):
+        return {key: _clone(item) for key, item in value.items()}
+    if isinstance(value, list):
+        if value and isinstance(value[0], (dict, list)):
+            return [_clone(item) for item in value]
+        return list(value)
+    return value
+
+
+def _resolve(doc: Dict[str, Any], path: str) -> List[Any]:
+    """Valori di un campo dotted (gli array di sotto-documenti vengono attraversati)"""
+    values = [doc]
+    for part in path.split("."):
+        next_values = []
+        for value in values:
+            if isinstance(value, dict):
+                if part in value:
+                    next_values.append(value[part])
+            elif isinstance(value, list):
+                next_values.extend(item[part] for item in value if isinstance(item, dict) and part in item)
+        values = next_values
+    return values
+
+
+def _compare(value: Any, op: str, arg: Any) -> bool:
+    try:
+        if op == "$gt":
+            return value > arg
+        if op == "$gte":
+            return value >= arg
+        if op == "$lt":
+            return value < arg
+        return value <= arg
+    except TypeError:
+        return False
+
+
+def _match_condition(values: List[Any], condition: Any) -> bool:
+    # Un array corrisponde se uno dei suoi elementi corrisponde
+    expanded = values + [item for value in values if isinstance(value, list) for item in value]
+
+    if isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition):
+        for op, arg in condition.items():
+            if op == "$exists":
+                if bool(values) != bool(arg):
+                    return False
+            elif op == "$ne":
+                if any(value == arg for value in expanded) or (arg is None and not values):
+                    return False
+            elif op == "$in":
+                if not any(value in arg for value in expanded if not isinstance(value, (dict, list))):
+                    return False
+            elif op == "$nin":
+                if any(value in arg for value in expanded if not isinstance(value, (dict, list))):
+                    return False
+            elif op in ("$gt", "$gte", "$lt", "$lte"):
+                if not any(_compare(value, op, arg) for value in expanded):
+                    return False
+            elif op == "$all":
+                if not all(any(value == item for value in expanded) for item in arg):
+                    return False
+            elif op == "$regex":
+                flags = re.IGNORECASE if "i" in condition.get("$options", "") else 0
+                if not any(isinstance(value, str) and re.search(arg, value, flags) for value in expanded):
+                    return False
+            elif op == "$options":
+                continue
+            else:
+                raise OperationFailure(f"unknown operator: {op}")
+        return True
+
+    if condition is None and not values:
+        return True
+    return any(value == condition for value in expanded)
+
+
+def _matches(doc: Dict[str, Any], filter: Optional[Dict[str, Any]]) -> bool:
+    for key, condition in (filter or {}).items():
+        if key == "$and":
+            if not all(_matches(doc, sub) for sub in condition):
+                return False
+        elif key == "$or":
+            if not any(_matches(doc, sub) for sub in condition):
+                return False
+        elif key == "$text":
+            raise OperationFailure("text index required for $text query", code=27)
+        elif key.startswith("$"):
+            raise OperationFailure(f"unknown top level operator: {key}")
+        elif not _match_condition(_resolve(doc, key), condition):
+            return False
+    return True
+
+
+def _projection_tree(projection: Dict[str, Any]) -> Dict[str, Any]:
+    tree: Dict[str, Any] = {}
+    for path, spec in projection.items():
+        if path == "_id":
+            continue
+        node = tree
+        parts = path.split(".")
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = spec
+    return tree
+
+
+def _project_tree(doc: Dict[str, Any], tree: Dict[str, Any]) -> Dict[str, Any]:
+    out = {}
+    for key, spec in tree.items():
+        if key not in doc:
+            continue
+        value = doc[key]
+        if isinstance(spec, dict) and "$slice" in spec:
+            limit = spec["$slice"]
+            if isinstance(value, list):
+                value = value[:limit] if limit >= 0 else value[limit:]
+            out[key] = _clone(value)
+        elif isinstance(spec, dict):
+            if isinstance(value, dict):
+                out[key] = _project_tree(value, spec)
+            elif isinstance(value, list):
+                out[key] = [_project_tree(item, spec) for item in value if isinstance(item, dict)]
+        elif spec:
+            out[key] = _clone(value)
+    return out
+
+
+def _project(doc: Dict[str, Any], projection: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if not projection:
+        return _clone(doc)
+
+    include_id = projection.get("_id", 1)
+    fields = {key: spec for key, spec in projection.items() if key != "_id"}
+    if fields and all(spec == 0 for spec in fields.values()):
+        # Proiezione di esclusione
+        out = _clone(doc)
+        for path in fields:
+            *parents, leaf = path.split(".")
+            node = out
+            for part in parents:
+                node = node.get(part) if isinstance(node, dict) else None
+            if isinstance(node, dict):
+                node.pop(leaf, None)
+    else:
+        out = _project_tree(doc, _projection_tree(fields))
+        if include_id and "_id" in doc:
+            out = {"_id": doc["_id"], **out}
+    if not include_id:
+        out.pop("_id", None)
+    return out
+
+
+def _set_path(doc: Dict[str, Any], path: str, value: Any):
+    *parents, leaf = path.split(".")
+    for part in parents:
+        doc = doc.setdefault(part, {})
+    doc[leaf] = value
+
+
+def _get_path(doc: Dict[str, Any], path: str, default: Any = None) -> Any:
+    for part in path.split("."):
+        if not isinstance(doc, dict) or part not in doc:
+            return default
+        doc = doc[part]
+    return doc
+
+
+class InMemoryCursor:
+    """Cursore pymongo-like (sort/skip/limit/batch_size)"""
+
+    def __init__(self, docs: List[Dict[str, Any]], projection: Optional[Dict[str, Any]] = None):
+        self._docs = docs
+        self._projection = projection
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, key_or_list, direction: Optional[int] = None) -> "InMemoryCursor":
+        keys = [(key_or_list, direction or 1)] if isinstance(key_or_list, str) else list(key_or_list)
+        for key, order in reversed(keys):
+            present = [doc for doc in self._docs if _get_path(doc, key) is not None]
+            missing = [doc for doc in self._docs if _get_path(doc, key) is None]
+            present.sort(key=lambda doc: _get_path(doc, key), reverse=order < 0)
+            self._docs = missing + present if order > 0 else present + missing
+        return self
+
+    def skip(self, count: int) -> "InMemoryCursor":
+        self._skip = count
+        return self
+
+    def limit(self, count: int) -> "InMemoryCursor":
+        self._limit = count
+        return self
+
+    def batch_size(self, size: int) -> "InMemoryCursor":
+        return self
+
+    def __iter__(self):
+        docs = self._docs[self._skip:]
+        if self._limit:
+            docs = docs[:self._limit]
+        for doc in docs:
+            yield _project(doc, self._projection)
+
+
+class InMemoryCollection:
+    """Collection in memoria con l'API pymongo usata dai servizi"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._docs: Dict[Any, Dict[str, Any]] = {}
+
+    def _candidates(self, filter: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # Lookup per _id come l'indice _id di MongoDB (hydrate_documents)
+        id_condition = (filter or {}).get("_id")
+        if id_condition is not None and len(filter) == 1:
+            ids = id_condition["$in"] if isinstance(id_condition, dict) and "$in" in id_condition else [id_condition]
+            if not isinstance(id_condition, dict) or set(id_condition) == {"$in"}:
+                return [self._docs[doc_id] for doc_id in dict.fromkeys(ids) if doc_id in self._docs]
+        return [doc for doc in self._docs.values() if _matches(doc, filter)]
+
+    def find(self, filter: Optional[Dict[str, Any]] = None, projection: Optional[Dict[str, Any]] = None, **kwargs) -> InMemoryCursor:
+        return InMemoryCursor(self._candidates(filter), projection)
+
+    def find_one(self, filter: Optional[Dict[str, Any]] = None, projection: Optional[Dict[str, Any]] = None, **kwargs) -> Optional[Dict[str, Any]]:
+        return next(iter(self.find(filter, projection).limit(1)), None)
+
+    def count_documents(self, filter: Dict[str, Any], **kwargs) -> int:
+        return len(self._candidates(filter))
+
+    def estimated_document_count(self, **kwargs) -> int:
+        return len(self._docs)
+
+    def distinct(self, key: str, filter: Optional[Dict[str, Any]] = None, **kwargs) -> List[Any]:
+        values = []
+        for doc in self._candidates(filter):
+            for value in _resolve(doc, key):
+                for item in (value if isinstance(value, list) else [value]):
+                    if item not in values:
+                        values.append(item)
+        return values
+
+    def insert_one(self, document: Dict[str, Any], **kwargs) -> InsertOneResult:
+        document.setdefault("_id", ObjectId())
+        if document["_id"] in self._docs:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: _id_")
+        self._docs[document["_id"]] = _clone(document)
+        return InsertOneResult(document["_id"], True)
+
+    def insert_many(self, documents, ordered: bool = True, **kwargs) -> InsertManyResult:
+        inserted_ids = [self.insert_one(document).inserted_id for document in documents]
+        return InsertManyResult(inserted_ids, True)
+
+    def _apply_update(self, doc: Dict[str, Any], update: Dict[str, Any], inserting: bool):
+        for op, fields in update.items():
+            for path, value in fields.items():
+                if op == "$set" or (op == "$setOnInsert" and inserting):
+                    _set_path(doc, path, _clone(value))
+                elif op == "$inc":
+                    _set_path(doc, path, _get_path(doc, path, 0) + value)
+                elif op == "$addToSet":
+                    items = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+                    current = list(_get_path(doc, path, []))
+                    current.extend(item for item in items if item not in current)
+                    _set_path(doc, path, current)
+                elif op == "$unset":
+                    *parents, leaf = path.split(".")
+                    node = _get_path(doc, ".".join(parents)) if parents else doc
+                    if isinstance(node, dict):
+                        node.pop(leaf, None)
+                elif op != "$setOnInsert":
+                    raise OperationFailure(f"Unsupported update operator {op}")
+
+    def _update(self, filter: Dict[str, Any], update: Dict[str, Any], upsert: bool, many: bool) -> UpdateResult:
+        docs = self._candidates(filter)
+        if not many:
+            docs = docs[:1]
+        for doc in docs:
+            self._apply_update(doc, update, inserting=False)
+        if docs or not upsert:
+            return UpdateResult({"n": len(docs), "nModified": len(docs)}, True)
+
+        document = {key: value for key, value in filter.items() if not key.startswith("$") and not isinstance(value, dict)}
+        self._apply_update(document, update, inserting=True)
+        inserted_id = self.insert_one(document).inserted_id
+        return UpdateResult({"n": 1, "nModified": 0, "upserted": inserted_id}, True)
+
+    def update_one(self, filter: Dict[str, Any], update: Dict[str, Any], upsert: bool = False, **kwargs) -> UpdateResult:
+        return self._update(filter, update, upsert, many=False)
+
+    def update_many(self, filter: Dict[str, Any], update: Dict[str, Any], upsert: bool = False, **kwargs) -> UpdateResult:
+        return self._update(filter, update, upsert, many=True)
+
+    def bulk_write(self, requests, ordered: bool = True, **kwargs) -> BulkWriteResult:
+        # Solo UpdateOne (il sottoinsieme usato da MongoDBService.bulk_upsert)
+        counts = {"nMatched": 0, "nModified": 0, "nUpserted": 0, "nInserted": 0, "nRemoved": 0, "upserted": []}
+        for index, request in enumerate(requests):
+            if not isinstance(request, UpdateOne):
+                raise OperationFailure(f"Unsupported bulk operation {type(request).__name__}")
+            result = self._update(request._filter, request._doc, request._upsert, many=False)
+            if result.upserted_id is not None:
+                counts["nUpserted"] += 1
+                counts["upserted"].append({"index": index, "_id": result.upserted_id})
+            else:
+                counts["nMatched"] += result.matched_count
+                counts["nModified"] += result.modified_count
+        return BulkWriteResult(counts, True)
+
+    def delete_many(self, filter: Dict[str, Any], **kwargs) -> DeleteResult:
+        docs = self._candidates(filter)
+        for doc in docs:
+            del self._docs[doc["_id"]]
+        return DeleteResult({"n": len(docs)}, True)
+
+    def aggregate(self, pipeline: List[Dict[str, Any]], **kwargs) -> Iterator[Dict[str, Any]]:
+        docs = list(self._docs.values())
+        for stage in pipeline:
+            (op, arg), = stage.items()
+            if op == "$vectorSearch":
+                # Come MongoDB Community: lo stage esiste solo su Atlas
+                raise OperationFailure("$vectorSearch stage is only allowed on MongoDB Atlas", code=6047401)
+            if op == "$match":
+                docs = [doc for doc in docs if _matches(doc, arg)]
+            elif op == "$sort":
+                docs = list(InMemoryCursor(docs).sort(list(arg.items()))._docs)
+            elif op == "$skip":
+                docs = docs[arg:]
+            elif op == "$limit":
+                docs = docs[:arg]
+            elif op == "$project":
+                docs = [_project(doc, {k: v for k, v in arg.items() if not isinstance(v, dict) or "$slice" in v}) for doc in docs]
+            elif op == "$count":
+                docs = [{arg: len(docs)}]
+            else:
+                raise OperationFailure(f"Unsupported aggregation stage {op} in benchmark stand-in")
+        return iter([_clone(doc) for doc in docs])
+
+    def create_index(self, keys, **kwargs) -> str:
+        return kwargs.get("name") or "_".join(str(key) for key in (keys if isinstance(keys, list) else [keys]))
+
+    def create_indexes(self, indexes, **kwargs) -> List[str]:
+        return [str(index) for index in indexes]
+
+    def drop(self):
+        self._docs.clear()
+
+
+class InMemoryDatabase:
+    def __init__(self, name: str):
+        self.name = name
+        self._collections: Dict[str, InMemoryCollection] = {}
+
+    def __getitem__(self, name: str) -> InMemoryCollection:
+        if name not in self._collections:
+            self._collections[name] = InMemoryCollection(name)
+        return self._collections[name]
+
+    def get_collection(self, name: str, **kwargs) -> InMemoryCollection:
+        return self[name]
+
+    def list_collection_names(self) -> List[str]:
+        return list(self._collections)
+
+    def drop_collection(self, name: str):
+        self._collections.pop(name, None)
+
+    def command(self, command: str, *args, **kwargs) -> Dict[str, Any]:
+        return {"ok": 1.0}
+
+
+class InMemoryClient:
+    """Stand-in di MongoClient (un processo, nessun I/O)"""
+
+    def __init__(self):
+        self._databases: Dict[str, InMemoryDatabase] = {}
+        self.admin = InMemoryDatabase("admin")
+
+    def __getitem__(self, name: str) -> InMemoryDatabase:
+        if name not in self._databases:
+            self._databases[name] = InMemoryDatabase(name)
+        return self._databases[name]
+
+    def get_database(self, name: str, **kwargs) -> InMemoryDatabase:
+        return self[name]
+
+    def drop_database(self, name: str):
+        self._databases.pop(name, None)
+
+    def close(self):
+        pass
+
+
+# === Adapter AI stub ===
+
+class StubEmbeddingAdapter(BaseEmbeddingAdapter):
+    """Embedding deterministici dal corpus sintetico, con latenza simulata"""
+
+    def __init__(self, corpus: SyntheticCorpus, latency_ms: float = 0.0):
+        self.corpus = corpus
+        self.latency_ms = latency_ms
+        self.model = "stub-embedding"
+        self.calls = 0
+
+    def _result(self, text: str) -> Dict[str, Any]:
+        return {
+            "embedding": self.corpus.embed_text(text),
+            "dimensions": self.corpus.dimensions,
+            "model": self.model,
+            "tokens": len(text.split()),
+        }
+
+    async def embed(self, text: str, **options) -> Dict[str, Any]:
+        self.calls += 1
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        return self._result(text)
+
+    async def embed_batch(self, texts: List[str], **options) -> List[Dict[str, Any]]:
+        # Una sola richiesta upstream per il batch
+        self.calls += 1
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        return [self._result(text) for text in texts]
+
+
+class StubChatAdapter(BaseChatAdapter):
+    """Risposta fissa (STUB_CHAT_RESPONSE) con latenza simulata"""
+
+    def __init__(self, latency_ms: float = 0.0, content: str = STUB_CHAT_RESPONSE):
+        self.latency_ms = latency_ms
+        self.content = content
+        self.model = "stub-chat"
+        self.calls = 0
+
+    async def generate(self, messages: List[Dict[str, str]], **options) -> Dict[str, Any]:
+        self.calls += 1
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        prompt_tokens = sum(len(str(message.get("content", "")).split()) for message in messages)
+        return {
+            "content": self.content,
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(self.content.split()),
+                "total_tokens": prompt_tokens + len(self.content.split()),
+            },
+            "model": self.model,
+            "finish_reason": "stop",
+        }
+
+
+# === Ambiente ===
+
+def load_corpus(collection: Any, corpus: SyntheticCorpus, tenant_id: int, batch_size: int = 500) -> int:
+    """Inserisce il corpus nella collection (a blocchi); ritorna i documenti inseriti"""
+    inserted = 0
+    batch = []
+    for document in corpus.iter_documents(tenant_id):
+        batch.append(document)
+        if len(batch) >= batch_size:
+            inserted += len(collection.insert_many(batch).inserted_ids)
+            batch = []
+    if batch:
+        inserted += len(collection.insert_many(batch).inserted_ids)
+    return inserted
+
+
+@contextmanager
+def bench_environment(
+    corpus: SyntheticCorpus,
+    tenant_id: int = 1,
+    embedding_latency_ms: float = 0.0,
+    llm_latency_ms: float = 0.0,
+    client: Optional[Any] = None,
+    database: str = BENCH_DATABASE
+):
+    """
+    Servizi collegati al corpus sintetico e agli adapter stub
+
+    Args:
+        corpus: Corpus da caricare nella collection "documents"
+        tenant_id: Tenant dei documenti
+        embedding_latency_ms: Latenza simulata per richiesta di embedding
+        llm_latency_ms: Latenza simulata per generate()
+        client: MongoClient reale (database `database` svuotato all'uscita);
+            default InMemoryClient
+
+    Yields:
+        SimpleNamespace(corpus, tenant_id, collection, embedding, chat)
+    """
+    client = client or InMemoryClient()
+    db = client[database]
+    db.drop_collection("documents")
+    db.drop_collection("corpus_versions")
+    load_corpus(db["documents"], corpus, tenant_id)
+
+    embedding_adapter = StubEmbeddingAdapter(corpus, embedding_latency_ms)
+    chat_adapter = StubChatAdapter(llm_latency_ms)
+    saved_connection = (MongoDBService._client, MongoDBService._db, MongoDBService._connected)
+    saved_store_dir = EmbeddingStore.base_dir
+    saved_pipeline = pipeline._pipeline_instance
+
+    with tempfile.TemporaryDirectory(prefix="natan_bench_") as store_dir, ExitStack() as stack:
+        MongoDBService._client, MongoDBService._db, MongoDBService._connected = client, db, True
+        stack.enter_context(patch.object(MongoDBService, "is_connected", return_value=True))
+        stack.enter_context(patch.object(AIRouter, "get_embedding_adapter", lambda self, context: embedding_adapter))
+        stack.enter_context(patch.object(AIRouter, "get_chat_adapter", lambda self, context: chat_adapter))
+        # Ogni iterazione deve eseguire la pipeline, non leggere la cache semantica
+        stack.enter_context(patch.object(pipeline, "ANSWER_CACHE_ENABLED", False))
+        EmbeddingStore.reset(Path(store_dir))
+        VectorIndexRegistry.invalidate()
+        LexicalIndexRegistry.invalidate()
+        CorpusVersion.reset()
+        pipeline._pipeline_instance = None
+        try:
+            yield SimpleNamespace(
+                corpus=corpus,
+                tenant_id=tenant_id,
+                collection=db["documents"],
+                embedding=embedding_adapter,
+                chat=chat_adapter,
+            )
+        finally:
+            MongoDBService._client, MongoDBService._db, MongoDBService._connected = saved_connection
+            EmbeddingStore.reset(saved_store_dir)
+            VectorIndexRegistry.invalidate()
+            LexicalIndexRegistry.invalidate()
+            CorpusVersion.reset()
+            pipeline._pipeline_instance = saved_pipeline
+            db.drop_collection("documents")
+            db.drop_collection("corpus_versions")
@@ -0,0 +1,306 @@
+"""
+Benchmark Suite - hot path di retrieval e pipeline per dimensione del corpus
+
+Per ogni benchmark: latenza p50/p95, prima chiamata a freddo (build indice,
+popolamento EmbeddingStore), throughput sequenziale e memoria di picco di una
+chiamata a regime (tracemalloc, misurata a parte per non falsare i tempi).
+
+Il report JSON (--output) può essere usato come baseline di un run successivo
+(--baseline): una p95 o una memoria di picco oltre la tolleranza è una
+regressione e il comando termina con exit code 1 (gate prima del deploy).
+
+Uso:
+    python -m tests.benchmarks.suite --sizes 100,500,1000 --output bench.json
+    python -m tests.benchmarks.suite --baseline bench.json --llm-latency-ms 50
+    python -m tests.benchmarks.suite --mongo-uri mongodb://localhost:27017
+"""
+
+import argparse
+import asyncio
+import inspect
+import json
+import logging
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.services.pa_act_mongodb_importer import PAActMongoDBImporter
+from app.services.question_classifier import QuestionClassifier
+from app.services.rag_fortress import pipeline
+from app.services.rag_fortress.retriever import HybridRetriever
+from app.services.retriever_service import RetrieverService
+from tests.benchmarks.harness import SyntheticCorpus, bench_environment
+
+DEFAULT_SIZES = (100, 500, 1000)
+DEFAULT_ITERATIONS = 20
+DEFAULT_TOP_K = 100
+REGRESSION_TOLERANCE = 0.25
+# Sotto queste soglie le differenze sono rumore di misura
+REGRESSION_MIN_DELTA_MS = 1.0
+REGRESSION_MIN_DELTA_KB = 256
+
+
+class Benchmark:
+    """
+    Un hot path da misurare
+
+    setup(env) riceve l'ambiente di bench_environment() e restituisce la
+    funzione da cronometrare, chiamata con l'indice dell'iterazione
+    (sincrona o coroutine).
+    """
+
+    def __init__(self, name: str, setup: Callable[[Any], Callable[[int], Any]], per_corpus: bool = True):
+        self.name = name
+        self.setup = setup
+        # False: non dipende dal corpus, misurato una sola volta
+        self.per_corpus = per_corpus
+
+
+def _query_embeddings(env, count: int = 64) -> List[List[float]]:
+    return [env.corpus.embed_text(env.corpus.question(i)) for i in range(count)]
+
+
+def _retriever_service(env):
+    retriever = RetrieverService()
+    queries = _query_embeddings(env)
+    return lambda i: retriever.retrieve(queries[i % len(queries)], env.tenant_id, limit=DEFAULT_TOP_K)
+
+
+def _retrieve_evidence(env):
+    retriever = HybridRetriever()
+    return lambda i: retriever.retrieve_evidence(env.corpus.question(i), env.tenant_id, top_k=DEFAULT_TOP_K)
+
+
+def _fallback_vector_search(env):
+    retriever = HybridRetriever()
+    queries = _query_embeddings(env)
+    return lambda i: retriever._fallback_manual_vector_search(queries[i % len(queries)], env.tenant_id, DEFAULT_TOP_K)
+
+
+def _classify(env):
+    return lambda i: QuestionClassifier.classify(env.corpus.question(i), env.tenant_id)
+
+
+def _split_text_into_chunks(env):
+    importer = PAActMongoDBImporter(tenant_id=env.tenant_id, dry_run=True)
+    text = env.corpus.long_text()
+    return lambda i: importer.split_text_into_chunks(text)
+
+
+def _rag_fortress(env):
+    return lambda i: pipeline.rag_fortress(env.corpus.question(i), env.tenant_id)
+
+
+BENCHMARKS = [
+    Benchmark("retriever_service.retrieve", _retriever_service),
+    Benchmark("hybrid_retriever.retrieve_evidence", _retrieve_evidence),
+    Benchmark("hybrid_retriever.fallback_vector_search", _fallback_vector_search),
+    Benchmark("question_classifier.classify", _classify, per_corpus=False),
+    Benchmark("importer.split_text_into_chunks", _split_text_into_chunks, per_corpus=False),
+    Benchmark("rag_fortress.end_to_end", _rag_fortress),
+]
+
+
+async def _call(fn: Callable[[int], Any], index: int) -> Any:
+    result = fn(index)
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+async def measure(fn: Callable[[int], Any], iterations: int = DEFAULT_ITERATIONS) -> Dict[str, float]:
+    """
+    Cronometra fn
+
+    Returns:
+        cold_ms (prima chiamata), p50_ms, p95_ms, mean_ms, max_ms,
+        ops_per_s (sequenziale), peak_kb (tracemalloc, una chiamata a regime)
+    """
+    start = time.perf_counter()
+    await _call(fn, 0)
+    cold_ms = (time.perf_counter() - start) * 1000
+
+    timings = []
+    loop_start = time.perf_counter()
+    for index in range(1, iterations + 1):
+        start = time.perf_counter()
+        await _call(fn, index)
+        timings.append((time.perf_counter() - start) * 1000)
+    elapsed = time.perf_counter() - loop_start
+
+    tracemalloc.start()
+    try:
+        await _call(fn, iterations + 1)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "iterations": iterations,
+        "cold_ms": round(cold_ms, 3),
+        "p50_ms": round(float(np.percentile(timings, 50)), 3),
+        "p95_ms": round(float(np.percentile(timings, 95)), 3),
+        "mean_ms": round(float(np.mean(timings)), 3),
+        "max_ms": round(float(np.max(timings)), 3),
+        "ops_per_s": round(iterations / elapsed, 2) if elapsed > 0 else 0.0,
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def run_suite(
+    sizes: Sequence[int] = DEFAULT_SIZES,
+    iterations: int = DEFAULT_ITERATIONS,
+    chunks_per_document: int = 4,
+    dimensions: int = 1536,
+    embedding_latency_ms: float = 0.0,
+    llm_latency_ms: float = 0.0,
+    benchmarks: Optional[Sequence[str]] = None,
+    client: Optional[Any] = None
+) -> Dict[str, Any]:
+    """
+    Esegue i benchmark selezionati su un corpus sintetico per ogni dimensione
+
+    Returns:
+        Report {"meta": {...}, "results": [{"benchmark", "corpus_documents", "vectors", ...misure}]}
+    """
+    selected = [bench for bench in BENCHMARKS if not benchmarks or bench.name in benchmarks]
+    unknown = set(benchmarks or ()) - {bench.name for bench in BENCHMARKS}
+    if unknown:
+        raise ValueError(f"Benchmark sconosciuti: {', '.join(sorted(unknown))}")
+
+    results = []
+    for position, size in enumerate(sizes):
+        corpus = SyntheticCorpus(size, chunks_per_document=chunks_per_document, dimensions=dimensions)
+        with bench_environment(
+            corpus,
+            embedding_latency_ms=embedding_latency_ms,
+            llm_latency_ms=llm_latency_ms,
+            client=client
+        ) as env:
+            for bench in selected:
+                if not bench.per_corpus and position > 0:
+                    continue
+                stats = asyncio.run(measure(bench.setup(env), iterations))
+                results.append({
+                    "benchmark": bench.name,
+                    "corpus_documents": size if bench.per_corpus else None,
+                    "vectors": corpus.vector_count if bench.per_corpus else None,
+                    **stats,
+                })
+
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "dimensions": dimensions,
+            "chunks_per_document": chunks_per_document,
+            "embedding_latency_ms": embedding_latency_ms,
+            "llm_latency_ms": llm_latency_ms,
+            "mongo": "external" if client is not None else "in-memory",
+        },
+        "results": results,
+    }
+
+
+def compare(
+    report: Dict[str, Any],
+    baseline: Dict[str, Any],
+    tolerance: float = REGRESSION_TOLERANCE
+) -> List[str]:
+    """
+    Regressioni rispetto alla baseline (p95 o memoria di picco oltre la tolleranza)
+
+    Benchmark o dimensioni assenti dalla baseline non vengono confrontati.
+    """
+    previous = {(r["benchmark"], r["corpus_documents"]): r for r in baseline.get("results", [])}
+    regressions = []
+    for result in report.get("results", []):
+        base = previous.get((result["benchmark"], result["corpus_documents"]))
+        if base is None:
+            continue
+        label = result["benchmark"] + (f" @ {result['corpus_documents']} docs" if result["corpus_documents"] else "")
+        for metric, min_delta, unit in (("p95_ms", REGRESSION_MIN_DELTA_MS, "ms"), ("peak_kb", REGRESSION_MIN_DELTA_KB, "KB")):
+            current, before = result[metric], base.get(metric)
+            if before is None:
+                continue
+            if current > before * (1 + tolerance) and current - before > min_delta:
+                regressions.append(f"{label}: {metric} {before}{unit} → {current}{unit} (+{(current / before - 1) * 100 if before else float('inf'):.0f}%)")
+    return regressions
+
+
+def format_table(report: Dict[str, Any]) -> str:
+    """Tabella testuale del report"""
+    header = f"{'benchmark':<42} {'docs':>6} {'vectors':>8} {'cold ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'ops/s':>9} {'peak KB':>9}"
+    lines = [header, "-" * len(header)]
+    for r in report["results"]:
+        lines.append(
+            f"{r['benchmark']:<42} {r['corpus_documents'] or '-':>6} {r['vectors'] or '-':>8} "
+            f"{r['cold_ms']:>9.2f} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['ops_per_s']:>9.1f} {r['peak_kb']:>9.1f}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="NATAN_LOC benchmark suite (retrieval e pipeline)")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES),
+                        help="Documenti per tenant sintetico, separati da virgola")
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS)
+    parser.add_argument("--chunks", type=int, default=4, help="Chunk per documento")
+    parser.add_argument("--dimensions", type=int, default=1536, help="Dimensione embedding")
+    parser.add_argument("--embedding-latency-ms", type=float, default=0.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0)
+    parser.add_argument("--benchmarks", default="", help="Sottoinsieme di benchmark (nomi separati da virgola)")
+    parser.add_argument("--mongo-uri", default=None, help="MongoDB reale (default: stand-in in-memory)")
+    parser.add_argument("--output", default=None, help="Salva il report JSON")
+    parser.add_argument("--baseline", default=None, help="Report JSON di riferimento per le regressioni")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE)
+    parser.add_argument("--verbose", action="store_true", help="Mantieni i log dei servizi")
+    args = parser.parse_args(argv)
+
+    if not args.verbose:
+        # Il fallback senza $vectorSearch è il percorso atteso: i suoi warning sono rumore
+        logging.disable(logging.WARNING)
+
+    client = None
+    if args.mongo_uri:
+        from pymongo import MongoClient
+        client = MongoClient(args.mongo_uri)
+
+    report = run_suite(
+        sizes=[int(size) for size in args.sizes.split(",") if size.strip()],
+        iterations=args.iterations,
+        chunks_per_document=args.chunks,
+        dimensions=args.dimensions,
+        embedding_latency_ms=args.embedding_latency_ms,
+        llm_latency_ms=args.llm_latency_ms,
+        benchmarks=[name.strip() for name in args.benchmarks.split(",") if name.strip()],
+        client=client
+    )
+    print(format_table(report))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n📄 Report salvato in {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regressioni (tolleranza {args.tolerance:.0%}):")
+            for regression in regressions:
+                print(f"  - {regression}")
+            return 1
+        print(f"\n✅ Nessuna regressione rispetto a {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
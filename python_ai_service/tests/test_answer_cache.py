@@ -0,0 +1,168 @@
+"""
+Unit Tests for SemanticAnswerCache and CorpusVersion
+"""
+
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.services import answer_cache
+from app.services.answer_cache import SemanticAnswerCache, is_cacheable, uses_user_memories
+from app.services.corpus_version import GLOBAL_KEY, CorpusVersion
+
+
+def _result(answer="Il bilancio 2024 è stato approvato.", document_id="doc_1"):
+    return {
+        "answer": answer,
+        "sources": [{"document_id": document_id, "title": "Delibera 12/2024"}],
+        "urs_score": 92,
+    }
+
+
+@pytest.fixture(autouse=True)
+def _reset():
+    SemanticAnswerCache.reset()
+    CorpusVersion.reset()
+    yield
+    SemanticAnswerCache.reset()
+    CorpusVersion.reset()
+
+
+class TestSemanticAnswerCache:
+    """Test suite for SemanticAnswerCache"""
+
+    def test_hit_on_near_identical_embedding(self):
+        SemanticAnswerCache.store(1, "strict", None, [1.0, 0.0, 0.0], "0.0", _result())
+
+        cached = SemanticAnswerCache.lookup(1, "strict", None, [0.999, 0.01, 0.0], "0.0")
+
+        assert cached["answer"] == "Il bilancio 2024 è stato approvato."
+        assert cached["answer_cache"]["hit"] is True
+        assert cached["answer_cache"]["similarity"] >= 0.97
+
+    def test_miss_below_threshold(self):
+        SemanticAnswerCache.store(1, "strict", None, [1.0, 0.0, 0.0], "0.0", _result())
+
+        assert SemanticAnswerCache.lookup(1, "strict", None, [0.7, 0.7, 0.0], "0.0") is None
+        assert SemanticAnswerCache.get_stats()["misses"] == 1
+
+    def test_tenant_and_mode_are_isolated(self):
+        SemanticAnswerCache.store(1, "strict", None, [1.0, 0.0], "0.0", _result())
+
+        assert SemanticAnswerCache.lookup(2, "strict", None, [1.0, 0.0], "0.0") is None
+        assert SemanticAnswerCache.lookup(1, "generative", None, [1.0, 0.0], "0.0") is None
+        # Tenant id int/str normalizzato
+        assert SemanticAnswerCache.lookup("1", "strict", None, [1.0, 0.0], "0.0") is not None
+
+    def test_corpus_version_change_invalidates(self):
+        SemanticAnswerCache.store(1, "strict", None, [1.0, 0.0], "0.0", _result())
+
+        assert SemanticAnswerCache.lookup(1, "strict", None, [1.0, 0.0], "1.0") is None
+        stats = SemanticAnswerCache.get_stats()
+        assert stats["stale"] == 1
+        assert stats["size"] == 0
+
+    def test_user_memory_answers_are_scoped_to_user(self):
+        SemanticAnswerCache.store(1, "strict", 7, [1.0, 0.0], "0.0", _result(document_id="user_memory_42"))
+
+        assert SemanticAnswerCache.lookup(1, "strict", 8, [1.0, 0.0], "0.0") is None
+        assert SemanticAnswerCache.lookup(1, "strict", 7, [1.0, 0.0], "0.0") is not None
+
+    def test_error_and_sourceless_results_not_stored(self):
+        assert not SemanticAnswerCache.store(1, "strict", None, [1.0, 0.0], "0.0", {"answer": "x", "sources": []})
+        assert not SemanticAnswerCache.store(
+            1, "strict", None, [1.0, 0.0], "0.0", {**_result(), "error_type": "rate_limit"}
+        )
+        assert SemanticAnswerCache.get_stats()["size"] == 0
+
+    def test_eviction_keeps_most_used(self):
+        with patch.object(answer_cache, "ANSWER_CACHE_MAX_PER_TENANT", 2):
+            SemanticAnswerCache.store(1, "strict", None, [1.0, 0.0, 0.0], "0.0", _result("a"))
+            SemanticAnswerCache.store(1, "strict", None, [0.0, 1.0, 0.0], "0.0", _result("b"))
+            SemanticAnswerCache.lookup(1, "strict", None, [1.0, 0.0, 0.0], "0.0")
+            SemanticAnswerCache.store(1, "strict", None, [0.0, 0.0, 1.0], "0.0", _result("c"))
+
+        assert SemanticAnswerCache.lookup(1, "strict", None, [1.0, 0.0, 0.0], "0.0")["answer"] == "a"
+        assert SemanticAnswerCache.lookup(1, "strict", None, [0.0, 1.0, 0.0], "0.0") is None
+        assert SemanticAnswerCache.get_stats()["evictions"] == 1
+
+    def test_helpers(self):
+        assert uses_user_memories(_result(document_id="user_memory_1"))
+        assert not uses_user_memories(_result())
+        assert is_cacheable(_result())
+        assert not is_cacheable({"answer": "", "sources": [{"document_id": "d"}]})
+
+
+class TestCorpusVersion:
+    """Test suite for CorpusVersion"""
+
+    def test_get_combines_tenant_and_global(self):
+        collection = MagicMock()
+        collection.find.return_value = [{"_id": 1, "version": 3}, {"_id": GLOBAL_KEY, "version": 2}]
+
+        with patch.object(CorpusVersion, "_collection", return_value=collection):
+            assert CorpusVersion.get("1") == "3.2"
+            # Seconda lettura servita dalla cache locale
+            CorpusVersion.get(1)
+        assert collection.find.call_count == 1
+
+    def test_bump_increments_and_clears_cache(self):
+        collection = MagicMock()
+        collection.find.return_value = []
+
+        with patch.object(CorpusVersion, "_collection", return_value=collection):
+            CorpusVersion.get(1)
+            CorpusVersion.bump_for_filter({"tenant_id": 1, "document_id": "x"})
+            CorpusVersion.get(1)
+
+        filter_, update = collection.update_one.call_args[0]
+        assert filter_ == {"_id": 1}
+        assert update["$inc"] == {"version": 1}
+        assert collection.find.call_count == 2
+
+    def test_bump_without_tenant_is_global(self):
+        collection = MagicMock()
+        with patch.object(CorpusVersion, "_collection", return_value=collection):
+            CorpusVersion.bump_for_filter({"document_id": "x"})
+        assert collection.update_one.call_args[0][0] == {"_id": GLOBAL_KEY}
+
+    def test_mongodb_unavailable_is_version_zero(self):
+        with patch.object(CorpusVersion, "_collection", return_value=None):
+            assert CorpusVersion.get(1) == "0.0"
+            CorpusVersion.bump(1)
+
+
+class TestRagFortressWrapper:
+    """Test suite for the cached rag_fortress() entry point"""
+
+    def _pipeline(self):
+        instance = MagicMock()
+        instance.retriever._generate_embedding = AsyncMock(return_value=[1.0, 0.0])
+        instance.rag_fortress = AsyncMock(return_value=_result())
+        return instance
+
+    def test_second_identical_question_skips_pipeline(self):
+        from app.services.rag_fortress import pipeline
+
+        instance = self._pipeline()
+        with patch.object(pipeline, "_pipeline_instance", instance), \
+             patch.object(CorpusVersion, "aget", AsyncMock(return_value="0.0")):
+            first = asyncio.run(pipeline.rag_fortress("Bilancio 2024?", 1, messages=[{"role": "user", "content": "x"}]))
+            second = asyncio.run(pipeline.rag_fortress("Bilancio 2024?", 1))
+
+        assert instance.rag_fortress.await_count == 1
+        assert "answer_cache" not in first
+        assert second["answer_cache"]["hit"] is True
+
+    def test_conversation_history_bypasses_cache(self):
+        from app.services.rag_fortress import pipeline
+
+        instance = self._pipeline()
+        history = [{"role": "user", "content": "a"}, {"role": "assistant", "content": "b"}, {"role": "user", "content": "c"}]
+        with patch.object(pipeline, "_pipeline_instance", instance), \
+             patch.object(CorpusVersion, "aget", AsyncMock(return_value="0.0")):
+            asyncio.run(pipeline.rag_fortress("Bilancio 2024?", 1, messages=history))
+            asyncio.run(pipeline.rag_fortress("Bilancio 2024?", 1, messages=history))
+
+        assert instance.rag_fortress.await_count == 2
+        instance.retriever._generate_embedding.assert_not_awaited()
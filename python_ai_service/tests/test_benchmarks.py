@@ -0,0 +1,113 @@
+"""
+Unit Tests for the benchmark harness (tests/benchmarks)
+"""
+
+import asyncio
+import pytest
+from pymongo.errors import OperationFailure
+
+from app.services.mongodb_service import MongoDBService
+from app.services.rag_fortress.retriever import HybridRetriever
+from tests.benchmarks.harness import InMemoryClient, SyntheticCorpus, bench_environment
+from tests.benchmarks.suite import BENCHMARKS, compare, format_table, run_suite
+
+
+class TestInMemoryCollection:
+    """Test suite for the MongoDB stand-in"""
+
+    @pytest.fixture
+    def collection(self):
+        collection = InMemoryClient()["bench"]["documents"]
+        collection.insert_many([
+            {"_id": 1, "tenant_id": 1, "embedding": [0.1, 0.2], "content": {"full_text": "a", "chunks": [{"chunk_text": "x", "embedding": [1]}, {"chunk_text": "y"}]}},
+            {"_id": 2, "tenant_id": 1, "embedding": None, "content": {"full_text": "b"}},
+            {"_id": 3, "tenant_id": 2, "content": {"full_text": "c"}},
+        ])
+        return collection
+
+    def test_filters(self, collection):
+        assert collection.count_documents({"tenant_id": 1}) == 2
+        assert collection.count_documents({"embedding": {"$exists": True, "$ne": None}}) == 1
+        assert collection.count_documents({"content.chunks.embedding": {"$exists": True}}) == 1
+        assert [doc["_id"] for doc in collection.find({"_id": {"$in": [3, 1, 9]}})] == [3, 1]
+
+    def test_projection(self, collection):
+        doc = collection.find_one({"_id": 1}, {"content.full_text": 1, "content.chunks": {"$slice": 1}})
+        assert doc == {"_id": 1, "content": {"full_text": "a", "chunks": [{"chunk_text": "x", "embedding": [1]}]}}
+
+        doc = collection.find_one({"_id": 1}, {"_id": 0, "content.chunks.chunk_text": 1})
+        assert doc == {"content": {"chunks": [{"chunk_text": "x"}, {"chunk_text": "y"}]}}
+
+    def test_results_are_copies(self, collection):
+        collection.find_one({"_id": 1})["content"]["full_text"] = "modificato"
+        assert collection.find_one({"_id": 1})["content"]["full_text"] == "a"
+
+    def test_upsert_and_inc(self, collection):
+        collection.update_one({"_id": "t1"}, {"$inc": {"version": 1}}, upsert=True)
+        collection.update_one({"_id": "t1"}, {"$inc": {"version": 1}}, upsert=True)
+        assert collection.find_one({"_id": "t1"})["version"] == 2
+
+    def test_atlas_only_stages_rejected(self, collection):
+        with pytest.raises(OperationFailure):
+            list(collection.aggregate([{"$vectorSearch": {"queryVector": [0.1]}}]))
+        with pytest.raises(OperationFailure):
+            collection.find({"$text": {"$search": "delibera"}})
+
+
+class TestBenchEnvironment:
+    """Test suite for bench_environment"""
+
+    def test_retriever_runs_on_synthetic_corpus(self):
+        corpus = SyntheticCorpus(30, chunks_per_document=2, dimensions=32)
+
+        with bench_environment(corpus, tenant_id=7) as env:
+            evidences = asyncio.run(HybridRetriever().retrieve_evidence(corpus.question(3), 7))
+
+        assert evidences
+        assert all(ev["document_id"].startswith("pa_act_bench_7_") for ev in evidences)
+        assert env.embedding.calls == 1
+
+    def test_state_restored(self):
+        saved = (MongoDBService._client, MongoDBService._db)
+
+        with bench_environment(SyntheticCorpus(5, dimensions=16)):
+            assert isinstance(MongoDBService._client, InMemoryClient)
+
+        assert (MongoDBService._client, MongoDBService._db) == saved
+
+
+class TestSuite:
+    """Test suite for run_suite and regression detection"""
+
+    def test_all_benchmarks_run(self):
+        report = run_suite(sizes=[10, 20], iterations=2, chunks_per_document=2, dimensions=32)
+
+        rows = {(r["benchmark"], r["corpus_documents"]) for r in report["results"]}
+        per_corpus = [bench.name for bench in BENCHMARKS if bench.per_corpus]
+        assert {(name, size) for name in per_corpus for size in (10, 20)} <= rows
+        assert ("importer.split_text_into_chunks", None) in rows
+        for result in report["results"]:
+            assert 0 < result["p50_ms"] <= result["p95_ms"]
+            assert result["ops_per_s"] > 0
+        assert "rag_fortress.end_to_end" in format_table(report)
+
+    def test_unknown_benchmark(self):
+        with pytest.raises(ValueError):
+            run_suite(sizes=[5], benchmarks=["nope"])
+
+    def test_compare_flags_regressions(self):
+        baseline = {"results": [
+            {"benchmark": "retrieve", "corpus_documents": 100, "p95_ms": 10.0, "peak_kb": 1000},
+            {"benchmark": "classify", "corpus_documents": None, "p95_ms": 0.1, "peak_kb": 2},
+        ]}
+        report = {"results": [
+            {"benchmark": "retrieve", "corpus_documents": 100, "p95_ms": 20.0, "peak_kb": 1100},
+            # +100% ma sotto la soglia di rumore (1 ms)
+            {"benchmark": "classify", "corpus_documents": None, "p95_ms": 0.2, "peak_kb": 2},
+            {"benchmark": "new", "corpus_documents": 100, "p95_ms": 99.0, "peak_kb": 1},
+        ]}
+
+        regressions = compare(report, baseline, tolerance=0.25)
+
+        assert len(regressions) == 1
+        assert regressions[0].startswith("retrieve @ 100 docs: p95_ms")
@@ -0,0 +1,333 @@
+"""
+Unit Tests for the bulk import pipeline (BulkActImporter) and MongoDBService.bulk_upsert
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import httpx
+import pytest
+from pymongo.errors import BulkWriteError
+
+from app.services.ai_router import AIRouter
+from app.services import bulk_importer
+from app.services.bulk_importer import BulkActImporter, ImportJob, atto_from_scanner_dict
+from app.services.corpus_version import CorpusVersion
+from app.services.embedding_store import EmbeddingStore
+from app.services.mongodb_async import AsyncMongoDBService
+from app.services.mongodb_service import MongoDBService
+from app.services.pdf_extraction import PDFTextCache
+from app.services.providers.base import BaseEmbeddingAdapter
+from app.services.vector_index import VectorIndexRegistry
+from tests.benchmarks.harness import InMemoryClient
+
+
+class FakeEmbeddingAdapter(BaseEmbeddingAdapter):
+    model = "fake"
+
+    def __init__(self):
+        self.batches = []
+
+    async def embed(self, text, **options):
+        return (await self.embed_batch([text]))[0]
+
+    async def embed_batch(self, texts, **options):
+        self.batches.append(list(texts))
+        return [{"embedding": [float(len(t)), 1.0], "dimensions": 2, "model": "fake", "tokens": 3} for t in texts]
+
+
+def _act_text(numero: int) -> str:
+    paragraphs = [f"Paragrafo {i} della determinazione {numero}: " + "affidamento servizio manutenzione " * 12 for i in range(8)]
+    return "\n\n".join(paragraphs)
+
+
+def _read_pages(pdf_path):
+    # Nei test i "PDF" sono file di testo (una pagina)
+    with open(pdf_path, encoding="utf-8") as f:
+        yield f.read()
+
+
+def _items(tmp_path, count: int, start: int = 1):
+    items = []
+    for numero in range(start, start + count):
+        path = tmp_path / f"atto_{numero}.pdf"
+        path.write_text(_act_text(numero), encoding="utf-8")
+        items.append({
+            "atto_data": {
+                "numero_atto": f"{numero}/2024",
+                "tipo_atto": "determina",
+                "oggetto": f"Affidamento servizio manutenzione lotto {numero}",
+                "data_atto": "2024-03-01",
+                "anno": 2024,
+                "scraper_type": "test",
+            },
+            "pdf_path": str(path),
+        })
+    return items
+
+
+@pytest.fixture
+def env(tmp_path):
+    client = InMemoryClient()
+    db = client["bulk_import_test"]
+    adapter = FakeEmbeddingAdapter()
+    saved_connection = (MongoDBService._client, MongoDBService._db, MongoDBService._connected)
+    saved_store_dir = EmbeddingStore.base_dir
+    saved_cache_dir = PDFTextCache.base_dir
+    MongoDBService._client, MongoDBService._db, MongoDBService._connected = client, db, True
+    EmbeddingStore.reset(tmp_path / "embeddings")
+    PDFTextCache.reset(tmp_path / "pdf_text_cache")
+    CorpusVersion.reset()
+    VectorIndexRegistry.invalidate()
+    executor = ThreadPoolExecutor(max_workers=2)
+    with patch.object(MongoDBService, "is_connected", return_value=True), \
+         patch.object(AIRouter, "get_embedding_adapter", lambda self, context: adapter), \
+         patch("app.services.pdf_extraction.iter_pdf_pages", _read_pages):
+        yield SimpleNamespace(db=db, adapter=adapter, executor=executor, tmp_path=tmp_path)
+    executor.shutdown()
+    MongoDBService._client, MongoDBService._db, MongoDBService._connected = saved_connection
+    EmbeddingStore.reset(saved_store_dir)
+    PDFTextCache.reset(saved_cache_dir)
+    CorpusVersion.reset()
+    VectorIndexRegistry.invalidate()
+
+
+def _importer(env, **kwargs):
+    kwargs.setdefault("extract_executor", env.executor)
+    return BulkActImporter(tenant_id="1", ente="Firenze", **kwargs)
+
+
+class TestBulkUpsert:
+    """Test suite for MongoDBService.bulk_upsert"""
+
+    def test_upsert_keeps_created_at_and_bumps_corpus_version(self, env):
+        version = CorpusVersion.get(1)
+        first = MongoDBService.bulk_upsert("documents", [
+            {"tenant_id": "1", "document_id": "a", "title": "A", "created_at": "t0"},
+            {"tenant_id": 1, "document_id": "b", "title": "B", "created_at": "t0"},
+        ])
+        assert first == {"matched": 0, "modified": 0, "upserted": 2}
+        assert CorpusVersion.get(1) != version
+
+        second = MongoDBService.bulk_upsert("documents", [
+            {"_id": "ignored", "tenant_id": 1, "document_id": "a", "title": "A2", "created_at": "t1"},
+        ])
+        assert second["matched"] == 1 and second["upserted"] == 0
+        doc = env.db["documents"].find_one({"document_id": "a"})
+        assert doc["title"] == "A2"
+        assert doc["created_at"] == "t0"
+        assert doc["tenant_id"] == 1
+        assert env.db["documents"].count_documents({}) == 2
+
+    def test_not_connected_is_noop(self, env):
+        with patch.object(MongoDBService, "is_connected", return_value=False):
+            assert MongoDBService.bulk_upsert("documents", [{"tenant_id": 1, "document_id": "a"}]) == {"matched": 0, "modified": 0, "upserted": 0}
+
+
+class TestBulkActImporter:
+    """Test suite for the staged import pipeline"""
+
+    def test_imports_all_acts(self, env):
+        report = asyncio.run(_importer(env).run(_items(env.tmp_path, 5)))
+
+        stats = report["stats"]
+        assert stats["processed"] == 5
+        assert stats["total_documents"] == 5
+        assert stats["errors"] == 0
+        assert stats["total_chunks"] > 5
+
+        documents = list(env.db["documents"].find({"tenant_id": 1}))
+        assert len(documents) == 5
+        for document in documents:
+            assert document["document_type"] == "pa_act"
+            assert document["content"]["full_text"].startswith("Paragrafo 0")
+            assert all(chunk["embedding"] for chunk in document["content"]["chunks"])
+            assert document["embedding"]
+            assert EmbeddingStore.get(1).get_version(document["_id"]) is not None
+
+        # Ogni testo (chunk + documento) è stato embeddato una sola volta
+        embedded = sum(len(batch) for batch in env.adapter.batches)
+        assert embedded == stats["total_chunks"] + 5
+        assert report["costs"]["total_tokens"] == embedded * 3
+
+    def test_embed_stage_batches_across_acts(self, env):
+        importer = _importer(env)
+        jobs = []
+        for item in _items(env.tmp_path, 3):
+            job = ImportJob(item["atto_data"], pdf_path=item["pdf_path"])
+            job.document_id = importer.importer.generate_document_id(job.atto_data, "Firenze")
+            job.prepared = {
+                "text": _act_text(1),
+                "using_fallback_oggetto": False,
+                "structure": None,
+                "chunks": importer.importer.split_text_into_chunks(_act_text(1)),
+            }
+            jobs.append(job)
+
+        ready = asyncio.run(importer._embed(jobs))
+
+        assert len(env.adapter.batches) == 1
+        assert len(ready) == 3
+        assert all(job.document["content"]["chunks"][0]["embedding"] for job in ready)
+
+    def test_skips_existing_and_refresh_updates(self, env):
+        items = _items(env.tmp_path, 4)
+        asyncio.run(_importer(env).run(items))
+        created = {doc["document_id"]: doc["created_at"] for doc in env.db["documents"].find({})}
+
+        again = asyncio.run(_importer(env).run(items))
+        assert again["stats"]["skipped"] == 4
+        assert again["stats"]["processed"] == 0
+
+        refreshed = asyncio.run(_importer(env, refresh=True).run(items))
+        assert refreshed["stats"]["processed"] == 4
+        assert refreshed["stats"]["total_documents"] == 0
+        assert env.db["documents"].count_documents({}) == 4
+        assert {doc["document_id"]: doc["created_at"] for doc in env.db["documents"].find({})} == created
+
+    def test_protocol_number_remaps_document_id(self, env):
+        env.db["documents"].insert_one({
+            "tenant_id": 1, "document_type": "pa_act", "document_id": "vecchio_id", "protocol_number": "1/2024",
+        })
+
+        report = asyncio.run(_importer(env, refresh=True).run(_items(env.tmp_path, 1)))
+
+        assert report["stats"]["total_documents"] == 0
+        assert env.db["documents"].count_documents({}) == 1
+        assert env.db["documents"].find_one({})["document_id"] == "vecchio_id"
+
+    def test_job_resumes_after_interruption(self, env):
+        items = _items(env.tmp_path, 5)
+        importer = _importer(env, refresh=True, job_id="firenze-test")
+        done = [importer.importer.generate_document_id(item["atto_data"], "Firenze") for item in items[:2]]
+        env.db["import_jobs"].insert_one({"_id": "firenze-test", "completed_ids": done, "status": "interrupted"})
+
+        report = asyncio.run(importer.run(items))
+
+        assert report["stats"]["skipped"] == 2
+        assert report["stats"]["processed"] == 3
+        job = env.db["import_jobs"].find_one({"_id": "firenze-test"})
+        assert job["status"] == "completed"
+        assert len(job["completed_ids"]) == 5
+
+    def test_dry_run_estimates_without_writing(self, env):
+        report = asyncio.run(_importer(env, dry_run=True, job_id="dry").run(_items(env.tmp_path, 3)))
+
+        assert report["dry_run"] is True
+        assert report["stats"]["processed"] == 3
+        assert report["costs"]["total_tokens"] > 0
+        assert env.adapter.batches == []
+        assert env.db["documents"].count_documents({}) == 0
+        assert env.db["import_jobs"].count_documents({}) == 0
+
+    def test_failing_act_does_not_stop_pipeline(self, env):
+        items = _items(env.tmp_path, 4)
+        broken_path = items[1]["pdf_path"]
+
+        prepare_document = bulk_importer.prepare_document
+
+        def prepare(pdf_path, *args):
+            if pdf_path == broken_path:
+                raise ValueError("PDF corrotto")
+            return prepare_document(pdf_path, *args)
+
+        with patch.object(bulk_importer, "prepare_document", prepare):
+            report = asyncio.run(_importer(env).run(items))
+
+        assert report["stats"]["processed"] == 3
+        assert report["stats"]["errors"] == 1
+        assert report["errors"] == [{"atto": "2/2024", "error": "PDF corrotto"}]
+
+    def test_default_executor_is_the_shared_extraction_pool(self, env):
+        with patch.object(bulk_importer.PDFExtractionService, "get_executor", return_value=env.executor) as get_executor:
+            first = asyncio.run(BulkActImporter(tenant_id="1", ente="Firenze").run(_items(env.tmp_path, 2)))
+            second = asyncio.run(BulkActImporter(tenant_id="1", ente="Firenze").run(_items(env.tmp_path, 2, start=3)))
+
+        assert first["stats"]["processed"] == second["stats"]["processed"] == 2
+        assert get_executor.call_count == 2
+        # Il pool condiviso resta aperto dopo ogni import
+        assert env.executor.submit(len, "ok").result() == 2
+
+    def test_bulk_write_error_fails_only_rejected_acts(self, env):
+        items = _items(env.tmp_path, 4)
+        importer = _importer(env, job_id="firenze-partial")
+        rejected_id = importer.importer.generate_document_id(items[2]["atto_data"], "Firenze")
+
+        async def bulk_upsert(collection_name, documents, **kwargs):
+            rejected = [index for index, document in enumerate(documents) if document["document_id"] == rejected_id]
+            counts = MongoDBService.bulk_upsert(collection_name, [d for i, d in enumerate(documents) if i not in rejected])
+            if rejected:
+                raise BulkWriteError({
+                    "writeErrors": [{"index": index, "code": 11000, "errmsg": "E11000 duplicate key"} for index in rejected],
+                    "nMatched": counts["matched"], "nModified": counts["modified"], "nUpserted": counts["upserted"],
+                })
+            return counts
+
+        with patch.object(AsyncMongoDBService, "bulk_upsert", bulk_upsert):
+            report = asyncio.run(importer.run(items))
+
+        assert report["stats"]["processed"] == 3
+        assert report["stats"]["total_documents"] == 3
+        assert report["errors"] == [{"atto": "3/2024", "error": "Scrittura MongoDB fallita: E11000 duplicate key"}]
+        assert env.db["documents"].count_documents({}) == 3
+        job = env.db["import_jobs"].find_one({"_id": "firenze-partial"})
+        assert rejected_id not in job["completed_ids"] and len(job["completed_ids"]) == 3
+        assert EmbeddingStore.get(1).size == 3
+
+    def test_mongodb_unavailable_does_not_checkpoint(self, env):
+        items = _items(env.tmp_path, 3)
+        importer = _importer(env, job_id="firenze-offline")
+
+        with patch.object(MongoDBService, "bulk_upsert", return_value={"matched": 0, "modified": 0, "upserted": 0}):
+            report = asyncio.run(importer.run(items))
+
+        assert report["stats"]["processed"] == 0
+        assert report["stats"]["errors"] == 3
+        assert all("MongoDB non disponibile" in error["error"] for error in report["errors"])
+        assert env.db["import_jobs"].find_one({"_id": "firenze-offline"}).get("completed_ids", []) == []
+
+    def test_downloads_pdf_url_and_falls_back_to_oggetto(self, env):
+        requested = []
+
+        def handler(request):
+            requested.append(str(request.url))
+            if request.url.path.endswith("missing.pdf"):
+                return httpx.Response(404)
+            return httpx.Response(200, content=_act_text(7).encode("utf-8"))
+
+        real_client = httpx.AsyncClient
+        items = [
+            {"atto_data": {"numero_atto": "7/2024", "tipo_atto": "delibera", "oggetto": "Approvazione bilancio di previsione 2024-2026 e allegati", "anno": 2024}, "pdf_url": "https://albo.example.it/7.pdf"},
+            {"atto_data": {"numero_atto": "8/2024", "tipo_atto": "delibera", "oggetto": "Variazione al bilancio di previsione 2024-2026 urgente", "anno": 2024}, "pdf_url": "https://albo.example.it/missing.pdf"},
+        ]
+        with patch("app.services.bulk_importer.httpx.AsyncClient", lambda **kwargs: real_client(transport=httpx.MockTransport(handler), **kwargs)):
+            report = asyncio.run(_importer(env).run(items))
+
+        assert sorted(requested) == ["https://albo.example.it/7.pdf", "https://albo.example.it/missing.pdf"]
+        assert report["stats"]["downloaded"] == 1
+        assert report["stats"]["download_failed"] == 1
+        assert report["stats"]["fallback_oggetto"] == 1
+        fallback = env.db["documents"].find_one({"protocol_number": "8/2024"})
+        assert fallback["content"]["full_text"].startswith("Variazione al bilancio")
+        assert env.db["documents"].find_one({"protocol_number": "7/2024"})["metadata"]["pdf_url"] == "https://albo.example.it/7.pdf"
+
+
+class TestScannerItems:
+    """Test suite for the Compliance Scanner item conversion"""
+
+    def test_atto_from_scanner_dict(self):
+        item = atto_from_scanner_dict({"numero": "12/2024", "tipo": "Delibera", "descrizione": "Oggetto", "data_pubblicazione": "2024-01-02", "link": "https://x/a.pdf"}, "firenze")
+        assert item == {
+            "atto_data": {
+                "numero_atto": "12/2024",
+                "tipo_atto": "Delibera",
+                "oggetto": "Oggetto",
+                "data_atto": "2024-01-02",
+                "anno": "",
+                "scraper_type": "compliance_scanner",
+                "comune_slug": "firenze",
+            },
+            "pdf_url": "https://x/a.pdf",
+        }
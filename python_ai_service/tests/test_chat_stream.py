@@ -0,0 +1,269 @@
+"""
+Unit Tests for streaming chat (stream events, adapter generate_stream, /chat/stream)
+"""
+
+import asyncio
+import json
+import pytest
+import httpx
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+
+from app.routers import chat
+from app.services.providers import anthropic_adapter, groq_adapter, ollama_adapter, openai_adapter
+from app.services.providers.anthropic_adapter import AnthropicChatAdapter
+from app.services.providers.base import BaseChatAdapter, StreamCompletion
+from app.services.providers.groq_adapter import GroqChatAdapter
+from app.services.providers.ollama_adapter import OllamaChatAdapter
+from app.services.providers.openai_adapter import OpenAIChatAdapter
+from app.services.rag_fortress.stream_events import emit, generate_streaming, is_streaming, stream_events
+
+
+class FakeChatAdapter(BaseChatAdapter):
+    model = "fake-model"
+
+    async def generate(self, messages, **options):
+        return {"content": "risposta completa", "usage": {"total_tokens": 3}, "model": self.model, "finish_reason": "stop"}
+
+
+class FakeStreamingAdapter(FakeChatAdapter):
+    async def generate_stream(self, messages, **options):
+        for chunk in ["Il ", "bilancio ", "2024"]:
+            yield chunk
+        yield StreamCompletion(usage={"input_tokens": 12, "output_tokens": 3}, model="fake-model-v2", finish_reason="length")
+
+
+async def _collect(coro, **kwargs):
+    return [item async for item in stream_events(coro, **kwargs)]
+
+
+def _mock_client(body: str):
+    return httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, text=body)))
+
+
+class TestStreamEvents:
+    """Test suite for stream_events / emit"""
+
+    def test_events_in_order_then_result(self):
+        async def work():
+            emit("stage", {"stage": "retrieval"})
+            await asyncio.sleep(0)
+            emit("sources", {"total": 2})
+            return {"answer": "ok"}
+
+        events = asyncio.run(_collect(work()))
+
+        assert [e["event"] for e in events] == ["stage", "sources", "result"]
+        assert events[-1]["data"] == {"answer": "ok"}
+
+    def test_child_tasks_inherit_stream(self):
+        async def batch(i):
+            await asyncio.sleep(0.01 * i)
+            emit("batch_summary", {"index": i})
+
+        async def work():
+            await asyncio.gather(*(batch(i) for i in range(3)))
+            return None
+
+        events = asyncio.run(_collect(work()))
+
+        assert [e["data"]["index"] for e in events if e["event"] == "batch_summary"] == [0, 1, 2]
+
+    def test_emit_without_stream_is_noop(self):
+        assert not is_streaming()
+        emit("stage", {"stage": "retrieval"})
+
+    def test_exception_propagates(self):
+        async def work():
+            emit("stage", {"stage": "retrieval"})
+            raise RuntimeError("boom")
+
+        with pytest.raises(RuntimeError, match="boom"):
+            asyncio.run(_collect(work()))
+
+    def test_heartbeat_while_idle(self):
+        async def work():
+            await asyncio.sleep(0.12)
+            return 1
+
+        events = asyncio.run(_collect(work(), heartbeat_seconds=0.05))
+
+        assert events.count({"event": "heartbeat", "data": {}}) >= 1
+        assert events[-1] == {"event": "result", "data": 1}
+
+    def test_consumer_close_cancels_work(self):
+        cancelled = []
+
+        async def work():
+            emit("stage", {"stage": "retrieval"})
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        async def run():
+            stream = stream_events(work())
+            first = await stream.__anext__()
+            await stream.aclose()
+            await asyncio.sleep(0)
+            return first
+
+        assert asyncio.run(run())["event"] == "stage"
+        assert cancelled == [True]
+
+
+class TestGenerateStreaming:
+    """Test suite for generate_streaming and BaseChatAdapter.generate_stream"""
+
+    def test_without_stream_uses_generate(self):
+        result = asyncio.run(generate_streaming(FakeStreamingAdapter(), []))
+
+        assert result["content"] == "risposta completa"
+        assert result["usage"] == {"total_tokens": 3}
+
+    def test_with_stream_emits_tokens(self):
+        events = asyncio.run(_collect(generate_streaming(FakeStreamingAdapter(), [])))
+
+        assert [e["data"]["text"] for e in events if e["event"] == "token"] == ["Il ", "bilancio ", "2024"]
+        assert events[-1]["data"]["content"] == "Il bilancio 2024"
+        assert events[-1]["data"]["usage"] == {"input_tokens": 12, "output_tokens": 3}
+        assert (events[-1]["data"]["model"], events[-1]["data"]["finish_reason"]) == ("fake-model-v2", "length")
+
+    def test_base_adapter_default_single_chunk(self):
+        async def run():
+            return [chunk async for chunk in FakeChatAdapter().generate_stream([])]
+
+        chunks = asyncio.run(run())
+
+        assert chunks[:-1] == ["risposta completa"]
+        assert chunks[-1] == {"usage": {"total_tokens": 3}, "model": "fake-model", "finish_reason": "stop"}
+
+
+class TestProviderStreams:
+    """Test suite for provider generate_stream parsing"""
+
+    def _stream(self, adapter, module, body):
+        """Text chunks and the terminal StreamCompletion"""
+        async def run():
+            client = _mock_client(body)
+            with patch.object(module.HTTPClientRegistry, "get", return_value=client):
+                return [chunk async for chunk in adapter.generate_stream([{"role": "user", "content": "ciao"}])]
+
+        items = asyncio.run(run())
+        assert isinstance(items[-1], StreamCompletion)
+        return items[:-1], items[-1]
+
+    def test_openai(self):
+        body = (
+            'data: {"choices":[{"delta":{"role":"assistant"}}]}\n\n'
+            'data: {"choices":[{"delta":{"content":"Ciao"}}]}\n\n'
+            'data: {"choices":[{"delta":{"content":" Mario"},"finish_reason":"stop"}]}\n\n'
+            'data: {"model":"gpt-4o-mini-2024-07-18","choices":[],"usage":{"prompt_tokens":9,"completion_tokens":2,"total_tokens":11}}\n\n'
+            "data: [DONE]\n\n"
+        )
+        adapter = OpenAIChatAdapter(model="gpt-4o-mini")
+        adapter.api_key = "sk-test"
+
+        chunks, completion = self._stream(adapter, openai_adapter, body)
+
+        assert chunks == ["Ciao", " Mario"]
+        assert completion["usage"] == {"prompt_tokens": 9, "completion_tokens": 2, "total_tokens": 11}
+        assert completion["model"] == "gpt-4o-mini-2024-07-18"
+
+    def test_groq(self):
+        body = (
+            'data: {"choices":[{"delta":{"content":"Ecco"}}]}\n\n'
+            'data: {"choices":[{"delta":{},"finish_reason":"stop"}],"x_groq":{"usage":{"prompt_tokens":7,"completion_tokens":1,"total_tokens":8}}}\n\n'
+            "data: [DONE]\n\n"
+        )
+        adapter = GroqChatAdapter(model="llama-3.3-70b-versatile")
+        adapter.api_key = "gsk-test"
+
+        chunks, completion = self._stream(adapter, groq_adapter, body)
+
+        assert chunks == ["Ecco"]
+        assert completion == {
+            "usage": {"input_tokens": 7, "output_tokens": 1, "total_tokens": 8},
+            "model": "llama-3.3-70b-versatile",
+            "finish_reason": "stop"
+        }
+
+    def test_anthropic(self):
+        body = (
+            'event: message_start\ndata: {"type":"message_start","message":{"model":"claude-sonnet-4-20250514","usage":{"input_tokens":25,"output_tokens":1}}}\n\n'
+            'event: content_block_delta\ndata: {"type":"content_block_delta","delta":{"type":"text_delta","text":"Buon"}}\n\n'
+            'event: content_block_delta\ndata: {"type":"content_block_delta","delta":{"type":"text_delta","text":"giorno"}}\n\n'
+            'event: message_delta\ndata: {"type":"message_delta","delta":{"stop_reason":"end_turn"},"usage":{"output_tokens":4}}\n\n'
+            'event: message_stop\ndata: {"type":"message_stop"}\n\n'
+        )
+        adapter = AnthropicChatAdapter(model="claude-sonnet-4")
+        adapter.api_key = "test"
+        adapter.model = "claude-sonnet-4-20250514"
+
+        chunks, completion = self._stream(adapter, anthropic_adapter, body)
+
+        assert chunks == ["Buon", "giorno"]
+        assert completion["usage"] == {"input_tokens": 25, "output_tokens": 4}
+        assert completion["finish_reason"] == "end_turn"
+
+    def test_ollama(self):
+        body = (
+            '{"response":"Sal","done":false}\n{"response":"ve","done":false}\n'
+            '{"response":"","done":true,"done_reason":"stop","prompt_eval_count":30,"eval_count":2}\n'
+        )
+
+        chunks, completion = self._stream(OllamaChatAdapter(model="llama3.1:8b"), ollama_adapter, body)
+
+        assert chunks == ["Sal", "ve"]
+        assert completion["usage"] == {"input_tokens": 30, "output_tokens": 2}
+
+
+class TestChatStreamEndpoint:
+    """Test suite for POST /chat/stream"""
+
+    def _client(self):
+        app = FastAPI()
+        app.include_router(chat.router)
+        return TestClient(app)
+
+    def _events(self, response):
+        events = []
+        for block in response.text.split("\n\n"):
+            lines = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+            if "event" in lines:
+                events.append((lines["event"], json.loads(lines["data"])))
+        return events
+
+    def test_rag_generative_stream(self):
+        async def fake_rag_fortress(**kwargs):
+            emit("sources", {"sources": [{"title": "Delibera 1"}], "total": 1})
+            emit("token", {"text": "Sintesi"})
+            return {"answer": "Sintesi finale", "sources": [{"title": "Delibera 1"}], "urs_explanation": "x"}
+
+        with patch.object(chat.question_classifier, "classify", return_value={"intent": "generative", "confidence": 0.9}), \
+             patch.object(chat.execution_router, "route", return_value={"action": "rag_generative"}), \
+             patch.object(chat, "rag_fortress", fake_rag_fortress):
+            response = self._client().post("/chat/stream", json={"messages": [{"role": "user", "content": "Crea un piano"}], "tenant_id": 1})
+
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = self._events(response)
+        assert [name for name, _ in events] == ["stage", "sources", "token", "result"]
+        assert events[0][1]["action"] == "rag_generative"
+        assert events[-1][1]["message"] == "Sintesi finale"
+        assert events[-1][1]["model"] == "rag-generative-pipeline"
+
+    def test_pipeline_failure_emits_error(self):
+        async def failing_rag_fortress(**kwargs):
+            emit("stage", {"stage": "retrieval"})
+            raise RuntimeError("MongoDB non raggiungibile")
+
+        with patch.object(chat.question_classifier, "classify", return_value={"intent": "fact_check", "confidence": 0.9}), \
+             patch.object(chat.execution_router, "route", return_value={"action": "rag_strict"}), \
+             patch.object(chat, "rag_fortress", failing_rag_fortress):
+            response = self._client().post("/chat/stream", json={"messages": [{"role": "user", "content": "Delibere 2024?"}], "tenant_id": 1})
+
+        events = self._events(response)
+        assert [name for name, _ in events] == ["stage", "stage", "error"]
+        assert events[-1][1] == {"status_code": 500, "detail": "Chat inference failed: MongoDB non raggiungibile"}
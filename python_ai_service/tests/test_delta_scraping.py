@@ -0,0 +1,248 @@
+"""
+Unit Tests for incremental (delta) scraping: HighWaterMark, tracker persistence,
+BaseAlboScraper paging stop, ScraperFactory and scan_comune incremental mode
+"""
+
+import asyncio
+from datetime import datetime
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.scrapers.base_scraper import AttoPA, BaseAlboScraper
+from app.scrapers.factory import ScraperFactory
+from app.scrapers.utils.high_water_mark import HighWaterMark, parse_act_date
+from app.services.compliance_scanner.comuni_tracker import ComuniScrapingTracker
+from app.services.compliance_scanner.scanner import AlboPretorioComplianceScanner
+from app.services.mongodb_service import MongoDBService
+from tests.benchmarks.harness import InMemoryClient
+
+
+@pytest.fixture
+def tracker_db():
+    client = InMemoryClient()
+    db = client["delta_scraping_test"]
+    saved_connection = (MongoDBService._client, MongoDBService._db, MongoDBService._connected)
+    MongoDBService._client, MongoDBService._db, MongoDBService._connected = client, db, True
+    with patch.object(MongoDBService, "is_connected", return_value=True):
+        yield db
+    MongoDBService._client, MongoDBService._db, MongoDBService._connected = saved_connection
+
+
+class PagedAlbo:
+    """Albo finto: atti dal più recente, N per pagina"""
+
+    def __init__(self, atti_per_page: int = 2):
+        self.atti = []          # (numero, data)
+        self.atti_per_page = atti_per_page
+        self.pages_requested = []
+        self.fail_pages = set()
+
+    def publish(self, numero: str, data: datetime):
+        self.atti.insert(0, (numero, data))
+
+    @property
+    def total_pages(self) -> int:
+        return max(1, -(-len(self.atti) // self.atti_per_page))
+
+    def page(self, page_num: int):
+        self.pages_requested.append(page_num)
+        if page_num in self.fail_pages:
+            raise ConnectionError("timeout")
+        start = (page_num - 1) * self.atti_per_page
+        return self.atti[start:start + self.atti_per_page]
+
+
+class FakeAlboScraper(BaseAlboScraper):
+    albo: PagedAlbo = None
+
+    async def detect_platform(self, url):
+        return True
+
+    async def get_total_pages(self, url):
+        return self.albo.total_pages
+
+    async def scrape_page(self, url, page_num=1):
+        return [AttoPA(
+            numero=numero, data_pubblicazione=data, oggetto="Oggetto", tipo_atto="determina",
+            url_dettaglio=url, comune_code=self.comune_code, tenant_id=self.tenant_id
+        ) for numero, data in self.albo.page(page_num)]
+
+
+def _albo_with(count: int, day: int = 1) -> PagedAlbo:
+    albo = PagedAlbo()
+    for i in range(1, count + 1):
+        albo.publish(f"{i}/2025", datetime(2025, 3, day + i))
+    return albo
+
+
+class TestHighWaterMark:
+    """Test suite for HighWaterMark"""
+
+    def test_parse_act_date_formats(self):
+        assert parse_act_date("02/01/2025") == datetime(2025, 1, 2)
+        assert parse_act_date("2025-01-02T10:30:00") == datetime(2025, 1, 2)
+        assert parse_act_date("2.1.2025") == datetime(2025, 1, 2)
+        assert parse_act_date(datetime(2025, 1, 2, 18, 5)) == datetime(2025, 1, 2)
+        assert parse_act_date("N/A") is None
+        assert parse_act_date(None) is None
+
+    def test_is_known(self):
+        mark = HighWaterMark(datetime(2025, 3, 10), "12/2025", ["11/2025", "12/2025"])
+        assert mark.is_known("09/03/2025", "99/2025")
+        assert mark.is_known("10/03/2025", " 12/2025 ")
+        assert not mark.is_known("10/03/2025", "13/2025")
+        assert not mark.is_known("11/03/2025", "1/2025")
+        assert not mark.is_known("N/A", "12/2025")
+        assert mark.year == 2025
+
+    def test_from_acts_keeps_all_numbers_of_newest_date(self):
+        previous = HighWaterMark(datetime(2025, 3, 10), "12/2025", ["12/2025"])
+        mark = HighWaterMark.from_acts(
+            [("10/03/2025", "13/2025"), ("09/03/2025", "10/2025"), ("bad", "x")],
+            previous=previous
+        )
+        assert mark.data_pubblicazione == datetime(2025, 3, 10)
+        assert mark.numeri == ["12/2025", "13/2025"]
+
+        newer = HighWaterMark.from_acts([("11/03/2025", "14/2025")], previous=mark)
+        assert newer.numeri == ["14/2025"] and newer.numero == "14/2025"
+        assert HighWaterMark.from_acts([("N/A", "1")]) is None
+
+    def test_dict_round_trip(self):
+        mark = HighWaterMark(datetime(2025, 3, 10), "12/2025", ["12/2025"])
+        restored = HighWaterMark.from_dict(mark.to_dict())
+        assert (restored.data_pubblicazione, restored.numero, restored.numeri) == (mark.data_pubblicazione, "12/2025", ["12/2025"])
+        assert HighWaterMark.from_dict(None) is None
+
+
+class TestTrackerHighWaterMark:
+    """Test suite for ComuniScrapingTracker high-water mark persistence"""
+
+    def test_set_and_get(self, tracker_db):
+        mark = HighWaterMark(datetime(2025, 3, 10), "12/2025", ["12/2025"])
+        assert ComuniScrapingTracker.set_high_water_mark("Empoli", mark.to_dict(), tenant_id=1)
+
+        saved = ComuniScrapingTracker.get_high_water_mark("empoli", tenant_id=1)
+        assert saved["numero"] == "12/2025"
+        assert ComuniScrapingTracker.get_high_water_mark("empoli", tenant_id=2) is None
+        # Il solo mark non rende il comune "scrapato"
+        assert ComuniScrapingTracker.get_scraped_comuni(tenant_id=1) == []
+
+    def test_mark_never_moves_back(self, tracker_db):
+        ComuniScrapingTracker.set_high_water_mark("empoli", HighWaterMark(datetime(2025, 3, 10), "12/2025").to_dict(), tenant_id=1)
+        assert not ComuniScrapingTracker.set_high_water_mark("empoli", HighWaterMark(datetime(2025, 2, 1), "1/2025").to_dict(), tenant_id=1)
+        assert ComuniScrapingTracker.get_high_water_mark("empoli", tenant_id=1)["numero"] == "12/2025"
+
+
+class TestIncrementalScrapeAll:
+    """Test suite for BaseAlboScraper.scrape_all with a high-water mark"""
+
+    def _scraper(self, albo, tmp_path):
+        scraper = FakeAlboScraper("empoli", "tenant_toscana", {"log_dir": str(tmp_path), "page_delay": 0})
+        scraper.albo = albo
+        return scraper
+
+    def test_stops_at_first_known_act(self, tmp_path):
+        albo = _albo_with(10)     # 5 pagine, 10/2025 il più recente
+        mark = HighWaterMark(datetime(2025, 3, 8), "7/2025", ["7/2025"])
+
+        result = asyncio.run(self._scraper(albo, tmp_path).scrape_all("https://albo.empoli.it", high_water_mark=mark))
+
+        assert [atto.numero for atto in result.atti] == ["10/2025", "9/2025", "8/2025"]
+        assert albo.pages_requested == [1, 2]
+        assert result.stats["known_atti_skipped"] == 1
+        assert result.stats["reached_known_atti"] is True
+
+    def test_without_mark_scrapes_everything(self, tmp_path):
+        albo = _albo_with(5)
+        result = asyncio.run(self._scraper(albo, tmp_path).scrape_all("https://albo.empoli.it"))
+        assert len(result.atti) == 5
+        assert albo.pages_requested == [1, 2, 3]
+        assert result.stats["incremental"] is False
+
+
+class TestIncrementalFactory:
+    """Test suite for ScraperFactory.scrape_comune(incremental=True)"""
+
+    def _run(self, albo, tmp_path, **kwargs):
+        scraper = FakeAlboScraper("empoli", "tenant_toscana", {"log_dir": str(tmp_path), "page_delay": 0})
+        scraper.albo = albo
+        with patch.object(ScraperFactory, "create_scraper", new=AsyncMock(return_value=scraper)):
+            return asyncio.run(ScraperFactory.scrape_comune("empoli", "https://albo.empoli.it", "tenant_toscana", incremental=True, **kwargs))
+
+    def test_nightly_refresh_touches_only_new_acts(self, tracker_db, tmp_path):
+        albo = _albo_with(6)
+
+        first = self._run(albo, tmp_path)
+        assert len(first.atti) == 6
+        mark = ComuniScrapingTracker.get_high_water_mark("empoli", tenant_id="tenant_toscana")
+        assert mark["numero"] == "6/2025"
+
+        albo.publish("7/2025", datetime(2025, 3, 20))
+        albo.pages_requested.clear()
+        second = self._run(albo, tmp_path)
+
+        assert [atto.numero for atto in second.atti] == ["7/2025"]
+        assert albo.pages_requested == [1]
+        assert ComuniScrapingTracker.get_high_water_mark("empoli", tenant_id="tenant_toscana")["numero"] == "7/2025"
+
+    def test_partial_run_does_not_advance_mark(self, tracker_db, tmp_path):
+        albo = _albo_with(6)
+        albo.fail_pages = {3}
+
+        result = self._run(albo, tmp_path)
+
+        assert result.status == "partial"
+        assert ComuniScrapingTracker.get_high_water_mark("empoli", tenant_id="tenant_toscana") is None
+
+    def test_explicit_mark_is_not_saved(self, tracker_db, tmp_path):
+        albo = _albo_with(4)
+        mark = HighWaterMark(datetime(2025, 3, 3), "2/2025", ["2/2025"])
+
+        result = self._run(albo, tmp_path, high_water_mark=mark)
+
+        assert [atto.numero for atto in result.atti] == ["4/2025", "3/2025"]
+        assert ComuniScrapingTracker.get_high_water_mark("empoli", tenant_id="tenant_toscana") is None
+
+
+class TestIncrementalScanComune:
+    """Test suite for AlboPretorioComplianceScanner.scan_comune(incremental=True)"""
+
+    ATTI = [
+        {"numero": "3/2025", "data": "12/03/2025", "oggetto": "Nuovo", "fonte": "Albo Pretorio HTML"},
+        {"numero": "2/2025", "data": "10/03/2025", "oggetto": "Già visto", "fonte": "Albo Pretorio HTML"},
+        {"numero": "1/2025", "data": "05/03/2025", "oggetto": "Vecchio", "fonte": "Albo Pretorio HTML"},
+    ]
+
+    def test_only_new_acts_are_kept_and_mark_advances(self, tracker_db, tmp_path):
+        ComuniScrapingTracker.set_high_water_mark(
+            "firenze", HighWaterMark(datetime(2025, 3, 10), "2/2025", ["2/2025"]).to_dict(), tenant_id=1
+        )
+        scanner = AlboPretorioComplianceScanner(output_dir=str(tmp_path))
+
+        with patch.object(scanner, "_strategy_api_firenze", new=AsyncMock(return_value=list(self.ATTI))) as strategy:
+            report = asyncio.run(scanner.scan_comune("firenze", tenant_id=1, incremental=True))
+
+        passed_mark = strategy.call_args.args[0]
+        assert passed_mark.numeri == ["2/2025"]
+        assert [atto["numero"] for atto in report.metadata["atti_list"]] == ["3/2025"]
+        assert report.metadata["incremental"]["atti_gia_visti"] == 2
+        assert report.metadata["atti_estratti"] == 3
+        assert ComuniScrapingTracker.get_high_water_mark("firenze", tenant_id=1)["numero"] == "3/2025"
+
+    def test_failed_import_keeps_mark(self, tracker_db, tmp_path):
+        scanner = AlboPretorioComplianceScanner(output_dir=str(tmp_path))
+
+        with patch.object(scanner, "_strategy_api_firenze", new=AsyncMock(return_value=list(self.ATTI))), \
+             patch("app.services.bulk_importer.BulkActImporter.run", new=AsyncMock(side_effect=RuntimeError("mongo down"))):
+            asyncio.run(scanner.scan_comune("firenze", tenant_id=1, incremental=True, mongodb_import=True))
+
+        assert ComuniScrapingTracker.get_high_water_mark("firenze", tenant_id=1) is None
+
+    def test_api_years_from_mark(self):
+        from app.services.compliance_scanner.scanner import _anni_da_interrogare
+
+        mark = HighWaterMark(datetime(2024, 12, 30), "9/2024")
+        assert _anni_da_interrogare([2022, 2023, 2024, 2025], mark) == [2024, 2025]
+        assert _anni_da_interrogare([2022, 2023], None) == [2022, 2023]
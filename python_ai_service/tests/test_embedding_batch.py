@@ -0,0 +1,230 @@
+"""
+Unit Tests for batched embeddings (embed_batch) and the micro-batching coalescer
+"""
+
+import asyncio
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import httpx
+import pytest
+
+from app.services.providers.base import BaseEmbeddingAdapter
+from app.services.providers.embedding_coalescer import CoalescingEmbeddingAdapter, EmbeddingCoalescer
+from app.services.providers.http_client import HTTPClientRegistry
+from app.services.providers.ollama_adapter import OllamaEmbeddingAdapter
+from app.services.providers.openai_adapter import OpenAIEmbeddingAdapter
+
+
+class FakeEmbeddingAdapter(BaseEmbeddingAdapter):
+    model = "fake"
+
+    def __init__(self):
+        self.batches = []
+        self.single_calls = 0
+
+    async def embed(self, text, **options):
+        self.single_calls += 1
+        return {"embedding": [float(len(text))], "dimensions": 1, "model": "fake", "tokens": 1}
+
+    async def embed_batch(self, texts, **options):
+        self.batches.append(list(texts))
+        return [{"embedding": [float(len(t))], "dimensions": 1, "model": "fake", "tokens": 1} for t in texts]
+
+
+@pytest.fixture(autouse=True)
+def _reset_coalescers():
+    EmbeddingCoalescer.reset()
+    yield
+    EmbeddingCoalescer.reset()
+
+
+def _mock_client(handler):
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+class TestEmbedBatch:
+    """Test suite for embed_batch on provider adapters"""
+
+    def test_openai_sends_list_input_and_keeps_order(self):
+        requests = []
+
+        def handler(request):
+            body = json.loads(request.content)
+            requests.append(body["input"])
+            data = [{"index": i, "embedding": [float(i)]} for i in range(len(body["input"]))]
+            return httpx.Response(200, json={
+                "data": list(reversed(data)),  # l'API non garantisce l'ordine
+                "model": "text-embedding-3-small",
+                "usage": {"total_tokens": 10},
+            })
+
+        async def scenario():
+            client = _mock_client(handler)
+            adapter = OpenAIEmbeddingAdapter()
+            adapter.api_key = "test"
+            adapter.max_batch_size = 2
+            with patch.object(HTTPClientRegistry, "get", return_value=client):
+                results = await adapter.embed_batch(["a", "bb", "ccc"])
+            await client.aclose()
+            return results
+
+        results = asyncio.run(scenario())
+
+        assert requests == [["a", "bb"], ["ccc"]]
+        assert [r["embedding"] for r in results] == [[0.0], [1.0], [0.0]]
+        assert sum(r["tokens"] for r in results[:2]) == 10
+
+    def test_ollama_uses_api_embed(self):
+        def handler(request):
+            assert request.url.path == "/api/embed"
+            texts = json.loads(request.content)["input"]
+            return httpx.Response(200, json={"embeddings": [[float(len(t))] for t in texts]})
+
+        async def scenario():
+            client = _mock_client(handler)
+            with patch.object(HTTPClientRegistry, "get", return_value=client):
+                results = await OllamaEmbeddingAdapter().embed_batch(["a", "bb"])
+            await client.aclose()
+            return results
+
+        assert [r["embedding"] for r in asyncio.run(scenario())] == [[1.0], [2.0]]
+
+    def test_ollama_falls_back_on_old_servers(self):
+        def handler(request):
+            if request.url.path == "/api/embed":
+                return httpx.Response(404)
+            text = json.loads(request.content)["prompt"]
+            return httpx.Response(200, json={"embedding": [float(len(text))]})
+
+        async def scenario():
+            client = _mock_client(handler)
+            adapter = OllamaEmbeddingAdapter()
+            with patch.object(HTTPClientRegistry, "get", return_value=client):
+                results = await adapter.embed_batch(["a", "bb"])
+            await client.aclose()
+            return adapter, results
+
+        adapter, results = asyncio.run(scenario())
+
+        assert [r["embedding"] for r in results] == [[1.0], [2.0]]
+        assert adapter._batch_supported is False
+
+    def test_ollama_model_not_found_keeps_batching(self):
+        def handler(request):
+            return httpx.Response(404, json={"error": 'model "nomic-embed" not found, try pulling it first'})
+
+        async def scenario():
+            client = _mock_client(handler)
+            adapter = OllamaEmbeddingAdapter()
+            try:
+                with patch.object(HTTPClientRegistry, "get", return_value=client):
+                    with pytest.raises(httpx.HTTPStatusError):
+                        await adapter.embed_batch(["a"])
+            finally:
+                await client.aclose()
+            return adapter
+
+        assert asyncio.run(scenario())._batch_supported is True
+
+
+class TestEmbeddingCoalescer:
+    """Test suite for EmbeddingCoalescer"""
+
+    def test_concurrent_calls_share_one_request(self):
+        fake = FakeEmbeddingAdapter()
+        adapter = CoalescingEmbeddingAdapter(fake)
+
+        async def scenario():
+            return await asyncio.gather(*(adapter.embed(t) for t in ["a", "bb", "a", "ccc"]))
+
+        results = asyncio.run(scenario())
+
+        assert fake.batches == [["a", "bb", "ccc"]]  # duplicati inviati una volta
+        assert [r["embedding"] for r in results] == [[1.0], [2.0], [1.0], [3.0]]
+        stats = EmbeddingCoalescer.get_stats()["FakeEmbeddingAdapter:fake"]
+        assert stats["calls"] == 4
+        assert stats["upstream_requests"] == 1
+
+    def test_max_batch_flushes_immediately(self):
+        fake = FakeEmbeddingAdapter()
+        coalescer = EmbeddingCoalescer(fake, window_ms=10_000, max_batch=2)
+
+        async def scenario():
+            return await asyncio.wait_for(
+                asyncio.gather(coalescer.embed("a"), coalescer.embed("bb")), timeout=1
+            )
+
+        asyncio.run(scenario())
+
+        assert fake.batches == [["a", "bb"]]
+
+    def test_single_call_uses_embed(self):
+        fake = FakeEmbeddingAdapter()
+
+        result = asyncio.run(CoalescingEmbeddingAdapter(fake).embed("abc"))
+
+        assert result["embedding"] == [3.0]
+        assert fake.single_calls == 1
+        assert fake.batches == []
+
+    def test_errors_propagate_to_every_caller(self):
+        fake = FakeEmbeddingAdapter()
+        fake.embed_batch = AsyncMock(side_effect=RuntimeError("provider down"))
+        adapter = CoalescingEmbeddingAdapter(fake)
+
+        async def scenario():
+            return await asyncio.gather(adapter.embed("a"), adapter.embed("b"), return_exceptions=True)
+
+        results = asyncio.run(scenario())
+
+        assert all(isinstance(r, RuntimeError) for r in results)
+
+    def test_wrapper_exposes_adapter_attributes(self):
+        fake = FakeEmbeddingAdapter()
+        assert CoalescingEmbeddingAdapter(fake).model == "fake"
+
+
+class TestImporterBatchEmbeddings:
+    """PAActMongoDBImporter genera gli embedding dei chunk con embed_batch"""
+
+    def test_generate_embeddings_tracks_cost(self):
+        from app.services.pa_act_mongodb_importer import PAActMongoDBImporter
+
+        importer = PAActMongoDBImporter.__new__(PAActMongoDBImporter)
+        importer.tenant_id = 1
+        importer.cost_tracker = MagicMock()
+        importer.ai_router = MagicMock()
+        fake = FakeEmbeddingAdapter()
+        importer.ai_router.get_embedding_adapter.return_value = fake
+
+        results = asyncio.run(importer.generate_embeddings(["uno", "due", "tre"]))
+
+        assert fake.batches == [["uno", "due", "tre"]]
+        assert [r[0] for r in results] == [[3.0], [3.0], [3.0]]
+        assert importer.cost_tracker.add_usage.call_count == 3
+
+    def test_batch_failure_retries_each_text(self):
+        from app.services.pa_act_mongodb_importer import PAActMongoDBImporter
+
+        importer = PAActMongoDBImporter.__new__(PAActMongoDBImporter)
+        importer.tenant_id = 1
+        importer.cost_tracker = MagicMock()
+        importer.ai_router = MagicMock()
+        fake = FakeEmbeddingAdapter()
+        fake.embed_batch = AsyncMock(side_effect=RuntimeError("503"))
+        embed = fake.embed
+
+        async def flaky_embed(text, **options):
+            if text == "due":
+                raise RuntimeError("testo non valido")
+            return await embed(text, **options)
+
+        fake.embed = flaky_embed
+        importer.ai_router.get_embedding_adapter.return_value = fake
+
+        results = asyncio.run(importer.generate_embeddings(["uno", "due", "tre"]))
+
+        assert [r[0] for r in results] == [[3.0], None, [3.0]]
+        assert fake.single_calls == 2
+        assert importer.cost_tracker.add_usage.call_count == 2
@@ -0,0 +1,155 @@
+"""
+Unit Tests for EmbeddingCache (content-addressed LRU + persistent tier)
+"""
+
+import asyncio
+import pytest
+
+from app.services.providers.base import BaseEmbeddingAdapter
+from app.services.providers.embedding_cache import (
+    CachingEmbeddingAdapter,
+    EmbeddingCache,
+    _decode,
+    _encode,
+    cache_key,
+)
+
+
+class CountingAdapter(BaseEmbeddingAdapter):
+    model = "text-embedding-3-small"
+    dimensions = 4
+
+    def __init__(self):
+        self.embedded = []
+
+    async def embed(self, text, **options):
+        self.embedded.append(text)
+        return {"embedding": [float(len(text))] * 4, "dimensions": 4, "model": self.model, "tokens": 5}
+
+    async def embed_batch(self, texts, **options):
+        self.embedded.extend(texts)
+        return [{"embedding": [float(len(t))] * 4, "dimensions": 4, "model": self.model, "tokens": 5} for t in texts]
+
+
+class DictTier:
+    """Tier persistente in memoria (simula Redis/MongoDB)"""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get_many(self, keys):
+        return {k: _decode(self.data[k]) for k in keys if k in self.data}
+
+    async def set_many(self, items):
+        self.data.update({k: _encode(v) for k, v in items.items()})
+
+
+@pytest.fixture(autouse=True)
+def _reset_cache():
+    EmbeddingCache.reset()
+    EmbeddingCache.configure()
+    yield
+    EmbeddingCache.reset()
+
+
+class TestCacheKey:
+    """Test suite for cache_key"""
+
+    def test_whitespace_is_normalized(self):
+        assert cache_key("m", 4, "Qual è  il\nbilancio? ") == cache_key("m", 4, "Qual è il bilancio?")
+
+    def test_model_and_dimensions_are_part_of_key(self):
+        assert cache_key("a", 4, "x") != cache_key("b", 4, "x")
+        assert cache_key("a", 4, "x") != cache_key("a", 8, "x")
+
+
+class TestCachingEmbeddingAdapter:
+    """Test suite for CachingEmbeddingAdapter"""
+
+    def test_repeated_question_costs_no_upstream_call(self):
+        inner = CountingAdapter()
+        adapter = CachingEmbeddingAdapter(inner)
+
+        async def scenario():
+            first = await adapter.embed("Qual è il bilancio 2024?")
+            second = await adapter.embed("Qual è il bilancio  2024?")
+            return first, second
+
+        first, second = asyncio.run(scenario())
+
+        assert inner.embedded == ["Qual è il bilancio 2024?"]
+        assert second["embedding"] == first["embedding"]
+        assert second["tokens"] == 0 and second["cached"] is True
+        stats = EmbeddingCache.get_stats()
+        assert stats["memory_hits"] == 1 and stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+
+    def test_batch_embeds_only_missing_unique_texts(self):
+        inner = CountingAdapter()
+        adapter = CachingEmbeddingAdapter(inner)
+
+        async def scenario():
+            await adapter.embed("a")
+            return await adapter.embed_batch(["a", "bb", "bb", "ccc"])
+
+        results = asyncio.run(scenario())
+
+        assert inner.embedded == ["a", "bb", "ccc"]
+        assert [r["embedding"][0] for r in results] == [1.0, 2.0, 2.0, 3.0]
+        assert [r["tokens"] for r in results] == [0, 5, 0, 5]
+
+    def test_lru_eviction(self):
+        EmbeddingCache.configure(max_entries=2)
+        inner = CountingAdapter()
+        adapter = CachingEmbeddingAdapter(inner)
+
+        async def scenario():
+            for text in ["a", "bb", "ccc", "a"]:
+                await adapter.embed(text)
+
+        asyncio.run(scenario())
+
+        assert inner.embedded == ["a", "bb", "ccc", "a"]
+        assert EmbeddingCache.get_stats()["evictions"] >= 1
+
+    def test_ttl_expiry(self):
+        EmbeddingCache.configure(ttl_seconds=10)
+        inner = CountingAdapter()
+        adapter = CachingEmbeddingAdapter(inner)
+
+        asyncio.run(adapter.embed("a"))
+        # Invecchia la voce oltre il TTL
+        for key, (embedding, stored_at) in list(EmbeddingCache._entries.items()):
+            EmbeddingCache._entries[key] = (embedding, stored_at - 60)
+        asyncio.run(adapter.embed("a"))
+
+        assert inner.embedded == ["a", "a"]
+
+    def test_persistent_tier_survives_process_restart(self):
+        tier = DictTier()
+        EmbeddingCache.configure(tier=tier)
+        asyncio.run(CachingEmbeddingAdapter(CountingAdapter()).embed("chunk invariato"))
+
+        # "Nuovo processo": memoria vuota, stesso tier persistente
+        EmbeddingCache.reset()
+        EmbeddingCache.configure(tier=tier)
+        inner = CountingAdapter()
+        result = asyncio.run(CachingEmbeddingAdapter(inner).embed("chunk invariato"))
+
+        assert inner.embedded == []
+        assert result["embedding"] == [15.0] * 4
+        assert EmbeddingCache.get_stats()["persistent_hits"] == 1
+
+    def test_tier_errors_do_not_break_embedding(self):
+        class BrokenTier:
+            async def get_many(self, keys):
+                raise ConnectionError("redis down")
+
+            async def set_many(self, items):
+                raise ConnectionError("redis down")
+
+        EmbeddingCache.configure(tier=BrokenTier())
+        result = asyncio.run(CachingEmbeddingAdapter(CountingAdapter()).embed("x"))
+
+        assert result["embedding"] == [1.0] * 4
+        assert EmbeddingCache.get_stats()["tier_errors"] == 2
@@ -0,0 +1,217 @@
+"""
+Unit Tests for EmbeddingStore (per-tenant memory-mapped embedding matrix)
+"""
+
+import asyncio
+import threading
+from datetime import datetime
+from unittest.mock import AsyncMock, patch
+
+import numpy as np
+import pytest
+
+from app.services.corpus_version import CorpusVersion
+from app.services.embedding_store import EmbeddingStore, TenantEmbeddingStore, document_version
+from app.services.mongodb_service import MongoDBService
+from app.services.rag_fortress.retriever import HybridRetriever
+from tests.benchmarks.harness import InMemoryClient
+
+
+def _vectors(n: int, dim: int = 16, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+
+
+@pytest.fixture
+def store_dir(tmp_path):
+    EmbeddingStore.reset(tmp_path)
+    yield tmp_path
+    EmbeddingStore.reset()
+
+
+class TestTenantEmbeddingStore:
+    """Test suite for TenantEmbeddingStore"""
+
+    def test_rebuild_and_search_from_mmap(self, store_dir):
+        vectors = _vectors(20)
+        store = EmbeddingStore.get(1)
+        store.rebuild((f"id_{i}", vectors[i].tolist(), "v1") for i in range(20))
+
+        assert isinstance(store.matrix, np.memmap)
+        hits = store.search(vectors[7].tolist(), k=3)
+        assert hits[0][0] == "id_7"
+        assert hits[0][1] == pytest.approx(1.0, abs=1e-5)
+
+    def test_store_is_persistent_across_processes(self, store_dir):
+        vectors = _vectors(5)
+        EmbeddingStore.get("1").rebuild((f"id_{i}", vectors[i].tolist(), "v1") for i in range(5))
+
+        # Stesso tenant come int, store riaperto da disco
+        EmbeddingStore.reset(store_dir)
+        assert EmbeddingStore.load_all() == 1
+        store = EmbeddingStore.get(1)
+        assert store.size == 5
+        assert store.search(vectors[2].tolist(), k=1)[0][0] == "id_2"
+
+    def test_upsert_new_version_replaces_row(self, store_dir):
+        vectors = _vectors(3)
+        store = EmbeddingStore.get(1)
+        assert store.upsert("a", vectors[0].tolist(), "v1")
+        assert not store.upsert("a", vectors[0].tolist(), "v1")  # stessa versione: no-op
+        assert store.upsert("a", vectors[1].tolist(), "v2")
+
+        assert store.size == 1
+        assert store.get_version("a") == "v2"
+        hits = store.search(vectors[1].tolist(), k=5)
+        assert hits == [("a", pytest.approx(1.0, abs=1e-5))]
+
+    def test_compaction_drops_dead_rows(self, store_dir):
+        vectors = _vectors(10)
+        store = EmbeddingStore.get(1)
+        store.rebuild((f"id_{i}", vectors[i].tolist(), "v1") for i in range(4))
+        for version in ("v2", "v3"):
+            store.upsert("id_0", vectors[9].tolist(), version)
+
+        assert store.row_count < 6
+        assert store.size == 4
+        assert store.search(vectors[9].tolist(), k=1)[0][0] == "id_0"
+
+    def test_refresh_sees_appends_from_other_instance(self, store_dir):
+        vectors = _vectors(2)
+        reader = TenantEmbeddingStore(1, store_dir / "shared")
+        writer = TenantEmbeddingStore(1, store_dir / "shared")
+        writer.upsert("x", vectors[0].tolist(), "v1")
+
+        assert reader.search(vectors[0].tolist(), k=1)[0][0] == "x"
+
+    def test_upsert_many_writes_table_once_per_batch(self, store_dir):
+        vectors = _vectors(50)
+        store = EmbeddingStore.get(1)
+        store.rebuild([("seed", vectors[0].tolist(), "v1")])
+
+        with patch.object(TenantEmbeddingStore, "_save_table", autospec=True) as save_table:
+            written = EmbeddingStore.upsert_many(1, [(f"id_{i}", vectors[i].tolist(), "v1") for i in range(1, 50)])
+            assert store.upsert("id_1", vectors[1].tolist(), "v2")
+
+        assert written == 49
+        save_table.assert_not_called()
+        assert store.size == 50 and store.get_version("id_1") == "v2"
+        assert store.search(vectors[30].tolist(), k=1)[0][0] == "id_30"
+
+    def test_log_is_replayed_and_folded_into_table(self, store_dir):
+        vectors = _vectors(4)
+        writer = TenantEmbeddingStore(1, store_dir / "shared")
+        writer.rebuild([("a", vectors[0].tolist(), "v1"), ("b", vectors[1].tolist(), "v1")])
+        writer.upsert_many([("c", vectors[2].tolist(), "v1"), ("a", vectors[3].tolist(), "v2")])
+        writer.remove("b")
+        assert writer.log_path.exists()
+
+        reader = TenantEmbeddingStore(1, store_dir / "shared")
+        assert reader.size == 2 and reader.get_version("a") == "v2" and reader.get_version("b") is None
+        assert reader.search(vectors[3].tolist(), k=1)[0][0] == "a"
+
+        writer.compact()
+        assert not writer.log_path.exists()
+        assert TenantEmbeddingStore(1, store_dir / "shared").size == 2
+
+    def test_concurrent_writers_keep_rows_consistent(self, store_dir):
+        # Due istanze sulla stessa directory = due processi (worker API e script di import)
+        vectors = _vectors(80)
+        writers = [TenantEmbeddingStore(1, store_dir / "shared") for _ in range(2)]
+
+        def write(worker: int):
+            for i in range(worker, 80, 2):
+                writers[worker].upsert(f"id_{i}", vectors[i].tolist(), "v1")
+
+        threads = [threading.Thread(target=write, args=(worker,)) for worker in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        reader = TenantEmbeddingStore(1, store_dir / "shared")
+        assert reader.size == 80
+        for i in range(80):
+            assert reader.search(vectors[i].tolist(), k=1) == [(f"id_{i}", pytest.approx(1.0, abs=1e-5))]
+
+    def test_document_version_matches_mongo_precision(self):
+        written = datetime(2025, 1, 28, 10, 30, 0, 123456)
+        read_back = datetime(2025, 1, 28, 10, 30, 0, 123000)
+        assert document_version(written) == document_version({"updated_at": read_back})
+
+
+class TestFallbackUsesStore:
+    """HybridRetriever fallback hydrates only the winning documents"""
+
+    def test_fallback_fetches_only_top_k_by_id(self, store_dir):
+        vectors = _vectors(30, seed=4)
+        ids = [f"{i:024x}" for i in range(30)]
+        updated_at = datetime(2025, 1, 1)
+        store = EmbeddingStore.get("1")
+        store.rebuild((ids[i], vectors[i].tolist(), updated_at) for i in range(30))
+        store.synced_version = "0.0"
+
+        requested = []
+
+        def hydrate(collection_name, object_ids, projection):
+            assert "embedding" not in projection
+            requested.extend(str(oid) for oid in object_ids)
+            return {
+                str(oid): {"_id": oid, "document_id": f"doc_{oid}", "title": "Atto", "updated_at": updated_at,
+                           "content": {"full_text": f"testo {oid}"}}
+                for oid in object_ids
+            }
+
+        with patch('app.services.mongodb_async.MongoDBService') as mock_service, \
+             patch('app.services.rag_fortress.retriever.CorpusVersion.aget', new=AsyncMock(return_value="0.0")), \
+             patch('app.services.rag_fortress.retriever.AIRouter'):
+            mock_service.hydrate_documents.side_effect = hydrate
+            results = asyncio.run(
+                HybridRetriever()._fallback_manual_vector_search(vectors[12].tolist(), "1", 3)
+            )
+
+        assert len(results) == 3
+        assert results[0]["evidence_id"] == ids[12]
+        assert results[0]["score"] == pytest.approx(1.0, abs=1e-5)
+        assert mock_service.hydrate_documents.call_count == 1
+        assert len(requested) == 6
+
+
+class TestStoreResync:
+    """The store follows documents written by other processes (CorpusVersion change)"""
+
+    @pytest.fixture
+    def documents(self, store_dir):
+        client = InMemoryClient()
+        db = client["embedding_store_test"]
+        saved_connection = (MongoDBService._client, MongoDBService._db, MongoDBService._connected)
+        MongoDBService._client, MongoDBService._db, MongoDBService._connected = client, db, True
+        CorpusVersion.reset()
+        with patch.object(MongoDBService, "is_connected", return_value=True):
+            yield db["documents"]
+        CorpusVersion.reset()
+        MongoDBService._client, MongoDBService._db, MongoDBService._connected = saved_connection
+
+    def test_external_writes_are_picked_up(self, documents):
+        vectors = _vectors(4, seed=2)
+        updated_at = datetime(2025, 1, 1)
+        for i in range(3):
+            documents.insert_one({"_id": f"{i:024x}", "tenant_id": 1, "embedding": vectors[i].tolist(), "updated_at": updated_at})
+        store = EmbeddingStore.get(1)
+        store.rebuild([(f"{0:024x}", vectors[0].tolist(), updated_at)])
+
+        with patch('app.services.rag_fortress.retriever.AIRouter'):
+            retriever = HybridRetriever()
+        asyncio.run(retriever._ensure_embedding_store(store, 1))
+        assert store.size == 3
+
+        # Scritture di un altro processo: nuovo atto, atto eliminato, versione del corpus incrementata
+        documents.insert_one({"_id": f"{3:024x}", "tenant_id": 1, "embedding": vectors[3].tolist(), "updated_at": updated_at})
+        documents.delete_many({"_id": f"{1:024x}"})
+        asyncio.run(retriever._ensure_embedding_store(store, 1))
+        assert store.size == 3  # versione invariata: nessuna scansione
+
+        CorpusVersion.bump(1)
+        asyncio.run(retriever._ensure_embedding_store(store, 1))
+        assert store.size == 3
+        assert store.get_version(f"{3:024x}") is not None and store.get_version(f"{1:024x}") is None
+        assert store.search(vectors[3].tolist(), k=1)[0][0] == f"{3:024x}"
@@ -0,0 +1,125 @@
+"""
+Unit Tests for HTTPClientRegistry (shared pooled clients for AI providers)
+"""
+
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from app.services.providers.http_client import HTTPClientRegistry
+from app.services.providers.openai_adapter import OpenAIEmbeddingAdapter
+
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = json.dumps({"ok": True}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def local_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _KeepAliveHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def _reset_registry():
+    HTTPClientRegistry.reset_stats()
+    yield
+    asyncio.run(HTTPClientRegistry.aclose())
+    HTTPClientRegistry.reset_stats()
+
+
+class TestHTTPClientRegistry:
+    """Test suite for HTTPClientRegistry"""
+
+    def test_same_client_per_base_url(self):
+        async def scenario():
+            first = HTTPClientRegistry.get("https://api.example.com/v1/", "example")
+            second = HTTPClientRegistry.get("https://api.example.com/v1", "example")
+            other = HTTPClientRegistry.get("https://other.example.com", "other")
+            return first, second, other
+
+        first, second, other = asyncio.run(scenario())
+
+        assert first is second
+        assert first is not other
+
+    def test_client_recreated_on_new_event_loop(self):
+        async def get():
+            return HTTPClientRegistry.get("https://api.example.com", "example")
+
+        assert asyncio.run(get()) is not asyncio.run(get())
+
+    def test_connections_are_reused(self, local_server):
+        async def scenario():
+            for _ in range(5):
+                client = HTTPClientRegistry.get(local_server, "local")
+                response = await client.post(f"{local_server}/embeddings", json={"input": "x"})
+                assert response.json() == {"ok": True}
+
+        asyncio.run(scenario())
+
+        stats = HTTPClientRegistry.get_stats()["providers"]["local"]
+        assert stats["requests"] == 5
+        assert stats["new_connections"] == 1
+        assert stats["reused_connections"] == 4
+        assert stats["reuse_ratio"] == 0.8
+
+    def test_aclose_closes_clients(self):
+        async def scenario():
+            client = HTTPClientRegistry.get("https://api.example.com", "example")
+            await HTTPClientRegistry.aclose()
+            return client
+
+        client = asyncio.run(scenario())
+
+        assert client.is_closed
+        assert HTTPClientRegistry.get_stats()["open_clients"] == 0
+
+
+class TestAdaptersUseSharedClient:
+    """Gli adapter usano il client condiviso invece di aprirne uno per chiamata"""
+
+    def test_openai_embedding_adapter(self):
+        def handler(request: httpx.Request) -> httpx.Response:
+            assert request.url.path == "/v1/embeddings"
+            return httpx.Response(200, json={
+                "data": [{"embedding": [0.1, 0.2]}],
+                "model": "text-embedding-3-small",
+                "usage": {"total_tokens": 3},
+            })
+
+        async def scenario():
+            client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            with patch.object(HTTPClientRegistry, "get", return_value=client) as get, \
+                 patch("httpx.AsyncClient", side_effect=AssertionError("client per chiamata")):
+                adapter = OpenAIEmbeddingAdapter()
+                adapter.api_key = "test"
+                result = await adapter.embed("ciao")
+            await client.aclose()
+            return result, get
+
+        result, get = asyncio.run(scenario())
+
+        assert result["embedding"] == [0.1, 0.2]
+        get.assert_called_once_with("https://api.openai.com/v1", "openai")
@@ -0,0 +1,220 @@
+"""
+Unit Tests for the in-process BM25 lexical index and the RRF reranker of HybridRetriever
+"""
+
+import asyncio
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.services.lexical_index import LexicalIndexRegistry, TenantLexicalIndex, stem_italian, tokenize
+from app.services.mongodb_service import MongoDBService
+from app.services.rag_fortress.retriever import HybridRetriever
+from tests.benchmarks.harness import InMemoryClient
+
+
+def _document(i: int, title: str, protocol: str, text: str, updated_at: datetime = datetime(2025, 3, 1)) -> dict:
+    return {
+        "_id": f"oid_{i}",
+        "document_id": f"pa_act_{i}",
+        "tenant_id": 1,
+        "title": title,
+        "protocol_number": protocol,
+        "protocol_date": "2025-03-01",
+        "content": {"chunks": [{"chunk_text": text, "embedding": [0.1, 0.2]}]},
+        "metadata": {"tipo_atto": "delibera"},
+        "updated_at": updated_at,
+    }
+
+
+CORPUS = [
+    _document(1, "Delibera di approvazione del bilancio di previsione", "45/2025", "Il consiglio comunale approva il bilancio."),
+    _document(2, "Determina affidamento manutenzione del verde pubblico", "DD/2025/00123", "Affidamento diretto dei lavori di manutenzione delle aree verdi."),
+    _document(3, "Ordinanza viabilità", "12/2024", "Divieto di sosta nelle piazze pubbliche per la fiera."),
+    _document(4, "Delibere sulle tariffe TARI", "46/2025", "Tariffe della tassa sui rifiuti per le utenze domestiche."),
+]
+
+
+@pytest.fixture(autouse=True)
+def _reset_registry():
+    LexicalIndexRegistry.invalidate()
+    yield
+    LexicalIndexRegistry.invalidate()
+
+
+@pytest.fixture
+def documents_db():
+    client = InMemoryClient()
+    db = client["lexical_index_test"]
+    db["documents"].insert_many([dict(doc) for doc in CORPUS])
+    saved_connection = (MongoDBService._client, MongoDBService._db, MongoDBService._connected)
+    MongoDBService._client, MongoDBService._db, MongoDBService._connected = client, db, True
+    with patch.object(MongoDBService, "is_connected", return_value=True):
+        yield db
+    MongoDBService._client, MongoDBService._db, MongoDBService._connected = saved_connection
+
+
+class TestTokenizer:
+    """Test suite for the Italian tokenizer"""
+
+    def test_stemming_merges_inflections(self):
+        assert stem_italian("delibera") == stem_italian("delibere") == "deliber"
+        assert stem_italian("pubblico") == stem_italian("pubbliche")
+        assert stem_italian("servizio") == stem_italian("servizi")
+        assert stem_italian("provincia") == stem_italian("province")
+        assert stem_italian("anno") == "anno"
+
+    def test_accents_and_stopwords(self):
+        assert tokenize("La viabilità della città") == tokenize("viabilita citta")
+
+    def test_protocol_numbers_kept_whole_without_leading_zeros(self):
+        terms = tokenize("Determina n. DD/2025/00123")
+        assert "dd/2025/123" in terms
+        assert {"dd", "2025", "123"} <= set(terms)
+        assert "123/2025" in tokenize("atto 00123/2025")
+
+
+class TestTenantLexicalIndex:
+    """Test suite for TenantLexicalIndex"""
+
+    def _index(self) -> TenantLexicalIndex:
+        return TenantLexicalIndex.from_documents(1, [dict(doc) for doc in CORPUS])
+
+    def test_protocol_number_query_ranks_act_first(self):
+        hits = self._index().search("cosa prevede l'atto 45/2025?", k=3)
+        assert hits[0][0]["document_id"] == "pa_act_1"
+        assert hits[0][0]["content"].startswith("Il consiglio comunale")
+
+    def test_stemmed_terms_match_across_inflections(self):
+        hits = self._index().search("delibera tariffe rifiuti", k=2)
+        assert hits[0][0]["document_id"] == "pa_act_4"
+
+    def test_title_weighs_more_than_text(self):
+        index = TenantLexicalIndex.from_documents(1, [
+            _document(1, "Verde pubblico", "1/2025", "Testo generico"),
+            _document(2, "Atto generico", "2/2025", "Si parla anche di verde pubblico"),
+        ])
+        assert [payload["document_id"] for payload, _ in index.search("verde pubblico", k=2)] == ["pa_act_1", "pa_act_2"]
+
+    def test_upsert_replaces_old_version_and_remove(self):
+        index = self._index()
+        updated = _document(3, "Ordinanza mercato", "12/2024", "Mercato settimanale spostato.", datetime(2025, 4, 1))
+
+        assert index.upsert("oid_3", updated)
+        assert not index.upsert("oid_3", updated)
+        assert index.search("fiera", k=5) == []
+        assert index.search("mercato", k=5)[0][0]["document_id"] == "pa_act_3"
+        assert index.size == 4
+
+        assert index.remove("oid_3")
+        assert index.search("mercato", k=5) == []
+        assert index.size == 3
+
+    def test_no_matching_terms(self):
+        assert self._index().search("di per la", k=5) == []
+        assert TenantLexicalIndex(1).search("bilancio", k=5) == []
+
+
+class TestLexicalIndexRegistry:
+    """Test suite for LexicalIndexRegistry"""
+
+    def test_built_lazily_from_mongodb_and_updated_on_import(self, documents_db):
+        index = LexicalIndexRegistry.get_index("1")
+        assert index.size == 4
+        assert LexicalIndexRegistry.get_index(1) is index
+
+        new_doc = _document(5, "Regolamento del mercato contadino", "50/2025", "Nuove regole per il mercato.")
+        assert LexicalIndexRegistry.upsert(1, "oid_5", new_doc)
+        assert index.search("50/2025", k=1)[0][0]["document_id"] == "pa_act_5"
+
+    def test_upsert_without_built_index_is_noop(self):
+        assert not LexicalIndexRegistry.upsert(1, "oid_5", CORPUS[0])
+
+    def test_not_connected_returns_empty_uncached_index(self):
+        with patch.object(MongoDBService, "is_connected", return_value=False):
+            assert LexicalIndexRegistry.get_index(1).size == 0
+        assert 1 not in LexicalIndexRegistry._indexes
+
+
+class TestRerankFusion:
+    """Test suite for HybridRetriever._rerank_chunks and the lexical leg"""
+
+    def _chunk(self, chunk_id, score, vector_score=None, lexical_score=None):
+        return {"evidence_id": chunk_id, "score": score, "vector_score": vector_score, "lexical_score": lexical_score}
+
+    def test_rrf_promotes_documents_found_by_both_rankings(self):
+        with patch("app.services.rag_fortress.retriever.AIRouter"):
+            retriever = HybridRetriever()
+        chunks = [
+            self._chunk("v1", 0.9, vector_score=0.9),
+            self._chunk("both", 0.8, vector_score=0.8, lexical_score=0.7),
+            self._chunk("l1", 1.0, lexical_score=1.0),
+        ]
+
+        ranked = asyncio.run(retriever._rerank_chunks("domanda", chunks, top_k=3))
+
+        assert ranked[0]["evidence_id"] == "both"
+        assert ranked[0]["score"] == 0.8
+
+    def test_without_lexical_results_orders_by_score(self):
+        with patch("app.services.rag_fortress.retriever.AIRouter"):
+            retriever = HybridRetriever()
+        chunks = [self._chunk("a", 0.4, vector_score=0.4), self._chunk("b", 0.9, vector_score=0.9)]
+        assert [c["evidence_id"] for c in asyncio.run(retriever._rerank_chunks("q", chunks, top_k=1))] == ["b"]
+
+    def _retrieve(self, question, vector_results):
+        collection = MagicMock()
+        collection.aggregate.return_value = vector_results
+
+        async def run(fn, *args, **kwargs):
+            return fn(*args)
+
+        with patch("app.services.rag_fortress.retriever.AsyncMongoDBService") as async_mongo, \
+             patch("app.services.rag_fortress.retriever.MongoDBService") as mongo, \
+             patch("app.services.rag_fortress.retriever.AIRouter"):
+            async_mongo.is_connected = AsyncMock(return_value=True)
+            async_mongo.run = AsyncMock(side_effect=run)
+            mongo.get_collection.return_value = collection
+
+            evidences = asyncio.run(HybridRetriever().retrieve_evidence(
+                question, tenant_id=1, question_embedding=[0.1]
+            ))
+        return collection, evidences
+
+    def test_protocol_query_hits_without_text_index(self, documents_db):
+        # Per la ricerca vettoriale l'atto 45/2025 è secondo e sotto soglia
+        collection, evidences = self._retrieve("delibera 45/2025", [
+            {"_id": "oid_3", "document_id": "pa_act_3", "title": "Ordinanza viabilità", "content": "testo", "score": 0.6},
+            {"_id": "oid_1", "document_id": "pa_act_1", "title": "Delibera", "content": "testo", "score": 0.45},
+        ])
+
+        # Solo $vectorSearch su MongoDB: la gamba lessicale è in-process
+        assert collection.aggregate.call_count == 1
+        assert evidences[0]["evidence_id"] == "oid_1"
+        assert evidences[0]["vector_score"] == 0.45 and evidences[0]["lexical_score"] == 1.0
+        assert evidences[0]["score"] == 0.45
+        # "Delibere" (solo lessicale, BM25 basso) resta fuori
+        assert {ev["evidence_id"] for ev in evidences} == {"oid_1", "oid_3"}
+
+    def test_strong_lexical_only_hit_passes_threshold(self, documents_db):
+        _, evidences = self._retrieve("approvazione bilancio di previsione 45/2025", [])
+
+        assert [ev["evidence_id"] for ev in evidences] == ["oid_1"]
+        assert evidences[0]["score"] == 0.0 and evidences[0]["vector_score"] is None
+
+    def test_unrelated_question_sharing_one_token_returns_no_evidence(self, documents_db):
+        # Solo "comunale" in comune con l'atto 1; la ricerca vettoriale è sotto soglia
+        _, evidences = self._retrieve("quali sono gli orari della piscina comunale?", [
+            {"_id": "oid_3", "document_id": "pa_act_3", "title": "Ordinanza viabilità", "content": "testo", "score": 0.2},
+        ])
+
+        assert evidences == []
+
+    def test_weak_vector_hit_sharing_one_token_is_not_rescued(self, documents_db):
+        # Atto 1 in entrambe le liste: vettoriale 0.3 (sotto soglia 0.5) e BM25 di un solo termine
+        _, evidences = self._retrieve("quali sono gli orari della piscina comunale?", [
+            {"_id": "oid_1", "document_id": "pa_act_1", "title": "Delibera", "content": "testo", "score": 0.3},
+        ])
+
+        assert evidences == []
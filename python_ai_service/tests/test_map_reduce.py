@@ -0,0 +1,163 @@
+"""
+Unit Tests for the bounded-concurrency map stage of _multi_step_synthesis
+"""
+
+import asyncio
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.config.rag_config import RAGConfig, load_rag_config
+from app.services.providers.api_errors import RateLimitError
+from app.services.rag_fortress.map_reduce import (
+    BoundedMapExecutor,
+    MapStageError,
+    ProviderRateLimiter,
+    provider_name,
+)
+from app.services.rag_fortress.pipeline import RAGFortressPipeline
+
+
+class _Tracker:
+    def __init__(self):
+        self.now = 0
+        self.peak = 0
+
+    async def run(self, value, delay=0.02):
+        self.now += 1
+        self.peak = max(self.peak, self.now)
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            self.now -= 1
+        return value
+
+
+@pytest.fixture(autouse=True)
+def _reset_limiters():
+    ProviderRateLimiter.reset()
+    yield
+    ProviderRateLimiter.reset()
+
+
+class TestBoundedMapExecutor:
+    """Test suite for BoundedMapExecutor"""
+
+    def test_respects_max_in_flight_and_keeps_order(self):
+        tracker = _Tracker()
+        executor = BoundedMapExecutor(max_in_flight=3)
+
+        result = asyncio.run(executor.map(list(range(8)), lambda i: tracker.run(i * 10)))
+
+        assert result.results == [i * 10 for i in range(8)]
+        assert tracker.peak == 3
+        assert result.failures == []
+
+    def test_partial_failures_are_tolerated(self):
+        async def fn(i):
+            if i == 1:
+                raise RuntimeError("boom")
+            return i
+
+        result = asyncio.run(BoundedMapExecutor(min_success_ratio=0.5).map([0, 1, 2], fn))
+
+        assert result.results == [0, None, 2]
+        assert result.failures == [(1, "boom")]
+        assert result.succeeded == [(0, 0), (2, 2)]
+
+    def test_too_many_failures_raise_with_errors(self):
+        error = RuntimeError("down")
+
+        async def fn(i):
+            if i > 0:
+                raise error
+            return i
+
+        with pytest.raises(MapStageError) as exc_info:
+            asyncio.run(BoundedMapExecutor(min_success_ratio=0.5).map([0, 1, 2], fn))
+
+        assert exc_info.value.errors == [error, error]
+
+    def test_rate_limit_error_is_retried(self):
+        calls = {"n": 0}
+
+        async def fn(i):
+            calls["n"] += 1
+            if calls["n"] == 1:
+                raise RateLimitError("openai", retry_after=0.01)
+            return i
+
+        limiter = ProviderRateLimiter.get("openai", 100)
+        result = asyncio.run(BoundedMapExecutor(rate_limiter=limiter).map([7], fn))
+
+        assert result.results == [7]
+        assert calls["n"] == 2
+
+    def test_rate_limiter_paces_requests_per_minute(self):
+        limiter = ProviderRateLimiter("groq", 2)
+        sleeps = []
+
+        async def fake_sleep(seconds):
+            sleeps.append(seconds)
+            limiter._sent.clear()  # la finestra si libera dopo l'attesa
+
+        async def scenario():
+            with patch("app.services.rag_fortress.map_reduce.asyncio.sleep", side_effect=fake_sleep):
+                for _ in range(3):
+                    await limiter.acquire()
+
+        asyncio.run(scenario())
+
+        assert len(sleeps) == 1
+        assert 0 < sleeps[0] <= 60.0
+
+    def test_limiter_is_shared_per_provider(self):
+        assert ProviderRateLimiter.get("anthropic", 50) is ProviderRateLimiter.get("anthropic", 50)
+        assert ProviderRateLimiter.get("anthropic", None) is None
+
+    def test_provider_name(self):
+        class OpenAIChatAdapter:
+            pass
+
+        assert provider_name(OpenAIChatAdapter()) == "openai"
+
+
+class TestMapReduceConfig:
+    """Test suite for map stage settings in ai_policies.yaml"""
+
+    def test_profiles_expose_map_settings(self):
+        config = load_rag_config()
+
+        assert config.map_max_in_flight >= 1
+        assert 0 < config.map_min_success_ratio <= 1
+        assert isinstance(config.provider_rate_limits, dict)
+
+
+class TestMultiStepSynthesisParallelMap:
+    """Test suite for the parallel map stage in RAGFortressPipeline._multi_step_synthesis"""
+
+    def test_batches_are_extracted_concurrently(self):
+        tracker = _Tracker()
+
+        class FakeAdapter:
+            async def generate(self, messages, **options):
+                content = await tracker.run("sintesi", delay=0.05 if options.get("max_tokens") == 800 else 0)
+                return {"content": content}
+
+        pipeline = RAGFortressPipeline()
+        pipeline.ai_router = MagicMock()
+        pipeline.ai_router.get_chat_adapter.return_value = FakeAdapter()
+        evidences = [
+            {"document_id": f"doc{i}", "title": f"Atto {i}", "content": f"testo {i}"}
+            for i in range(12)
+        ]
+        config = RAGConfig(batch_size=3, map_max_in_flight=4, map_min_success_ratio=0.5)
+
+        with patch("app.services.rag_fortress.pipeline.get_rag_config", return_value=config), \
+             patch("app.services.mongodb_service.MongoDBService.count_documents", return_value=100):
+            response = asyncio.run(pipeline._multi_step_synthesis("Riassumi gli atti", evidences, "1"))
+
+        assert tracker.peak == 4  # 4 batch estratti insieme
+        assert response["answer"]
+        assert len(response["sources"]) == 12
+        assert "batch non elaborati" not in response["urs_explanation"]
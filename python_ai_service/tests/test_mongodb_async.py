@@ -0,0 +1,88 @@
+"""
+Unit Tests for AsyncMongoDBService (bounded thread-pool wrapper)
+"""
+
+import asyncio
+import time
+from unittest.mock import patch
+
+import pytest
+
+from app.services.mongodb_async import AsyncMongoDBService, MongoDBTimeoutError
+
+
+@pytest.fixture(autouse=True)
+def fresh_pool():
+    AsyncMongoDBService.configure(pool_size=4)
+    AsyncMongoDBService.reset_stats()
+    yield
+    AsyncMongoDBService.shutdown()
+
+
+class TestAsyncMongoDBService:
+    """Test suite for AsyncMongoDBService"""
+
+    def test_same_api_delegates_to_sync_service(self):
+        with patch('app.services.mongodb_async.MongoDBService') as mock_service:
+            mock_service.find_documents.return_value = [{"document_id": "a"}]
+            mock_service.count_documents.return_value = 7
+
+            async def scenario():
+                docs = await AsyncMongoDBService.find_documents("documents", {"tenant_id": 1}, limit=5)
+                count = await AsyncMongoDBService.count_documents("documents", {"tenant_id": 1})
+                return docs, count
+
+            docs, count = asyncio.run(scenario())
+
+        assert docs == [{"document_id": "a"}]
+        assert count == 7
+        mock_service.find_documents.assert_called_once_with("documents", {"tenant_id": 1}, limit=5, sort=None)
+
+    def test_blocking_calls_do_not_block_event_loop(self):
+        def slow_query():
+            time.sleep(0.2)
+            return "done"
+
+        async def scenario():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            tick_task = asyncio.create_task(ticker())
+            start = time.perf_counter()
+            results = await asyncio.gather(*(AsyncMongoDBService.run(slow_query) for _ in range(4)))
+            elapsed = time.perf_counter() - start
+            tick_task.cancel()
+            return results, elapsed, ticks
+
+        results, elapsed, ticks = asyncio.run(scenario())
+
+        assert results == ["done"] * 4
+        assert elapsed < 0.6  # 4 query in parallelo, non in serie (0.8s)
+        assert ticks >= 5     # l'event loop ha continuato a girare
+
+    def test_timeout_raises_and_is_counted(self):
+        with pytest.raises(MongoDBTimeoutError):
+            asyncio.run(AsyncMongoDBService.run(time.sleep, 0.3, timeout=0.05))
+
+        stats = AsyncMongoDBService.get_stats()
+        assert stats["timeouts"] == 1
+        assert stats["failed"] == 1
+        assert stats["in_flight"] == 0
+
+    def test_metrics_track_pool_usage(self):
+        async def scenario():
+            await asyncio.gather(*(AsyncMongoDBService.run(time.sleep, 0.05) for _ in range(8)))
+
+        asyncio.run(scenario())
+        stats = AsyncMongoDBService.get_stats()
+
+        assert stats["pool_size"] == 4
+        assert stats["submitted"] == 8
+        assert stats["completed"] == 8
+        assert stats["peak_in_flight"] == 8
+        assert stats["avg_wait_ms"] > 0  # metà delle chiamate ha atteso un worker libero
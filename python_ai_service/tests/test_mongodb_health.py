@@ -0,0 +1,130 @@
+"""
+Unit Tests for MongoHealthMonitor (cached health state, circuit breaker, pool stats)
+"""
+
+import time
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.services import mongodb_health
+from app.services.mongodb_health import MongoHealthMonitor, PoolStatsListener
+from app.services.mongodb_service import MongoDBService
+
+
+@pytest.fixture(autouse=True)
+def fresh_state():
+    MongoHealthMonitor.reset()
+    yield
+    MongoHealthMonitor.reset()
+
+
+class TestMongoHealthMonitor:
+    """Test suite for MongoHealthMonitor"""
+
+    def test_state_is_cached_within_ttl(self):
+        probe = MagicMock(return_value=True)
+
+        assert all(MongoHealthMonitor.is_healthy(probe) for _ in range(10))
+        assert probe.call_count == 1
+        assert MongoHealthMonitor.get_status()["cache_hits"] == 9
+
+    def test_stale_state_triggers_new_probe(self):
+        probe = MagicMock(return_value=True)
+        with patch.object(mongodb_health, "MONGODB_HEALTH_TTL_SECONDS", 0):
+            MongoHealthMonitor.is_healthy(probe)
+            MongoHealthMonitor.is_healthy(probe)
+        assert probe.call_count == 2
+
+    def test_circuit_opens_and_fails_fast(self):
+        probe = MagicMock(side_effect=ConnectionError("down"))
+
+        with patch.object(mongodb_health, "MONGODB_HEALTH_TTL_SECONDS", 0), \
+             patch.object(mongodb_health, "MONGODB_CIRCUIT_FAILURE_THRESHOLD", 2):
+            assert not MongoHealthMonitor.is_healthy(probe)
+            assert not MongoHealthMonitor.is_healthy(probe)
+            assert MongoHealthMonitor.circuit_open()
+
+            # Circuito aperto: nessun probe ulteriore
+            for _ in range(5):
+                assert not MongoHealthMonitor.is_healthy(probe)
+
+        assert probe.call_count == 2
+        status = MongoHealthMonitor.get_status()
+        assert status["circuit"] == "open"
+        assert status["fast_failures"] == 5
+        assert status["last_error"] == "down"
+
+    def test_half_open_probe_closes_circuit(self):
+        probe = MagicMock(side_effect=[ConnectionError("down"), True])
+
+        with patch.object(mongodb_health, "MONGODB_HEALTH_TTL_SECONDS", 0), \
+             patch.object(mongodb_health, "MONGODB_CIRCUIT_FAILURE_THRESHOLD", 1), \
+             patch.object(mongodb_health, "MONGODB_CIRCUIT_RESET_SECONDS", 0.05):
+            assert not MongoHealthMonitor.is_healthy(probe)
+            assert MongoHealthMonitor.circuit_open()
+            time.sleep(0.06)
+            assert MongoHealthMonitor.is_healthy(probe)
+
+        assert not MongoHealthMonitor.circuit_open()
+
+    def test_heartbeat_running_serves_last_state_past_ttl(self):
+        probe = MagicMock(return_value=True)
+        MongoHealthMonitor.check(probe)
+
+        heartbeat = MagicMock()
+        heartbeat.done.return_value = False
+        with patch.object(mongodb_health, "MONGODB_HEALTH_TTL_SECONDS", 0), \
+             patch.object(MongoHealthMonitor, "_heartbeat_task", heartbeat):
+            assert MongoHealthMonitor.is_healthy(probe)
+
+        assert probe.call_count == 1
+
+    def test_default_heartbeat_is_shorter_than_ttl(self):
+        assert mongodb_health.MONGODB_HEARTBEAT_INTERVAL_SECONDS < mongodb_health.MONGODB_HEALTH_TTL_SECONDS
+
+    def test_concurrent_check_returns_last_state_without_waiting(self):
+        MongoHealthMonitor.record(True)
+        probe = MagicMock(return_value=False)
+
+        MongoHealthMonitor._probe_lock.acquire()
+        try:
+            start = time.perf_counter()
+            assert MongoHealthMonitor.check(probe)
+            assert time.perf_counter() - start < 0.1
+        finally:
+            MongoHealthMonitor._probe_lock.release()
+
+        probe.assert_not_called()
+
+    def test_is_connected_uses_cached_state(self):
+        with patch.object(MongoDBService, "ping", return_value=True) as ping:
+            assert MongoDBService.is_connected()
+            assert MongoDBService.is_connected()
+        assert ping.call_count == 1
+
+
+class TestPoolStatsListener:
+    """Test suite for PoolStatsListener"""
+
+    def test_tracks_checked_out_sockets_and_wait(self):
+        listener = PoolStatsListener()
+        event = SimpleNamespace(address=("localhost", 27017), connection_id=1)
+
+        listener.pool_created(event)
+        listener.connection_created(event)
+        listener.connection_check_out_started(event)
+        time.sleep(0.01)
+        listener.connection_checked_out(event)
+
+        stats = listener.snapshot()
+        assert stats["checked_out"] == 1
+        assert stats["wait_queue"] == 0
+        assert stats["avg_wait_ms"] >= 10
+
+        listener.connection_checked_in(event)
+        stats = listener.snapshot()
+        assert stats["checked_out"] == 0
+        assert stats["peak_checked_out"] == 1
+        assert stats["checkouts"] == 1
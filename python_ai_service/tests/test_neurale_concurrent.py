@@ -0,0 +1,78 @@
+"""
+Unit Tests for NeuraleStrict concurrent answer/claims generation
+"""
+
+import asyncio
+import time
+import pytest
+from unittest.mock import patch
+
+from app.services import neurale_strict
+from app.services.neurale_strict import NeuraleStrict
+
+
+CHUNKS = [
+    {
+        "chunk_text": "Il bilancio 2024 prevede investimenti per 1M euro.",
+        "source_ref": {"source_id": "src_1", "title": "Bilancio Previsione", "url": "http://example.com/doc1"},
+    }
+]
+
+
+def _neurale(answer_delay=0.2, claims_delay=0.2, claims_error=None, cancelled=None):
+    neurale = NeuraleStrict.__new__(NeuraleStrict)
+
+    async def answer(**kwargs):
+        try:
+            await asyncio.sleep(answer_delay)
+        except asyncio.CancelledError:
+            if cancelled is not None:
+                cancelled.append("answer")
+            raise
+        return {"answer": "Investimenti per 1M euro.", "tokens": {"input_tokens": 100, "output_tokens": 20}, "model": "m"}
+
+    async def claims(**kwargs):
+        await asyncio.sleep(claims_delay)
+        if claims_error:
+            raise claims_error
+        return {"claims": [], "tokens": {"input_tokens": 150, "output_tokens": 30}, "model": "m"}
+
+    neurale._generate_natural_answer = answer
+    neurale._generate_claims_from_context = claims
+    return neurale
+
+
+class TestNeuraleConcurrent:
+    """Test suite for NeuraleStrict.generate_claims concurrency"""
+
+    def test_latency_is_max_not_sum(self):
+        neurale = _neurale(answer_delay=0.3, claims_delay=0.3)
+
+        start = time.perf_counter()
+        result = asyncio.run(neurale.generate_claims("Bilancio?", CHUNKS, tenant_id=1))
+        elapsed = time.perf_counter() - start
+
+        assert elapsed < 0.5
+        assert result["answer"] == "Investimenti per 1M euro."
+
+    def test_token_usage_is_combined(self):
+        result = asyncio.run(_neurale().generate_claims("Bilancio?", CHUNKS, tenant_id=1))
+
+        assert result["tokens_used"] == {"input": 250, "output": 50, "total": 300}
+
+    def test_failure_cancels_sibling(self):
+        cancelled = []
+        neurale = _neurale(answer_delay=5, claims_delay=0.05, claims_error=RuntimeError("LLM down"), cancelled=cancelled)
+
+        with pytest.raises(RuntimeError, match="LLM down"):
+            asyncio.run(neurale.generate_claims("Bilancio?", CHUNKS, tenant_id=1))
+        assert cancelled == ["answer"]
+
+    def test_timeout_budget(self):
+        cancelled = []
+        neurale = _neurale(answer_delay=5, claims_delay=0.01, cancelled=cancelled)
+
+        with patch.object(neurale_strict, "NEURALE_STRICT_TIMEOUT_SECONDS", 0.1):
+            with pytest.raises(asyncio.TimeoutError):
+                asyncio.run(neurale.generate_claims("Bilancio?", CHUNKS, tenant_id=1))
+        assert cancelled == ["answer"]
@@ -0,0 +1,94 @@
+"""
+Unit Tests for MultiPatternMatcher and the compiled QuestionClassifier
+"""
+
+import random
+
+from app.services.pattern_matcher import MultiPatternMatcher
+from app.services.pattern_weights import get_weighted_confidence
+from app.services.question_classifier import (
+    QueryIntent,
+    QuestionClassifier,
+    _classify_keywords,
+    _keyword_matcher,
+)
+
+
+class TestMultiPatternMatcher:
+    """Test suite for MultiPatternMatcher"""
+
+    def test_same_semantics_as_substring_check(self):
+        random.seed(7)
+        alphabet = "abc "
+        groups = {
+            "g1": ["".join(random.choices(alphabet, k=random.randint(1, 4))) for _ in range(40)],
+            "g2": ["".join(random.choices(alphabet, k=random.randint(1, 6))) for _ in range(40)],
+        }
+        matcher = MultiPatternMatcher(groups)
+
+        for _ in range(200):
+            text = "".join(random.choices(alphabet, k=random.randint(0, 30)))
+            found = matcher.find(text)
+            for group, patterns in groups.items():
+                expected = [p for p in dict.fromkeys(patterns) if p in text]
+                assert [p for p, _ in found[group]] == expected
+
+    def test_overlapping_and_nested_patterns(self):
+        matcher = MultiPatternMatcher({"g": ["he", "she", "his", "hers", "sono", "sono nato"]})
+
+        found = [p for p, _ in matcher.find("ushers, sono nato")["g"]]
+
+        assert found == ["he", "she", "hers", "sono", "sono nato"]
+
+    def test_weights_and_empty_groups(self):
+        matcher = MultiPatternMatcher(
+            {"personal": ["mi chiamo", "anni"], "other": ["bilancio"]},
+            weights={"personal": {"mi chiamo": 0.95, "anni": 0.85}}
+        )
+
+        found = matcher.find("mi chiamo luca e ho 40 anni")
+
+        assert found["personal"] == [("mi chiamo", 0.95), ("anni", 0.85)]
+        assert found["other"] == []
+
+    def test_empty_pattern_always_matches(self):
+        matcher = MultiPatternMatcher({"g": ["", "x"]})
+
+        assert matcher.find("abc")["g"] == [("", None)]
+
+
+class TestCompiledQuestionClassifier:
+    """Test suite for QuestionClassifier on the compiled automaton"""
+
+    def setup_method(self):
+        _classify_keywords.cache_clear()
+
+    def test_high_priority_personal(self):
+        result = QuestionClassifier.classify("Mi chiamo Mario", 1)
+
+        assert result["intent"] == QueryIntent.CONVERSATIONAL
+        assert result["confidence"] == get_weighted_confidence(["mi chiamo"], "PERSONAL")
+
+    def test_generative_and_document_requests(self):
+        assert QuestionClassifier.classify("Crea una matrice decisionale", 1)["intent"] == "generative"
+        result = QuestionClassifier.classify("Perché la delibera è stata revocata?", 1)
+        assert result["intent"] == "interpretation"
+        assert result["confidence"] == 0.80
+
+    def test_weights_match_pattern_weights_module(self):
+        matcher = _keyword_matcher()
+        text = "ciao, come stai? mi piace il calcio"
+
+        found = matcher.find(text)[QueryIntent.CONVERSATIONAL.value]
+
+        assert found
+        for pattern, weight in found:
+            assert weight == get_weighted_confidence([pattern], "PERSONAL")
+
+    def test_memoized_per_normalized_question(self):
+        QuestionClassifier.classify("Quanti atti ha approvato la giunta?", 1)
+        first = QuestionClassifier.classify("  QUANTI atti ha approvato la giunta?", 1, model="llm_fallback")
+
+        assert _classify_keywords.cache_info().hits == 1
+        assert first["model"] == "llm_fallback"
+        assert first["question"] == "  QUANTI atti ha approvato la giunta?"
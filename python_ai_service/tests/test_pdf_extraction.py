@@ -0,0 +1,184 @@
+"""
+Unit Tests for page-streamed PDF extraction, the incremental chunker and the PDF text cache
+"""
+
+import asyncio
+import random
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pytest
+
+from app.services import pdf_extraction
+from app.services.pa_act_mongodb_importer import PAActMongoDBImporter
+from app.services.pdf_extraction import (
+    IncrementalChunker,
+    PDFExtractionService,
+    PDFTextCache,
+    extract_document,
+    split_text_into_chunks,
+)
+
+PAGES = [
+    "DETERMINAZIONE DIRIGENZIALE n. 123/2024\n\nIL DIRIGENTE\n\n" + "Premesso che il servizio di manutenzione è necessario. " * 30,
+    "Considerato che la spesa trova copertura nel bilancio.\n\n" + "Visto il decreto legislativo 36/2023. " * 40,
+    "DETERMINA\n\n1. di affidare il servizio;\n\n2. di impegnare la spesa di euro 12.000,00.",
+]
+
+
+@pytest.fixture(autouse=True)
+def _cache_dir(tmp_path):
+    saved = PDFTextCache.base_dir
+    PDFTextCache.reset(tmp_path / "pdf_text_cache")
+    yield
+    PDFTextCache.reset(saved)
+
+
+@pytest.fixture
+def pdf_file(tmp_path):
+    path = tmp_path / "atto.pdf"
+    path.write_bytes(b"%PDF-1.4 contenuto di prova")
+    return str(path)
+
+
+class CountingPages:
+    """Stand-in di iter_pdf_pages: conta i parsing"""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.calls = 0
+
+    def __call__(self, pdf_path):
+        self.calls += 1
+        yield from self.pages
+
+
+def _reference_text(pages):
+    # Testo prodotto dalla vecchia estrazione (text += page + "\n")
+    text = ""
+    for page in pages:
+        text += page + "\n"
+    return text.strip()
+
+
+class TestIncrementalChunker:
+    """Test suite for IncrementalChunker"""
+
+    def test_matches_whole_text_chunking_for_any_split(self):
+        rng = random.Random(7)
+        words = ["delibera", "servizio", "\n", "\n\n", " \n  \n", "spesa", "\t"]
+        for _ in range(100):
+            text = " ".join(rng.choice(words) for _ in range(rng.randint(0, 2500)))
+            expected = split_text_into_chunks(text)
+            chunker = IncrementalChunker()
+            chunks = []
+            position = 0
+            while position < len(text):
+                step = rng.randint(1, 300)
+                chunks.extend(chunker.feed(text[position:position + step]))
+                position += step
+            chunks.extend(chunker.finish())
+            assert chunks == expected
+
+    def test_short_text_has_no_chunks(self):
+        assert split_text_into_chunks("   Oggetto breve   ") == []
+
+    def test_overlap_and_indexes(self):
+        text = "\n\n".join(f"Paragrafo {i} " + "x" * 600 for i in range(6))
+        chunks = split_text_into_chunks(text, chunk_size=1300, overlap=100)
+        assert [chunk["chunk_index"] for chunk in chunks] == list(range(len(chunks)))
+        assert len(chunks) > 1
+        assert chunks[1]["chunk_text"].startswith(chunks[0]["chunk_text"][-100:])
+
+    def test_importer_uses_same_chunker(self):
+        text = "\n\n".join(PAGES)
+        importer = PAActMongoDBImporter(dry_run=True)
+        assert importer.split_text_into_chunks(text) == split_text_into_chunks(text, importer.CHUNK_SIZE, importer.CHUNK_OVERLAP)
+
+
+class TestExtractDocument:
+    """Test suite for extract_document and PDFTextCache"""
+
+    def test_text_and_chunks_in_one_pass(self, pdf_file):
+        pages = CountingPages(PAGES)
+        with patch.object(pdf_extraction, "iter_pdf_pages", pages):
+            result = extract_document(pdf_file)
+
+        assert pages.calls == 1
+        assert result["text"] == _reference_text(PAGES)
+        assert result["chunks"] == split_text_into_chunks(result["text"])
+        assert result["page_count"] == 3
+        assert result["cached"] is False
+
+    def test_cache_hit_skips_parsing(self, pdf_file):
+        pages = CountingPages(PAGES)
+        with patch.object(pdf_extraction, "iter_pdf_pages", pages):
+            first = extract_document(pdf_file)
+            second = extract_document(pdf_file)
+
+        assert pages.calls == 1
+        assert second["cached"] is True
+        assert second["text"] == first["text"]
+        assert second["chunks"] == first["chunks"]
+        assert second["content_hash"] == first["content_hash"]
+
+    def test_cache_keyed_by_content(self, pdf_file, tmp_path):
+        other = tmp_path / "copia.pdf"
+        other.write_bytes(open(pdf_file, "rb").read())
+        changed = tmp_path / "modificato.pdf"
+        changed.write_bytes(b"%PDF-1.4 altro contenuto")
+
+        pages = CountingPages(PAGES)
+        with patch.object(pdf_extraction, "iter_pdf_pages", pages):
+            extract_document(pdf_file)
+            assert extract_document(str(other))["cached"] is True
+            assert extract_document(str(changed))["cached"] is False
+        assert pages.calls == 2
+
+    def test_cache_disabled(self, pdf_file):
+        pages = CountingPages(PAGES)
+        with patch.object(pdf_extraction, "iter_pdf_pages", pages):
+            extract_document(pdf_file, use_cache=False)
+            result = extract_document(pdf_file, use_cache=False)
+        assert pages.calls == 2
+        assert result["content_hash"] is None
+
+    def test_corrupt_cache_entry_is_reparsed(self, pdf_file):
+        pages = CountingPages(PAGES)
+        with patch.object(pdf_extraction, "iter_pdf_pages", pages):
+            content_hash = extract_document(pdf_file)["content_hash"]
+            PDFTextCache._path(content_hash).write_bytes(b"non gzip")
+            result = extract_document(pdf_file)
+        assert pages.calls == 2
+        assert result["text"] == _reference_text(PAGES)
+
+    def test_parse_error_propagates_and_extract_text_returns_none(self, pdf_file):
+        def broken(pdf_path):
+            yield PAGES[0]
+            raise ValueError("xref rotto")
+
+        with patch.object(pdf_extraction, "iter_pdf_pages", broken):
+            with pytest.raises(ValueError):
+                extract_document(pdf_file)
+            assert pdf_extraction.extract_text(pdf_file) is None
+        assert list(PDFTextCache.base_dir.rglob("*.txt.gz")) == []
+
+
+class TestPDFExtractionService:
+    """Test suite for the process-pool service"""
+
+    def test_extract_runs_in_executor(self, pdf_file):
+        executor = ThreadPoolExecutor(max_workers=1)
+        pages = CountingPages(PAGES)
+        try:
+            with patch.object(PDFExtractionService, "get_executor", return_value=executor), \
+                 patch.object(pdf_extraction, "iter_pdf_pages", pages):
+                importer = PAActMongoDBImporter(dry_run=True)
+                text = asyncio.run(importer.aextract_pdf_text(pdf_file))
+                cached = asyncio.run(PDFExtractionService.extract(pdf_file))
+        finally:
+            executor.shutdown()
+
+        assert text == _reference_text(PAGES)
+        assert cached["cached"] is True
+        assert pages.calls == 1
@@ -0,0 +1,286 @@
+"""
+Unit Tests for pipeline tracing (spans, provider/Mongo timing, Prometheus export)
+"""
+
+import asyncio
+import httpx
+import pytest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routers import chat, health
+from app.services.mongodb_async import AsyncMongoDBService
+from app.services.providers import openai_adapter
+from app.services.providers.openai_adapter import OpenAIChatAdapter
+from app.services.rag_fortress.stream_events import generate_streaming, stream_events
+from app.services.tracing import (
+    PipelineMetrics,
+    mark_stage,
+    mongo_command_listener,
+    span,
+    start_trace,
+    traced_provider_call,
+    traced_provider_stream,
+)
+
+
+class FakeProvider:
+    model = "gpt-4o-mini"
+
+    @traced_provider_call("openai", "generate")
+    async def generate(self, messages, **options):
+        return {"content": "ok", "usage": {"prompt_tokens": 120, "completion_tokens": 30}, "model": "gpt-4o-mini-2024"}
+
+    @traced_provider_call("openai", "embed")
+    async def embed(self, text, **options):
+        return {"embedding": [0.1], "tokens": 4}
+
+    @traced_provider_call("openai", "embed_batch")
+    async def embed_batch(self, texts, **options):
+        return [await self.embed(text) for text in texts]
+
+    @traced_provider_call("anthropic", "generate")
+    async def generate_anthropic(self, messages, **options):
+        return {"content": "ok", "usage": {"input_tokens": 50, "output_tokens": 10}, "model": "claude-sonnet-4"}
+
+    @traced_provider_call("openai", "generate")
+    async def generate_failing(self, messages, **options):
+        raise RuntimeError("429")
+
+    @traced_provider_stream("openai")
+    async def generate_stream_failing(self, messages, **options):
+        yield "Il "
+        raise RuntimeError("connection reset")
+
+
+@pytest.fixture(autouse=True)
+def _reset_metrics():
+    PipelineMetrics.reset()
+    yield
+    PipelineMetrics.reset()
+
+
+class TestTrace:
+    """Test suite for spans and sequential stages"""
+
+    def test_sequential_stages_and_nested_spans(self):
+        async def pipeline():
+            with start_trace("rag_fortress_strict") as trace:
+                mark_stage("retrieval")
+                with span("vector_search", top_k=100):
+                    await asyncio.sleep(0.02)
+                mark_stage("verification")
+                await asyncio.sleep(0.01)
+                trace.mark_stage(None)
+                return trace.to_dict()
+
+        result = asyncio.run(pipeline())
+
+        stages = {s["stage"]: s for s in result["stages"]}
+        assert set(stages) == {"retrieval", "vector_search", "verification"}
+        assert stages["vector_search"]["top_k"] == 100
+        assert stages["retrieval"]["ms"] >= stages["vector_search"]["ms"] >= 15
+        assert stages["verification"]["start_ms"] >= stages["retrieval"]["start_ms"]
+
+    def test_spans_from_concurrent_tasks(self):
+        async def search(i):
+            with span("vector_search", query=i):
+                await asyncio.sleep(0.01)
+
+        async def pipeline():
+            with start_trace("t") as trace:
+                await asyncio.gather(*(search(i) for i in range(3)))
+                return trace.to_dict()
+
+        result = asyncio.run(pipeline())
+
+        assert sorted(s["query"] for s in result["stages"]) == [0, 1, 2]
+
+    def test_no_trace_outside_request(self):
+        with span("embedding"):
+            pass
+        mark_stage("retrieval")
+        assert 'stage="embedding"' in PipelineMetrics.render_prometheus()
+
+
+class TestProviderCalls:
+    """Test suite for traced_provider_call"""
+
+    def test_tokens_aggregated_across_providers(self):
+        provider = FakeProvider()
+
+        async def run():
+            with start_trace("t") as trace:
+                await provider.generate([])
+                await provider.generate_anthropic([])
+                return trace.to_dict()
+
+        result = asyncio.run(run())
+
+        assert result["tokens"] == {"prompt": 170, "completion": 40, "total": 210}
+        assert result["providers"]["openai:gpt-4o-mini-2024"]["calls"] == 1
+        assert result["providers"]["anthropic:claude-sonnet-4"]["input_tokens"] == 50
+
+    def test_nested_calls_counted_once(self):
+        provider = FakeProvider()
+
+        async def run():
+            with start_trace("t") as trace:
+                await provider.embed_batch(["a", "b", "c"])
+                return trace.to_dict()
+
+        entry = asyncio.run(run())["providers"]["openai:gpt-4o-mini"]
+
+        assert entry["calls"] == 1
+        assert entry["operations"] == {"embed_batch": 1}
+        assert entry["input_tokens"] == 12
+
+    def test_errors_recorded(self):
+        async def run():
+            with start_trace("t") as trace:
+                with pytest.raises(RuntimeError):
+                    await FakeProvider().generate_failing([])
+                return trace.to_dict()
+
+        assert asyncio.run(run())["providers"]["openai:gpt-4o-mini"]["errors"] == 1
+        assert 'natan_provider_errors_total{operation="generate",provider="openai"} 1' in PipelineMetrics.render_prometheus()
+
+
+class TestProviderStreams:
+    """Test suite for traced_provider_stream"""
+
+    def test_streamed_request_recorded_on_close(self):
+        body = (
+            'data: {"choices":[{"delta":{"content":"Il bilancio"}}]}\n\n'
+            'data: {"choices":[{"delta":{"content":" 2024"},"finish_reason":"stop"}]}\n\n'
+            'data: {"model":"gpt-4o-mini-2024","choices":[],"usage":{"prompt_tokens":80,"completion_tokens":5}}\n\n'
+            "data: [DONE]\n\n"
+        )
+        client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, text=body)))
+        adapter = OpenAIChatAdapter(model="gpt-4o-mini")
+        adapter.api_key = "sk-test"
+
+        async def run():
+            with start_trace("t") as trace:
+                with patch.object(openai_adapter.HTTPClientRegistry, "get", return_value=client):
+                    events = [event async for event in stream_events(generate_streaming(adapter, []))]
+                return events, trace.to_dict()
+
+        events, result = asyncio.run(run())
+
+        assert events[-1]["data"]["content"] == "Il bilancio 2024"
+        entry = result["providers"]["openai:gpt-4o-mini-2024"]
+        assert entry["operations"] == {"generate_stream": 1}
+        assert (entry["input_tokens"], entry["output_tokens"]) == (80, 5)
+        assert result["tokens"] == {"prompt": 80, "completion": 5, "total": 85}
+        assert 'operation="generate_stream",provider="openai"' in PipelineMetrics.render_prometheus()
+
+    def test_stream_errors_recorded(self):
+        async def run():
+            chunks = []
+            with start_trace("t") as trace:
+                with pytest.raises(RuntimeError):
+                    async for chunk in FakeProvider().generate_stream_failing([]):
+                        chunks.append(chunk)
+                return chunks, trace.to_dict()
+
+        chunks, result = asyncio.run(run())
+
+        assert chunks == ["Il "]
+        assert result["providers"]["openai:gpt-4o-mini"]["errors"] == 1
+
+
+class TestMongoTiming:
+    """Test suite for MongoDB command timing"""
+
+    def test_commands_in_worker_threads_join_request_trace(self):
+        def fake_find():
+            # pymongo chiama il listener nel thread che esegue il comando
+            mongo_command_listener.succeeded(SimpleNamespace(command_name="aggregate", duration_micros=12_500))
+            return []
+
+        async def run():
+            with start_trace("t") as trace:
+                await AsyncMongoDBService.run(fake_find)
+                return trace.to_dict()
+
+        result = asyncio.run(run())
+
+        assert result["mongo"]["aggregate"] == {"calls": 1, "ms": 12.5, "failures": 0}
+
+    def test_failures_counted(self):
+        mongo_command_listener.failed(SimpleNamespace(command_name="find", duration_micros=1000))
+
+        assert 'natan_mongo_command_failures_total{command="find"} 1' in PipelineMetrics.render_prometheus()
+
+
+class TestPrometheusExport:
+    """Test suite for PipelineMetrics exposition"""
+
+    def test_histogram_format(self):
+        PipelineMetrics.observe_stage("synthesis", 0.3)
+        PipelineMetrics.observe_stage("synthesis", 3.0)
+
+        text = PipelineMetrics.render_prometheus()
+
+        assert "# TYPE natan_pipeline_stage_duration_seconds histogram" in text
+        assert 'natan_pipeline_stage_duration_seconds_bucket{stage="synthesis",le="0.5"} 1' in text
+        assert 'natan_pipeline_stage_duration_seconds_bucket{stage="synthesis",le="+Inf"} 2' in text
+        assert 'natan_pipeline_stage_duration_seconds_count{stage="synthesis"} 2' in text
+
+    def test_metrics_endpoint(self):
+        PipelineMetrics.observe_stage("retrieval", 0.1)
+        app = FastAPI()
+        app.include_router(health.router)
+
+        response = TestClient(app).get("/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert 'stage="retrieval"' in response.text
+
+    def test_stats_summary(self):
+        PipelineMetrics.observe_stage("urs", 0.002)
+
+        stats = PipelineMetrics.get_stats()
+
+        assert stats["pipeline_stage"]['stage="urs"'] == {"count": 1, "avg_ms": 2.0}
+
+
+class TestChatUsage:
+    """Test suite for trace-based usage in chat responses"""
+
+    def _run_pipeline(self, trace_in_response: bool):
+        from app.services.rag_fortress import pipeline
+
+        async def fake_pipeline(*args, **kwargs):
+            mark_stage("retrieval")
+            await FakeProvider().generate([])
+            return {"answer": "ok", "sources": []}
+
+        instance = MagicMock()
+        instance.rag_fortress = fake_pipeline
+        with patch.object(pipeline, "_pipeline_instance", instance), \
+             patch.object(pipeline, "ANSWER_CACHE_ENABLED", False), \
+             patch.object(pipeline, "PIPELINE_TRACE_IN_RESPONSE", trace_in_response):
+            return asyncio.run(pipeline.rag_fortress("Delibere 2024?", "1"))
+
+    def test_rag_fortress_result_carries_trace(self):
+        result = self._run_pipeline(trace_in_response=True)
+
+        assert result["trace"]["name"] == "rag_fortress_strict"
+        assert result["trace"]["stages"][0]["stage"] == "retrieval"
+        usage = chat._pipeline_usage(result, elapsed_ms=10)
+        assert usage["prompt_tokens"] == 120
+        assert usage["total_tokens"] == 150
+        assert chat._pipeline_debug(result)["trace"]["tokens"]["total"] == 150
+
+    def test_usage_without_trace_in_response(self):
+        result = self._run_pipeline(trace_in_response=False)
+
+        assert "trace" not in result and chat._pipeline_debug(result) is None
+        usage = chat._pipeline_usage(result, elapsed_ms=10)
+        assert (usage["prompt_tokens"], usage["completion_tokens"], usage["total_tokens"]) == (120, 30, 150)
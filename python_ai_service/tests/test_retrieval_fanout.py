@@ -0,0 +1,128 @@
+"""
+Unit Tests for fan-out retrieval (batched embeddings, concurrent searches, RRF)
+"""
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.services.rag_fortress.retriever import HybridRetriever, reciprocal_rank_fusion
+
+
+def _ev(ev_id: str, score: float = 0.5) -> dict:
+    return {"evidence_id": ev_id, "content": ev_id, "score": score}
+
+
+class TestReciprocalRankFusion:
+    """Test suite for reciprocal_rank_fusion"""
+
+    def test_documents_found_by_more_queries_rank_first(self):
+        fused = reciprocal_rank_fusion([
+            [_ev("a"), _ev("b"), _ev("c")],
+            [_ev("c"), _ev("d")],
+        ])
+
+        assert [ev["evidence_id"] for ev in fused][:1] == ["c"]
+        assert {ev["evidence_id"] for ev in fused} == {"a", "b", "c", "d"}
+        assert fused[0]["rrf_score"] == pytest.approx(1 / 63 + 1 / 61)
+
+    def test_keeps_highest_original_score(self):
+        fused = reciprocal_rank_fusion([[_ev("a", 0.4)], [_ev("a", 0.9)]])
+
+        assert len(fused) == 1
+        assert fused[0]["score"] == 0.9
+
+    def test_empty_lists(self):
+        assert reciprocal_rank_fusion([]) == []
+        assert reciprocal_rank_fusion([[], []]) == []
+
+
+class TestRetrieveEvidenceMulti:
+    """Test suite for HybridRetriever.retrieve_evidence_multi"""
+
+    def _retriever(self, adapter):
+        with patch("app.services.rag_fortress.retriever.AIRouter") as router_cls:
+            router_cls.return_value.get_embedding_adapter.return_value = adapter
+            return HybridRetriever()
+
+    def test_embeds_once_and_searches_concurrently(self):
+        adapter = MagicMock()
+        adapter.embed_batch = AsyncMock(return_value=[{"embedding": [float(i)]} for i in range(3)])
+        retriever = self._retriever(adapter)
+
+        in_flight = {"now": 0, "peak": 0}
+
+        async def fake_retrieve(question, tenant_id, user_id=None, top_k=100,
+                                relevance_threshold=None, question_embedding=None):
+            in_flight["now"] += 1
+            in_flight["peak"] = max(in_flight["peak"], in_flight["now"])
+            await asyncio.sleep(0.01)
+            in_flight["now"] -= 1
+            assert relevance_threshold == 0.0
+            return [_ev(f"doc-{question_embedding[0]:.0f}"), _ev("shared")]
+
+        with patch.object(retriever, "retrieve_evidence", side_effect=fake_retrieve) as retrieve:
+            evidences = asyncio.run(retriever.retrieve_evidence_multi(
+                ["q1", "q2", "q3"], tenant_id="1", relevance_threshold=0.0
+            ))
+
+        adapter.embed_batch.assert_awaited_once_with(["q1", "q2", "q3"])
+        assert retrieve.call_count == 3
+        assert in_flight["peak"] == 3
+        assert evidences[0]["evidence_id"] == "shared"
+        assert len(evidences) == 4
+        # Nessuna mutazione dello stato condiviso
+        assert retriever.relevance_threshold == 0.5
+
+    def test_falls_back_to_concurrent_single_embeds(self):
+        adapter = MagicMock(spec=["embed"])
+        adapter.embed = AsyncMock(side_effect=lambda text: {"embedding": [len(text)]})
+        retriever = self._retriever(adapter)
+
+        embeddings = asyncio.run(retriever._generate_embeddings(["a", "bb"]))
+
+        assert embeddings == [[1], [2]]
+        assert adapter.embed.await_count == 2
+
+    def test_failed_query_does_not_drop_others(self):
+        adapter = MagicMock()
+        adapter.embed_batch = AsyncMock(return_value=[{"embedding": [0.0]}, {"embedding": [1.0]}])
+        retriever = self._retriever(adapter)
+
+        async def fake_retrieve(question, **kwargs):
+            if question == "bad":
+                raise RuntimeError("boom")
+            return [_ev("ok")]
+
+        with patch.object(retriever, "retrieve_evidence", side_effect=fake_retrieve):
+            evidences = asyncio.run(retriever.retrieve_evidence_multi(["bad", "good"], tenant_id=1))
+
+        assert [ev["evidence_id"] for ev in evidences] == ["ok"]
+
+    def test_threshold_is_per_call(self):
+        adapter = MagicMock()
+        retriever = self._retriever(adapter)
+        collection = MagicMock()
+        collection.aggregate.return_value = [
+            {"_id": "low", "content": "x", "score": 0.2},
+            {"_id": "high", "content": "y", "score": 0.8},
+        ]
+
+        async def run(fn, *args, **kwargs):
+            return fn(*args)
+
+        with patch("app.services.rag_fortress.retriever.AsyncMongoDBService") as async_mongo, \
+             patch("app.services.rag_fortress.retriever.MongoDBService") as mongo:
+            async_mongo.is_connected = AsyncMock(return_value=True)
+            async_mongo.run = AsyncMock(side_effect=run)
+            mongo.get_collection.return_value = collection
+
+            strict = asyncio.run(retriever.retrieve_evidence("domanda", tenant_id=1, question_embedding=[0.1]))
+            loose = asyncio.run(retriever.retrieve_evidence(
+                "domanda", tenant_id=1, question_embedding=[0.1], relevance_threshold=0.0
+            ))
+
+        assert [ev["evidence_id"] for ev in strict] == ["high"]
+        assert {ev["evidence_id"] for ev in loose} == {"low", "high"}
+        adapter.embed.assert_not_called()
@@ -0,0 +1,285 @@
+"""
+Unit Tests for ScannerHTTPFetcher and the async scanner strategies (local HTTP server, no real albi)
+"""
+
+import asyncio
+import json
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from app.scrapers.utils.high_water_mark import HighWaterMark
+from app.services.compliance_scanner import scanner as scanner_module
+from app.services.compliance_scanner import http_fetcher
+from app.services.compliance_scanner.http_fetcher import ConditionalCache, ScannerClientPool, ScannerHTTPFetcher
+from app.services.compliance_scanner.scanner import AlboPretorioComplianceScanner
+
+API_DELAY = 0.05
+ALBO_PAGES = 3
+
+
+def _card(numero: str) -> str:
+    return (
+        '<div class="card concorso-card multi-line">'
+        f'<p>Determinazione</p><p>N° registro {numero}</p><p>N° atto {numero}</p>'
+        '<p>Inizio pubblicazione 02/01/2025</p><p>Fine pubblicazione 17/01/2025</p>'
+        '<p>Affidamento del servizio di manutenzione ordinaria del verde pubblico comunale</p>'
+        f'<a href="/docs/{numero.replace("/", "_")}.pdf">PDF</a></div>'
+    )
+
+
+class _AlboHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = None
+
+    def _send(self, status: int, body: str = "", headers: dict = None, content_type: str = "text/html"):
+        payload = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        state = self.state
+        with state["lock"]:
+            state["in_flight"] += 1
+            state["max_in_flight"] = max(state["max_in_flight"], state["in_flight"])
+            state["api_calls"] += 1
+        time.sleep(API_DELAY)
+        with state["lock"]:
+            state["in_flight"] -= 1
+        docs = [{"numeroAdozione": f"{payload['tipiAtto'][0]}-{payload['annoAdozione']}", "oggetto": "Atto", "annoAdozione": payload["annoAdozione"]}]
+        self._send(200, json.dumps(docs), content_type="application/json")
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        state = self.state
+        state["gets"].append((url.path, dict(self.headers)))
+
+        if url.path == "/AOL/Affissione/ComuneFi/Page":
+            page = int(query.get("page", ["1"])[0])
+            body = f"<html><span>Pagina {page} di {ALBO_PAGES}</span>{_card(f'{page}/2025')}</html>"
+            self._send(200, body)
+        elif url.path == "/etag":
+            if self.headers.get("If-None-Match") == '"v1"':
+                self._send(304)
+            else:
+                self._send(200, "albo v1", {"ETag": '"v1"'})
+        elif url.path == "/last-modified":
+            if self.headers.get("If-Modified-Since") == "Wed, 01 Jan 2025 00:00:00 GMT":
+                self._send(304)
+            else:
+                self._send(200, "albo lm", {"Last-Modified": "Wed, 01 Jan 2025 00:00:00 GMT"})
+        elif url.path == "/old-albo":
+            self._send(301, "", {"Location": "/etag"})
+        elif url.path == "/albo/search.php":
+            # DataTables: 5 righe per anno, restituite a blocchi di length
+            anno = query["search[value]"][0]
+            start, length = int(query["start"][0]), int(query["length"][0])
+            rows = [[str(i), anno, f"Oggetto {i}", "", "", "", "", "", ""] for i in range(5)]
+            self._send(200, json.dumps({"recordsFiltered": 5, "data": rows[start:start + length]}), content_type="application/json")
+        else:
+            self._send(404, "not found")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def albo_server():
+    _AlboHandler.state = {"lock": threading.Lock(), "in_flight": 0, "max_in_flight": 0, "api_calls": 0, "gets": []}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _AlboHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", _AlboHandler.state
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def _reset_pools():
+    ConditionalCache.clear()
+    yield
+    asyncio.run(ScannerClientPool.aclose())
+    ConditionalCache.clear()
+
+
+class RecordingLimiter:
+    def __init__(self):
+        self.waits = 0
+        self.statuses = []
+
+    async def wait(self):
+        self.waits += 1
+
+    def adjust_for_response(self, response_time, status_code):
+        self.statuses.append(status_code)
+
+
+class TestScannerHTTPFetcher:
+    """Test suite for the fetch layer"""
+
+    def test_etag_conditional_get(self, albo_server):
+        base_url, state = albo_server
+        fetcher = ScannerHTTPFetcher()
+
+        async def twice():
+            return await fetcher.get(f"{base_url}/etag"), await fetcher.get(f"{base_url}/etag")
+
+        first, second = asyncio.run(twice())
+
+        assert first.text == "albo v1" and first.from_cache is False
+        assert second.status_code == 200 and second.from_cache is True
+        assert second.text == "albo v1"
+        assert state["gets"][1][1].get("If-None-Match") == '"v1"'
+        assert ConditionalCache.get_stats()["hits"] == 1
+
+    def test_last_modified_conditional_get(self, albo_server):
+        base_url, _ = albo_server
+        fetcher = ScannerHTTPFetcher()
+        asyncio.run(fetcher.get(f"{base_url}/last-modified"))
+        # Cache di processo: anche un nuovo fetcher (nuovo scan) riceve 304
+        second = asyncio.run(ScannerHTTPFetcher().get(f"{base_url}/last-modified"))
+        assert second.from_cache is True
+        assert second.text == "albo lm"
+
+    def test_conditional_disabled(self, albo_server):
+        base_url, state = albo_server
+        fetcher = ScannerHTTPFetcher(conditional=False)
+        asyncio.run(fetcher.get(f"{base_url}/etag"))
+        second = asyncio.run(fetcher.get(f"{base_url}/etag"))
+        assert second.from_cache is False
+        assert "If-None-Match" not in state["gets"][1][1]
+
+    def test_network_error_returns_none_and_gather_keeps_order(self, albo_server):
+        base_url, _ = albo_server
+        fetcher = ScannerHTTPFetcher(timeout=1)
+
+        responses = asyncio.run(fetcher.gather([
+            fetcher.get(f"{base_url}/etag"),
+            fetcher.get("http://127.0.0.1:9/albo"),
+            fetcher.get(f"{base_url}/missing"),
+        ]))
+
+        assert responses[0].text == "albo v1"
+        assert responses[1] is None
+        assert responses[2].status_code == 404 and not responses[2].ok
+
+    def test_rate_limiter_wraps_every_request(self, albo_server):
+        base_url, _ = albo_server
+        limiter = RecordingLimiter()
+        fetcher = ScannerHTTPFetcher(rate_limiter=limiter)
+
+        asyncio.run(fetcher.gather(fetcher.get(f"{base_url}/etag") for _ in range(3)))
+
+        assert limiter.waits == 3
+        assert limiter.statuses[0] == 200
+
+    def test_redirects_are_followed(self, albo_server):
+        base_url, state = albo_server
+
+        response = asyncio.run(ScannerHTTPFetcher().get(f"{base_url}/old-albo"))
+
+        assert response.ok and response.text == "albo v1"
+        assert [path for path, _ in state["gets"]] == ["/old-albo", "/etag"]
+
+    def test_client_pool_is_bounded(self, albo_server):
+        base_url, _ = albo_server
+        port = urlparse(base_url).port
+        fetcher = ScannerHTTPFetcher(conditional=False)
+
+        async def scan_hosts():
+            first = await fetcher.get(f"http://127.0.0.1:{port}/etag")
+            second = await fetcher.get(f"http://localhost:{port}/etag")
+            return first, second, ScannerClientPool.open_clients()
+
+        with patch.object(http_fetcher, "SCANNER_HTTP_MAX_CLIENTS", 1):
+            first, second, open_clients = asyncio.run(scan_hosts())
+
+        assert first.ok and second.ok
+        assert open_clients == 1
+
+    def test_parse_runs_off_event_loop_thread(self):
+        fetcher = ScannerHTTPFetcher()
+
+        async def parse_thread():
+            return threading.get_ident(), await fetcher.parse(threading.get_ident)
+
+        loop_thread, parse_thread_id = asyncio.run(parse_thread())
+        assert parse_thread_id != loop_thread
+
+
+class TestAsyncStrategies:
+    """Test suite for the Firenze / Sesto Fiorentino strategies on the fetch layer"""
+
+    def test_firenze_fan_out_is_parallel_and_bounded(self, albo_server, tmp_path):
+        base_url, state = albo_server
+        scanner = AlboPretorioComplianceScanner(output_dir=str(tmp_path), fetcher=ScannerHTTPFetcher(concurrency=8))
+
+        with patch.object(scanner_module, "FIRENZE_BASE_URL", base_url):
+            started = time.perf_counter()
+            documenti = asyncio.run(scanner._strategy_api_firenze())
+            elapsed = time.perf_counter() - started
+
+        combinazioni = len(scanner_module.FIRENZE_TIPI_ATTO) * len(scanner_module.FIRENZE_ANNI)
+        assert state["api_calls"] == combinazioni
+        assert 1 < state["max_in_flight"] <= 8
+        # In sequenza: 40 × 50ms = 2s
+        assert elapsed < combinazioni * API_DELAY / 2
+
+        api_docs = [doc for doc in documenti if doc["fonte"] == "API Atti"]
+        # Ordine tipi × anni preservato
+        assert [doc["numero"] for doc in api_docs[:2]] == ["DG-2018", "DG-2019"]
+        albo_docs = [doc for doc in documenti if doc["fonte"] == "Albo Pretorio HTML"]
+        assert [doc["numero"] for doc in albo_docs] == ["1/2025", "2/2025", "3/2025"]
+        assert albo_docs[0]["link"].endswith("/docs/1_2025.pdf")
+        assert albo_docs[0]["data"] == "02/01/2025"
+
+    def test_firenze_incremental_limits_years_and_pages(self, albo_server, tmp_path):
+        base_url, state = albo_server
+        scanner = AlboPretorioComplianceScanner(output_dir=str(tmp_path), fetcher=ScannerHTTPFetcher(concurrency=1))
+        # La prima pagina dell'albo contiene già l'atto più recente visto
+        mark = HighWaterMark(datetime(2025, 1, 2), "1/2025", ["1/2025"])
+
+        with patch.object(scanner_module, "FIRENZE_BASE_URL", base_url), \
+             patch.object(scanner_module, "FIRENZE_ANNI", [2023, 2024, 2025]):
+            documenti = asyncio.run(scanner._strategy_api_firenze(mark))
+
+        # Solo anno 2025 per i 5 tipi atto
+        assert state["api_calls"] == len(scanner_module.FIRENZE_TIPI_ATTO)
+        albo_gets = [path for path, _ in state["gets"] if path == "/AOL/Affissione/ComuneFi/Page"]
+        assert len(albo_gets) == 1
+        assert [doc["numero"] for doc in documenti if doc["fonte"] == "Albo Pretorio HTML"] == ["1/2025"]
+
+    def test_count_atti_firenze(self, albo_server, tmp_path):
+        base_url, _ = albo_server
+        scanner = AlboPretorioComplianceScanner(output_dir=str(tmp_path))
+        with patch.object(scanner_module, "FIRENZE_BASE_URL", base_url):
+            count = asyncio.run(scanner._count_atti_firenze())
+        assert count == len(scanner_module.FIRENZE_TIPI_ATTO) * len(scanner_module.FIRENZE_ANNI)
+
+    def test_sesto_year_pagination(self, albo_server, tmp_path):
+        base_url, _ = albo_server
+        scanner = AlboPretorioComplianceScanner(output_dir=str(tmp_path))
+
+        with patch.object(scanner_module, "SESTO_BATCH_SIZE", 2):
+            rows = asyncio.run(scanner._fetch_sesto_year(f"{base_url}/albo/search.php", 2024))
+
+        assert [row[0] for row in rows] == ["0", "1", "2", "3", "4"]
+        assert all(row[1] == "2024" for row in rows)
+
+    def test_strategy_requests_uses_fetcher(self, albo_server, tmp_path):
+        base_url, _ = albo_server
+        scanner = AlboPretorioComplianceScanner(output_dir=str(tmp_path))
+        assert asyncio.run(scanner._strategy_requests(f"{base_url}/etag")) == "albo v1"
+        assert asyncio.run(scanner._strategy_requests(f"{base_url}/missing")) is None
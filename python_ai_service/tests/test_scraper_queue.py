@@ -0,0 +1,264 @@
+"""
+Unit Tests for DistributedScraperQueue (concurrent multi-comune scraping)
+"""
+
+import asyncio
+import time
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+
+from app.scrapers.base_scraper import AttoPA, BaseAlboScraper, ScrapeResult
+from app.scrapers.distributed_queue import DistributedScraperQueue, HostRateLimiter, ScrapeTask
+from app.scrapers.factory import ScraperFactory
+from app.services.compliance_scanner.comuni_tracker import ComuniScrapingTracker
+from app.services.mongodb_service import MongoDBService
+from tests.benchmarks.harness import InMemoryClient
+
+
+class ConcurrencyProbe:
+    """Runner che registra la concorrenza globale e per host"""
+
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.running = 0
+        self.max_running = 0
+        self.running_per_host = {}
+        self.max_per_host = {}
+        self.calls = []
+
+    async def __call__(self, task, rate_limiter):
+        self.calls.append(task.key)
+        self.running += 1
+        self.running_per_host[task.host] = self.running_per_host.get(task.host, 0) + 1
+        self.max_running = max(self.max_running, self.running)
+        self.max_per_host[task.host] = max(self.max_per_host.get(task.host, 0), self.running_per_host[task.host])
+        await asyncio.sleep(self.delay)
+        self.running -= 1
+        self.running_per_host[task.host] -= 1
+        return {"comune": task.key, "host": rate_limiter.host}
+
+
+@pytest.fixture
+def tracker_db():
+    client = InMemoryClient()
+    db = client["scraper_queue_test"]
+    saved_connection = (MongoDBService._client, MongoDBService._db, MongoDBService._connected)
+    MongoDBService._client, MongoDBService._db, MongoDBService._connected = client, db, True
+    with patch.object(MongoDBService, "is_connected", return_value=True):
+        yield db
+    MongoDBService._client, MongoDBService._db, MongoDBService._connected = saved_connection
+
+
+def _tasks(count: int, host: str = None):
+    return [ScrapeTask(f"comune{i}", f"https://{host or f'albo{i}.example.it'}/albo") for i in range(count)]
+
+
+class TestDistributedScraperQueue:
+    """Test suite for the queue scheduling"""
+
+    def test_runs_comuni_concurrently(self):
+        probe = ConcurrencyProbe(delay=0.1)
+        queue = DistributedScraperQueue(probe, concurrency=8)
+
+        started = time.perf_counter()
+        outcomes = asyncio.run(queue.run(_tasks(8)))
+        elapsed = time.perf_counter() - started
+
+        assert probe.max_running == 8
+        # Circa quanto il comune più lento, non la somma (0.8s)
+        assert elapsed < 0.4
+        assert all(outcome.state == "completed" for outcome in outcomes.values())
+        assert outcomes["comune3"].result == {"comune": "comune3", "host": "albo3.example.it"}
+
+    def test_global_limit(self):
+        probe = ConcurrencyProbe()
+        asyncio.run(DistributedScraperQueue(probe, concurrency=3).run(_tasks(9)))
+        assert probe.max_running == 3
+        assert len(probe.calls) == 9
+
+    def test_one_task_per_host_and_shared_rate_limiter(self):
+        probe = ConcurrencyProbe()
+        tasks = _tasks(3, host="albo.shared.it") + _tasks(3)[:2]
+        tasks[3].key, tasks[4].key = "altro0", "altro1"
+        queue = DistributedScraperQueue(probe, concurrency=5)
+
+        asyncio.run(queue.run(tasks))
+
+        assert probe.max_per_host["albo.shared.it"] == 1
+        assert probe.max_running >= 2
+        assert len(queue.get_host_stats()) == 3
+        assert queue.get_rate_limiter("albo.shared.it") is queue.get_rate_limiter("albo.shared.it")
+
+    def test_host_falls_back_to_key(self):
+        assert ScrapeTask("Empoli").host == "empoli"
+        assert ScrapeTask("empoli", "https://WWW.Comune.Empoli.it/albo?page=1").host == "www.comune.empoli.it"
+
+    def test_retry_then_success(self):
+        attempts = {}
+
+        async def flaky(task, rate_limiter):
+            attempts[task.key] = attempts.get(task.key, 0) + 1
+            if attempts[task.key] == 1:
+                raise ConnectionError("timeout")
+            return "ok"
+
+        outcomes = asyncio.run(DistributedScraperQueue(flaky, max_attempts=3, retry_delay=0).run(_tasks(2)))
+
+        assert attempts == {"comune0": 2, "comune1": 2}
+        assert all(outcome.state == "completed" and outcome.attempts == 2 for outcome in outcomes.values())
+
+    def test_failed_result_after_max_attempts(self):
+        async def broken(task, rate_limiter):
+            return ScrapeResult(status="error", atti=[], errors=["down"], stats={})
+
+        queue = DistributedScraperQueue(broken, max_attempts=2, retry_delay=0, is_failure=lambda r: r.status == "error")
+        outcome = asyncio.run(queue.run(_tasks(1)))["comune0"]
+
+        assert outcome.state == "failed"
+        assert outcome.attempts == 2
+        assert outcome.result.status == "error"
+        assert queue.get_progress()["failed"] == 1
+
+    def test_progress_reporting(self):
+        snapshots = []
+        queue = DistributedScraperQueue(ConcurrencyProbe(delay=0), concurrency=2, progress_callback=snapshots.append)
+
+        asyncio.run(queue.run(_tasks(4)))
+
+        assert snapshots[0]["queued"] == 4
+        assert any(snapshot["running"] > 0 for snapshot in snapshots)
+        assert snapshots[-1]["completed"] == 4
+        assert snapshots[-1]["total"] == 4
+
+
+class TestHostRateLimiter:
+    """Test suite for the per-host limiter wrapper"""
+
+    def test_concurrent_waits_are_spaced(self):
+        limiter = HostRateLimiter("albo.example.it", preset="api_endpoint")
+
+        async def three_waits():
+            started = time.perf_counter()
+            await asyncio.gather(limiter.wait(), limiter.wait(), limiter.wait())
+            return time.perf_counter() - started
+
+        # min_delay 0.1s: la terza richiesta parte dopo ~0.2s
+        assert asyncio.run(three_waits()) >= 0.18
+        assert limiter.get_stats()["total_requests"] == 3
+
+
+class TestJobPersistence:
+    """Test suite for resume/retry through ComuniScrapingTracker"""
+
+    def test_resume_skips_completed_comuni(self, tracker_db):
+        failing = {"comune1"}
+
+        async def runner(task, rate_limiter):
+            if task.key in failing:
+                raise RuntimeError("albo non raggiungibile")
+            return task.key
+
+        first = asyncio.run(DistributedScraperQueue(runner, job_id="job-1", tenant_id=1, max_attempts=1).run(_tasks(3)))
+        assert first["comune1"].state == "failed"
+
+        states = ComuniScrapingTracker.get_queue_states("job-1", tenant_id=1)
+        assert {slug: state["state"] for slug, state in states.items()} == {
+            "comune0": "completed", "comune1": "failed", "comune2": "completed",
+        }
+        assert states["comune1"]["last_error"] == "albo non raggiungibile"
+
+        failing.clear()
+        probe_calls = []
+
+        async def second_runner(task, rate_limiter):
+            probe_calls.append(task.key)
+            return task.key
+
+        second = asyncio.run(DistributedScraperQueue(second_runner, job_id="job-1", tenant_id=1).run(_tasks(3)))
+
+        assert probe_calls == ["comune1"]
+        assert second["comune0"].state == "skipped"
+        assert second["comune1"].state == "completed"
+        assert ComuniScrapingTracker.get_queue_states("job-1", tenant_id=1)["comune1"]["state"] == "completed"
+
+    def test_queue_state_does_not_count_as_scraped(self, tracker_db):
+        ComuniScrapingTracker.update_queue_state("empoli", "job-1", "queued", tenant_id=1)
+        ComuniScrapingTracker.mark_comune_scraped("pisa", atti_estratti=10, tenant_id=1)
+        ComuniScrapingTracker.update_queue_state("pisa", "job-1", "completed", tenant_id=1)
+
+        assert [doc["comune_slug"] for doc in ComuniScrapingTracker.get_scraped_comuni(tenant_id=1)] == ["pisa"]
+        assert ComuniScrapingTracker.get_unscraped_comuni(["empoli", "pisa"], tenant_id=1) == ["empoli"]
+        pisa = tracker_db["scraped_comuni"].find_one({"comune_slug": "pisa"})
+        assert pisa["atti_estratti"] == 10
+        assert pisa["queue"]["state"] == "completed"
+
+
+class FakeAlboScraper(BaseAlboScraper):
+    async def detect_platform(self, url):
+        return True
+
+    async def get_total_pages(self, url):
+        return 3
+
+    async def scrape_page(self, url, page_num=1):
+        return [AttoPA(
+            numero=f"{page_num}/2024", data_pubblicazione=datetime(2024, 1, page_num), oggetto="Oggetto",
+            tipo_atto="delibera", url_dettaglio=url, comune_code=self.comune_code, tenant_id=self.tenant_id
+        )]
+
+
+class RecordingLimiter:
+    def __init__(self):
+        self.waits = 0
+        self.responses = []
+
+    async def wait(self):
+        self.waits += 1
+
+    def adjust_for_response(self, response_time, status_code):
+        self.responses.append(status_code)
+
+
+class TestScraperIntegration:
+    """Test suite for ScraperFactory.scrape_multiple and BaseAlboScraper politeness"""
+
+    def test_scrape_all_uses_rate_limiter(self, tmp_path):
+        limiter = RecordingLimiter()
+        scraper = FakeAlboScraper("empoli", "tenant_toscana", {"log_dir": str(tmp_path), "rate_limiter": limiter})
+
+        with patch("app.scrapers.base_scraper.asyncio.sleep") as sleep:
+            result = asyncio.run(scraper.scrape_all("https://albo.empoli.it"))
+
+        assert result.status == "success"
+        assert len(result.atti) == 3
+        assert limiter.waits == 3
+        assert limiter.responses == [200, 200, 200]
+        sleep.assert_not_called()
+
+    def test_scrape_multiple_runs_through_queue(self):
+        seen_configs = {}
+
+        async def fake_scrape_comune(comune_code, url, tenant_id, max_pages=None, config=None, save_to_mongodb=False, incremental=False):
+            seen_configs[comune_code] = config
+            if comune_code == "lucca":
+                raise RuntimeError("boom")
+            return ScrapeResult(status="success", atti=[], errors=[], stats={"comune_code": comune_code})
+
+        comuni = [
+            {"code": "empoli", "url": "https://albo.empoli.it"},
+            {"code": "prato", "url": "https://albo.prato.it"},
+            {"code": "lucca", "url": "https://albo.lucca.it"},
+        ]
+        with patch.object(ScraperFactory, "scrape_comune", side_effect=fake_scrape_comune), \
+             patch("app.scrapers.distributed_queue.SCRAPER_QUEUE_RETRY_DELAY_SECONDS", 0):
+            results = asyncio.run(ScraperFactory.scrape_multiple(comuni, "tenant_toscana", config={"timeout": 5}))
+
+        assert set(results) == {"empoli", "prato", "lucca"}
+        assert results["empoli"].status == "success"
+        assert results["lucca"].status == "error"
+        assert "boom" in results["lucca"].errors[0]
+        assert seen_configs["empoli"]["timeout"] == 5
+        assert isinstance(seen_configs["empoli"]["rate_limiter"], HostRateLimiter)
+        assert seen_configs["empoli"]["rate_limiter"].host == "albo.empoli.it"
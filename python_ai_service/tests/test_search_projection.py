@@ -0,0 +1,161 @@
+"""
+Unit Tests for the normalized search projection and the /commands filters compiled on it
+"""
+
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.routers import commands
+from app.services.mongodb_service import MongoDBService
+from app.services.search_projection import (
+    SEARCH_INDEXES,
+    backfill_collection,
+    build_search_projection,
+    canonical_value,
+    compile_filter,
+    ensure_search_indexes,
+    text_condition,
+)
+from tests.benchmarks.harness import InMemoryClient
+
+
+def _document(i: int, **fields) -> dict:
+    document = {
+        "_id": f"oid_{i}",
+        "document_id": f"pa_act_{i}",
+        "tenant_id": 1,
+        "title": f"Atto {i}",
+        "document_type": "pa_act",
+        "protocol_number": f"{i}/2025",
+        "protocol_date": 1_735_689_600_000 + i,
+        "metadata": {},
+    }
+    document.update(fields)
+    return document
+
+
+@pytest.fixture
+def documents_db():
+    client = InMemoryClient()
+    db = client["search_projection_test"]
+    saved_connection = (MongoDBService._client, MongoDBService._db, MongoDBService._connected)
+    MongoDBService._client, MongoDBService._db, MongoDBService._connected = client, db, True
+    with patch.object(MongoDBService, "is_connected", return_value=True):
+        yield db["documents"]
+    MongoDBService._client, MongoDBService._db, MongoDBService._connected = saved_connection
+
+
+def _insert(collection, *documents, projected: bool = True):
+    for document in documents:
+        if projected:
+            document.update(build_search_projection(document))
+        collection.insert_one(document)
+
+
+class TestBuildSearchProjection:
+    """Test suite for build_search_projection"""
+
+    def test_canonical_fields(self):
+        projection = build_search_projection(_document(
+            1,
+            title="Delibera di approvazione del Bilancio",
+            description="Esercizio finanziario 2025",
+            protocol_number=" DD/2025/123 ",
+            metadata={"direzione": "  Direzione  Urbanistica ", "responsabile": "Mario Rossì", "tipo_atto": "Delibera"},
+        ))
+
+        assert {"deliber", "approvazion", "bilanc", "eserciz", "finanziar", "2025"} <= set(projection["search_terms"])
+        assert len(projection["search_terms"]) == len(set(projection["search_terms"]))
+        assert projection["search_department"] == "direzione urbanistica"
+        assert projection["search_responsible"] == "mario rossi"
+        assert projection["search_protocols"] == ["dd/2025/123"]
+        assert projection["search_types"] == ["pa_act", "delibera"]
+
+    def test_department_priority_and_missing_values(self):
+        projection = build_search_projection(_document(1, department="Ambiente", metadata={"dipartimento": "Altro"}))
+        assert projection["search_department"] == "ambiente"
+        assert build_search_projection({})["search_responsible"] is None
+        assert canonical_value("   ") is None
+
+
+class TestCompileFilter:
+    """Test suite for compile_filter (natural-query)"""
+
+    def test_plain_regex_becomes_search_terms(self):
+        compiled = compile_filter({"$and": [{"title": {"$regex": "bilancio", "$options": "i"}}, {"tenant_id": 1}]})
+        indexed, legacy = compiled["$and"][0]["$and"][0]["$or"]
+        assert indexed == {"search_terms": {"$all": ["bilanc"]}}
+        assert legacy["$and"][1] == {"$or": [{"title": {"$regex": "bilancio", "$options": "i"}}]}
+
+    def test_department_and_protocol_equality(self):
+        compiled = compile_filter({"metadata.department": "Urbanistica", "protocol_number": {"$in": ["45/2025"]}, "tenant_id": 1})
+        assert compiled["tenant_id"] == 1
+        indexed = [condition["$or"][0] for condition in compiled["$and"]]
+        assert {"search_department": "urbanistica"} in indexed
+        assert {"search_protocols": {"$in": ["45/2025"]}} in indexed
+
+    def test_untranslatable_conditions_are_unchanged(self):
+        original = {"title": {"$regex": "^Delibera.*2025$"}, "protocol_date": {"$gte": 1}}
+        assert compile_filter(dict(original)) == original
+
+    def test_stopword_only_text_keeps_regex(self):
+        assert text_condition("di") == {"$or": [
+            {"title": {"$regex": "di", "$options": "i"}},
+            {"description": {"$regex": "di", "$options": "i"}},
+            {"metadata.title": {"$regex": "di", "$options": "i"}},
+        ]}
+
+
+class TestCommandsOnProjection:
+    """Test suite for /commands/atti and /atto on the projected fields"""
+
+    def _atti(self, **kwargs):
+        with patch.object(commands, "_ensure_connection", new=AsyncMock()):
+            return asyncio.run(commands.command_atti(commands.AttiCommandRequest(tenant_id=1, **kwargs)))
+
+    def test_text_department_and_type_filters(self, documents_db):
+        _insert(
+            documents_db,
+            _document(1, title="Approvazione bilancio di previsione", metadata={"direzione": "Ragioneria"}),
+            _document(2, title="Bilanci consuntivi", metadata={"dipartimento": "Urbanistica"}),
+            _document(3, title="Manutenzione verde", metadata={"direzione": "Ragioneria"}),
+            _document(4, title="Bilancio", tenant_id=2, metadata={"direzione": "Ragioneria"}),
+        )
+
+        result = self._atti(text="Bilancio", departments=["RAGIONERIA"], types=["PA_ACT"])
+
+        assert [row["document_id"] for row in result["rows"]] == ["pa_act_1"]
+
+    def test_legacy_documents_without_projection_still_match(self, documents_db):
+        _insert(documents_db, _document(1, title="Bilancio 2025"))
+        _insert(documents_db, _document(2, title="Bilancio storico", metadata={"responsabile": "Rossi"}), projected=False)
+
+        assert {row["document_id"] for row in self._atti(text="bilancio")["rows"]} == {"pa_act_1", "pa_act_2"}
+        assert [row["document_id"] for row in self._atti(responsibles=["Rossi"])["rows"]] == ["pa_act_2"]
+
+    def test_atto_by_protocol_number(self, documents_db):
+        _insert(documents_db, _document(7, protocol_number="DD/2025/7"))
+
+        with patch.object(commands, "_ensure_connection", new=AsyncMock()):
+            result = asyncio.run(commands.command_atto(commands.AttoCommandRequest(tenant_id=1, protocol_number="dd/2025/7")))
+
+        assert result["success"] and result["rows"][0]["document_id"] == "pa_act_7"
+
+
+class TestBackfill:
+    """Test suite for backfill_collection and ensure_search_indexes"""
+
+    def test_backfill_only_missing_documents(self, documents_db):
+        _insert(documents_db, _document(1, title="Bilancio"))
+        _insert(documents_db, _document(2, title="Verde pubblico"), _document(3, tenant_id=2), projected=False)
+
+        assert backfill_collection(documents_db, dry_run=True) == 2
+        assert backfill_collection(documents_db, tenant_id=1) == 1
+        assert documents_db.find_one({"_id": "oid_2"})["search_terms"] == ["verd", "pubblic"]
+        assert backfill_collection(documents_db, dry_run=True) == 1
+
+    def test_ensure_indexes(self, documents_db):
+        assert ensure_search_indexes(documents_db) is not None
+        assert [index["keys"][0] for index in SEARCH_INDEXES] == [("tenant_id", 1)] * len(SEARCH_INDEXES)
@@ -0,0 +1,227 @@
+"""
+Unit Tests for the materialized per-tenant statistics rollup (/commands/stats, /chat/estimate)
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+from app.routers import commands
+from app.services import stats_rollup
+from app.services.corpus_version import CorpusVersion
+from app.services.mongodb_service import MongoDBService
+from app.services.stats_rollup import STATS_ROLLUP_COLLECTION, StatsRollup, month_of, month_range
+from tests.benchmarks.harness import InMemoryClient
+
+
+def _document(i: int, **fields) -> dict:
+    document = {
+        "document_id": f"pa_act_{i}",
+        "tenant_id": 1,
+        "document_type": "pa_act",
+        "protocol_date": "2025-03-10",
+        "metadata": {"scraper_type": "albo_pretorio"},
+        "embedding": [0.1, 0.2],
+        "created_at": datetime(2025, 3, 10),
+    }
+    document.update(fields)
+    return document
+
+
+@pytest.fixture
+def stats_db():
+    client = InMemoryClient()
+    db = client["stats_rollup_test"]
+    saved_connection = (MongoDBService._client, MongoDBService._db, MongoDBService._connected)
+    MongoDBService._client, MongoDBService._db, MongoDBService._connected = client, db, True
+    with patch.object(MongoDBService, "is_connected", return_value=True):
+        yield db
+    MongoDBService._client, MongoDBService._db, MongoDBService._connected = saved_connection
+
+
+def _stored(db, tenant_id: int = 1) -> dict:
+    summary = StatsRollup.summary(db[STATS_ROLLUP_COLLECTION].find_one({"_id": tenant_id}))
+    return {key: value for key, value in summary.items() if key not in ("rebuilt_at", "updated_at")}
+
+
+def _rebuilt(tenant_id: int = 1) -> dict:
+    summary = StatsRollup.summary(StatsRollup.rebuild(tenant_id))
+    return {key: value for key, value in summary.items() if key not in ("rebuilt_at", "updated_at")}
+
+
+class TestMonths:
+    """Test suite for month bucketing and month-aligned date ranges"""
+
+    def test_month_of_supported_formats(self):
+        assert month_of("2025-03-10") == month_of("10/03/2025") == "2025-03"
+        assert month_of(datetime(2024, 12, 31, 23, 0)) == "2024-12"
+        assert month_of(datetime(2025, 2, 1).timestamp() * 1000) == "2025-02"
+        assert month_of("n.d.") is None and month_of(None) is None
+
+    def test_month_range(self):
+        assert month_range(None, None) == (None, None)
+        assert month_range("2025-01-01", "2025-03-31") == ("2025-01", "2025-03")
+        assert month_range("2024-02-01", "2024-02-29") == ("2024-02", "2024-02")
+        assert month_range("2025-01-15", None) is None
+        assert month_range(None, "2025-03-30") is None
+
+
+class TestRollupMaintenance:
+    """Test suite for the incremental deltas applied by MongoDBService writes"""
+
+    def test_rebuild_counts_every_dimension(self, stats_db):
+        stats_db["documents"].insert_many([
+            _document(1),
+            _document(2, document_type="delibera", protocol_date=None, metadata={"data_atto": "05/01/2025", "scraper_type": "albo_pretorio"}),
+            _document(3, scraper_type="trasparenza", metadata={}),
+            _document(4, tenant_id=2),
+        ])
+        stats_db["documents"].update_one({"document_id": "pa_act_3"}, {"$unset": {"embedding": ""}})
+
+        summary = StatsRollup.summary(StatsRollup.get(1))
+
+        assert summary["total"] == 3
+        assert (summary["embedded"], summary["not_embedded"]) == (2, 1)
+        assert summary["by_type"] == {"pa_act": 2, "delibera": 1}
+        assert summary["by_month"] == {"2025-01": 1, "2025-03": 2}
+        assert summary["by_scraper"] == {"albo_pretorio": 2, "trasparenza": 1}
+
+    def test_writes_apply_deltas_equal_to_rebuild(self, stats_db):
+        MongoDBService.insert_document("documents", _document(1))
+        StatsRollup.get(1)
+
+        MongoDBService.insert_document("documents", _document(2, embedding=None, document_type="delibera"))
+        MongoDBService.bulk_upsert("documents", [
+            _document(3, protocol_date="2025-04-02"),
+            {k: v for k, v in _document(4).items() if k != "embedding"},
+            _document(1, document_type="determina"),  # aggiornato: cambia tipo
+        ])
+        MongoDBService.update_document("documents", {"tenant_id": 1, "document_id": "pa_act_4"}, {"embedding": [0.3], "metadata.pdf_path": "x.pdf"})
+        MongoDBService.delete_documents("documents", {"tenant_id": 1, "document_id": "pa_act_2"})
+
+        assert _stored(stats_db) == _rebuilt()
+        assert _stored(stats_db)["by_type"] == {"determina": 1, "pa_act": 2}
+        assert _stored(stats_db)["embedded"] == 3
+
+    def test_writes_without_rollup_do_not_create_partial_counters(self, stats_db):
+        stats_db["documents"].insert_one(_document(1))
+        MongoDBService.insert_document("documents", _document(2))
+
+        assert stats_db[STATS_ROLLUP_COLLECTION].find_one({"_id": 1}) is None
+        assert StatsRollup.get(1)["total"] == 2
+
+    def test_wide_write_marks_rollup_stale(self, stats_db):
+        MongoDBService.bulk_upsert("documents", [_document(i) for i in range(5)])
+        StatsRollup.get(1)
+
+        with patch.object(stats_rollup, "STATS_ROLLUP_DELTA_MAX_DOCS", 2):
+            MongoDBService.delete_documents("documents", {"tenant_id": 1, "document_id": {"$in": ["pa_act_0", "pa_act_1", "pa_act_2"]}})
+
+        assert stats_db[STATS_ROLLUP_COLLECTION].find_one({"_id": 1})["stale"] is True
+        assert StatsRollup.get(1)["total"] == 2
+
+    def test_concurrent_insert_between_snapshot_and_write(self, stats_db):
+        MongoDBService.insert_document("documents", _document(1))
+        StatsRollup.get(1)
+        before_upsert = StatsRollup.before_upsert
+
+        def racing_snapshot(*args):
+            snapshot = before_upsert(*args)
+            # Un altro processo inserisce l'atto 2 dopo la lettura, prima della bulk_write
+            MongoDBService.insert_document("documents", _document(2))
+            return snapshot
+
+        with patch.object(StatsRollup, "before_upsert", side_effect=racing_snapshot):
+            MongoDBService.bulk_upsert("documents", [_document(2, document_type="delibera"), _document(3)])
+
+        assert stats_db[STATS_ROLLUP_COLLECTION].find_one({"_id": 1})["stale"] is True
+        assert StatsRollup.summary(StatsRollup.get(1))["by_type"] == {"pa_act": 2, "delibera": 1}
+
+    def test_bulk_write_error_invalidates_and_bumps_version(self, stats_db):
+        MongoDBService.insert_document("documents", _document(1))
+        StatsRollup.get(1)
+        version = CorpusVersion.get(1)
+        error = BulkWriteError({"writeErrors": [{"index": 0, "code": 11000, "errmsg": "E11000"}], "nUpserted": 1})
+
+        with patch.object(type(stats_db["documents"]), "bulk_write", side_effect=error):
+            with pytest.raises(BulkWriteError):
+                MongoDBService.bulk_upsert("documents", [_document(2), _document(3)])
+
+        assert stats_db[STATS_ROLLUP_COLLECTION].find_one({"_id": 1})["stale"] is True
+        assert CorpusVersion.get(1) != version
+
+    def test_old_rollup_is_rebuilt(self, stats_db):
+        MongoDBService.insert_document("documents", _document(1))
+        StatsRollup.get(1)
+        # Deriva non rilevata dai delta
+        stats_db[STATS_ROLLUP_COLLECTION].update_one({"_id": 1}, {"$set": {"total": 7}})
+        assert StatsRollup.get(1)["total"] == 7
+
+        stats_db[STATS_ROLLUP_COLLECTION].update_one(
+            {"_id": 1}, {"$set": {"rebuilt_at": datetime.utcnow() - timedelta(hours=25)}}
+        )
+        assert StatsRollup.get(1)["total"] == 1
+        with patch.object(stats_rollup, "STATS_ROLLUP_MAX_AGE_HOURS", 0):
+            stats_db[STATS_ROLLUP_COLLECTION].update_one(
+                {"_id": 1}, {"$set": {"total": 7, "rebuilt_at": datetime(2020, 1, 1)}}
+            )
+            assert StatsRollup.get(1)["total"] == 7
+
+    def test_field_names_are_escaped(self, stats_db):
+        MongoDBService.insert_document("documents", _document(1, document_type="d.lgs.$x|y", metadata={}))
+        summary = StatsRollup.summary(StatsRollup.get(1))
+        assert summary["by_type"] == {"d.lgs.$x|y": 1}
+        assert summary["by_scraper"] == {"": 1}
+
+    def test_not_connected_or_disabled(self, stats_db):
+        with patch.object(stats_rollup, "STATS_ROLLUP_ENABLED", False):
+            assert StatsRollup.embedded_count(1) is None
+        with patch.object(MongoDBService, "is_connected", return_value=False):
+            assert StatsRollup.get(1) is None
+
+
+class TestStatsEndpoints:
+    """Test suite for /commands/stats served from the rollup"""
+
+    def _stats(self, **kwargs):
+        with patch.object(commands, "_ensure_connection", new=AsyncMock()):
+            return asyncio.run(commands.command_stats(commands.StatsCommandRequest(tenant_id=1, **kwargs)))
+
+    def _seed(self):
+        MongoDBService.bulk_upsert("documents", [
+            _document(1),
+            _document(2),
+            _document(3, document_type="delibera", protocol_date="2025-01-20"),
+            _document(4, document_type="delibera", metadata={"scraper_type": "trasparenza"}),
+            _document(5, protocol_date=None),
+        ])
+
+    def test_stats_without_aggregation(self, stats_db):
+        self._seed()
+
+        # Il $group non è supportato dal client in memoria: la risposta viene dal rollup
+        result = self._stats()
+
+        assert result["rows"] == [{"document_type": "pa_act", "count": 3}, {"document_type": "delibera", "count": 2}]
+        assert result["total_acts"] == 5 and result["count"] == 2
+
+    def test_month_aligned_period_and_scraper_filter(self, stats_db):
+        self._seed()
+
+        result = self._stats(date_from="2025-03-01", date_to="2025-03-31", scraper_type="albo_pretorio")
+
+        assert result["rows"] == [{"document_type": "pa_act", "count": 2}]
+        assert self._stats(date_from="2025-01-01", limit=1)["total_acts"] == 4
+
+    def test_rebuild_endpoint(self, stats_db):
+        self._seed()
+        stats_db[STATS_ROLLUP_COLLECTION].update_one({"_id": 1}, {"$set": {"total": 0}})
+
+        with patch.object(commands, "_ensure_connection", new=AsyncMock()):
+            result = asyncio.run(commands.command_stats_rebuild(commands.CommandBaseRequest(tenant_id=1)))
+
+        assert result["total"] == 5 and result["embedded"] == 5
+        assert result["by_month"] == {"2025-01": 1, "2025-03": 3, "unknown": 1}
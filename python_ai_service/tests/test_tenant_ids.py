@@ -0,0 +1,65 @@
+"""
+Unit Tests for tenant_id normalization
+"""
+
+import asyncio
+from unittest.mock import MagicMock, patch
+
+from app.services.tenant_ids import normalize_collection, normalize_tenant_id
+from app.services.rag_fortress.retriever import HybridRetriever
+
+
+class TestNormalizeTenantId:
+    """Test suite for normalize_tenant_id"""
+
+    def test_numeric_values_become_int(self):
+        assert normalize_tenant_id("1") == 1
+        assert normalize_tenant_id(" 42 ") == 42
+        assert normalize_tenant_id(7) == 7
+
+    def test_non_numeric_values_are_unchanged(self):
+        assert normalize_tenant_id("florence") == "florence"
+        assert normalize_tenant_id(None) is None
+
+    def test_normalize_collection_dry_run_only_counts(self):
+        collection = MagicMock()
+        collection.count_documents.return_value = 3
+
+        assert normalize_collection(collection, dry_run=True) == 3
+        collection.update_many.assert_not_called()
+
+    def test_normalize_collection_converts_with_pipeline_update(self):
+        collection = MagicMock()
+        collection.count_documents.return_value = 2
+        collection.update_many.return_value.modified_count = 2
+
+        assert normalize_collection(collection) == 2
+        filter_query, pipeline = collection.update_many.call_args[0]
+        assert filter_query["tenant_id"]["$type"] == "string"
+        assert "$toInt" in pipeline[0]["$set"]["tenant_id"]
+
+
+class TestSingleVectorSearch:
+    """HybridRetriever issues exactly one $vectorSearch per query"""
+
+    def test_retrieve_evidence_runs_one_vector_search(self):
+        collection = MagicMock()
+        collection.aggregate.return_value = [
+            {"_id": "a", "document_id": "doc_a", "title": "Atto", "content": "testo", "score": 0.9}
+        ]
+
+        with patch('app.services.rag_fortress.retriever.MongoDBService') as mock_service, \
+             patch('app.services.mongodb_async.MongoDBService') as mock_async_service, \
+             patch('app.services.rag_fortress.retriever.AIRouter'):
+            mock_service.get_collection.return_value = collection
+            mock_async_service.is_connected.return_value = True
+
+            retriever = HybridRetriever()
+            retriever._generate_embedding = MagicMock(return_value=asyncio.sleep(0, [0.1, 0.2]))
+            retriever._detect_keywords = MagicMock(return_value=asyncio.sleep(0, False))
+
+            asyncio.run(retriever.retrieve_evidence("domanda", tenant_id="1"))
+
+        assert collection.aggregate.call_count == 1
+        pipeline = collection.aggregate.call_args[0][0]
+        assert pipeline[0]["$vectorSearch"]["filter"] == {"tenant_id": 1}
@@ -0,0 +1,216 @@
+"""
+Unit Tests for VectorIndex (IVF ANN index) and RetrieverService on top of it
+"""
+
+import numpy as np
+import pytest
+from unittest.mock import patch
+
+from app.services.vector_index import IVFIndex, TenantVectorIndex, VectorIndexRegistry
+from app.services.retriever_service import RetrieverService
+
+
+def _random_vectors(n: int, dim: int = 64, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return rng.standard_normal((n, dim)).astype(np.float32)
+
+
+def _make_documents(vectors: np.ndarray, chunks_per_doc: int = 2):
+    documents = []
+    for doc_idx in range(0, len(vectors), chunks_per_doc):
+        chunks = [
+            {
+                "chunk_index": offset,
+                "chunk_text": f"testo {doc_idx + offset}",
+                "embedding": vectors[doc_idx + offset].tolist()
+            }
+            for offset in range(min(chunks_per_doc, len(vectors) - doc_idx))
+        ]
+        documents.append({
+            "_id": f"oid_{doc_idx}",
+            "document_id": f"doc_{doc_idx}",
+            "tenant_id": 1,
+            "title": f"Atto {doc_idx}",
+            "document_type": "pa_act" if doc_idx % 4 == 0 else "other",
+            "embedding": vectors[doc_idx].tolist(),
+            "content": {"chunks": chunks, "full_text": "x" * 100}
+        })
+    return documents
+
+
+class TestIVFIndex:
+    """Test suite for IVFIndex"""
+
+    def test_exact_search_matches_brute_force(self):
+        vectors = _random_vectors(200)
+        index = IVFIndex(vectors, min_ivf_size=1000)
+        assert index.is_exact
+
+        query = vectors[17]
+        ids, scores = index.search(query, k=5)
+
+        normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        expected = np.argsort(-(normalized @ (query / np.linalg.norm(query))))[:5]
+        assert list(ids) == list(expected)
+        assert scores[0] == pytest.approx(1.0, abs=1e-5)
+
+    def test_ivf_search_has_high_recall(self):
+        vectors = _random_vectors(4000, dim=32, seed=1)
+        index = IVFIndex(vectors, min_ivf_size=1000)
+        assert not index.is_exact
+        assert index.nlist > 0
+
+        # Ogni vettore indicizzato deve ritrovare se stesso come primo risultato
+        hits = sum(int(index.search(vectors[i], k=1)[0][0] == i) for i in range(0, 4000, 40))
+        assert hits >= 95
+
+    def test_mask_restricts_candidates(self):
+        vectors = _random_vectors(50)
+        index = IVFIndex(vectors)
+        mask = np.zeros(50, dtype=bool)
+        mask[[3, 7, 9]] = True
+
+        ids, _ = index.search(vectors[0], k=10, mask=mask)
+        assert set(ids) == {3, 7, 9}
+
+    def test_empty_index(self):
+        index = IVFIndex(np.empty((0, 8), dtype=np.float32))
+        ids, scores = index.search(np.ones(8), k=3)
+        assert len(ids) == 0 and len(scores) == 0
+
+
+class TestTenantVectorIndex:
+    """Test suite for TenantVectorIndex"""
+
+    def test_from_documents_keeps_only_references_in_payload(self):
+        documents = _make_documents(_random_vectors(10))
+        index = TenantVectorIndex.from_documents(1, documents)
+
+        assert index.size == 10
+        assert index.document_count == 5
+        assert [entry["chunk_position"] for entry in index.entries[:2]] == [0, 1]
+        assert index.entries[0]["_id"] == "oid_0"
+        assert all(set(entry["doc"]) == set(TenantVectorIndex.FILTER_FIELDS) for entry in index.entries)
+
+    def test_document_type_filter(self):
+        documents = _make_documents(_random_vectors(16))
+        index = TenantVectorIndex.from_documents(1, documents)
+
+        hits = index.search(documents[1]["embedding"], k=20, filters={"document_type": "pa_act"})
+        assert hits
+        assert all(entry["doc"]["document_type"] == "pa_act" for entry, _ in hits)
+
+
+class TestRetrieverServiceWithIndex:
+    """RetrieverService.retrieve must keep the USE result shape"""
+
+    @pytest.fixture(autouse=True)
+    def clear_registry(self):
+        VectorIndexRegistry.invalidate()
+        # Nessun MongoDB nei test: versione del corpus costante
+        with patch('app.services.vector_index.CorpusVersion.get', return_value="0.0"):
+            yield
+        VectorIndexRegistry.invalidate()
+
+    def test_retrieve_returns_source_ref_metadata_similarity(self):
+        vectors = _random_vectors(20, seed=3)
+        documents = _make_documents(vectors)
+
+        by_id = {doc["_id"]: doc for doc in documents}
+        hydrated_ids = []
+
+        def hydrate(collection, ids):
+            hydrated_ids.extend(ids)
+            return {i: by_id[i] for i in hydrated_ids}
+
+        with patch('app.services.retriever_service.MongoDBService') as mock_service, \
+             patch('app.services.vector_index.MongoDBService') as mock_index_service:
+            mock_service.is_connected.return_value = True
+            mock_service.hydrate_documents.side_effect = hydrate
+            mock_index_service.iter_embeddings.return_value = iter(documents)
+
+            results = RetrieverService().retrieve(query_embedding=vectors[5].tolist(), tenant_id=1, limit=3)
+
+        # Only the surviving hits are hydrated
+        assert 0 < len(hydrated_ids) <= 3
+
+        assert results
+        assert results[0]["chunk_text"] == "testo 5"
+        assert results[0]["similarity"] == pytest.approx(1.0, abs=1e-5)
+        assert results[0]["source_ref"]["document_id"] == "doc_4"
+        assert "metadata" in results[0]
+        assert len(results) <= 3
+
+    def test_index_is_built_once_and_invalidated(self):
+        documents = _make_documents(_random_vectors(6))
+
+        with patch('app.services.vector_index.MongoDBService') as mock_index_service:
+            mock_index_service.iter_embeddings.side_effect = lambda *args, **kwargs: iter(documents)
+
+            first = VectorIndexRegistry.get_index(1)
+            assert VectorIndexRegistry.get_index(1) is first
+            assert mock_index_service.iter_embeddings.call_count == 1
+
+            VectorIndexRegistry.invalidate("1")
+            assert VectorIndexRegistry.get_index(1) is not first
+            assert mock_index_service.iter_embeddings.call_count == 2
+
+    def test_corpus_version_change_triggers_rebuild(self):
+        # Delete o import da un altro processo: nessuna invalidate(), solo la versione del corpus avanza
+        documents = _make_documents(_random_vectors(6))
+
+        with patch('app.services.vector_index.MongoDBService') as mock_index_service, \
+             patch('app.services.vector_index.CorpusVersion.get', return_value="1.0") as mock_version:
+            mock_index_service.iter_embeddings.side_effect = lambda *args, **kwargs: iter(documents)
+
+            first = VectorIndexRegistry.get_index(1)
+            assert VectorIndexRegistry.get_index(1) is first
+
+            mock_version.return_value = "2.0"
+            second = VectorIndexRegistry.get_index(1)
+            assert second is not first
+            assert second.version[2] == "2.0"
+            assert mock_index_service.iter_embeddings.call_count == 2
+
+    def test_invalidate_during_build_is_not_cached_as_fresh(self):
+        documents = _make_documents(_random_vectors(6))
+
+        def load_and_invalidate(*args, **kwargs):
+            # Import concluso mentre la build legge ancora i documenti
+            if mock_index_service.iter_embeddings.call_count == 1:
+                VectorIndexRegistry.invalidate(1)
+            return iter(documents)
+
+        with patch('app.services.vector_index.MongoDBService') as mock_index_service:
+            mock_index_service.iter_embeddings.side_effect = load_and_invalidate
+
+            stale = VectorIndexRegistry.get_index(1)
+            fresh = VectorIndexRegistry.get_index(1)
+
+            assert fresh is not stale
+            assert VectorIndexRegistry.get_index(1) is fresh
+            assert mock_index_service.iter_embeddings.call_count == 2
+
+
+class TestTwoPhaseFetch:
+    """VectorSearchService.knn_search streams embeddings and hydrates only the top K"""
+
+    def test_knn_search_hydrates_top_k_without_full_document(self):
+        from app.services.vector_search import VectorSearchService, KNN_METADATA_PROJECTION
+
+        vectors = _random_vectors(12, seed=5)
+        phase_one = [{"_id": f"oid_{i}", "embedding": vectors[i].tolist()} for i in range(12)]
+
+        with patch('app.services.vector_search.MongoDBService') as mock_service:
+            mock_service.iter_embeddings.return_value = iter(phase_one)
+            mock_service.hydrate_documents.side_effect = lambda collection, ids, projection: {
+                i: {"_id": i, "document_id": f"doc_{i}", "content": {"raw_text": "testo"}} for i in ids
+            }
+
+            results = VectorSearchService.knn_search(vectors[3].tolist(), tenant_id=1, k=2)
+
+            assert mock_service.hydrate_documents.call_args[1]["projection"] is KNN_METADATA_PROJECTION
+
+        assert [r["document_id"] for r in results][0] == "doc_oid_3"
+        assert len(results) == 2
+        assert all("document" not in r for r in results)
@@ -0,0 +1,87 @@
+"""
+Unit Tests for vector_scoring (shared vectorized cosine engine)
+"""
+
+import numpy as np
+import pytest
+
+from app.services import vector_scoring
+from app.services.conversational_learner import ConversationalLearner
+
+
+def _brute_force(query, vectors):
+    return [
+        float(np.dot(query, v) / (np.linalg.norm(query) * np.linalg.norm(v)))
+        for v in vectors
+    ]
+
+
+class TestVectorScoring:
+    """Test suite for vector_scoring"""
+
+    def test_build_matrix_skips_invalid_vectors(self):
+        matrix, positions = vector_scoring.build_matrix([
+            [1.0, 0.0, 0.0],
+            None,
+            [],
+            [0.0, 1.0],           # dimensione diversa
+            [0.0, 3.0, 4.0],
+        ])
+        assert matrix.shape == (2, 3)
+        assert list(positions) == [0, 4]
+        assert np.linalg.norm(matrix, axis=1) == pytest.approx([1.0, 1.0])
+
+    def test_search_matches_brute_force(self):
+        rng = np.random.default_rng(7)
+        vectors = rng.standard_normal((300, 32))
+        query = rng.standard_normal(32)
+        matrix, _ = vector_scoring.build_matrix(vectors.tolist())
+
+        hits = vector_scoring.search(query.tolist(), matrix, k=10)
+
+        expected = _brute_force(query, vectors)
+        expected_order = list(np.argsort(expected)[::-1][:10])
+        assert [row for row, _ in hits] == expected_order
+        assert hits[0][1] == pytest.approx(expected[expected_order[0]], abs=1e-5)
+
+    def test_min_score_filters_results(self):
+        matrix, _ = vector_scoring.build_matrix([[1.0, 0.0], [0.0, 1.0], [1.0, 1.0]])
+        hits = vector_scoring.search([1.0, 0.0], matrix, k=3, min_score=0.5)
+        assert [row for row, _ in hits] == [0, 2]
+
+    def test_batch_search_equals_single_searches(self):
+        rng = np.random.default_rng(11)
+        matrix, _ = vector_scoring.build_matrix(rng.standard_normal((50, 16)).tolist())
+        queries = rng.standard_normal((4, 16)).tolist()
+
+        batched = vector_scoring.batch_search(queries, matrix, k=5)
+        single = [vector_scoring.search(q, matrix, k=5) for q in queries]
+        assert [[row for row, _ in r] for r in batched] == [[row for row, _ in r] for r in single]
+
+    def test_dimension_mismatch_and_empty(self):
+        matrix, _ = vector_scoring.build_matrix([[1.0, 0.0]])
+        assert vector_scoring.search([1.0, 0.0, 0.0], matrix, k=1) == []
+        empty, _ = vector_scoring.build_matrix([])
+        assert vector_scoring.search([1.0], empty, k=1) == []
+
+    def test_cosine_similarity_compat(self):
+        assert vector_scoring.cosine_similarity([1, 0], [1, 0]) == pytest.approx(1.0)
+        assert vector_scoring.cosine_similarity([1, 0], [0, 0]) == 0.0
+        assert vector_scoring.cosine_similarity([1, 0], [1, 0, 0]) == 0.0
+
+
+class TestSemanticSearch:
+    """ConversationalLearner._semantic_search on top of vector_scoring"""
+
+    def test_returns_best_match_above_threshold(self):
+        learner = ConversationalLearner.__new__(ConversationalLearner)
+        learned = [
+            {"question": "a", "embedding": [1.0, 0.0]},
+            {"question": "b"},
+            {"question": "c", "embedding": [0.9, 0.1]},
+        ]
+        match = learner._semantic_search([0.9, 0.1], learned, threshold=0.85)
+        assert match["data"]["question"] == "c"
+        assert match["similarity"] == pytest.approx(1.0, abs=1e-5)
+
+        assert learner._semantic_search([0.0, 1.0], learned, threshold=0.85) is None